@@ -0,0 +1,4 @@
+"""
+Общие модули для примеров курса.
+Здесь находятся компоненты, которые используются сразу в нескольких уроках.
+"""
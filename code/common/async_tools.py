@@ -0,0 +1,134 @@
+"""
+Асинхронный слой инструментов агента
+Инструмент без асинхронной реализации (coroutine) при ainvoke выполняется
+в пуле потоков цикла событий: каждый вызов - переход в поток, а
+одновременно выполняется не больше вызовов, чем потоков в пуле (по
+умолчанию min(32, число ядер + 4)). Чтобы агент под ainvoke оставался в
+цикле событий от начала до конца, каждому инструменту нужна coroutine:
+
+    crm = ServiceClient("https://crm.example.com/api")
+    get_customer = StructuredTool.from_function(
+        func=lambda customer_id: format_customer(crm.get(f"/customers/{customer_id}")),
+        coroutine=...,  # async-функция с await crm.aget(f"/customers/{customer_id}")
+        name="GetCustomerInfo", description="...")
+
+    get_weather = inline_coroutine(get_weather)  # быстрый локальный инструмент
+
+ServiceClient - JSON-клиент REST-сервиса с парами методов get/aget,
+post/apost поверх пулов соединений httpx с keep-alive (большие пулы
+делятся на несколько небольших, см. common.llm_client). inline_coroutine
+подходит инструментам, которые не ждут сети или диска и работают доли
+миллисекунды (словарь, калькулятор, индекс в памяти): их coroutine
+вызывает func прямо в цикле событий, без перехода в поток.
+"""
+
+import threading
+
+import httpx
+from langchain_core.tools import BaseTool
+
+from .llm_client import ShardedAsyncTransport, ShardedTransport, sharded_transports
+
+
+class ServiceClient:
+    """JSON-клиент REST-сервиса: синхронные методы для func инструмента, асинхронные - для coroutine.
+
+    Ответ 404 возвращается как None (инструмент сообщает модели, что объект
+    не найден), остальные ошибочные статусы вызывают httpx.HTTPStatusError.
+    Асинхронный клиент привязан к циклу событий, в котором выполнен первый
+    запрос: один asyncio.run() на процесс, как в примерах курса.
+
+    Args:
+        base_url: Адрес сервиса (например, https://crm.example.com/api)
+        timeout: Таймаут запроса в секундах
+        max_connections: Наибольшее число соединений с сервисом у каждого из двух клиентов
+        headers: Заголовки всех запросов (например, авторизация)
+    """
+
+    def __init__(self, base_url, timeout=10.0, max_connections=100, headers=None):
+        self.base_url = base_url.rstrip("/")
+        self._limits = httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections)
+        self._kwargs = {"base_url": self.base_url, "timeout": timeout, "headers": headers}
+        self._client = None
+        self._async_client = None
+        self._lock = threading.Lock()
+
+    @property
+    def client(self):
+        if self._client is None:
+            with self._lock:
+                if self._client is None:
+                    self._client = httpx.Client(**sharded_transports(ShardedTransport, self._limits), **self._kwargs)
+        return self._client
+
+    @property
+    def async_client(self):
+        if self._async_client is None:
+            with self._lock:
+                if self._async_client is None:
+                    self._async_client = httpx.AsyncClient(
+                        **sharded_transports(ShardedAsyncTransport, self._limits), **self._kwargs)
+        return self._async_client
+
+    def request(self, method, path, json=None, params=None):
+        return _decode(self.client.request(method, path, json=json, params=params))
+
+    async def arequest(self, method, path, json=None, params=None):
+        return _decode(await self.async_client.request(method, path, json=json, params=params))
+
+    def get(self, path, **params):
+        return self.request("GET", path, params=params or None)
+
+    async def aget(self, path, **params):
+        return await self.arequest("GET", path, params=params or None)
+
+    def post(self, path, json=None):
+        return self.request("POST", path, json=json)
+
+    async def apost(self, path, json=None):
+        return await self.arequest("POST", path, json=json)
+
+    def close(self):
+        with self._lock:
+            if self._client is not None:
+                self._client.close()
+            self._client = None
+
+    async def aclose(self):
+        """Закрывает оба клиента из асинхронного кода."""
+        client, self._async_client = self._async_client, None
+        if client is not None:
+            await client.aclose()
+        self.close()
+
+
+def _decode(response):
+    """JSON ответа или None, если объект не найден."""
+    if response.status_code == 404:
+        return None
+    response.raise_for_status()
+    return response.json()
+
+
+def inline_coroutine(tool):
+    """Копия быстрого локального инструмента, которая при ainvoke выполняет func в цикле событий.
+
+    Пока func работает, остальные сессии в этом цикле ждут, поэтому
+    инструменты с сетью или диском нужно делать настоящими async-функциями.
+    """
+    func = getattr(tool, "func", None)
+    if func is None:
+        raise TypeError(f"Инструмент {tool.name} не основан на синхронной функции (нужен @tool, Tool или StructuredTool)")
+
+    async def coroutine(*args, **kwargs):
+        return func(*args, **kwargs)
+
+    return tool.model_copy(update={"coroutine": coroutine})
+
+
+def runs_in_thread(tool):
+    """True, если tool.ainvoke выполнит инструмент в пуле потоков, а не в цикле событий."""
+    if hasattr(tool, "coroutine"):
+        return tool.coroutine is None
+    # Собственный подкласс BaseTool асинхронен, только если переопределяет _arun
+    return type(tool)._arun is BaseTool._arun
@@ -0,0 +1,340 @@
+"""
+Общий пул HTTP-соединений для моделей OpenRouter
+Модуль выдает процессу один синхронный и один асинхронный HTTP-клиент
+с keep-alive (и HTTP/2, если установлен пакет h2), чтобы все цепочки
+переиспользовали соединения вместо отдельного пула в каждом ChatOpenAI.
+Большой пул делится на несколько небольших (ShardedTransport,
+ShardedAsyncTransport): учет соединений в пуле httpcore растет
+квадратично с его размером. Прокси из переменных окружения (HTTP_PROXY,
+HTTPS_PROXY, ALL_PROXY, NO_PROXY) учитываются, как в обычном клиенте httpx.
+"""
+
+import asyncio
+import atexit
+import importlib.util
+import ipaddress
+import math
+import os
+import threading
+import urllib.request
+from dataclasses import dataclass, replace
+
+import httpx
+from langchain_openai import ChatOpenAI
+
+DEFAULT_MODEL = "openai/gpt-3.5-turbo"
+OPENROUTER_API_BASE = "https://openrouter.ai/api/v1"
+
+
+@dataclass(frozen=True)
+class PoolConfig:
+    """Параметры пула соединений."""
+    max_connections: int = 20
+    max_keepalive_connections: int = 10
+    keepalive_expiry: float = 30.0
+    http2: bool = True
+    timeout: float = 60.0
+    shard_size: int = 8  # соединений в одном пуле (см. ShardedTransport)
+
+
+def _config_from_env() -> PoolConfig:
+    """Читает параметры пула из переменных окружения."""
+    defaults = PoolConfig()
+    return PoolConfig(
+        max_connections=int(os.getenv("LLM_POOL_MAX_CONNECTIONS", defaults.max_connections)),
+        max_keepalive_connections=int(os.getenv("LLM_POOL_MAX_KEEPALIVE", defaults.max_keepalive_connections)),
+        keepalive_expiry=float(os.getenv("LLM_POOL_KEEPALIVE_EXPIRY", defaults.keepalive_expiry)),
+        http2=os.getenv("LLM_HTTP2", "1") != "0",
+        timeout=float(os.getenv("LLM_HTTP_TIMEOUT", defaults.timeout)),
+        shard_size=int(os.getenv("LLM_POOL_SHARD_SIZE", defaults.shard_size)),
+    )
+
+
+_config = _config_from_env()
+_lock = threading.Lock()
+_sync_client = None
+_async_client = None
+
+
+def configure_http_pool(**kwargs) -> PoolConfig:
+    """Меняет параметры пула (max_connections, max_keepalive_connections, ...).
+
+    Настройки нужно задать до первого вызова get_http_client/create_chat_model,
+    иначе уже созданные модели продолжили бы работать со старым пулом.
+    """
+    global _config
+    with _lock:
+        if _sync_client is not None or _async_client is not None:
+            raise RuntimeError("Пул уже создан. Вызовите close_http_clients() перед изменением настроек")
+        _config = replace(_config, **kwargs)
+        return _config
+
+
+def _http2_available() -> bool:
+    """HTTP/2 в httpx требует необязательный пакет h2."""
+    return importlib.util.find_spec("h2") is not None
+
+
+def _client_kwargs() -> dict:
+    limits = httpx.Limits(
+        max_connections=_config.max_connections,
+        max_keepalive_connections=_config.max_keepalive_connections,
+        keepalive_expiry=_config.keepalive_expiry,
+    )
+    return {
+        "limits": limits,
+        "http2": _config.http2 and _http2_available(),
+        "timeout": httpx.Timeout(_config.timeout, connect=10.0),
+    }
+
+
+def _shard_limits(limits, shard_size):
+    """(число пулов, лимиты одного пула) для общих лимитов limits."""
+    shards = max(1, math.ceil(limits.max_connections / shard_size))
+    return shards, httpx.Limits(
+        max_connections=math.ceil(limits.max_connections / shards),
+        max_keepalive_connections=math.ceil(limits.max_keepalive_connections / shards),
+        keepalive_expiry=limits.keepalive_expiry,
+    )
+
+
+class ShardedTransport(httpx.BaseTransport):
+    """Транспорт из нескольких небольших пулов соединений.
+
+    Пул httpcore на каждое событие (новый запрос, ответ) перебирает свои
+    соединения, а свободные - попарно, так что на пуле в сотни соединений
+    учет занимает больше процессорного времени, чем сами запросы. Здесь
+    каждый запрос уходит в пул с наименьшим числом незавершенных запросов.
+
+    Args:
+        limits: Общие лимиты соединений; делятся между пулами поровну
+        shard_size: Наибольшее число соединений в одном пуле
+        **kwargs: Остальные параметры httpx.HTTPTransport (http2 и т.д.)
+    """
+
+    transport_class = httpx.HTTPTransport
+
+    def __init__(self, limits, shard_size=8, **kwargs):
+        shards, shard_limits = _shard_limits(limits, shard_size)
+        # Один SSL-контекст на все пулы: загрузка сертификатов занимает ~20 мс
+        kwargs.setdefault("verify", httpx.create_ssl_context())
+        self._transports = [self.transport_class(limits=shard_limits, **kwargs) for _ in range(shards)]
+        self._active = [0] * shards
+        self._lock = threading.Lock()
+
+    def _acquire(self):
+        with self._lock:
+            shard = self._active.index(min(self._active))
+            self._active[shard] += 1
+        return shard
+
+    def _release(self, shard):
+        with self._lock:
+            self._active[shard] -= 1
+
+    def handle_request(self, request):
+        shard = self._acquire()
+        try:
+            response = self._transports[shard].handle_request(request)
+        except BaseException:
+            self._release(shard)
+            raise
+        # Запрос занимает соединение, пока ответ не дочитан или не закрыт
+        response.stream = _ReleasingStream(response.stream, lambda: self._release(shard))
+        return response
+
+    def close(self):
+        for transport in self._transports:
+            transport.close()
+
+
+class ShardedAsyncTransport(ShardedTransport, httpx.AsyncBaseTransport):
+    """Асинхронный вариант ShardedTransport (параметры httpx.AsyncHTTPTransport)."""
+
+    transport_class = httpx.AsyncHTTPTransport
+
+    async def handle_async_request(self, request):
+        shard = self._acquire()
+        try:
+            response = await self._transports[shard].handle_async_request(request)
+        except BaseException:
+            self._release(shard)
+            raise
+        response.stream = _ReleasingAsyncStream(response.stream, lambda: self._release(shard))
+        return response
+
+    async def aclose(self):
+        for transport in self._transports:
+            await transport.aclose()
+
+
+class _ReleasingStream(httpx.SyncByteStream):
+    """Тело ответа, которое при закрытии один раз вызывает release."""
+
+    def __init__(self, stream, release):
+        self._stream = stream
+        self._release = release
+
+    def __iter__(self):
+        yield from self._stream
+
+    def _released(self):
+        if self._release is not None:
+            self._release()
+            self._release = None
+
+    def close(self):
+        try:
+            self._stream.close()
+        finally:
+            self._released()
+
+
+class _ReleasingAsyncStream(_ReleasingStream, httpx.AsyncByteStream):
+
+    async def __aiter__(self):
+        async for chunk in self._stream:
+            yield chunk
+
+    async def aclose(self):
+        try:
+            await self._stream.aclose()
+        finally:
+            self._released()
+
+
+def environment_proxies():
+    """Прокси из переменных окружения как шаблоны mounts httpx (None - без прокси).
+
+    Те же правила, что у httpx для trust_env: HTTP(S)_PROXY и ALL_PROXY по
+    схеме, NO_PROXY - исключения по хосту, NO_PROXY=* отключает прокси.
+    """
+    proxies = urllib.request.getproxies()
+    mounts = {}
+    for scheme in ("http", "https", "all"):
+        url = proxies.get(scheme)
+        if url:
+            mounts[f"{scheme}://"] = url if "://" in url else f"http://{url}"
+    for host in (host.strip() for host in proxies.get("no", "").split(",")):
+        if host == "*":
+            return {}
+        if not host:
+            continue
+        if "://" in host:
+            mounts[host] = None
+            continue
+        try:
+            address = ipaddress.ip_address(host)
+        except ValueError:
+            # example.com и .example.com - сам домен и его поддомены
+            mounts["all://localhost" if host.lower() == "localhost" else f"all://*{host}"] = None
+        else:
+            mounts[f"all://[{host}]" if address.version == 6 else f"all://{host}"] = None
+    return mounts
+
+
+def sharded_transports(transport_class, limits, shard_size=8, **kwargs):
+    """Параметры transport и mounts клиента httpx из разделенных транспортов transport_class.
+
+    Клиент с собственным transport не читает прокси из переменных окружения,
+    поэтому каждому прокси здесь достается свой разделенный транспорт, а
+    адреса из NO_PROXY идут через transport напрямую.
+    """
+    # Общий SSL-контекст и для пулов прокси
+    kwargs.setdefault("verify", httpx.create_ssl_context())
+    mounts = {
+        pattern: None if url is None else transport_class(limits, shard_size, proxy=httpx.Proxy(url), **kwargs)
+        for pattern, url in environment_proxies().items()
+    }
+    return {"transport": transport_class(limits, shard_size, **kwargs), "mounts": mounts}
+
+
+def _sharded_client(client_class, transport_class):
+    kwargs = _client_kwargs()
+    transports = sharded_transports(transport_class, kwargs.pop("limits"), _config.shard_size,
+                                    http2=kwargs.pop("http2"))
+    return client_class(**transports, **kwargs)
+
+
+def get_http_client() -> httpx.Client:
+    """Возвращает общий для процесса синхронный HTTP-клиент."""
+    global _sync_client
+    if _sync_client is None:
+        with _lock:
+            if _sync_client is None:
+                _sync_client = _sharded_client(httpx.Client, ShardedTransport)
+    return _sync_client
+
+
+def get_async_http_client() -> httpx.AsyncClient:
+    """Возвращает общий для процесса асинхронный HTTP-клиент.
+
+    Соединения асинхронного клиента привязаны к циклу событий, поэтому
+    клиент рассчитан на один asyncio.run() на процесс, как в примерах курса.
+    """
+    global _async_client
+    if _async_client is None:
+        with _lock:
+            if _async_client is None:
+                _async_client = _sharded_client(httpx.AsyncClient, ShardedAsyncTransport)
+    return _async_client
+
+
+def close_http_clients():
+    """Закрывает оба клиента из синхронного кода (вызывается и при выходе).
+
+    Асинхронный клиент закрывается в новом цикле событий. Если цикл уже
+    запущен, закрыть его отсюда нельзя: клиент остается для aclose_http_clients.
+    """
+    global _sync_client, _async_client
+    with _lock:
+        if _sync_client is not None:
+            _sync_client.close()
+        _sync_client = None
+        client = _async_client
+        if client is None:
+            return
+        try:
+            asyncio.get_running_loop()
+            return
+        except RuntimeError:
+            _async_client = None
+    try:
+        asyncio.run(client.aclose())
+    except RuntimeError:
+        # Соединения привязаны к уже закрытому циклу (не было aclose_http_clients
+        # в конце asyncio.run): их сокеты освободятся вместе с клиентом
+        pass
+
+
+async def aclose_http_clients():
+    """Закрывает оба клиента из асинхронного кода."""
+    global _async_client
+    with _lock:
+        client, _async_client = _async_client, None
+    if client is not None:
+        await client.aclose()
+    close_http_clients()
+
+
+atexit.register(close_http_clients)
+
+
+def create_chat_model(api_key=None, model=DEFAULT_MODEL, base_url=None, **kwargs) -> ChatOpenAI:
+    """Создает ChatOpenAI, работающий через общий пул соединений.
+
+    Args:
+        api_key: API ключ (по умолчанию OPENROUTER_API_KEY из окружения)
+        model: Имя модели OpenRouter
+        base_url: Базовый URL OpenAI-совместимого API (по умолчанию OPENROUTER_API_BASE
+            из окружения или адрес OpenRouter)
+        **kwargs: Остальные параметры ChatOpenAI (temperature и т.д.)
+    """
+    return ChatOpenAI(
+        model=model,
+        openai_api_key=api_key or os.getenv("OPENROUTER_API_KEY"),
+        openai_api_base=base_url or os.getenv("OPENROUTER_API_BASE", OPENROUTER_API_BASE),
+        http_client=get_http_client(),
+        http_async_client=get_async_http_client(),
+        **kwargs
+    )
@@ -0,0 +1,63 @@
+"""
+Детерминированные локальные эмбеддинги
+HashingEmbeddings строит вектор по хэшам слов и символьных триграмм.
+Качество далеко от настоящих моделей, но результат воспроизводим, не требует
+сети и API ключа, поэтому подходит для тестов и бенчмарков.
+"""
+
+import re
+import zlib
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+_WORD_RE = re.compile(r"\w+")
+
+
+class HashingEmbeddings(Embeddings):
+    """Эмбеддинги на основе хэширования признаков (feature hashing).
+
+    Args:
+        dim: Размерность вектора
+        ngram: Длина символьных n-грамм внутри слова
+    """
+
+    def __init__(self, dim=256, ngram=3):
+        self.dim = dim
+        self.ngram = ngram
+        self.calls = 0
+
+    def _features(self, text):
+        for word in _WORD_RE.findall(text.lower().replace("ё", "е")):
+            yield word
+            padded = f"<{word}>"
+            for i in range(max(1, len(padded) - self.ngram + 1)):
+                yield padded[i:i + self.ngram]
+
+    def embed_text(self, text):
+        """Вектор одного текста (float32, нормирован по L2)."""
+        hashes = np.fromiter(
+            (zlib.crc32(feature.encode("utf-8")) for feature in self._features(text)), dtype=np.uint32
+        )
+        # Младшие биты выбирают координату, старший бит - знак
+        signs = np.where(hashes & 0x80000000, 1.0, -1.0)
+        vector = np.bincount(hashes % self.dim, weights=signs, minlength=self.dim).astype(np.float32)
+        norm = np.linalg.norm(vector)
+        if norm > 0:
+            vector /= norm
+        return vector
+
+    def embed_array(self, texts):
+        """Матрица эмбеддингов (len(texts), dim) без преобразования в списки."""
+        self.calls += 1
+        matrix = np.empty((len(texts), self.dim), dtype=np.float32)
+        for i, text in enumerate(texts):
+            matrix[i] = self.embed_text(text)
+        return matrix
+
+    def embed_documents(self, texts):
+        return self.embed_array(texts).tolist()
+
+    def embed_query(self, text):
+        self.calls += 1
+        return self.embed_text(text).tolist()
@@ -0,0 +1,185 @@
+"""
+Агент с параллельным вызовом инструментов
+AgentExecutor с ReAct-агентом выполняет одно действие за шаг: на каждый
+инструмент приходится отдельный запрос к модели. ParallelToolAgent
+использует вызов функций (bind_tools): модель может вернуть несколько
+вызовов инструментов в одном ответе, они выполняются одновременно (в пуле
+потоков или через asyncio), и все результаты возвращаются модели одним
+обновлением истории. Запросов к модели столько, сколько шагов рассуждения,
+а не сколько инструментов.
+
+ainvoke не покидает цикл событий, если у всех инструментов есть coroutine
+(см. common.async_tools); вызовы инструментов без нее уходят в пул потоков
+и считаются в stats.thread_tool_calls.
+"""
+
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict, dataclass
+
+from langchain_core.messages import HumanMessage, SystemMessage, ToolMessage
+
+from .async_tools import runs_in_thread
+
+DEFAULT_SYSTEM_PROMPT = (
+    "Ты полезный ассистент. Используй инструменты, когда они нужны для ответа. "
+    "Независимые вызовы инструментов делай одновременно, в одном ответе."
+)
+
+
+@dataclass
+class AgentRunStats:
+    """Счетчики одного запуска ParallelToolAgent."""
+    llm_calls: int = 0
+    tool_calls: int = 0
+    steps_with_parallel_calls: int = 0
+    thread_tool_calls: int = 0  # вызовы из ainvoke, выполненные в пуле потоков
+    seconds: float = 0.0
+
+    def as_dict(self):
+        return asdict(self)
+
+
+class ParallelToolAgent:
+    """Цикл агента с несколькими вызовами инструментов за шаг.
+
+    Args:
+        llm: Чат-модель с поддержкой bind_tools (например, ChatOpenAI)
+        tools: Инструменты LangChain (@tool, StructuredTool, Tool)
+        system_prompt: Системное сообщение
+        max_iterations: Наибольшее число запросов к модели
+        max_workers: Сколько инструментов выполнять одновременно
+        sequential_tools: Имена инструментов, которые нельзя выполнять
+            одновременно с другими (например, меняющие общее состояние); их
+            вызовы выполняются после остальных вызовов шага, по одному в
+            порядке, заданном моделью
+        verbose: Печатать вызовы инструментов и результаты
+
+    Пример:
+        agent = ParallelToolAgent(llm, [check_inventory, process_order])
+        result = agent.invoke("Проверь остаток товара 1 и оформи заказ на 2 штуки товара 2")
+        print(result["output"], result["stats"])
+    """
+
+    def __init__(self, llm, tools, system_prompt=DEFAULT_SYSTEM_PROMPT, max_iterations=10, max_workers=8,
+                 sequential_tools=(), verbose=False):
+        self.tools = {tool.name: tool for tool in tools}
+        self.llm = llm.bind_tools(list(tools))
+        self.system_prompt = system_prompt
+        self.max_iterations = max_iterations
+        self.max_workers = max_workers
+        self.sequential_tools = set(sequential_tools)
+        self.verbose = verbose
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="agent-tool")
+
+    def _messages(self, inputs):
+        question = inputs if isinstance(inputs, str) else inputs["input"]
+        messages = [SystemMessage(content=self.system_prompt)] if self.system_prompt else []
+        if not isinstance(inputs, str):
+            messages.extend(inputs.get("chat_history", []))
+        messages.append(HumanMessage(content=question))
+        return question, messages
+
+    def _call_tool(self, call):
+        tool = self.tools.get(call["name"])
+        if tool is None:
+            return f"Ошибка: неизвестный инструмент {call['name']}. Доступны: {', '.join(self.tools)}"
+        try:
+            return tool.invoke(call["args"])
+        except Exception as error:
+            # Ошибка возвращается модели как результат, чтобы она могла исправить вызов
+            return f"Ошибка инструмента {call['name']}: {error}"
+
+    async def _acall_tool(self, call):
+        tool = self.tools.get(call["name"])
+        if tool is None:
+            return self._call_tool(call)
+        try:
+            return await tool.ainvoke(call["args"])
+        except Exception as error:
+            return f"Ошибка инструмента {call['name']}: {error}"
+
+    def _run_tools(self, calls):
+        """Результаты вызовов в том же порядке, что и calls."""
+        if len(calls) == 1:
+            return [self._call_tool(calls[0])]
+        futures = {i: self._pool.submit(self._call_tool, call) for i, call in enumerate(calls)
+                   if call["name"] not in self.sequential_tools}
+        results = {i: future.result() for i, future in futures.items()}
+        # Последовательные вызовы - после остальных: они видят уже прочитанное состояние
+        results.update((i, self._call_tool(call)) for i, call in enumerate(calls) if i not in futures)
+        return [results[i] for i in range(len(calls))]
+
+    async def _arun_tools(self, calls):
+        parallel = [i for i, call in enumerate(calls) if call["name"] not in self.sequential_tools]
+        results = dict(zip(parallel, await asyncio.gather(*(self._acall_tool(calls[i]) for i in parallel))))
+        for i, call in enumerate(calls):
+            if i not in results:
+                results[i] = await self._acall_tool(call)
+        return [results[i] for i in range(len(calls))]
+
+    def _record(self, response, stats, messages):
+        stats.llm_calls += 1
+        messages.append(response)
+        calls = response.tool_calls
+        stats.tool_calls += len(calls)
+        if len(calls) > 1:
+            stats.steps_with_parallel_calls += 1
+        if self.verbose:
+            for call in calls:
+                print(f"-> {call['name']}({call['args']})")
+        return calls
+
+    def _observe(self, calls, observations, messages, steps):
+        for call, observation in zip(calls, observations):
+            if self.verbose:
+                print(f"<- {call['name']}: {observation}")
+            steps.append((call, observation))
+            messages.append(ToolMessage(content=str(observation), tool_call_id=call["id"], name=call["name"]))
+
+    def _result(self, question, response, steps, stats, started):
+        stats.seconds = time.perf_counter() - started
+        output = response.content if response is not None and not response.tool_calls else \
+            "Агент остановлен: достигнут предел числа шагов"
+        return {"input": question, "output": output, "intermediate_steps": steps, "stats": stats}
+
+    def invoke(self, inputs, config=None):
+        """Выполняет задачу; inputs - строка или {"input": ..., "chat_history": [...]}.
+
+        Returns:
+            {"input", "output", "intermediate_steps": [(вызов, результат)], "stats": AgentRunStats}
+        """
+        started = time.perf_counter()
+        question, messages = self._messages(inputs)
+        stats = AgentRunStats()
+        steps = []
+        response = None
+        for _ in range(self.max_iterations):
+            response = self.llm.invoke(messages, config=config)
+            calls = self._record(response, stats, messages)
+            if not calls:
+                break
+            self._observe(calls, self._run_tools(calls), messages, steps)
+        return self._result(question, response, steps, stats, started)
+
+    async def ainvoke(self, inputs, config=None):
+        """Асинхронный вариант invoke: инструменты выполняются через asyncio.gather.
+
+        Модель вызывается через ainvoke, инструменты - через свои coroutine;
+        инструменты без coroutine LangChain выполняет в пуле потоков.
+        """
+        started = time.perf_counter()
+        question, messages = self._messages(inputs)
+        stats = AgentRunStats()
+        steps = []
+        response = None
+        for _ in range(self.max_iterations):
+            response = await self.llm.ainvoke(messages, config=config)
+            calls = self._record(response, stats, messages)
+            if not calls:
+                break
+            stats.thread_tool_calls += sum(1 for call in calls
+                                           if call["name"] in self.tools and runs_in_thread(self.tools[call["name"]]))
+            self._observe(calls, await self._arun_tools(calls), messages, steps)
+        return self._result(question, response, steps, stats, started)
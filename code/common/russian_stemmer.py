@@ -0,0 +1,137 @@
+"""
+Токенизация и стемминг русского текста
+stem реализует алгоритм Snowball (Портера) для русского языка: отбрасывает
+окончания, чтобы "фреймворки", "фреймворков" и "фреймворк" давали один
+термин. Латинские слова (API, Python) только приводятся к нижнему регистру.
+Tokenizer кэширует результат для каждого слова, поэтому стемминг
+выполняется один раз на слово словаря, а не на каждое вхождение.
+
+Используется индексом BM25 урока 3 и базой знаний агента урока 4.
+"""
+
+import re
+
+_WORD_RE = re.compile(r"\w+")
+_VOWELS = "аеиоуыэюя"
+
+_PERFECTIVE_GERUND = re.compile(r"((?<=[ая])(в|вши|вшись)|(ив|ивши|ившись|ыв|ывши|ывшись))$")
+_REFLEXIVE = re.compile(r"(ся|сь)$")
+_ADJECTIVE = r"(ее|ие|ые|ое|ими|ыми|ей|ий|ый|ой|ем|им|ым|ом|его|ого|ему|ому|их|ых|ую|юю|ая|яя|ою|ею)"
+_PARTICIPLE = r"((?<=[ая])(ем|нн|вш|ющ|щ)|(ивш|ывш|ующ))"
+_ADJECTIVAL = re.compile(f"({_PARTICIPLE}?{_ADJECTIVE})$")
+_VERB = re.compile(r"((?<=[ая])(ла|на|ете|йте|ли|й|л|ем|н|ло|но|ет|ют|ны|ть|ешь|нно)|"
+                   r"(ила|ыла|ена|ейте|уйте|ите|или|ыли|ей|уй|ил|ыл|им|ым|ен|ило|ыло|ено|ят|ует|уют|ит|ыт|"
+                   r"ены|ить|ыть|ишь|ую|ю))$")
+_NOUN = re.compile(r"(а|ев|ов|ие|ье|е|иями|ями|ами|еи|ии|и|ией|ей|ой|ий|й|иям|ям|ием|ем|ам|ом|о|у|ах|иях|ях|"
+                   r"ы|ь|ию|ью|ю|ия|ья|я)$")
+_DERIVATIONAL = re.compile(r"ость?$")
+_SUPERLATIVE = re.compile(r"(ейше|ейш)$")
+
+# Частые служебные слова, которые не помогают поиску
+STOP_WORDS = frozenset("""
+и в во не что он на я с со как а то все она так его но да ты к у же вы за бы по только ее мне было вот от
+меня еще нет о из ему теперь когда даже ну вдруг ли если уже или ни быть был него до вас нибудь опять уж
+вам ведь там потом себя ничего ей может они тут где есть надо ней для мы тебя их чем была сам чтоб без
+будто чего раз тоже себе под будет ж тогда кто этот того потому этого какой совсем ним здесь этом один
+почти мой тем чтобы нее сейчас были куда зачем всех никогда можно при наконец два об другой хоть после
+над больше тот через эти нас про всего них какая много разве три эту моя впрочем хорошо свою этой перед
+иногда лучше чуть том нельзя такой им более всегда конечно всю между это такое также
+the a an of to in on for and or is are be with as by at from that this it
+""".split())
+
+
+def _regions(word):
+    """Начала областей RV и R2 алгоритма Snowball."""
+    rv = len(word)
+    for i, char in enumerate(word):
+        if char in _VOWELS:
+            rv = i + 1
+            break
+    r1 = len(word)
+    for i in range(1, len(word)):
+        if word[i] not in _VOWELS and word[i - 1] in _VOWELS:
+            r1 = i + 1
+            break
+    r2 = len(word)
+    for i in range(r1 + 1, len(word)):
+        if word[i] not in _VOWELS and word[i - 1] in _VOWELS:
+            r2 = i + 1
+            break
+    return rv, r2
+
+
+def _strip(pattern, word):
+    """Удаляет окончание по шаблону; возвращает (слово, удалено ли)."""
+    match = pattern.search(word)
+    if match is None:
+        return word, False
+    return word[:match.start()], True
+
+
+def stem(word):
+    """Основа русского слова (слово в нижнем регистре, "ё" заменена на "е")."""
+    rv, r2 = _regions(word)
+    if rv >= len(word):
+        return word
+    prefix, rest = word[:rv], word[rv:]
+    # Шаг 1: деепричастие, иначе возвратная частица и прилагательное/глагол/существительное
+    rest, removed = _strip(_PERFECTIVE_GERUND, rest)
+    if not removed:
+        rest, _ = _strip(_REFLEXIVE, rest)
+        rest, removed = _strip(_ADJECTIVAL, rest)
+        if not removed:
+            rest, removed = _strip(_VERB, rest)
+            if not removed:
+                rest, _ = _strip(_NOUN, rest)
+    # Шаг 2
+    if rest.endswith("и"):
+        rest = rest[:-1]
+    # Шаг 3: словообразовательное окончание в области R2
+    match = _DERIVATIONAL.search(rest)
+    if match is not None and rv + match.start() >= r2:
+        rest = rest[:match.start()]
+    # Шаг 4
+    rest, removed = _strip(_SUPERLATIVE, rest)
+    if rest.endswith("нн"):
+        rest = rest[:-1]
+    elif not removed and rest.endswith("ь"):
+        rest = rest[:-1]
+    return prefix + rest
+
+
+def _is_cyrillic(word):
+    return "а" <= word[0] <= "я"
+
+
+class Tokenizer:
+    """Разбивает текст на термины: нижний регистр, без стоп-слов, основы слов.
+
+    Args:
+        stop_words: Множество игнорируемых слов
+        stemming: Приводить ли русские слова к основе
+    """
+
+    def __init__(self, stop_words=STOP_WORDS, stemming=True):
+        self.stop_words = stop_words
+        self.stemming = stemming
+        # слово -> термин (None для стоп-слов)
+        self._cache = {}
+
+    def _term(self, word):
+        if word in self.stop_words:
+            term = None
+        elif self.stemming and _is_cyrillic(word):
+            term = stem(word)
+        else:
+            term = word
+        self._cache[word] = term
+        return term
+
+    def __call__(self, text):
+        cache = self._cache
+        terms = []
+        for word in _WORD_RE.findall(text.lower().replace("ё", "е")):
+            term = cache[word] if word in cache else self._term(word)
+            if term:
+                terms.append(term)
+        return terms
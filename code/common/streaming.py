@@ -0,0 +1,84 @@
+"""
+Потоковый вывод ответов модели
+stream_to_console и astream_to_console печатают фрагменты ответа цепочки по
+мере поступления, возвращают полный текст (чтобы обновить память диалога
+после завершения потока) и измеряют время до первого токена.
+"""
+
+import sys
+import time
+from dataclasses import dataclass
+
+
+@dataclass
+class StreamStats:
+    """Время до первого токена и полное время потокового ответа, в секундах."""
+    ttft: float = 0.0
+    total: float = 0.0
+    chunks: int = 0
+    chars: int = 0
+
+    def __str__(self):
+        return (f"первый токен через {self.ttft * 1000:.0f} мс, "
+                f"ответ за {self.total * 1000:.0f} мс ({self.chunks} фрагментов)")
+
+
+def chunk_text(chunk):
+    """Текст фрагмента: AIMessageChunk (prompt | llm) или строка (с StrOutputParser)."""
+    if isinstance(chunk, str):
+        return chunk
+    content = getattr(chunk, "content", "")
+    if isinstance(content, list):
+        return "".join(part.get("text", "") if isinstance(part, dict) else str(part) for part in content)
+    return content or ""
+
+
+class _StreamPrinter:
+    def __init__(self, file, prefix):
+        self.file = file
+        self.prefix = prefix
+        self.parts = []
+        self.stats = StreamStats()
+        self.started = time.perf_counter()
+
+    def feed(self, chunk):
+        text = chunk_text(chunk)
+        if not text:
+            return
+        if not self.parts:
+            self.stats.ttft = time.perf_counter() - self.started
+            self.file.write(self.prefix)
+        self.parts.append(text)
+        self.stats.chunks += 1
+        self.file.write(text)
+        self.file.flush()
+
+    def finish(self):
+        self.stats.total = time.perf_counter() - self.started
+        text = "".join(self.parts)
+        self.stats.chars = len(text)
+        if not self.parts:
+            self.file.write(self.prefix)
+        self.file.write("\n")
+        self.file.flush()
+        return text, self.stats
+
+
+def stream_to_console(chain, inputs, config=None, prefix="", file=None):
+    """Печатает ответ цепочки по мере генерации.
+
+    Returns:
+        (полный текст ответа, StreamStats)
+    """
+    printer = _StreamPrinter(file or sys.stdout, prefix)
+    for chunk in chain.stream(inputs, config=config):
+        printer.feed(chunk)
+    return printer.finish()
+
+
+async def astream_to_console(chain, inputs, config=None, prefix="", file=None):
+    """Асинхронный вариант stream_to_console (через astream)."""
+    printer = _StreamPrinter(file or sys.stdout, prefix)
+    async for chunk in chain.astream(inputs, config=config):
+        printer.feed(chunk)
+    return printer.finish()
@@ -0,0 +1,371 @@
+"""
+Локальная заглушка OpenAI-совместимого API
+Сервер отвечает на /v1/chat/completions без обращения к внешним сервисам,
+что позволяет измерять накладные расходы клиента (соединения, повторы,
+кэширование) в бенчмарках без API ключа. Заглушка умеет имитировать
+задержку, ограничение частоты запросов (ответ 429 с Retry-After),
+случайные ошибки сервера и редкие очень медленные ответы, а при
+"stream": true отдает ответ по словам событиями SSE с заданной паузой.
+Отвечающая функция может вернуть вызовы инструментов (function calling),
+что позволяет проигрывать сценарии агентов.
+
+StubServiceServer - такая же заглушка для REST-сервисов, которые вызывают
+инструменты агента (CRM, склад, погода): JSON-маршруты с задержкой ответа.
+"""
+
+import json
+import math
+import random
+import re
+import socket
+import threading
+import time
+import uuid
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl, urlsplit
+
+
+def _assistant_message(reply):
+    """Ответ отвечающей функции -> (сообщение assistant в формате OpenAI, finish_reason).
+
+    Строка становится текстом ответа, словарь {"content": ..., "tool_calls":
+    [{"name": ..., "args": {...}}]} - вызовами инструментов.
+    """
+    if isinstance(reply, str):
+        return {"role": "assistant", "content": reply}, "stop"
+    tool_calls = [
+        {"id": call.get("id") or f"call_{uuid.uuid4().hex[:12]}", "type": "function",
+         "function": {"name": call["name"], "arguments": json.dumps(call.get("args", {}), ensure_ascii=False)}}
+        for call in reply.get("tool_calls", [])
+    ]
+    message = {"role": "assistant", "content": reply.get("content")}
+    if tool_calls:
+        message["tool_calls"] = tool_calls
+    return message, "tool_calls" if tool_calls else "stop"
+
+
+def default_responder(messages):
+    """Ответ по умолчанию: короткий текст с началом последнего сообщения."""
+    last = messages[-1]["content"] if messages else ""
+    if isinstance(last, list):
+        last = " ".join(part.get("text", "") for part in last)
+    return f"Ответ заглушки на: {last[:60]}"
+
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+    # Очередь соединений по умолчанию (5) переполняется, когда сотни клиентов подключаются разом
+    request_queue_size = 1024
+
+
+class _JSONHandler(BaseHTTPRequestHandler):
+    # HTTP/1.1 нужен для keep-alive соединений
+    protocol_version = "HTTP/1.1"
+
+    def setup(self):
+        super().setup()
+        # Без TCP_NODELAY заголовки и тело ответа ждут задержанного ACK (~40 мс)
+        self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        # Один экземпляр обработчика обслуживает одно TCP-соединение
+        self.server.stub.record_connection()
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status, payload, headers=None):
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        try:
+            self.wfile.write(body)
+        except (BrokenPipeError, ConnectionResetError):
+            # Клиент отменил запрос (например, проигравший страхующий запрос)
+            self.close_connection = True
+
+    def _read_json(self):
+        length = int(self.headers.get("Content-Length", 0))
+        return json.loads(self.rfile.read(length) or b"{}")
+
+
+class _StubHandler(_JSONHandler):
+
+    def _send_stream(self, events):
+        """Отправляет события SSE с chunked-кодированием (соединение остается keep-alive)."""
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        try:
+            for event in events:
+                data = f"data: {event}\n\n".encode("utf-8")
+                self.wfile.write(b"%x\r\n%s\r\n" % (len(data), data))
+                self.wfile.flush()
+            self.wfile.write(b"0\r\n\r\n")
+        except (BrokenPipeError, ConnectionResetError):
+            # Клиент прервал поток
+            self.close_connection = True
+
+    def do_POST(self):
+        payload = self._read_json()
+        stub = self.server.stub
+        stub.record_request()
+
+        if self.path.rstrip("/").endswith("/chat/completions"):
+            retry_after = stub.check_rate_limit()
+            if retry_after is not None:
+                headers = {
+                    "Retry-After": str(math.ceil(retry_after)),
+                    "retry-after-ms": str(int(retry_after * 1000)),
+                }
+                self._send_json(429, {"error": {"message": "Rate limit exceeded", "type": "rate_limit"}}, headers)
+                return
+            error_status = stub.injected_error()
+            if error_status is not None:
+                self._send_json(error_status, {"error": {"message": f"Injected error {error_status}"}})
+                return
+            stub.sleep_latency()
+            if payload.get("stream"):
+                self._send_stream(stub.chat_completion_stream(payload))
+            else:
+                self._send_json(200, stub.chat_completion(payload))
+        else:
+            self._send_json(404, {"error": {"message": f"Unknown path {self.path}"}})
+
+
+class _BackgroundServer:
+    """HTTP-сервер в фоновом потоке со счетчиками запросов и соединений."""
+
+    def __init__(self, handler, host, port, stats):
+        self._server = _Server((host, port), handler)
+        self._server.stub = self
+        self._thread = None
+        self._stats_lock = threading.Lock()
+        self.stats = {"requests": 0, "connections": 0, **stats}
+
+    @property
+    def address(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def record_request(self):
+        with self._stats_lock:
+            self.stats["requests"] += 1
+
+    def record_connection(self):
+        with self._stats_lock:
+            self.stats["connections"] += 1
+
+    def reset_stats(self):
+        with self._stats_lock:
+            for key in self.stats:
+                self.stats[key] = 0
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+        if self._thread is not None:
+            self._thread.join()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stop()
+
+
+class StubOpenAIServer(_BackgroundServer):
+    """OpenAI-совместимый сервер-заглушка, работающий в фоновом потоке.
+
+    Args:
+        latency: Искусственная задержка ответа в секундах
+        responder: Функция messages -> текст ответа или словарь с
+            вызовами инструментов {"content": ..., "tool_calls": [{"name", "args"}]}
+        host: Адрес для прослушивания
+        port: Порт (0 - выбрать свободный)
+        latency_jitter: Случайная добавка к задержке (равномерно от 0 до значения)
+        max_requests_per_second: Лимит частоты запросов; сверх лимита сервер
+            отвечает 429 с заголовком Retry-After
+        error_rate: Доля запросов, на которые сервер отвечает ошибкой
+        error_status: HTTP-статус внедряемой ошибки (например, 503 или 400)
+        slow_rate: Доля запросов с долгим ответом (хвост распределения задержек)
+        slow_latency: Задержка медленных ответов в секундах
+        token_delay: Пауза между словами потокового ответа в секундах
+        seed: Зерно генератора случайных чисел для воспроизводимости
+    """
+
+    def __init__(self, latency=0.0, responder=None, host="127.0.0.1", port=0,
+                 latency_jitter=0.0, max_requests_per_second=None, error_rate=0.0,
+                 error_status=503, slow_rate=0.0, slow_latency=1.0, token_delay=0.0, seed=None):
+        self.latency = latency
+        self.latency_jitter = latency_jitter
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.slow_rate = slow_rate
+        self.slow_latency = slow_latency
+        self.token_delay = token_delay
+        self.max_requests_per_second = max_requests_per_second
+        self.responder = responder or default_responder
+        self._random = random.Random(seed)
+        self._window = deque()
+        super().__init__(_StubHandler, host, port, {"rate_limited": 0, "injected_errors": 0, "slow": 0})
+
+    @property
+    def base_url(self):
+        return f"{self.address}/v1"
+
+    def check_rate_limit(self):
+        """Возвращает через сколько секунд повторить запрос или None, если лимит не превышен."""
+        if self.max_requests_per_second is None:
+            return None
+        now = time.monotonic()
+        with self._stats_lock:
+            # Скользящее окно в одну секунду
+            while self._window and now - self._window[0] >= 1.0:
+                self._window.popleft()
+            if len(self._window) >= self.max_requests_per_second:
+                self.stats["rate_limited"] += 1
+                return 1.0 - (now - self._window[0])
+            self._window.append(now)
+        return None
+
+    def injected_error(self):
+        """Возвращает HTTP-статус внедряемой ошибки или None."""
+        if not self.error_rate:
+            return None
+        with self._stats_lock:
+            if self._random.random() >= self.error_rate:
+                return None
+            self.stats["injected_errors"] += 1
+        return self.error_status
+
+    def sleep_latency(self):
+        delay = self.latency
+        with self._stats_lock:
+            if self.latency_jitter:
+                delay += self._random.uniform(0, self.latency_jitter)
+            if self.slow_rate and self._random.random() < self.slow_rate:
+                self.stats["slow"] += 1
+                delay = self.slow_latency
+        if delay:
+            time.sleep(delay)
+
+    def chat_completion(self, payload):
+        """Формирует ответ в формате chat.completion."""
+        messages = payload.get("messages", [])
+        message, finish_reason = _assistant_message(self.responder(messages))
+        content = message["content"] or ""
+        prompt_tokens = sum(len(str(m.get("content", "")).split()) for m in messages)
+        completion_tokens = len(content.split()) + len(message.get("tool_calls", []))
+        if self.token_delay and completion_tokens > 1:
+            # Без потока клиент ждет генерации всего ответа
+            time.sleep(self.token_delay * (completion_tokens - 1))
+        return {
+            "id": f"chatcmpl-{uuid.uuid4().hex[:12]}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": payload.get("model", "stub"),
+            "choices": [{
+                "index": 0,
+                "message": message,
+                "finish_reason": finish_reason,
+            }],
+            "usage": {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens,
+            },
+        }
+
+    def chat_completion_stream(self, payload):
+        """Генератор событий SSE в формате chat.completion.chunk.
+
+        Задержка latency уже прошла до первого события (время до первого токена),
+        дальше слова отдаются с паузой token_delay.
+        """
+        messages = payload.get("messages", [])
+        message, finish_reason = _assistant_message(self.responder(messages))
+        content = message["content"] or ""
+        base = {
+            "id": f"chatcmpl-{uuid.uuid4().hex[:12]}",
+            "object": "chat.completion.chunk",
+            "created": int(time.time()),
+            "model": payload.get("model", "stub"),
+        }
+
+        def chunk(delta, finish_reason=None):
+            return json.dumps({**base, "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}]},
+                              ensure_ascii=False)
+
+        yield chunk({"role": "assistant", "content": ""})
+        for i, token in enumerate(re.findall(r"\S+\s*", content)):
+            if i and self.token_delay:
+                time.sleep(self.token_delay)
+            yield chunk({"content": token})
+        if "tool_calls" in message:
+            yield chunk({"tool_calls": [{"index": i, **call} for i, call in enumerate(message["tool_calls"])]})
+        yield chunk({}, finish_reason=finish_reason)
+        if (payload.get("stream_options") or {}).get("include_usage"):
+            prompt_tokens = sum(len(str(m.get("content", "")).split()) for m in messages)
+            completion_tokens = len(content.split())
+            yield json.dumps({**base, "choices": [], "usage": {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens,
+            }})
+        yield "[DONE]"
+
+
+class _ServiceHandler(_JSONHandler):
+
+    def _dispatch(self):
+        payload = self._read_json() if self.command in ("POST", "PUT", "PATCH") else {}
+        stub = self.server.stub
+        stub.record_request()
+        url = urlsplit(self.path)
+        for (method, pattern), handler in stub.routes:
+            match = pattern.fullmatch(url.path)
+            if method == self.command and match:
+                stub.sleep_latency()
+                status, body = handler(match, payload, dict(parse_qsl(url.query)))
+                self._send_json(status, body)
+                return
+        self._send_json(404, {"error": f"Unknown path {url.path}"})
+
+    do_GET = do_POST = do_PUT = do_PATCH = do_DELETE = _dispatch
+
+
+class StubServiceServer(_BackgroundServer):
+    """REST-сервис-заглушка, работающий в фоновом потоке.
+
+    Args:
+        routes: {("GET", r"/customers/(\\w+)"): handler}; handler(match, payload,
+            query) возвращает (HTTP-статус, JSON-ответ), match - результат
+            re.fullmatch пути, payload - JSON тела, query - параметры строки запроса
+        latency: Задержка ответа в секундах
+        host: Адрес для прослушивания
+        port: Порт (0 - выбрать свободный)
+    """
+
+    def __init__(self, routes, latency=0.0, host="127.0.0.1", port=0):
+        self.routes = [((method.upper(), re.compile(pattern)), handler) for (method, pattern), handler in routes.items()]
+        self.latency = latency
+        super().__init__(_ServiceHandler, host, port, {})
+
+    @property
+    def base_url(self):
+        return self.address
+
+    def sleep_latency(self):
+        if self.latency:
+            time.sleep(self.latency)
@@ -0,0 +1,279 @@
+"""
+Кэш результатов инструментов агента
+Агент часто вызывает один и тот же инструмент с тем же аргументом
+несколько раз за сессию (погода в Москве, карточка клиента), и каждый
+вызов - это запрос к внешнему API. ToolCache оборачивает инструменты
+LangChain (@tool, Tool, StructuredTool):
+
+    cache = ToolCache(max_entries=1000)
+
+    @cache.cached(ttl=600)
+    @tool
+    def get_weather(city: str) -> str: ...
+
+    get_customer_info = cache.cached(ttl=60, tags=lambda customer_id: [f"customer:{customer_id}"])(
+        Tool(name="GetCustomerInfo", func=..., description=...))
+    update_status = cache.invalidates(lambda x: [f"customer:{x.split(',')[0]}"])(
+        Tool(name="UpdateCustomerStatus", func=..., description=...))
+
+Ключ записи - имя инструмента и аргументы (порядок именованных аргументов
+не важен). Строковые аргументы можно нормализовать (normalize=str.lower,
+normalize_text), если инструмент сам не различает такие варианты: иначе кэш
+вернул бы для "москва" результат "Москва". Записи живут ttl секунд своего
+инструмента и вытесняются по LRU при превышении max_entries.
+
+Изменяющий инструмент после выполнения (в том числе с ошибкой) сбрасывает
+записи с указанными тегами; каждая запись также помечена именем своего
+инструмента. Чтение, начатое до сброса, не сохраняет свой (возможно
+устаревший) результат.
+"""
+
+import json
+import threading
+import time
+from collections import OrderedDict, defaultdict
+from dataclasses import asdict, dataclass
+
+
+@dataclass
+class ToolCacheStats:
+    """Счетчики одного инструмента."""
+    hits: int = 0
+    misses: int = 0
+    expirations: int = 0
+    evictions: int = 0
+    invalidations: int = 0
+
+    @property
+    def hit_rate(self):
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def as_dict(self):
+        return {**asdict(self), "hit_rate": self.hit_rate}
+
+
+def normalize_text(value):
+    """Нормализация строк для инструментов, которым не важны регистр и лишние пробелы."""
+    return " ".join(value.split()).casefold()
+
+
+def normalize_args(value, normalize_string=None):
+    """Аргументы вызова с нормализованными строками (для ключа кэша)."""
+    if normalize_string is None:
+        return value
+    if isinstance(value, str):
+        return normalize_string(value)
+    if isinstance(value, dict):
+        return {key: normalize_args(item, normalize_string) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [normalize_args(item, normalize_string) for item in value]
+    return value
+
+
+def _tag_list(tags, args, kwargs):
+    if tags is None:
+        return []
+    if callable(tags):
+        tags = tags(*args, **kwargs)
+    return [tags] if isinstance(tags, str) else list(tags)
+
+
+class ToolCache:
+    """LRU-кэш результатов инструментов с TTL по инструменту и сбросом по тегам.
+
+    Args:
+        max_entries: Наибольшее число записей всех инструментов вместе
+        clock: Источник времени (секунды); для проверок можно подставить свой
+    """
+
+    def __init__(self, max_entries=1024, clock=time.monotonic):
+        self.max_entries = max_entries
+        self.clock = clock
+        self._entries = OrderedDict()  # ключ -> (истекает, результат, теги)
+        self._by_tag = defaultdict(set)
+        # Счетчик сбросов тега: чтение, во время которого тег сбросили, не сохраняется
+        self._generations = {}
+        self._epoch = 0  # растет при clear()
+        self._stats = defaultdict(ToolCacheStats)
+        self._lock = threading.Lock()
+
+    # --- Обертки инструментов ---
+
+    def cached(self, ttl=None, tags=None, normalize=None):
+        """Декоратор инструмента-чтения.
+
+        Args:
+            ttl: Время жизни записи в секундах (None - до вытеснения или сброса)
+            tags: Теги записи: строка, список или функция с теми же
+                аргументами, что у инструмента, возвращающая теги
+            normalize: Нормализация строковых аргументов для ключа
+                (str.lower, normalize_text); варианты, которые она
+                объединяет, инструмент должен обрабатывать одинаково
+        """
+        def decorator(tool):
+            name = tool.name
+
+            def lookup(args, kwargs):
+                """(найдено, результат, данные для сохранения промаха)."""
+                normalized = normalize_args([list(args), kwargs], normalize)
+                key = (name, json.dumps(normalized, sort_keys=True, ensure_ascii=False, default=str))
+                found, value = self._get(key)
+                if found:
+                    return True, value, None
+                entry_tags = [name, *_tag_list(tags, args, kwargs)]
+                return False, None, (key, entry_tags, self._snapshot(entry_tags))
+
+            def func(*args, **kwargs):
+                found, value, pending = lookup(args, kwargs)
+                if not found:
+                    value = tool.func(*args, **kwargs)
+                    self._put(*pending, value, ttl)
+                return value
+
+            update = {"func": func if getattr(tool, "func", None) is not None else None}
+            if getattr(tool, "coroutine", None) is not None:
+                async def coroutine(*args, **kwargs):
+                    found, value, pending = lookup(args, kwargs)
+                    if not found:
+                        value = await tool.coroutine(*args, **kwargs)
+                        self._put(*pending, value, ttl)
+                    return value
+                update["coroutine"] = coroutine
+            return _replace_functions(tool, update)
+
+        return decorator
+
+    def invalidates(self, tags):
+        """Декоратор изменяющего инструмента: после вызова сбрасывает записи с тегами.
+
+        Args:
+            tags: Строка, список или функция с аргументами инструмента,
+                возвращающая теги (имя инструмента-чтения сбрасывает все его записи)
+        """
+        def decorator(tool):
+            def func(*args, **kwargs):
+                try:
+                    return tool.func(*args, **kwargs)
+                finally:
+                    # Сброс и при ошибке: изменение могло частично примениться
+                    self.invalidate(*_tag_list(tags, args, kwargs))
+
+            update = {"func": func if getattr(tool, "func", None) is not None else None}
+            if getattr(tool, "coroutine", None) is not None:
+                async def coroutine(*args, **kwargs):
+                    try:
+                        return await tool.coroutine(*args, **kwargs)
+                    finally:
+                        self.invalidate(*_tag_list(tags, args, kwargs))
+                update["coroutine"] = coroutine
+            return _replace_functions(tool, update)
+
+        return decorator
+
+    # --- Хранилище ---
+
+    def _get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            stats = self._stats[key[0]]
+            if entry is not None and entry[0] is not None and entry[0] <= self.clock():
+                self._drop(key)
+                stats.expirations += 1
+                entry = None
+            if entry is None:
+                stats.misses += 1
+                return False, None
+            self._entries.move_to_end(key)
+            stats.hits += 1
+            return True, entry[1]
+
+    def _snapshot(self, tags):
+        with self._lock:
+            return [self._epoch, *(self._generations.get(tag, 0) for tag in tags)]
+
+    def _put(self, key, tags, generations, value, ttl):
+        with self._lock:
+            if [self._epoch, *(self._generations.get(tag, 0) for tag in tags)] != generations:
+                return  # данные сбросили, пока инструмент выполнялся
+            if key in self._entries:
+                self._drop(key)
+            expires = self.clock() + ttl if ttl is not None else None
+            self._entries[key] = (expires, value, tags)
+            for tag in tags:
+                self._by_tag[tag].add(key)
+            while len(self._entries) > self.max_entries:
+                oldest = next(iter(self._entries))
+                self._drop(oldest)
+                self._stats[oldest[0]].evictions += 1
+
+    def _drop(self, key):
+        _, _, tags = self._entries.pop(key)
+        for tag in tags:
+            keys = self._by_tag[tag]
+            keys.discard(key)
+            if not keys:
+                del self._by_tag[tag]
+
+    def invalidate(self, *tags):
+        """Удаляет записи с любым из тегов; возвращает число удаленных записей."""
+        removed = 0
+        with self._lock:
+            for tag in tags:
+                self._generations[tag] = self._generations.get(tag, 0) + 1
+                for key in list(self._by_tag.get(tag, ())):
+                    self._drop(key)
+                    self._stats[key[0]].invalidations += 1
+                    removed += 1
+        return removed
+
+    def clear(self):
+        with self._lock:
+            self._epoch += 1
+            self._entries.clear()
+            self._by_tag.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+    # --- Метрики ---
+
+    def stats(self):
+        """{"имя инструмента": {...}, "total": {...}} с hits, misses, hit_rate и др."""
+        with self._lock:
+            per_tool = {name: ToolCacheStats(**asdict(stats)) for name, stats in self._stats.items()}
+            entries = len(self._entries)
+        total = ToolCacheStats()
+        for stats in per_tool.values():
+            for field, value in asdict(stats).items():
+                setattr(total, field, getattr(total, field) + value)
+        result = {name: stats.as_dict() for name, stats in sorted(per_tool.items())}
+        result["total"] = {**total.as_dict(), "entries": entries}
+        return result
+
+    def to_prometheus(self, prefix="langchain_tool_cache"):
+        """Счетчики по инструментам в текстовом формате Prometheus."""
+        stats = self.stats()
+        total = stats.pop("total")
+        lines = []
+        for metric in ("hits", "misses", "expirations", "evictions", "invalidations"):
+            lines.append(f"# TYPE {prefix}_{metric}_total counter")
+            for name, values in stats.items():
+                lines.append(f'{prefix}_{metric}_total{{tool="{_escape(name)}"}} {values[metric]}')
+        lines.append(f"# TYPE {prefix}_hit_rate gauge")
+        for name, values in stats.items():
+            lines.append(f'{prefix}_hit_rate{{tool="{_escape(name)}"}} {values["hit_rate"]:.6f}')
+        lines.append(f"# TYPE {prefix}_entries gauge")
+        lines.append(f"{prefix}_entries {total['entries']}")
+        return "\n".join(lines) + "\n"
+
+
+def _replace_functions(tool, update):
+    """Копия инструмента с другими func/coroutine; исходный инструмент не меняется."""
+    if update["func"] is None and "coroutine" not in update:
+        raise TypeError(f"Инструмент {tool.name} не основан на функции (нужен @tool, Tool или StructuredTool)")
+    return tool.model_copy(update=update)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
@@ -1,12 +1,18 @@
 import os
+import sys
 from dotenv import load_dotenv
-from langchain_openai import ChatOpenAI
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from common.llm_client import create_chat_model
+from common.streaming import stream_to_console
 from langchain_core.prompts import PromptTemplate
 from langchain_core.runnables import RunnableSequence
 
 # Загружаем переменные окружения из файла .env
 load_dotenv()
 
+# Потоковый вывод по умолчанию; --no-stream печатает ответ целиком после генерации
+STREAMING = "--no-stream" not in sys.argv
+
 def main():
     try:
         # Проверяем наличие API ключа
@@ -16,11 +22,7 @@ def main():
             return
         
         # Инициализируем модель через OpenRouter (через OpenAI-совместимый API)
-        llm = ChatOpenAI(
-            model="openai/gpt-3.5-turbo",  # Модель OpenRouter
-            openai_api_key=api_key,
-            openai_api_base="https://openrouter.ai/api/v1"  # Базовый URL OpenRouter
-        )
+        llm = create_chat_model(api_key=api_key)
         
         # Создаем шаблон для вопросно-ответной системы
         prompt_template = PromptTemplate.from_template(
@@ -36,9 +38,14 @@ def main():
         print(f"Отправляем вопрос: {question}")
         
         # Получаем ответ
-        response = chain.invoke({"question": question})
         print(f"Вопрос: {question}")
-        print(f"Ответ: {response.content}")
+        if STREAMING:
+            # Фрагменты ответа печатаются по мере генерации
+            answer, stats = stream_to_console(chain, {"question": question}, prefix="Ответ: ")
+            print(f"({stats})")
+        else:
+            response = chain.invoke({"question": question})
+            print(f"Ответ: {response.content}")
         
     except Exception as e:
         print(f"Произошла ошибка при выполнении запроса: {str(e)}")
@@ -0,0 +1,136 @@
+"""
+История разговора с ограничением по токенам
+Сообщения хранятся как отдельные записи, количество токенов считается один раз
+при добавлении, а старые реплики при превышении бюджета сворачиваются
+в краткое содержание, которое пересчитывается только при вытеснении.
+"""
+
+import re
+from collections import deque
+from dataclasses import dataclass
+
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage
+from langchain_core.output_parsers import StrOutputParser
+from langchain_core.prompts import PromptTemplate
+
+# Слова и отдельные знаки препинания - грубая, но быстрая оценка числа токенов
+_TOKEN_RE = re.compile(r"\w+|[^\w\s]")
+
+ROLE_NAMES = {"user": "Пользователь", "assistant": "Ассистент"}
+
+
+def approx_token_count(text: str) -> int:
+    """Приблизительно считает токены в тексте."""
+    return len(_TOKEN_RE.findall(text))
+
+
+@dataclass
+class ChatTurn:
+    """Одно сообщение истории."""
+    role: str
+    content: str
+    tokens: int
+
+    def render(self) -> str:
+        return f"{ROLE_NAMES[self.role]}: {self.content}\n"
+
+
+class TokenBudgetHistory:
+    """История разговора, размер которой не превышает заданный бюджет токенов.
+
+    Args:
+        max_tokens: Максимальный размер истории (сообщения + краткое содержание)
+        summarizer: Функция (предыдущее содержание, вытесненные сообщения) -> новое
+            содержание. Если не задана, старые сообщения просто отбрасываются
+        token_counter: Функция подсчета токенов в строке
+        low_watermark: Доля бюджета, до которой история сокращается при вытеснении.
+            Сокращение "с запасом" позволяет вызывать summarizer не на каждом ходу
+    """
+
+    def __init__(self, max_tokens=1000, summarizer=None, token_counter=approx_token_count, low_watermark=0.6):
+        self.max_tokens = max_tokens
+        self.summarizer = summarizer
+        self.token_counter = token_counter
+        self.low_watermark = low_watermark
+        self.turns = deque()
+        self.turn_tokens = 0
+        self.summary = ""
+        self.summary_tokens = 0
+        self.summarizations = 0
+        self._rendered = ""
+
+    @property
+    def total_tokens(self) -> int:
+        return self.turn_tokens + self.summary_tokens
+
+    def add_message(self, role: str, content: str):
+        """Добавляет сообщение ("user" или "assistant") и при необходимости сжимает историю."""
+        turn = ChatTurn(role, content, self.token_counter(content))
+        self.turns.append(turn)
+        self.turn_tokens += turn.tokens
+        if self.total_tokens > self.max_tokens:
+            self._compact()
+        else:
+            # Дописываем в кэш отрисованной истории вместо полной пересборки
+            self._rendered += turn.render()
+
+    def add_turn(self, question: str, answer: str):
+        """Добавляет пару вопрос-ответ."""
+        self.add_message("user", question)
+        self.add_message("assistant", answer)
+
+    def _compact(self):
+        target = int(self.max_tokens * self.low_watermark)
+        evicted = []
+        # Последнее сообщение всегда остается в истории
+        while len(self.turns) > 1 and self.total_tokens > target:
+            turn = self.turns.popleft()
+            self.turn_tokens -= turn.tokens
+            evicted.append(turn)
+
+        if evicted and self.summarizer is not None:
+            self.summary = self.summarizer(self.summary, evicted)
+            self.summary_tokens = self.token_counter(self.summary)
+            self.summarizations += 1
+
+        self._rendered = "".join(turn.render() for turn in self.turns)
+
+    def render(self) -> str:
+        """Возвращает историю в виде текста для строкового шаблона."""
+        if not self.summary:
+            return self._rendered
+        return f"Краткое содержание предыдущего разговора: {self.summary}\n{self._rendered}"
+
+    def to_messages(self):
+        """Возвращает историю в виде сообщений для MessagesPlaceholder."""
+        messages = []
+        if self.summary:
+            messages.append(SystemMessage(content=f"Краткое содержание предыдущего разговора: {self.summary}"))
+        for turn in self.turns:
+            message_class = HumanMessage if turn.role == "user" else AIMessage
+            messages.append(message_class(content=turn.content))
+        return messages
+
+    def clear(self):
+        self.turns.clear()
+        self.turn_tokens = 0
+        self.summary = ""
+        self.summary_tokens = 0
+        self._rendered = ""
+
+
+def make_llm_summarizer(llm):
+    """Создает summarizer, который дополняет краткое содержание с помощью LLM."""
+    prompt = PromptTemplate.from_template(
+        "Кратко (не более 3 предложений) обнови содержание разговора.\n\n"
+        "Текущее содержание:\n{summary}\n\n"
+        "Новые реплики:\n{lines}\n\n"
+        "Обновленное содержание:"
+    )
+    chain = prompt | llm | StrOutputParser()
+
+    def summarize(summary, turns):
+        lines = "".join(turn.render() for turn in turns)
+        return chain.invoke({"summary": summary or "(пусто)", "lines": lines}).strip()
+
+    return summarize
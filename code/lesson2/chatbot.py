@@ -1,12 +1,18 @@
 import os
+import sys
 from dotenv import load_dotenv
-from langchain_openai import ChatOpenAI
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from common.llm_client import create_chat_model
+from common.streaming import stream_to_console
 from langchain_core.prompts import PromptTemplate
-from langchain_classic.memory import ConversationBufferMemory
+from chat_history import TokenBudgetHistory, make_llm_summarizer
 
 # Загружаем переменные окружения из файла .env
 load_dotenv()
 
+# Потоковый вывод по умолчанию; --no-stream печатает ответ целиком после генерации
+STREAMING = "--no-stream" not in sys.argv
+
 def main():
     try:
         # Проверяем наличие API ключа
@@ -16,14 +22,11 @@ def main():
             return
         
         # Инициализируем модель через OpenRouter
-        llm = ChatOpenAI(
-            model="openai/gpt-3.5-turbo",
-            openai_api_key=api_key,
-            openai_api_base="https://openrouter.ai/api/v1"
-        )
+        llm = create_chat_model(api_key=api_key)
         
-        # Инициализируем память
-        memory = ConversationBufferMemory(memory_key="chat_history", return_messages=True)
+        # Инициализируем историю: старые реплики сворачиваются в краткое содержание,
+        # когда история превышает бюджет токенов
+        history = TokenBudgetHistory(max_tokens=1500, summarizer=make_llm_summarizer(llm))
         
         # Создаем шаблон для чат-бота с учетом истории разговора
         prompt_template = PromptTemplate.from_template(
@@ -43,22 +46,24 @@ def main():
             "А как насчет полиморфизма?"
         ]
         
-        chat_history = ""
-        
         for question in questions:
             print(f"\nПользователь: {question}")
             
-            # Получаем ответ
-            response = chain.invoke({
-                "chat_history": chat_history,
+            inputs = {
+                "chat_history": history.render(),
                 "question": question
-            })
+            }
             
-            answer = response.content
-            print(f"Ассистент: {answer}")
+            # Получаем ответ
+            if STREAMING:
+                answer, stats = stream_to_console(chain, inputs, prefix="Ассистент: ")
+                print(f"({stats})")
+            else:
+                answer = chain.invoke(inputs).content
+                print(f"Ассистент: {answer}")
             
-            # Обновляем историю разговора
-            chat_history += f"Пользователь: {question}\nАссистент: {answer}\n"
+            # Обновляем историю разговора, когда ответ получен полностью
+            history.add_turn(question, answer)
         
     except Exception as e:
         print(f"Произошла ошибка при выполнении запроса: {str(e)}")
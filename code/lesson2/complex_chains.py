@@ -1,6 +1,8 @@
 import os
+import sys
 from dotenv import load_dotenv
-from langchain_openai import ChatOpenAI
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from common.llm_client import create_chat_model
 from langchain_core.prompts import PromptTemplate
 from langchain_core.runnables import RunnableParallel
 
@@ -16,11 +18,7 @@ def main():
             return
         
         # Инициализируем модель через OpenRouter
-        llm = ChatOpenAI(
-            model="openai/gpt-3.5-turbo",
-            openai_api_key=api_key,
-            openai_api_base="https://openrouter.ai/api/v1"
-        )
+        llm = create_chat_model(api_key=api_key)
         
         # Пример параллельной обработки
         print("=== Пример параллельной обработки ===")
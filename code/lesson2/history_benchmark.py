@@ -0,0 +1,90 @@
+"""
+Бенчмарк истории разговора
+Проигрывает длинный диалог с фиктивной моделью и сравнивает размер промпта
+и время хода для истории-строки (как в исходном chatbot.py) и для
+TokenBudgetHistory с кратким содержанием.
+"""
+
+import sys
+import time
+
+from langchain_core.language_models.fake_chat_models import FakeListChatModel
+from langchain_core.prompts import PromptTemplate
+
+from chat_history import TokenBudgetHistory, approx_token_count
+
+NUM_TURNS = 500
+REPORT_EVERY = 50
+
+PROMPT = PromptTemplate.from_template(
+    "Ты полезный ассистент. Отвечай на вопросы пользователя, учитывая историю разговора.\n\n"
+    "История разговора:\n{chat_history}\n\n"
+    "Вопрос пользователя: {question}\n"
+    "Ответ:"
+)
+
+ANSWERS = [
+    "Инкапсуляция скрывает внутреннее состояние объекта и открывает только нужный интерфейс. "
+    "Это упрощает сопровождение кода и защищает данные от некорректных изменений. " * 2,
+    "Полиморфизм позволяет работать с объектами разных классов через общий интерфейс, "
+    "а наследование дает возможность переиспользовать поведение базового класса. " * 2,
+]
+
+
+def fake_summarizer(summary, turns):
+    """Имитация LLM-суммаризации: короткое содержание фиксированного размера."""
+    topics = ", ".join(turn.content.split()[0] for turn in turns[:3])
+    return f"Обсуждали принципы ООП ({len(turns)} реплик, темы: {topics})."
+
+
+def replay(num_turns, use_budget):
+    """Проигрывает диалог и возвращает список (токены промпта, время хода)."""
+    chain = PROMPT | FakeListChatModel(responses=ANSWERS)
+    history = TokenBudgetHistory(max_tokens=1500, summarizer=fake_summarizer)
+    chat_history = ""
+    per_turn = []
+
+    for turn in range(num_turns):
+        question = f"Вопрос {turn}: расскажи подробнее про принцип номер {turn % 7}?"
+        start = time.perf_counter()
+
+        rendered = history.render() if use_budget else chat_history
+        response = chain.invoke({"chat_history": rendered, "question": question})
+        answer = response.content
+
+        if use_budget:
+            history.add_turn(question, answer)
+        else:
+            chat_history += f"Пользователь: {question}\nАссистент: {answer}\n"
+
+        elapsed = time.perf_counter() - start
+        prompt_tokens = approx_token_count(PROMPT.format(chat_history=rendered, question=question))
+        per_turn.append((prompt_tokens, elapsed))
+
+    return per_turn, history.summarizations
+
+
+def report(name, per_turn, summarizations=None):
+    print(f"\n=== {name} ===")
+    print(f"{'Ход':>6} | {'Токены промпта':>15} | {'Время хода, мс':>15}")
+    for turn in range(REPORT_EVERY - 1, len(per_turn), REPORT_EVERY):
+        tokens, elapsed = per_turn[turn]
+        print(f"{turn + 1:>6} | {tokens:>15} | {elapsed * 1000:>15.3f}")
+    total_tokens = sum(tokens for tokens, _ in per_turn)
+    total_time = sum(elapsed for _, elapsed in per_turn)
+    print(f"Всего токенов промпта: {total_tokens}, общее время: {total_time:.2f} с")
+    if summarizations is not None:
+        print(f"Вызовов суммаризации: {summarizations}")
+
+
+def main():
+    """Основная функция."""
+    num_turns = int(sys.argv[1]) if len(sys.argv) > 1 else NUM_TURNS
+    per_turn, _ = replay(num_turns, use_budget=False)
+    report("История-строка (без ограничений)", per_turn)
+    per_turn, summarizations = replay(num_turns, use_budget=True)
+    report("TokenBudgetHistory (бюджет 1500 токенов)", per_turn, summarizations)
+
+
+if __name__ == "__main__":
+    main()
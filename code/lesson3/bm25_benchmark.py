@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Бенчмарк индекса BM25
+Индексирует синтетический корпус (по умолчанию 1 000 000 фрагментов по
+20-60 слов с частотами слов по закону Ципфа) пакетами по 100 000 и
+измеряет скорость индексации, слияние сегментов, размер индекса и задержку
+запросов из частых и редких терминов. Затем проверяет инкрементальное
+добавление и удаление документов в готовом индексе, частоты терминов
+после удаления и автоматическое слияние сегментов после удаления.
+"""
+
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from bm25_index import MAX_SEGMENTS, BM25Index
+
+NUM_CHUNKS = 1_000_000
+BATCH = 100_000
+VOCABULARY = 30_000
+NUM_QUERIES = 200
+SYLLABLES = ["ра", "зо", "ми", "ка", "те", "ло", "ну", "ве", "да", "си", "пре", "про", "ст", "ко", "ль", "ны"]
+ENDINGS = ["", "а", "ы", "ов", "ами", "ой", "ый", "ение", "ировать", "ость"]
+
+
+def make_vocabulary(size, seed=0):
+    rng = np.random.default_rng(seed)
+    words = set()
+    while len(words) < size:
+        parts = rng.choice(SYLLABLES, rng.integers(2, 5))
+        words.add("".join(parts) + ENDINGS[rng.integers(len(ENDINGS))])
+    return sorted(words)
+
+
+def make_corpus(num_chunks, words, seed=0):
+    rng = np.random.default_rng(seed)
+    # Частоты слов по закону Ципфа
+    probabilities = 1.0 / np.arange(1, len(words) + 1)
+    probabilities /= probabilities.sum()
+    lengths = rng.integers(20, 61, num_chunks)
+    picks = rng.choice(len(words), int(lengths.sum()), p=probabilities)
+    words = np.array(words, dtype=object)
+    bounds = np.concatenate([[0], np.cumsum(lengths)])
+    for i in range(num_chunks):
+        yield " ".join(words[picks[bounds[i]:bounds[i + 1]]])
+
+
+def make_queries(words, seed=1):
+    rng = np.random.default_rng(seed)
+    queries = []
+    for _ in range(NUM_QUERIES):
+        # Одно частое слово и одно-два слова из хвоста распределения
+        terms = [words[rng.integers(0, 100)]] + [words[rng.integers(100, len(words))]
+                                                for _ in range(rng.integers(1, 3))]
+        queries.append(" ".join(terms))
+    return queries
+
+
+def index_bytes(index):
+    segments = sum(s.term_ids.nbytes + s.offsets.nbytes + s.docs.nbytes + s.tfs.nbytes for s in index._segments)
+    return segments + index._lengths.nbytes + index._deleted.nbytes + index._df.nbytes
+
+
+def measure_queries(index, queries):
+    latencies = []
+    for query in queries:
+        start = time.perf_counter()
+        index.search_ids(query, k=10)
+        latencies.append(time.perf_counter() - start)
+    return np.percentile(latencies, 50) * 1000, np.percentile(latencies, 99) * 1000
+
+
+def check_merge_after_delete():
+    """Автоматическое слияние сегментов после удаления учитывает документы нового пакета."""
+    index = BM25Index()
+    for i in range(MAX_SEGMENTS):
+        index.add_texts([f"общий термин документ{i}"], ids=[f"d{i}"])
+    index.delete(["d0"])
+    index.add_texts(["общий термин новый"], ids=["new"])
+    assert len(index._segments) == 1 and len(index) == MAX_SEGMENTS
+    docs, _ = index.search_ids("общий", k=2 * MAX_SEGMENTS)
+    assert sorted(index.ids[doc] for doc in docs) == [f"d{i}" for i in range(1, MAX_SEGMENTS)] + ["new"]
+    assert index._df[index.vocabulary[index.tokenizer("общий")[0]]] == MAX_SEGMENTS
+    print("Слияние сегментов после удаления: индекс согласован")
+
+
+def main():
+    """Основная функция."""
+    num_chunks = int(sys.argv[1]) if len(sys.argv) > 1 else NUM_CHUNKS
+    words = make_vocabulary(VOCABULARY)
+    queries = make_queries(words)
+    print(f"=== {num_chunks} фрагментов, словарь {VOCABULARY} слов ===\n")
+
+    index = BM25Index(store_documents=False)
+    corpus = make_corpus(num_chunks, words)
+    total_time = 0.0
+    for start in range(0, num_chunks, BATCH):
+        batch = [next(corpus) for _ in range(min(BATCH, num_chunks - start))]
+        began = time.perf_counter()
+        index.add_texts(batch)
+        elapsed = time.perf_counter() - began
+        total_time += elapsed
+        print(f"Пакет {start // BATCH + 1}: {len(batch) / elapsed:>8.0f} фрагментов/с, сегментов {len(index._segments)}")
+    p50, p99 = measure_queries(index, queries)
+    print(f"\nИндексация: {num_chunks / total_time:.0f} фрагментов/с, всего {total_time:.1f} с")
+    print(f"Запрос до слияния сегментов: p50 {p50:.1f} мс, p99 {p99:.1f} мс")
+
+    began = time.perf_counter()
+    index.optimize()
+    merge_time = time.perf_counter() - began
+    p50, p99 = measure_queries(index, queries)
+    print(f"Слияние сегментов: {merge_time:.1f} с; индекс {index_bytes(index) / 2 ** 20:.0f} МБ, "
+          f"терминов {len(index.vocabulary)}")
+    print(f"Запрос после слияния: p50 {p50:.1f} мс, p99 {p99:.1f} мс")
+
+    # Инкрементальные изменения: новый небольшой сегмент и удаление
+    extra = list(make_corpus(1000, words, seed=7))
+    began = time.perf_counter()
+    ids = index.add_texts(extra, ids=[f"new-{i}" for i in range(len(extra))])
+    add_time = time.perf_counter() - began
+    began = time.perf_counter()
+    index.delete(ids[:500])
+    delete_time = time.perf_counter() - began
+    p50, p99 = measure_queries(index, queries)
+    print(f"\nДобавление 1000 фрагментов: {add_time * 1000:.0f} мс, удаление 500: {delete_time * 1000:.1f} мс")
+    print(f"Запрос с новым сегментом: p50 {p50:.1f} мс, p99 {p99:.1f} мс")
+
+    # Частоты терминов после удаления должны совпадать с пересчитанными при слиянии
+    df = index._df.copy()
+    index.optimize()
+    assert np.array_equal(df, index._df), "df после удаления расходится с df после optimize"
+    print("Частоты терминов после удаления совпадают с пересчитанными при слиянии")
+    check_merge_after_delete()
+
+
+if __name__ == "__main__":
+    main()
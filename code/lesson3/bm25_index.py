@@ -0,0 +1,274 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Инвертированный индекс с ранжированием BM25
+BM25Index хранит для каждого термина массив документов, в которых он
+встречается, и частоты термина в них (postings). Документы добавляются
+пакетами: каждый пакет становится сегментом, построенным целиком в NumPy
+(сортировка пар термин-документ), а небольшие сегменты периодически
+сливаются. Оценка BM25 для запроса считается векторно по массивам postings
+без обхода документов в Python.
+"""
+
+import json
+import os
+
+import numpy as np
+from langchain_core.documents import Document
+
+from common.russian_stemmer import Tokenizer
+
+# Сегменты сливаются, когда их становится больше
+MAX_SEGMENTS = 8
+
+
+class _Segment:
+    """Неизменяемая часть индекса: postings в формате CSR."""
+
+    __slots__ = ("term_ids", "offsets", "docs", "tfs")
+
+    def __init__(self, term_ids, offsets, docs, tfs):
+        self.term_ids = term_ids  # отсортированные id терминов сегмента
+        self.offsets = offsets  # границы postings каждого термина в docs/tfs
+        self.docs = docs
+        self.tfs = tfs
+
+    @classmethod
+    def build(cls, term_ids, doc_ids):
+        """Сегмент из параллельных массивов (термин, документ) всех вхождений."""
+        keys = (term_ids.astype(np.int64) << 32) | doc_ids.astype(np.int64)
+        keys, tfs = np.unique(keys, return_counts=True)
+        terms = (keys >> 32).astype(np.int32)
+        unique_terms, starts = np.unique(terms, return_index=True)
+        offsets = np.append(starts, len(terms)).astype(np.int64)
+        return cls(unique_terms, offsets, (keys & 0xFFFFFFFF).astype(np.int32), tfs.astype(np.int32))
+
+    @classmethod
+    def merge(cls, segments, deleted=None):
+        """Один сегмент из нескольких; postings удаленных документов отбрасываются."""
+        term_ids = []
+        doc_ids = []
+        tfs = []
+        for segment in segments:
+            term_ids.append(np.repeat(segment.term_ids, np.diff(segment.offsets)))
+            doc_ids.append(segment.docs)
+            tfs.append(segment.tfs)
+        term_ids = np.concatenate(term_ids)
+        doc_ids = np.concatenate(doc_ids)
+        tfs = np.concatenate(tfs)
+        if deleted is not None:
+            keep = ~deleted[doc_ids]
+            term_ids, doc_ids, tfs = term_ids[keep], doc_ids[keep], tfs[keep]
+        # Документы разных сегментов не пересекаются: достаточно упорядочить пары
+        order = np.lexsort((doc_ids, term_ids))
+        term_ids, doc_ids, tfs = term_ids[order], doc_ids[order], tfs[order]
+        unique_terms, starts = np.unique(term_ids, return_index=True)
+        return cls(unique_terms, np.append(starts, len(term_ids)).astype(np.int64), doc_ids, tfs)
+
+    def postings(self, term_id):
+        position = np.searchsorted(self.term_ids, term_id)
+        if position == len(self.term_ids) or self.term_ids[position] != term_id:
+            return None
+        start, end = self.offsets[position], self.offsets[position + 1]
+        return self.docs[start:end], self.tfs[start:end]
+
+
+class BM25Index:
+    """Инвертированный индекс фрагментов с оценкой BM25.
+
+    Args:
+        k1: Насыщение частоты термина
+        b: Сила нормализации по длине документа
+        tokenizer: Функция текст -> список терминов
+        store_documents: Хранить ли сами документы (для search); без них
+            search_ids возвращает номера документов
+    """
+
+    def __init__(self, k1=1.5, b=0.75, tokenizer=None, store_documents=True):
+        self.k1 = k1
+        self.b = b
+        self.tokenizer = tokenizer or Tokenizer()
+        self.store_documents = store_documents
+        self.vocabulary = {}
+        self.documents = []
+        self.ids = []
+        self._segments = []
+        self._lengths = np.zeros(0, dtype=np.int32)
+        self._deleted = np.zeros(0, dtype=bool)
+        self._df = np.zeros(0, dtype=np.int64)
+        self._total_length = 0
+        self._rows_by_id = {}
+
+    def __len__(self):
+        return len(self._lengths) - int(self._deleted.sum())
+
+    # --- Индексация ---
+
+    def add_texts(self, texts, ids=None, metadatas=None):
+        """Добавляет пакет текстов одним сегментом; возвращает их id."""
+        texts = list(texts)
+        start = len(self._lengths)
+        ids = list(ids) if ids is not None else [str(start + i) for i in range(len(texts))]
+        vocabulary = self.vocabulary
+        term_ids = []
+        lengths = np.empty(len(texts), dtype=np.int32)
+        for i, text in enumerate(texts):
+            terms = self.tokenizer(text)
+            lengths[i] = len(terms)
+            for term in terms:
+                term_id = vocabulary.get(term)
+                if term_id is None:
+                    term_id = vocabulary[term] = len(vocabulary)
+                term_ids.append(term_id)
+        term_ids = np.array(term_ids, dtype=np.int32)
+        doc_ids = np.repeat(np.arange(start, start + len(texts), dtype=np.int32), lengths)
+        if len(term_ids):
+            segment = _Segment.build(term_ids, doc_ids)
+            self._segments.append(segment)
+            df = np.zeros(len(vocabulary), dtype=np.int64)
+            df[: len(self._df)] = self._df
+            df[segment.term_ids] += np.diff(segment.offsets)
+            self._df = df
+        self._lengths = np.concatenate([self._lengths, lengths])
+        self._total_length += int(lengths.sum())
+        self._deleted = np.concatenate([self._deleted, np.zeros(len(texts), dtype=bool)])
+        if self.store_documents:
+            metadatas = metadatas or [{} for _ in texts]
+            self.documents.extend(Document(id=record_id, page_content=text, metadata=metadata or {})
+                                  for record_id, text, metadata in zip(ids, texts, metadatas))
+        self.ids.extend(ids)
+        self._rows_by_id.update((record_id, start + i) for i, record_id in enumerate(ids))
+        # Слияние - после учета новых строк: маска удаленных должна их покрывать
+        if len(self._segments) > MAX_SEGMENTS:
+            self.optimize()
+        return ids
+
+    def add_documents(self, documents, ids=None):
+        documents = list(documents)
+        if ids is None:
+            ids = [doc.id for doc in documents] if all(doc.id for doc in documents) else None
+        return self.add_texts([doc.page_content for doc in documents], ids,
+                              [doc.metadata for doc in documents])
+
+    def delete(self, ids):
+        """Исключает документы из поиска (postings удаляются при optimize)."""
+        rows = np.array([self._rows_by_id.pop(record_id) for record_id in ids if record_id in self._rows_by_id],
+                        dtype=np.int64)
+        if not len(rows):
+            return False
+        self._deleted[rows] = True
+        self._total_length -= int(self._lengths[rows].sum())
+        # df считается по живым документам, как и их число в idf: иначе idf
+        # частого термина после удалений становится отрицательным
+        deleted = np.zeros(len(self._lengths), dtype=bool)
+        deleted[rows] = True
+        for segment in self._segments:
+            hit = deleted[segment.docs]
+            if hit.any():
+                terms = np.repeat(segment.term_ids, np.diff(segment.offsets))[hit]
+                self._df -= np.bincount(terms, minlength=len(self._df))
+        return True
+
+    def optimize(self):
+        """Сливает все сегменты в один и удаляет postings удаленных документов."""
+        if len(self._segments) > 1 or (self._segments and self._deleted.any()):
+            segment = _Segment.merge(self._segments, self._deleted if self._deleted.any() else None)
+            self._segments = [segment]
+            df = np.zeros(len(self.vocabulary), dtype=np.int64)
+            df[segment.term_ids] = np.diff(segment.offsets)
+            self._df = df
+
+    # --- Поиск ---
+
+    def score(self, query):
+        """Оценки BM25 документов, содержащих термины запроса.
+
+        Returns:
+            (номера документов, оценки)
+        """
+        term_ids = {self.vocabulary[term] for term in self.tokenizer(query) if term in self.vocabulary}
+        live = len(self)
+        if not term_ids or not live:
+            return np.zeros(0, dtype=np.int32), np.zeros(0, dtype=np.float32)
+        lengths = self._lengths
+        average_length = self._total_length / live or 1.0
+        docs = []
+        weights = []
+        for term_id in term_ids:
+            df = self._df[term_id]
+            idf = np.log(1.0 + (live - df + 0.5) / (df + 0.5))
+            for segment in self._segments:
+                postings = segment.postings(term_id)
+                if postings is None:
+                    continue
+                term_docs, tfs = postings
+                norm = self.k1 * (1.0 - self.b + self.b * lengths[term_docs] / average_length)
+                docs.append(term_docs)
+                weights.append(idf * tfs * (self.k1 + 1.0) / (tfs + norm))
+        if not docs:
+            return np.zeros(0, dtype=np.int32), np.zeros(0, dtype=np.float32)
+        docs = np.concatenate(docs)
+        weights = np.concatenate(weights)
+        if len(docs) * 8 > len(lengths):
+            # Много postings (частые термины): сумма в плотный массив дешевле сортировки
+            dense = np.bincount(docs, weights=weights, minlength=len(lengths))
+            unique_docs = np.flatnonzero(dense).astype(np.int32)
+            scores = dense[unique_docs].astype(np.float32)
+        else:
+            unique_docs, inverse = np.unique(docs, return_inverse=True)
+            scores = np.bincount(inverse, weights=weights).astype(np.float32)
+        keep = ~self._deleted[unique_docs]
+        return unique_docs[keep], scores[keep]
+
+    def search_ids(self, query, k=4):
+        """k лучших документов: (номера, оценки) по убыванию оценки."""
+        docs, scores = self.score(query)
+        if len(docs) > k:
+            best = np.argpartition(-scores, k - 1)[:k]
+            docs, scores = docs[best], scores[best]
+        order = np.argsort(-scores, kind="stable")
+        return docs[order], scores[order]
+
+    def search(self, query, k=4):
+        """Список (Document, оценка BM25)."""
+        if not self.store_documents:
+            raise ValueError("Индекс создан с store_documents=False: используйте search_ids")
+        docs, scores = self.search_ids(query, k)
+        return [(self.documents[doc], float(score)) for doc, score in zip(docs, scores)]
+
+    # --- Хранение ---
+
+    def save(self, directory):
+        """Сохраняет индекс (сегменты предварительно сливаются)."""
+        self.optimize()
+        os.makedirs(directory, exist_ok=True)
+        segment = self._segments[0] if self._segments else _Segment.build(np.zeros(0, np.int32), np.zeros(0, np.int32))
+        np.savez(os.path.join(directory, "bm25.npz"), term_ids=segment.term_ids, offsets=segment.offsets,
+                 docs=segment.docs, tfs=segment.tfs, lengths=self._lengths, deleted=self._deleted, df=self._df)
+        terms = sorted(self.vocabulary, key=self.vocabulary.get)
+        data = {"k1": self.k1, "b": self.b, "terms": terms, "ids": self.ids}
+        if self.store_documents:
+            data["documents"] = [[doc.page_content, doc.metadata] for doc in self.documents]
+        with open(os.path.join(directory, "bm25.json"), "w", encoding="utf-8") as file:
+            json.dump(data, file, ensure_ascii=False)
+
+    @classmethod
+    def load(cls, directory, tokenizer=None):
+        with open(os.path.join(directory, "bm25.json"), encoding="utf-8") as file:
+            data = json.load(file)
+        index = cls(data["k1"], data["b"], tokenizer, store_documents="documents" in data)
+        index.vocabulary = {term: i for i, term in enumerate(data["terms"])}
+        index.ids = data["ids"]
+        index._rows_by_id = {record_id: row for row, record_id in enumerate(index.ids)}
+        if index.store_documents:
+            index.documents = [Document(id=record_id, page_content=text, metadata=metadata)
+                               for record_id, (text, metadata) in zip(index.ids, data["documents"])]
+        with np.load(os.path.join(directory, "bm25.npz")) as arrays:
+            index._segments = [_Segment(arrays["term_ids"], arrays["offsets"], arrays["docs"], arrays["tfs"])]
+            index._lengths = arrays["lengths"]
+            index._deleted = arrays["deleted"]
+            index._df = arrays["df"]
+        index._total_length = int(index._lengths[~index._deleted].sum())
+        for row in np.flatnonzero(index._deleted):
+            index._rows_by_id.pop(index.ids[row], None)
+        return index
@@ -1,10 +1,14 @@
 import os
-import shutil
+import sys
 from dotenv import load_dotenv
 from langchain_core.documents import Document
-from langchain_text_splitters import RecursiveCharacterTextSplitter
-from langchain_community.vectorstores import Chroma
-from langchain_openai import ChatOpenAI, OpenAIEmbeddings
+from langchain_openai import OpenAIEmbeddings
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from common.llm_client import create_chat_model
+from embedding_cache import CachedEmbeddings, EmbeddingStore
+from index_manager import IndexManager
+from numpy_vector_store import NumpyVectorStore
+from token_splitter import TokenAwareSplitter
 
 # Загружаем переменные окружения из файла .env
 load_dotenv()
@@ -37,21 +41,15 @@ def main():
         )
         
         # Разделение документа на части
-        text_splitter = RecursiveCharacterTextSplitter(
-            chunk_size=300,
-            chunk_overlap=50,
-            length_function=len,
+        # Размер фрагментов в токенах той же кодировки, что у text-embedding-ada-002
+        text_splitter = TokenAwareSplitter(
+            encoding="cl100k_base",
+            chunk_size=128,
+            chunk_overlap=32,
         )
         
-        texts = text_splitter.split_documents([sample_document])
-        print(f"Документ разделен на {len(texts)} частей")
-        
         # Инициализируем модель через OpenRouter
-        llm = ChatOpenAI(
-            model="openai/gpt-3.5-turbo",
-            openai_api_key=api_key,
-            openai_api_base="https://openrouter.ai/api/v1"
-        )
+        llm = create_chat_model(api_key=api_key)
         
         # Инициализация эмбеддингов
         embeddings = OpenAIEmbeddings(
@@ -60,13 +58,25 @@ def main():
             openai_api_base="https://openrouter.ai/api/v1"
         )
         
-        # Создание векторного хранилища
-        vectorstore = Chroma.from_documents(
-            documents=texts,
-            embedding=embeddings,
-            persist_directory="./chroma_db"
+        # Кэш эмбеддингов на диске: при повторном запуске неизмененные
+        # фрагменты не отправляются в модель, промахи отправляются пакетами
+        cached_embeddings = CachedEmbeddings(
+            embeddings,
+            EmbeddingStore("./embedding_cache", "text-embedding-ada-002"),
+            batch_size=100,
+            max_concurrency=4,
         )
         
+        # Векторное хранилище на диске (точный поиск, без базы данных).
+        # IndexManager помнит, какие фрагменты каких источников уже в нем:
+        # при повторном запуске неизмененный документ пропускается, а у
+        # измененного добавляются и удаляются только отличающиеся фрагменты
+        vectorstore = NumpyVectorStore(cached_embeddings, persist_directory="./vector_store")
+        manager = IndexManager(vectorstore, "./vector_store/manifest.json", text_splitter)
+        index_stats = manager.index_documents([sample_document])
+        print(f"Индексация: добавлено {index_stats.chunks_added}, удалено {index_stats.chunks_deleted}, "
+              f"без изменений {index_stats.sources_unchanged} источников; в хранилище {len(vectorstore)} частей")
+        
         # Поиск похожих документов
         query = "Что такое машинное обучение?"
         similar_docs = vectorstore.similarity_search(query, k=2)
@@ -77,9 +87,8 @@ def main():
             print(f"Содержимое: {doc.page_content}")
             print(f"Метаданные: {doc.metadata}")
         
-        # Удаление временной базы данных
-        if os.path.exists("./chroma_db"):
-            shutil.rmtree("./chroma_db")
+        stats = cached_embeddings.stats
+        print(f"\nЭмбеддинги: {stats.hits} из кэша, {stats.misses} вычислено ({stats.batches} запросов)")
         
     except Exception as e:
         print(f"Произошла ошибка при выполнении запроса: {str(e)}")
@@ -0,0 +1,299 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Пакетное вычисление эмбеддингов с постоянным кэшем на диске
+CachedEmbeddings хэширует содержимое каждого фрагмента и ищет его в
+EmbeddingStore - кэше эмбеддингов одной модели. В модель отправляются только
+промахи: пакетами, ограниченными по числу текстов и по токенам, с ограниченным
+числом одновременных запросов. Повторная загрузка неизменного корпуса не
+делает ни одного запроса к модели эмбеддингов.
+
+Формат кэша (каталог на каждую модель):
+    keys.bin   - хэши текстов, по 16 байт на строку
+    vectors.bin - векторы float32 или float16, строка за строкой (memmap)
+    meta.json  - модель, размерность, тип и число записанных строк
+meta.json обновляется последним, поэтому недописанные строки после сбоя
+просто игнорируются при следующем открытии.
+"""
+
+import asyncio
+import hashlib
+import json
+import os
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict, dataclass
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+KEY_SIZE = 16
+
+
+def content_hash(text):
+    """Хэш содержимого фрагмента (16 байт)."""
+    return hashlib.blake2b(text.encode("utf-8"), digest_size=KEY_SIZE).digest()
+
+
+def approx_token_count(text):
+    """Грубая оценка числа токенов: около 4 символов на токен."""
+    return len(text) // 4 + 1
+
+
+def model_name_of(embeddings):
+    """Имя модели эмбеддингов для ключа кэша."""
+    for attribute in ("model", "model_name"):
+        name = getattr(embeddings, attribute, None)
+        if isinstance(name, str) and name:
+            return name
+    name = type(embeddings).__name__
+    dim = getattr(embeddings, "dim", None)
+    return f"{name}-{dim}" if dim else name
+
+
+class EmbeddingStore:
+    """Кэш эмбеддингов одной модели: хэш текста -> вектор.
+
+    Векторы хранятся в одном файле и читаются через memmap, поэтому открытие
+    кэша на сотни тысяч записей не загружает их в память целиком.
+
+    Args:
+        directory: Корневой каталог кэша; для модели создается подкаталог
+        model: Имя модели (векторы разных моделей несовместимы)
+        dtype: np.float32 или np.float16 (вдвое меньше места на диске)
+    """
+
+    def __init__(self, directory, model, dtype=np.float32):
+        safe_name = re.sub(r"[^\w.-]+", "_", model)
+        self.path = os.path.join(directory, safe_name)
+        self.model = model
+        self.dtype = np.dtype(dtype)
+        self.dim = None
+        self.size = 0
+        self._index = {}
+        self._vectors = None
+        self._lock = threading.Lock()
+        os.makedirs(self.path, exist_ok=True)
+        self._load()
+
+    def _file(self, name):
+        return os.path.join(self.path, name)
+
+    def _load(self):
+        try:
+            with open(self._file("meta.json"), encoding="utf-8") as file:
+                meta = json.load(file)
+        except FileNotFoundError:
+            return
+        if meta["model"] != self.model:
+            raise ValueError(f"Кэш {self.path} принадлежит модели {meta['model']}, а не {self.model}")
+        self.dim = meta["dim"]
+        self.dtype = np.dtype(meta["dtype"])
+        self.size = meta["count"]
+        with open(self._file("keys.bin"), "rb") as file:
+            keys = file.read(self.size * KEY_SIZE)
+        self._index = {keys[i * KEY_SIZE:(i + 1) * KEY_SIZE]: i for i in range(self.size)}
+        self._map_vectors()
+
+    def _map_vectors(self):
+        if self.size:
+            self._vectors = np.memmap(self._file("vectors.bin"), dtype=self.dtype, mode="r",
+                                      shape=(self.size, self.dim))
+
+    def __len__(self):
+        return self.size
+
+    def __contains__(self, key):
+        return key in self._index
+
+    def lookup(self, keys):
+        """Находит векторы по хэшам.
+
+        Returns:
+            (матрица len(keys) x dim в float32, список позиций промахов);
+            строки промахов в матрице не заполнены
+        """
+        with self._lock:
+            rows = np.fromiter((self._index.get(key, -1) for key in keys), dtype=np.int64, count=len(keys))
+            missing = np.flatnonzero(rows < 0).tolist()
+            if self.dim is None:
+                return None, missing
+            matrix = np.empty((len(keys), self.dim), dtype=np.float32)
+            if len(missing) < len(keys):
+                hits = np.flatnonzero(rows >= 0)
+                matrix[hits] = self._vectors[rows[hits]]
+            return matrix, missing
+
+    def add(self, keys, vectors):
+        """Дописывает новые векторы в конец файла и фиксирует их в meta.json."""
+        vectors = np.asarray(vectors, dtype=np.float32)
+        with self._lock:
+            if self.dim is None:
+                self.dim = vectors.shape[1]
+            elif vectors.shape[1] != self.dim:
+                raise ValueError(f"Размерность {vectors.shape[1]} не совпадает с размерностью кэша {self.dim}")
+            fresh = []
+            for i, key in enumerate(keys):
+                if key not in self._index:
+                    self._index[key] = self.size + len(fresh)
+                    fresh.append(i)
+            if not fresh:
+                return
+            mode = "r+b" if self.size else "wb"
+            # Файлы обрезаются до зафиксированного размера: хвост после сбоя перезаписывается
+            with open(self._file("vectors.bin"), mode) as file:
+                file.seek(self.size * self.dim * self.dtype.itemsize)
+                file.write(vectors[fresh].astype(self.dtype).tobytes())
+                file.truncate()
+            with open(self._file("keys.bin"), mode) as file:
+                file.seek(self.size * KEY_SIZE)
+                file.write(b"".join(keys[i] for i in fresh))
+                file.truncate()
+            self.size += len(fresh)
+            self._write_meta()
+            self._map_vectors()
+
+    def _write_meta(self):
+        meta = {"model": self.model, "dim": self.dim, "dtype": self.dtype.name, "count": self.size}
+        temporary = self._file("meta.json.tmp")
+        with open(temporary, "w", encoding="utf-8") as file:
+            json.dump(meta, file)
+        os.replace(temporary, self._file("meta.json"))
+
+
+@dataclass
+class EmbeddingCacheStats:
+    """Счетчики CachedEmbeddings."""
+    texts: int = 0
+    hits: int = 0
+    misses: int = 0
+    batches: int = 0
+
+    def as_dict(self):
+        return asdict(self)
+
+
+class CachedEmbeddings(Embeddings):
+    """Обертка над моделью эмбеддингов с кэшем и пакетной отправкой промахов.
+
+    Повторяющиеся тексты внутри одного вызова тоже вычисляются один раз.
+    Запросы (embed_query) не кэшируются: они редко повторяются и нужны сразу.
+
+    Args:
+        embeddings: Исходная модель эмбеддингов (например, OpenAIEmbeddings)
+        store: EmbeddingStore; по умолчанию ./embedding_cache/<модель>
+        batch_size: Максимум текстов в одном запросе
+        max_batch_tokens: Максимум токенов в одном запросе
+        max_concurrency: Максимум одновременных запросов
+        token_counter: Функция оценки числа токенов в тексте
+    """
+
+    def __init__(self, embeddings, store=None, batch_size=256, max_batch_tokens=8000,
+                 max_concurrency=4, token_counter=approx_token_count):
+        self.embeddings = embeddings
+        if store is None:
+            store = EmbeddingStore("./embedding_cache", model_name_of(embeddings))
+        self.store = store
+        self.batch_size = batch_size
+        self.max_batch_tokens = max_batch_tokens
+        self.max_concurrency = max_concurrency
+        self.token_counter = token_counter
+        self.stats = EmbeddingCacheStats()
+
+    def make_batches(self, texts):
+        """Делит тексты на пакеты по batch_size и max_batch_tokens (списки позиций)."""
+        batches = []
+        current = []
+        current_tokens = 0
+        for i, text in enumerate(texts):
+            tokens = self.token_counter(text)
+            if current and (len(current) >= self.batch_size or current_tokens + tokens > self.max_batch_tokens):
+                batches.append(current)
+                current = []
+                current_tokens = 0
+            current.append(i)
+            current_tokens += tokens
+        if current:
+            batches.append(current)
+        return batches
+
+    def _embed_batch(self, texts):
+        if hasattr(self.embeddings, "embed_array"):
+            return self.embeddings.embed_array(texts)
+        return np.asarray(self.embeddings.embed_documents(texts), dtype=np.float32)
+
+    async def _aembed_batch(self, texts):
+        return np.asarray(await self.embeddings.aembed_documents(texts), dtype=np.float32)
+
+    def _prepare(self, texts):
+        """Хэши, уникальные промахи и уже найденные векторы."""
+        keys = [content_hash(text) for text in texts]
+        matrix, missing = self.store.lookup(keys)
+        # Один и тот же текст может встретиться несколько раз
+        unique = {}
+        for i in missing:
+            unique.setdefault(keys[i], i)
+        self.stats.texts += len(texts)
+        self.stats.hits += len(texts) - len(missing)
+        self.stats.misses += len(unique)
+        miss_texts = [texts[i] for i in unique.values()]
+        return keys, matrix, missing, list(unique), miss_texts
+
+    def _finish(self, texts, keys, matrix, missing, miss_keys, miss_vectors):
+        if miss_keys:
+            self.store.add(miss_keys, miss_vectors)
+        if matrix is None:
+            matrix = np.empty((len(texts), self.store.dim), dtype=np.float32)
+        if missing:
+            position = {key: i for i, key in enumerate(miss_keys)}
+            matrix[missing] = miss_vectors[[position[keys[i]] for i in missing]]
+        return matrix
+
+    def embed_array(self, texts):
+        """Матрица эмбеддингов (len(texts), dim) в float32."""
+        texts = list(texts)
+        if not texts:
+            return np.empty((0, self.store.dim or 0), dtype=np.float32)
+        keys, matrix, missing, miss_keys, miss_texts = self._prepare(texts)
+        miss_vectors = None
+        if miss_texts:
+            batches = self.make_batches(miss_texts)
+            self.stats.batches += len(batches)
+            with ThreadPoolExecutor(max_workers=self.max_concurrency) as executor:
+                results = list(executor.map(
+                    lambda batch: self._embed_batch([miss_texts[i] for i in batch]), batches))
+            miss_vectors = np.concatenate(results).astype(np.float32, copy=False)
+        return self._finish(texts, keys, matrix, missing, miss_keys, miss_vectors)
+
+    async def aembed_array(self, texts):
+        """Асинхронный вариант embed_array."""
+        texts = list(texts)
+        if not texts:
+            return np.empty((0, self.store.dim or 0), dtype=np.float32)
+        keys, matrix, missing, miss_keys, miss_texts = self._prepare(texts)
+        miss_vectors = None
+        if miss_texts:
+            batches = self.make_batches(miss_texts)
+            self.stats.batches += len(batches)
+            semaphore = asyncio.Semaphore(self.max_concurrency)
+
+            async def run(batch):
+                async with semaphore:
+                    return await self._aembed_batch([miss_texts[i] for i in batch])
+
+            results = await asyncio.gather(*(run(batch) for batch in batches))
+            miss_vectors = np.concatenate(results).astype(np.float32, copy=False)
+        return self._finish(texts, keys, matrix, missing, miss_keys, miss_vectors)
+
+    def embed_documents(self, texts):
+        return self.embed_array(texts).tolist()
+
+    async def aembed_documents(self, texts):
+        return (await self.aembed_array(texts)).tolist()
+
+    def embed_query(self, text):
+        return self.embeddings.embed_query(text)
+
+    async def aembed_query(self, text):
+        return await self.embeddings.aembed_query(text)
@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Бенчмарк кэша эмбеддингов
+Загружает синтетический корпус (по умолчанию 100 000 фрагментов) через
+CachedEmbeddings с детерминированной локальной моделью, к каждому запросу
+которой добавлена сетевая задержка. Сравнивает первую загрузку, повторную
+загрузку того же корпуса (новый процесс открывает кэш с диска) и загрузку
+корпуса, в котором изменился 1% фрагментов.
+"""
+
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from common.local_embeddings import HashingEmbeddings
+from embedding_cache import CachedEmbeddings, EmbeddingStore
+
+NUM_CHUNKS = 100_000
+REQUEST_LATENCY = 0.05
+
+WORDS = ["модель", "вектор", "документ", "поиск", "индекс", "запрос", "ответ", "данные",
+         "обучение", "фрагмент", "хранилище", "эмбеддинг", "цепочка", "агент", "память"]
+
+
+class RemoteEmbeddings(HashingEmbeddings):
+    """HashingEmbeddings с задержкой сети на каждый запрос и счетчиком текстов."""
+
+    def __init__(self, latency=REQUEST_LATENCY, **kwargs):
+        super().__init__(**kwargs)
+        self.latency = latency
+        self.texts = 0
+
+    def embed_array(self, texts):
+        time.sleep(self.latency)
+        self.texts += len(texts)
+        return super().embed_array(texts)
+
+
+def make_corpus(num_chunks, seed=0):
+    rng = random.Random(seed)
+    return [f"Фрагмент {i}: " + " ".join(rng.choices(WORDS, k=rng.randint(10, 40))) for i in range(num_chunks)]
+
+
+def ingest(label, corpus, directory, dtype=np.float32, **kwargs):
+    model = RemoteEmbeddings()
+    start = time.perf_counter()
+    store = EmbeddingStore(directory, "hashing-256", dtype=dtype)
+    opened = time.perf_counter() - start
+    embeddings = CachedEmbeddings(model, store, **kwargs)
+    matrix = embeddings.embed_array(corpus)
+    elapsed = time.perf_counter() - start
+    stats = embeddings.stats
+    print(f"{label:<32} {elapsed:>7.2f} с (открытие {opened * 1000:>5.0f} мс)  запросов: {model.calls:>4}  "
+          f"текстов в модель: {model.texts:>6}  попаданий: {stats.hits:>6}")
+    return matrix
+
+
+def directory_size(path):
+    return sum(os.path.getsize(os.path.join(root, name)) for root, _, names in os.walk(path) for name in names)
+
+
+def main():
+    """Основная функция."""
+    num_chunks = int(sys.argv[1]) if len(sys.argv) > 1 else NUM_CHUNKS
+    corpus = make_corpus(num_chunks)
+    changed = list(corpus)
+    for i in random.Random(1).sample(range(num_chunks), num_chunks // 100):
+        changed[i] += " (изменено)"
+
+    root = tempfile.mkdtemp(prefix="embedding_cache_")
+    try:
+        print(f"=== {num_chunks} фрагментов, задержка запроса {REQUEST_LATENCY * 1000:.0f} мс ===\n")
+        directory = os.path.join(root, "float32")
+        reference = ingest("Первая загрузка (1 поток)", corpus, os.path.join(root, "serial"), max_concurrency=1)
+        cold = ingest("Первая загрузка (4 потока)", corpus, directory)
+        warm = ingest("Повторная загрузка", corpus, directory)
+        ingest("Изменен 1% фрагментов", changed, directory)
+        assert np.array_equal(cold, reference) and np.array_equal(cold, warm)
+
+        half = os.path.join(root, "float16")
+        ingest("Первая загрузка (float16)", corpus, half, dtype=np.float16)
+        warm_half = ingest("Повторная загрузка (float16)", corpus, half, dtype=np.float16)
+        error = np.abs(warm_half - cold).max()
+        print(f"\nРазмер кэша: float32 {directory_size(directory) / 2 ** 20:.1f} МБ, "
+              f"float16 {directory_size(half) / 2 ** 20:.1f} МБ (макс. отклонение {error:.1e})")
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Гибридный поиск: BM25 + векторный поиск
+Эмбеддинги хорошо находят близкие по смыслу фрагменты, но размывают точные
+термины ("RESTful API", названия функций). HybridRetriever ищет одновременно
+в векторном хранилище и в индексе BM25 по тем же фрагментам и объединяет
+два списка методом reciprocal rank fusion (RRF): документ получает сумму
+1 / (rrf_k + место) по спискам, в которые он попал.
+"""
+
+from typing import Any, List
+
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+
+from bm25_index import BM25Index
+
+
+def reciprocal_rank_fusion(rankings, weights=None, rrf_k=60):
+    """Объединяет ранжированные списки документов.
+
+    Args:
+        rankings: Списки документов, лучшие первыми
+        weights: Вес каждого списка (по умолчанию 1)
+
+    Returns:
+        Список (Document, оценка RRF) по убыванию оценки
+    """
+    weights = weights or [1.0] * len(rankings)
+    scores = {}
+    documents = {}
+    for ranking, weight in zip(rankings, weights):
+        for rank, doc in enumerate(ranking):
+            key = doc.id or doc.page_content
+            scores[key] = scores.get(key, 0.0) + weight / (rrf_k + rank + 1)
+            documents.setdefault(key, doc)
+    order = sorted(scores, key=scores.get, reverse=True)
+    return [(documents[key], scores[key]) for key in order]
+
+
+class HybridRetriever(BaseRetriever):
+    """Ретривер, объединяющий векторный поиск и BM25 через RRF.
+
+    Документы добавляются через add_documents, чтобы оба индекса содержали
+    одни и те же фрагменты с одинаковыми id.
+    """
+
+    vectorstore: Any
+    index: Any = None
+    k: int = 4
+    fetch_k: int = 20
+    rrf_k: int = 60
+    vector_weight: float = 1.0
+    keyword_weight: float = 1.0
+
+    def model_post_init(self, context):
+        if self.index is None:
+            self.index = BM25Index()
+
+    @classmethod
+    def from_documents(cls, documents, vectorstore, **kwargs):
+        retriever = cls(vectorstore=vectorstore, **kwargs)
+        retriever.add_documents(documents)
+        return retriever
+
+    def add_documents(self, documents):
+        """Индексирует фрагменты в обоих индексах; возвращает их id."""
+        documents = list(documents)
+        ids = self.vectorstore.add_documents(documents)
+        self.index.add_documents(documents, ids)
+        return ids
+
+    def delete(self, ids):
+        self.vectorstore.delete(ids)
+        self.index.delete(ids)
+
+    def search_with_scores(self, query):
+        """Список (Document, оценка RRF) для запроса."""
+        dense = self.vectorstore.similarity_search(query, k=self.fetch_k)
+        sparse = [doc for doc, _ in self.index.search(query, k=self.fetch_k)]
+        fused = reciprocal_rank_fusion([dense, sparse], [self.vector_weight, self.keyword_weight], self.rrf_k)
+        return fused[:self.k]
+
+    def _get_relevant_documents(self, query, *, run_manager) -> List[Document]:
+        return [doc for doc, _ in self.search_with_scores(query)]
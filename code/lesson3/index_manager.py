@@ -0,0 +1,238 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Инкрементальная индексация в векторное хранилище
+IndexManager хранит манифест: для каждого источника (файла или документа с
+metadata["source"]) - mtime, размер, хэш содержимого и id его фрагментов в
+хранилище. При повторном запуске файлы с прежними mtime и размером
+пропускаются без чтения, у остальных сравнивается хэш; измененные файлы
+заново режутся на фрагменты, и в хранилище попадает только разница:
+новые фрагменты добавляются, исчезнувшие удаляются, фрагменты удаленных
+файлов удаляются целиком.
+
+Id фрагмента - хэш источника и текста (без смещения), поэтому правка в
+одном месте файла меняет только соседние фрагменты, а не все после нее.
+
+Порядок записи: изменения хранилища, сохранение хранилища, манифест
+(временный файл, fsync, os.replace). После сбоя на любом шаге повторный
+запуск применяет ту же разницу еще раз: перед добавлением фрагменты с теми
+же id удаляются, поэтому дубликатов не будет.
+"""
+
+import hashlib
+import json
+import os
+from collections import Counter
+from dataclasses import asdict, dataclass
+
+from embedding_cache import content_hash
+from streaming_loader import BLOCK_SIZE, PATTERNS, StreamingSplitter, iter_files, read_blocks
+
+MANIFEST_VERSION = 1
+
+
+@dataclass
+class IndexStats:
+    """Счетчики одного прохода IndexManager."""
+
+    sources_scanned: int = 0
+    sources_unchanged: int = 0
+    sources_changed: int = 0
+    sources_removed: int = 0
+    chunks_added: int = 0
+    chunks_deleted: int = 0
+    chunks_kept: int = 0
+
+    def as_dict(self):
+        return asdict(self)
+
+
+def file_hash(path, block_size=BLOCK_SIZE):
+    """Хэш содержимого файла (hex), файл читается блоками."""
+    digest = hashlib.blake2b(digest_size=16)
+    with open(path, "rb") as file:
+        for block in iter(lambda: file.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def chunk_ids(source, chunks):
+    """Id фрагментов [(текст, метаданные)] источника.
+
+    Одинаковые фрагменты одного источника различаются номером повтора.
+    """
+    seen = Counter()
+    ids = []
+    for text, metadata in chunks:
+        key = content_hash(json.dumps([source, text, metadata], ensure_ascii=False, sort_keys=True)).hex()
+        seen[key] += 1
+        ids.append(key if seen[key] == 1 else f"{key}-{seen[key] - 1}")
+    return ids
+
+
+def load_manifest(path):
+    if not os.path.exists(path):
+        return {"version": MANIFEST_VERSION, "sources": {}}
+    with open(path, encoding="utf-8") as file:
+        manifest = json.load(file)
+    if manifest.get("version") != MANIFEST_VERSION:
+        raise ValueError(f"Неподдерживаемая версия манифеста {path}: {manifest.get('version')}")
+    return manifest
+
+
+def save_manifest(path, manifest):
+    """Атомарная запись: старый или новый манифест целиком даже при сбое питания."""
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    temporary = path + ".tmp"
+    with open(temporary, "w", encoding="utf-8") as file:
+        # json.dumps кодирует на C, json.dump - по частям на Python
+        file.write(json.dumps(manifest, ensure_ascii=False, separators=(",", ":")))
+        file.flush()
+        os.fsync(file.fileno())
+    os.replace(temporary, path)
+    descriptor = os.open(directory, os.O_RDONLY)
+    try:
+        os.fsync(descriptor)
+    finally:
+        os.close(descriptor)
+
+
+class IndexManager:
+    """Применяет к векторному хранилищу только изменения источников.
+
+    Args:
+        vectorstore: Хранилище с add_texts(ids=...) и delete(ids); если у него
+            есть save() (NumpyVectorStore), оно сохраняется перед манифестом
+        manifest_path: Файл манифеста (обычно рядом с хранилищем)
+        splitter: RecursiveCharacterTextSplitter или StreamingSplitter
+        batch_size: Фрагментов в одном вызове add_texts
+
+    Пример:
+        store = NumpyVectorStore(embeddings, persist_directory="./vector_store")
+        manager = IndexManager(store, "./vector_store/manifest.json", splitter)
+        print(manager.index_directory("./data").as_dict())
+    """
+
+    def __init__(self, vectorstore, manifest_path, splitter=None, batch_size=1000, encoding="utf-8"):
+        self.vectorstore = vectorstore
+        self.manifest_path = manifest_path
+        self.splitter = splitter if isinstance(splitter, StreamingSplitter) else StreamingSplitter(splitter)
+        self.batch_size = batch_size
+        self.encoding = encoding
+        self.manifest = load_manifest(manifest_path)
+        self._texts = []
+        self._metadatas = []
+        self._ids = []
+
+    def index_directory(self, root, patterns=PATTERNS):
+        """Синхронизирует хранилище с файлами каталога.
+
+        Фрагменты файлов, которых больше нет в каталоге, удаляются.
+        """
+        stats = IndexStats()
+        sources = self.manifest["sources"]
+        seen = set()
+        for path in iter_files(root, patterns):
+            seen.add(path)
+            stats.sources_scanned += 1
+            stat = os.stat(path)
+            entry = sources.get(path)
+            if entry and entry["mtime_ns"] == stat.st_mtime_ns and entry["size"] == stat.st_size:
+                stats.sources_unchanged += 1
+                continue
+            digest = file_hash(path)
+            if entry and entry["hash"] == digest:
+                stats.sources_unchanged += 1  # изменился только mtime
+                ids = entry["ids"]
+            else:
+                blocks = read_blocks(path, encoding=self.encoding)
+                chunks = [(text, {"source": path}) for text, _ in self.splitter.split_blocks(blocks)]
+                ids = self._update(path, chunks, entry, stats)
+            sources[path] = {"mtime_ns": stat.st_mtime_ns, "size": stat.st_size, "hash": digest, "ids": ids}
+        prefix = os.path.join(root, "")
+        self._remove([source for source in sources if source.startswith(prefix) and source not in seen], stats)
+        self._commit()
+        return stats
+
+    def index_documents(self, documents, cleanup=False):
+        """Синхронизирует хранилище с документами, сгруппированными по metadata["source"].
+
+        При cleanup=True удаляются фрагменты всех источников манифеста,
+        которых нет среди documents.
+        """
+        stats = IndexStats()
+        sources = self.manifest["sources"]
+        grouped = {}
+        for document in documents:
+            source = document.metadata.get("source")
+            if source is None:
+                raise ValueError("У документа нет metadata['source']")
+            grouped.setdefault(source, []).append(document)
+        text_splitter = self.splitter.splitter
+        for source, group in grouped.items():
+            stats.sources_scanned += 1
+            digest = content_hash(json.dumps([[document.page_content, document.metadata] for document in group],
+                                             ensure_ascii=False, sort_keys=True)).hex()
+            entry = sources.get(source)
+            if entry and entry["hash"] == digest:
+                stats.sources_unchanged += 1
+                continue
+            chunks = [(text, document.metadata) for document in group
+                      for text in text_splitter.split_text(document.page_content)]
+            ids = self._update(source, chunks, entry, stats)
+            sources[source] = {"mtime_ns": None, "size": None, "hash": digest, "ids": ids}
+        if cleanup:
+            self._remove([source for source in sources if source not in grouped], stats)
+        self._commit()
+        return stats
+
+    # --- Применение разницы ---
+
+    def _update(self, source, chunks, entry, stats):
+        """Ставит в очередь новые фрагменты источника, удаляет исчезнувшие и возвращает id всех."""
+        ids = chunk_ids(source, chunks)
+        old = set(entry["ids"]) if entry else set()
+        new = set(ids)
+        stale = [record_id for record_id in (entry["ids"] if entry else []) if record_id not in new]
+        if stale:
+            self.vectorstore.delete(stale)
+        for record_id, (text, metadata) in zip(ids, chunks):
+            if record_id not in old:
+                self._add(record_id, text, metadata)
+        stats.sources_changed += 1
+        stats.chunks_deleted += len(stale)
+        stats.chunks_added += len(new - old)
+        stats.chunks_kept += len(new & old)
+        return ids
+
+    def _remove(self, removed, stats):
+        sources = self.manifest["sources"]
+        for source in removed:
+            ids = sources.pop(source)["ids"]
+            if ids:
+                self.vectorstore.delete(ids)
+            stats.sources_removed += 1
+            stats.chunks_deleted += len(ids)
+
+    def _add(self, record_id, text, metadata):
+        self._ids.append(record_id)
+        self._texts.append(text)
+        self._metadatas.append(metadata)
+        if len(self._ids) >= self.batch_size:
+            self._flush()
+
+    def _flush(self):
+        if not self._ids:
+            return
+        # Остатки прошлого прохода, прерванного после сохранения хранилища
+        self.vectorstore.delete(self._ids)
+        self.vectorstore.add_texts(self._texts, self._metadatas, ids=self._ids)
+        self._texts, self._metadatas, self._ids = [], [], []
+
+    def _commit(self):
+        self._flush()
+        save = getattr(self.vectorstore, "save", None)
+        if save is not None:
+            save()
+        save_manifest(self.manifest_path, self.manifest)
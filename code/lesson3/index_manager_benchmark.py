@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Бенчмарк инкрементальной индексации
+Генерирует корпус на 1 млн фрагментов (1000 файлов по 1250 абзацев),
+индексирует его с нуля в NumpyVectorStore через IndexManager, затем
+изменяет 1% файлов (правка части абзацев, удаление и добавление файлов) и
+сравнивает время повторной индексации с полной перестройкой. В конце
+проверяет, что хранилище совпадает с индексацией измененного корпуса с нуля.
+"""
+
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+import numpy as np
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from common.local_embeddings import HashingEmbeddings
+from index_manager import IndexManager
+from numpy_vector_store import NumpyVectorStore
+
+NUM_FILES = 1000
+PARAGRAPHS_PER_FILE = 1250
+CHANGED_SHARE = 0.01
+# Доля абзацев, которые правятся в измененном файле
+EDITED_PARAGRAPHS = 0.1
+DIM = 64
+WORDS = ["данные", "модель", "запрос", "индекс", "вектор", "цепочка", "агент", "память", "ответ", "поиск",
+         "document", "chunk", "loader", "splitter", "token", "stream", "process", "memory", "file", "corpus"]
+
+
+def make_paragraph(rng):
+    return " ".join(WORDS[i] for i in rng.integers(0, len(WORDS), rng.integers(5, 25))) + f" {rng.integers(1 << 40)}."
+
+
+def write_file(path, paragraphs):
+    with open(path, "w", encoding="utf-8") as file:
+        file.write("\n\n".join(paragraphs))
+
+
+def make_corpus(directory, num_files, rng):
+    """Файлы по подкаталогам; возвращает абзацы каждого файла."""
+    corpus = {}
+    for i in range(num_files):
+        path = os.path.join(directory, f"part_{i // 100:02}", f"doc_{i:04}.txt")
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        corpus[path] = [make_paragraph(rng) for _ in range(PARAGRAPHS_PER_FILE)]
+        write_file(path, corpus[path])
+    return corpus
+
+
+def change_corpus(directory, corpus, rng):
+    """Правит абзацы в части файлов, один файл удаляет и один добавляет."""
+    paths = sorted(corpus)
+    count = max(3, int(len(paths) * CHANGED_SHARE))
+    chosen = [paths[i] for i in rng.choice(len(paths), count, replace=False)]
+    for path in chosen[:-1]:
+        paragraphs = corpus[path]
+        for i in rng.choice(len(paragraphs), int(len(paragraphs) * EDITED_PARAGRAPHS), replace=False):
+            paragraphs[i] = make_paragraph(rng)
+        write_file(path, paragraphs)
+    os.remove(chosen[-1])
+    del corpus[chosen[-1]]
+    path = os.path.join(directory, "new", "doc_new.txt")
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    corpus[path] = [make_paragraph(rng) for _ in range(PARAGRAPHS_PER_FILE)]
+    write_file(path, corpus[path])
+    return count
+
+
+def live_ids(store):
+    return sorted(record_id for record_id, deleted in zip(store._docs.ids(), store._deleted) if not deleted)
+
+
+def run(name, directory, store_directory, splitter, embeddings):
+    start = time.perf_counter()
+    store = NumpyVectorStore(embeddings, persist_directory=store_directory)
+    manager = IndexManager(store, os.path.join(store_directory, "manifest.json"), splitter, batch_size=5000)
+    stats = manager.index_directory(directory)
+    elapsed = time.perf_counter() - start
+    print(f"{name:<32} {elapsed:>8.2f} с {stats.sources_changed + stats.sources_removed:>9} "
+          f"{stats.chunks_added:>10} {stats.chunks_deleted:>10} {len(store):>10}", flush=True)
+    return elapsed, store, stats
+
+
+def main():
+    """Основная функция."""
+    num_files = int(sys.argv[1]) if len(sys.argv) > 1 else NUM_FILES
+    rng = np.random.default_rng(0)
+    splitter = RecursiveCharacterTextSplitter(chunk_size=200, chunk_overlap=0)
+    embeddings = HashingEmbeddings(dim=DIM)
+    workdir = tempfile.mkdtemp(prefix="reindex_")
+    try:
+        corpus_directory = os.path.join(workdir, "corpus")
+        store_directory = os.path.join(workdir, "store")
+        corpus = make_corpus(corpus_directory, num_files, rng)
+        size = sum(os.path.getsize(path) for path in corpus) / 2 ** 20
+        print(f"Корпус: {len(corpus)} файлов, {size:.0f} МБ\n")
+
+        print(f"{'Проход':<32} {'Время':>10} {'Источников':>9} {'Добавлено':>10} {'Удалено':>10} {'В индексе':>10}")
+        full, _, _ = run("Полная индексация", corpus_directory, store_directory, splitter, embeddings)
+        unchanged, _, _ = run("Без изменений", corpus_directory, store_directory, splitter, embeddings)
+        changed = change_corpus(corpus_directory, corpus, rng)
+        delta, store, stats = run(f"Изменено {changed} файлов ({CHANGED_SHARE:.0%})", corpus_directory,
+                                  store_directory, splitter, embeddings)
+        print(f"\nПовторная индексация: {delta / full:.1%} времени полной, "
+              f"{stats.chunks_added / len(store):.2%} фрагментов вычислено заново "
+              f"(без изменений: {unchanged / full:.1%})")
+
+        fresh_directory = os.path.join(workdir, "fresh")
+        _, fresh, _ = run("Проверка: индексация с нуля", corpus_directory, fresh_directory, splitter, embeddings)
+        assert live_ids(fresh) == live_ids(store)
+        print("Содержимое хранилища совпадает с индексацией с нуля")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Бенчмарк индекса IVF: полнота против скорости
+На синтетических кластеризованных данных (по умолчанию 100 000 векторов
+размерности 128) сравнивает точный поиск NumpyVectorStore с IVF без сжатия
+и IVF-PQ при разных nprobe: recall@10 относительно точного поиска и число
+запросов в секунду. Таблица помогает выбрать n_lists, nprobe и pq_m.
+"""
+
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from common.local_embeddings import HashingEmbeddings
+from ivf_index import IVFVectorStore
+from numpy_vector_store import NumpyVectorStore
+
+NUM_VECTORS = 100_000
+DIM = 128
+NUM_TOPICS = 200
+NOISE = 1.0
+NUM_QUERIES = 200
+K = 10
+NPROBES = [1, 2, 4, 8, 16, 32, 64]
+
+
+def clustered_data(num_vectors, dim, num_topics, seed=0):
+    """Векторы вокруг num_topics случайных центров и запросы рядом с ними."""
+    rng = np.random.default_rng(seed)
+    topics = rng.standard_normal((num_topics, dim), dtype=np.float32)
+    vectors = topics[rng.integers(0, num_topics, num_vectors)]
+    vectors += NOISE * rng.standard_normal((num_vectors, dim), dtype=np.float32)
+    queries = topics[rng.integers(0, num_topics, NUM_QUERIES)]
+    queries += NOISE * rng.standard_normal((NUM_QUERIES, dim), dtype=np.float32)
+    return vectors, queries
+
+
+def recall(found, truth):
+    return float(np.mean([len(set(row) & set(expected)) / len(expected) for row, expected in zip(found, truth)]))
+
+
+def timed_search(store, queries):
+    start = time.perf_counter()
+    rows, _ = store.search_vectors(queries, K)
+    return rows, len(queries) / (time.perf_counter() - start)
+
+
+def main():
+    """Основная функция."""
+    num_vectors = int(sys.argv[1]) if len(sys.argv) > 1 else NUM_VECTORS
+    vectors, queries = clustered_data(num_vectors, DIM, NUM_TOPICS)
+    texts = [f"Документ {i}" for i in range(num_vectors)]
+    print(f"=== {num_vectors} векторов, размерность {DIM}, {NUM_TOPICS} тем, recall@{K} ===\n")
+
+    exact = NumpyVectorStore(HashingEmbeddings(dim=DIM))
+    exact.add_embeddings(texts, vectors)
+    truth, exact_qps = timed_search(exact, queries)
+    print(f"Точный поиск: {exact_qps:.0f} запросов/с\n")
+
+    # Для IVF-PQ сравнивается оценка только по кодам PQ и с точным пересчетом лучших кандидатов
+    for name, options, reranks in [("IVF", {}, [0]), ("IVF-PQ m=16", {"pq_m": 16}, [0, 100])]:
+        store = IVFVectorStore(HashingEmbeddings(dim=DIM), **options)
+        store.add_embeddings(texts, vectors)
+        start = time.perf_counter()
+        store.build_index()
+        build_time = time.perf_counter() - start
+        index_bytes = store.centroids.nbytes + store._assignments.nbytes
+        if store.pq is not None:
+            index_bytes += store._codes.nbytes + store.pq.codebooks.nbytes
+        print(f"{name}: {len(store.centroids)} кластеров, индекс {index_bytes / 2 ** 20:.1f} МБ, "
+              f"построение {build_time:.1f} с")
+        header = f"{'nprobe':>8}"
+        for rerank in reranks:
+            label = f" rerank={rerank}" if store.pq is not None else ""
+            header += f" {'recall@' + str(K) + label:>18} {'запросов/с':>11}"
+        print(header)
+        for nprobe in NPROBES:
+            store.nprobe = nprobe
+            line = f"{nprobe:>8}"
+            for rerank in reranks:
+                store.rerank = rerank
+                rows, qps = timed_search(store, queries)
+                line += f" {recall(rows, truth):>18.3f} {qps:>11.0f}"
+            print(line)
+        print()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,277 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Приближенный поиск ближайших соседей: индекс IVF
+IVFVectorStore расширяет NumpyVectorStore инвертированным индексом: векторы
+разбиваются k-means на n_lists кластеров, а запрос сравнивается только с
+векторами nprobe ближайших кластеров. Чем больше nprobe, тем выше полнота
+(recall) и ниже скорость.
+
+Дополнительно векторы можно сжать произведением квантователей (PQ):
+остаток вектора относительно центра кластера делится на pq_m частей,
+и каждая часть кодируется одним байтом. Оценка близости тогда считается по
+таблице (asymmetric distance computation), а лучшие rerank кандидатов
+пересчитываются точно по полным векторам.
+"""
+
+import json
+import os
+
+import numpy as np
+
+from numpy_vector_store import NumpyVectorStore, normalize_rows, top_k
+
+# Строк в одном блоке при назначении кластеров
+ASSIGN_BLOCK_ROWS = 16384
+
+
+def _nearest(data, centroids, spherical):
+    """Индекс ближайшего центра для каждой строки."""
+    labels = np.empty(len(data), dtype=np.int32)
+    half_norms = None if spherical else 0.5 * np.einsum("ij,ij->i", centroids, centroids)
+    for start in range(0, len(data), ASSIGN_BLOCK_ROWS):
+        scores = data[start:start + ASSIGN_BLOCK_ROWS] @ centroids.T
+        if half_norms is not None:
+            # argmin |x - c|^2 = argmax (x.c - |c|^2 / 2)
+            scores -= half_norms
+        labels[start:start + len(scores)] = scores.argmax(axis=1)
+    return labels
+
+
+def kmeans(data, n_clusters, iterations=15, spherical=True, seed=0):
+    """k-means; spherical=True - по косинусной близости (центры нормированы).
+
+    Returns:
+        (центры (n_clusters, dim), метки строк data)
+    """
+    data = np.asarray(data, dtype=np.float32)
+    rng = np.random.default_rng(seed)
+    n_clusters = min(n_clusters, len(data))
+    centroids = data[rng.choice(len(data), n_clusters, replace=False)].copy()
+    labels = _nearest(data, centroids, spherical)
+    for _ in range(iterations):
+        counts = np.bincount(labels, minlength=n_clusters)
+        sums = np.empty_like(centroids)
+        for d in range(data.shape[1]):
+            sums[:, d] = np.bincount(labels, weights=data[:, d], minlength=n_clusters)
+        empty = counts == 0
+        if empty.any():
+            # Пустой кластер получает случайную точку
+            sums[empty] = data[rng.choice(len(data), int(empty.sum()), replace=False)]
+            counts[empty] = 1
+        centroids = sums / counts[:, None]
+        if spherical:
+            centroids = normalize_rows(centroids)
+        new_labels = _nearest(data, centroids, spherical)
+        if np.array_equal(new_labels, labels):
+            break
+        labels = new_labels
+    return centroids.astype(np.float32), labels
+
+
+class ProductQuantizer:
+    """Произведение квантователей: m частей вектора по 256 центров (1 байт) на часть."""
+
+    def __init__(self, codebooks):
+        self.codebooks = codebooks  # (m, 256, dim / m)
+        self.m, self.ksub, self.dsub = codebooks.shape
+
+    @classmethod
+    def train(cls, data, m, iterations=10, seed=0):
+        dim = data.shape[1]
+        if dim % m:
+            raise ValueError(f"Размерность {dim} не делится на число частей PQ {m}")
+        dsub = dim // m
+        codebooks = np.zeros((m, 256, dsub), dtype=np.float32)
+        for j in range(m):
+            centroids, _ = kmeans(data[:, j * dsub:(j + 1) * dsub], 256, iterations, spherical=False, seed=seed + j)
+            codebooks[j, :len(centroids)] = centroids
+        return cls(codebooks)
+
+    def encode(self, data):
+        codes = np.empty((len(data), self.m), dtype=np.uint8)
+        for j in range(self.m):
+            codes[:, j] = _nearest(data[:, j * self.dsub:(j + 1) * self.dsub], self.codebooks[j], spherical=False)
+        return codes
+
+    def lookup_table(self, query):
+        """Скалярные произведения частей запроса с центрами: (m, 256)."""
+        return np.einsum("jkd,jd->jk", self.codebooks, query.reshape(self.m, self.dsub))
+
+    def scores(self, table, codes):
+        """Приближенные скалярные произведения запроса с закодированными векторами."""
+        return table[np.arange(self.m), codes].sum(axis=1)
+
+
+class IVFVectorStore(NumpyVectorStore):
+    """Векторное хранилище с приближенным поиском по индексу IVF (IVF-PQ).
+
+    Пока индекс не построен (build_index), поиск точный. Новые документы
+    сразу попадают в ближайший кластер; удаленные исключаются из поиска.
+
+    Args:
+        embedding: Модель эмбеддингов
+        persist_directory: Каталог для сохранения (см. NumpyVectorStore)
+        n_lists: Число кластеров; по умолчанию 4 * sqrt(число векторов)
+        nprobe: Сколько ближайших кластеров просматривать при поиске; не
+            сохраняется, поэтому у загруженного индекса тоже задается здесь
+        pq_m: Число частей PQ (None - без сжатия, оценка по полным векторам);
+            у загруженного индекса берется с диска, другое значение - ошибка
+        rerank: Сколько лучших кандидатов PQ пересчитывать точно (0 - не пересчитывать)
+        train_size: Максимум векторов для обучения k-means
+    """
+
+    def __init__(self, embedding, persist_directory=None, n_lists=None, nprobe=8, pq_m=None, rerank=100,
+                 train_size=50000, **kwargs):
+        self.n_lists = n_lists
+        self.nprobe = nprobe
+        self.pq_m = pq_m
+        self.rerank = rerank
+        self.train_size = train_size
+        self.centroids = None
+        self.pq = None
+        self._assignments = np.zeros(0, dtype=np.int32)
+        self._codes = None
+        self._lists = []
+        super().__init__(embedding, persist_directory=persist_directory, **kwargs)
+
+    @property
+    def is_trained(self):
+        return self.centroids is not None
+
+    # --- Построение индекса ---
+
+    def build_index(self, seed=0):
+        """Обучает k-means (и PQ) на векторах хранилища и распределяет их по кластерам."""
+        matrix = self._matrix()
+        if not len(matrix):
+            raise ValueError("Хранилище пусто: нечего индексировать")
+        rng = np.random.default_rng(seed)
+        sample = matrix
+        if len(matrix) > self.train_size:
+            sample = matrix[np.sort(rng.choice(len(matrix), self.train_size, replace=False))]
+        sample = np.asarray(sample)
+        n_lists = self.n_lists or max(1, int(4 * np.sqrt(len(matrix))))
+        self.centroids, labels = kmeans(sample, n_lists, seed=seed)
+        self.pq = None
+        if self.pq_m:
+            residuals = sample - self.centroids[labels]
+            self.pq = ProductQuantizer.train(residuals, self.pq_m, seed=seed)
+        self._assignments = np.zeros(0, dtype=np.int32)
+        self._codes = np.zeros((0, self.pq_m), dtype=np.uint8) if self.pq is not None else None
+        self._assign(0, matrix)
+
+    def _assign(self, start, vectors):
+        """Распределяет строки start.. по кластерам (и кодирует их PQ)."""
+        vectors = np.asarray(vectors)
+        labels = _nearest(vectors, self.centroids, spherical=True)
+        self._assignments = np.concatenate([self._assignments, labels])
+        if self.pq is not None:
+            codes = self.pq.encode(vectors - self.centroids[labels])
+            self._codes = np.concatenate([self._codes, codes])
+        if start == 0:
+            self._rebuild_lists()
+            return
+        rows = np.arange(start, start + len(vectors))
+        for label in np.unique(labels):
+            self._lists[label] = np.concatenate([self._lists[label], rows[labels == label]])
+
+    def _rebuild_lists(self):
+        order = np.argsort(self._assignments, kind="stable")
+        bounds = np.searchsorted(self._assignments[order], np.arange(len(self.centroids) + 1))
+        self._lists = [order[bounds[i]:bounds[i + 1]] for i in range(len(self.centroids))]
+
+    def add_embeddings(self, texts, embeddings, metadatas=None, ids=None):
+        start = len(self._docs)
+        ids = super().add_embeddings(texts, embeddings, metadatas, ids)
+        if self.is_trained:
+            self._assign(start, self._pending[-1])
+        return ids
+
+    # --- Поиск ---
+
+    def search_vectors(self, queries, k=4, allowed=None):
+        if not self.is_trained or (allowed is not None and not allowed.is_dense):
+            # Без индекса или при выборочном фильтре точный поиск по кандидатам дешевле
+            return super().search_vectors(queries, k, allowed)
+        mask = allowed.to_mask() if allowed is not None else None
+        queries = normalize_rows(queries)
+        matrix = self._matrix()
+        best_rows = np.full((len(queries), k), -1, dtype=np.int64)
+        best_scores = np.full((len(queries), k), -np.inf, dtype=np.float32)
+        centroid_scores = queries @ self.centroids.T
+        probes = top_k(centroid_scores, self.nprobe)
+        for i, query in enumerate(queries):
+            lists = probes[i]
+            rows = np.concatenate([self._lists[label] for label in lists])
+            keep = ~self._deleted[rows]
+            if mask is not None:
+                keep &= mask[rows]
+            rows = rows[keep]
+            if not len(rows):
+                continue
+            if self.pq is None:
+                scores = matrix[rows] @ query
+            else:
+                # q.x = q.c + q.(x - c): первое слагаемое уже посчитано для кластеров
+                table = self.pq.lookup_table(query)
+                scores = centroid_scores[i, self._assignments[rows]] + self.pq.scores(table, self._codes[rows])
+                if self.rerank:
+                    candidates = top_k(scores[None, :], max(k, self.rerank))[0]
+                    rows = rows[candidates]
+                    scores = matrix[rows] @ query
+            order = top_k(scores[None, :], k)[0]
+            best_rows[i, :len(order)] = rows[order]
+            best_scores[i, :len(order)] = scores[order]
+        return best_rows, best_scores
+
+    # --- Хранение ---
+
+    def save(self, directory=None):
+        # Индекс записывается до хранилища: meta.json хранилища остается точкой фиксации
+        directory = directory or self.persist_directory
+        if self.is_trained and directory:
+            os.makedirs(directory, exist_ok=True)
+            self._save_index(directory)
+        super().save(directory)
+
+    def _save_index(self, directory):
+        meta = {"pq_m": self.pq_m if self.pq is not None else None}
+        arrays = {"centroids": self.centroids, "assignments": self._assignments}
+        if self.pq is not None:
+            arrays.update(codebooks=self.pq.codebooks, codes=self._codes)
+        temporary = os.path.join(directory, "ivf.tmp.npz")
+        np.savez(temporary, meta=np.array(json.dumps(meta)), **arrays)
+        os.replace(temporary, os.path.join(directory, "ivf.npz"))
+
+    def _load(self, directory):
+        super()._load(directory)
+        path = os.path.join(directory, "ivf.npz")
+        if not os.path.exists(path):
+            return
+        with np.load(path) as data:
+            meta = json.loads(str(data["meta"]))
+            if self.pq_m is not None and self.pq_m != meta["pq_m"]:
+                raise ValueError(f"Индекс в {directory} сохранен с pq_m={meta['pq_m']}, а не {self.pq_m}")
+            self.pq_m = meta["pq_m"]
+            self.centroids = data["centroids"]
+            assignments = data["assignments"]
+            self.pq = ProductQuantizer(data["codebooks"]) if self.pq_m else None
+            codes = data["codes"] if self.pq_m else None
+        self.n_lists = len(self.centroids)
+        # Индекс мог быть сохранен раньше последних добавлений
+        count = min(len(assignments), len(self._docs))
+        self._assignments = assignments[:count]
+        self._codes = codes[:count] if codes is not None else None
+        self._rebuild_lists()
+        if count < len(self._docs):
+            self._assign(count, self._matrix()[count:])
+
+    @classmethod
+    def from_texts(cls, texts, embedding, metadatas=None, *, ids=None, persist_directory=None, **kwargs):
+        store = cls(embedding, **kwargs)
+        store.add_texts(texts, metadatas, ids=ids)
+        store.build_index()
+        if persist_directory:
+            store.save(persist_directory)
+        return store
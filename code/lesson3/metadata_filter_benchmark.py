@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Бенчмарк поиска с фильтром по метаданным
+Строит NumpyVectorStore на синтетическом корпусе (по умолчанию 1 000 000
+фрагментов, размерность 128) с полями topic, language, year и shard и
+сравнивает задержку запроса с фильтром разной избирательности (от 0.01% до
+50% строк): по индексу метаданных и с проверкой метаданных каждого документа.
+Перед замерами проверяет, что индекс (в том числе неполный, без части
+полей) отбирает те же строки, что и перебор.
+"""
+
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from common.local_embeddings import HashingEmbeddings
+from numpy_vector_store import NumpyVectorStore
+
+NUM_CHUNKS = 1_000_000
+DIM = 128
+NUM_QUERIES = 20
+K = 10
+TOPICS = ["basics", "fullstack", "data", "devops", "mobile", "security", "ml", "testing", "design", "career"]
+LANGUAGES = ["python", "javascript", "go", "rust", "java"]
+FILTERS = [
+    ("shard == 0", 'shard == 0'),
+    ("shard < 10", 'shard < 10'),
+    ("shard < 100", 'shard < 100'),
+    ("topic AND language", 'topic == "basics" AND language == "python"'),
+    ("shard < 1000", 'shard < 1000'),
+    ("NOT topic", 'NOT topic == "basics"'),
+    ("shard < 5000", 'shard < 5000'),
+]
+CHECK_CHUNKS = 5000
+CHECK_FILTERS = [
+    'topic in ["basics", "data"]',
+    'NOT language in ["go", "rust"] AND year >= 2010',
+    {"language": {"$in": ["python", "java"]}},
+    {"topic": {"$nin": ["basics", "ml"]}, "shard": {"$lt": 5000}},
+    'shard in [1, 2, 3] OR topic == "devops"',
+]
+
+
+def make_corpus(num_chunks, seed=0):
+    rng = np.random.default_rng(seed)
+    vectors = rng.standard_normal((num_chunks, DIM), dtype=np.float32)
+    topics = rng.integers(0, len(TOPICS), num_chunks)
+    languages = rng.integers(0, len(LANGUAGES), num_chunks)
+    years = rng.integers(2000, 2025, num_chunks)
+    shards = rng.integers(0, 10_000, num_chunks)
+    metadatas = [{"topic": TOPICS[t], "language": LANGUAGES[l], "year": int(y), "shard": int(s)}
+                 for t, l, y, s in zip(topics, languages, years, shards)]
+    return vectors, metadatas
+
+
+def measure(store, queries, filter):
+    """Средняя задержка запроса (мс) и число подходящих строк."""
+    latencies = []
+    for query in queries:
+        start = time.perf_counter()
+        allowed = store.filter_rows(filter)
+        store.search_vectors(query[None, :], K, allowed)
+        latencies.append(time.perf_counter() - start)
+    return float(np.mean(latencies)) * 1000, len(allowed) if allowed is not None else len(store)
+
+
+def check_filters(num_chunks=CHECK_CHUNKS):
+    """Индекс (полный и только по topic) отбирает те же строки, что и перебор."""
+    vectors, metadatas = make_corpus(num_chunks, seed=2)
+    texts = [f"Фрагмент {i}" for i in range(num_chunks)]
+    for fields in (["topic", "language", "year", "shard"], ["topic"]):
+        store = NumpyVectorStore(HashingEmbeddings(dim=DIM), metadata_fields=fields)
+        store.add_embeddings(texts, vectors, metadatas)
+        index = store.metadata_index
+        for filter in CHECK_FILTERS:
+            store.metadata_index = index
+            indexed = store.filter_rows(filter)
+            store.metadata_index = None
+            scanned = store.filter_rows(filter)
+            assert np.array_equal(indexed.to_rows(), scanned.to_rows()), f"Индекс по {fields} расходится с перебором: {filter}"
+    print(f"Фильтры по индексу совпадают с перебором ({len(CHECK_FILTERS)} фильтров, IN, $in и $nin)\n")
+
+
+def main():
+    """Основная функция."""
+    num_chunks = int(sys.argv[1]) if len(sys.argv) > 1 else NUM_CHUNKS
+    print(f"=== {num_chunks} фрагментов, размерность {DIM}, top-{K} ===\n")
+    check_filters()
+    vectors, metadatas = make_corpus(num_chunks)
+    queries = np.random.default_rng(1).standard_normal((NUM_QUERIES, DIM), dtype=np.float32)
+    texts = [f"Фрагмент {i}" for i in range(num_chunks)]
+
+    start = time.perf_counter()
+    store = NumpyVectorStore(HashingEmbeddings(dim=DIM), metadata_fields=["topic", "language", "year", "shard"])
+    store.add_embeddings(texts, vectors, metadatas)
+    print(f"Построение хранилища с индексом метаданных: {time.perf_counter() - start:.1f} с")
+    del vectors, metadatas
+
+    no_filter, _ = measure(store, queries, None)
+    print(f"Без фильтра: {no_filter:.1f} мс\n")
+    print(f"{'Фильтр':<20} {'Строк':>9} {'Доля':>8} {'Индекс, мс':>11} {'Перебор, мс':>12}")
+    index = store.metadata_index
+    for name, filter in FILTERS:
+        store.metadata_index = index
+        indexed, count = measure(store, queries, filter)
+        # Без индекса фильтр проверяется по метаданным каждого документа
+        store.metadata_index = None
+        scanned, _ = measure(store, queries[:1], filter)
+        print(f"{name:<20} {count:>9} {count / num_chunks:>8.2%} {indexed:>11.1f} {scanned:>12.0f}")
+    store.metadata_index = index
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,405 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Индексы метаданных для фильтрации при поиске
+MetadataIndex строится при добавлении документов: для каждого значения поля
+хранится множество строк хранилища. Множества (RowSet) устроены как в
+roaring bitmap: редкие значения - отсортированные массивы номеров строк,
+частые - упакованные битовые карты; AND/OR/NOT выполняются над ними без
+чтения метаданных документов. Фильтр задается строкой
+    topic == "basics" AND (language == "python" OR year >= 2020)
+или словарем в стиле Chroma: {"topic": "basics", "year": {"$gte": 2020}}.
+"""
+
+import ast
+import json
+import os
+import re
+
+import numpy as np
+
+# Доля строк, начиная с которой множество хранится битовой картой
+DENSE_FRACTION = 1 / 16
+
+
+class RowSet:
+    """Множество номеров строк: массив (редкое) или битовая карта (плотное)."""
+
+    __slots__ = ("size", "rows", "bits")
+
+    def __init__(self, size, rows=None, bits=None):
+        self.size = size
+        self.rows = rows
+        self.bits = bits
+
+    @classmethod
+    def from_rows(cls, size, rows):
+        rows = np.asarray(rows, dtype=np.int64)
+        if len(rows) >= size * DENSE_FRACTION:
+            mask = np.zeros(size, dtype=bool)
+            mask[rows] = True
+            return cls.from_mask(mask)
+        return cls(size, rows=rows)
+
+    @classmethod
+    def from_mask(cls, mask):
+        return cls(len(mask), bits=np.packbits(mask))
+
+    @classmethod
+    def full(cls, size):
+        return cls.from_mask(np.ones(size, dtype=bool))
+
+    @property
+    def is_dense(self):
+        return self.bits is not None
+
+    def __len__(self):
+        if self.rows is not None:
+            return len(self.rows)
+        return int(np.unpackbits(self.bits, count=self.size).sum())
+
+    def to_rows(self):
+        """Отсортированный массив номеров строк."""
+        if self.rows is not None:
+            return self.rows
+        return np.flatnonzero(np.unpackbits(self.bits, count=self.size))
+
+    def to_mask(self):
+        if self.bits is not None:
+            return np.unpackbits(self.bits, count=self.size).astype(bool)
+        mask = np.zeros(self.size, dtype=bool)
+        mask[self.rows] = True
+        return mask
+
+    def _contains(self, rows):
+        """Булев массив: какие из строк rows входят в плотное множество."""
+        return ((self.bits[rows >> 3] >> (7 - (rows & 7))) & 1).astype(bool)
+
+    def __and__(self, other):
+        if self.rows is not None and other.rows is not None:
+            return RowSet(self.size, rows=np.intersect1d(self.rows, other.rows, assume_unique=True))
+        if self.rows is not None:
+            return RowSet(self.size, rows=self.rows[other._contains(self.rows)])
+        if other.rows is not None:
+            return RowSet(self.size, rows=other.rows[self._contains(other.rows)])
+        # Пересечение двух частых значений может оказаться редким
+        return RowSet.from_rows(self.size, np.flatnonzero(np.unpackbits(self.bits & other.bits, count=self.size)))
+
+    def __or__(self, other):
+        if self.rows is not None and other.rows is not None:
+            return RowSet.from_rows(self.size, np.union1d(self.rows, other.rows))
+        return RowSet(self.size, bits=np.packbits(self.to_mask() | other.to_mask()))
+
+    def __invert__(self):
+        return RowSet.from_rows(self.size, np.flatnonzero(~self.to_mask()))
+
+
+# --- Разбор фильтров ---
+
+_TOKEN_RE = re.compile(r"""\s*(?:(?P<punct>[()\[\],])|(?P<op>==|!=|<=|>=|<|>|=)|"""
+                       r"""(?P<string>"(?:[^"\\]|\\.)*"|'(?:[^'\\]|\\.)*')|(?P<number>-?\d+(?:\.\d+)?)|"""
+                       r"""(?P<word>[^\W\d][\w.]*))""")
+_KEYWORDS = {"and", "or", "not", "in", "true", "false", "null"}
+_CONSTANTS = {"true": True, "false": False, "null": None}
+_DICT_OPERATORS = {"$eq": "==", "$ne": "!=", "$gt": ">", "$gte": ">=", "$lt": "<", "$lte": "<="}
+
+
+def _tokenize(text):
+    tokens = []
+    position = 0
+    text = text.strip()
+    while position < len(text):
+        match = _TOKEN_RE.match(text, position)
+        if match is None or match.end() == position:
+            raise ValueError(f"Не удалось разобрать фильтр с позиции {position}: {text[position:position + 20]!r}")
+        position = match.end()
+        kind = match.lastgroup
+        value = match.group(kind)
+        if kind == "string":
+            value = ast.literal_eval(value)
+        elif kind == "number":
+            value = float(value) if "." in value else int(value)
+        elif kind == "word" and value.lower() in _KEYWORDS:
+            kind, value = "keyword", value.lower()
+        elif kind == "op" and value == "=":
+            value = "=="
+        tokens.append((kind, value))
+    return tokens
+
+
+class _Parser:
+    """Рекурсивный спуск: or -> and -> not -> сравнение или скобки."""
+
+    def __init__(self, text):
+        self.tokens = _tokenize(text)
+        self.position = 0
+
+    def peek(self, kind=None, value=None):
+        if self.position >= len(self.tokens):
+            return False
+        token_kind, token_value = self.tokens[self.position]
+        return (kind is None or token_kind == kind) and (value is None or token_value == value)
+
+    def take(self, kind=None, value=None):
+        if not self.peek(kind, value):
+            found = self.tokens[self.position][1] if self.position < len(self.tokens) else "конец строки"
+            raise ValueError(f"Ожидалось {value or kind}, найдено {found!r}")
+        self.position += 1
+        return self.tokens[self.position - 1][1]
+
+    def parse(self):
+        node = self.parse_or()
+        if self.position != len(self.tokens):
+            raise ValueError(f"Лишний текст в фильтре: {self.tokens[self.position][1]!r}")
+        return node
+
+    def parse_or(self):
+        nodes = [self.parse_and()]
+        while self.peek("keyword", "or"):
+            self.take()
+            nodes.append(self.parse_and())
+        return nodes[0] if len(nodes) == 1 else ("or", nodes)
+
+    def parse_and(self):
+        nodes = [self.parse_not()]
+        while self.peek("keyword", "and"):
+            self.take()
+            nodes.append(self.parse_not())
+        return nodes[0] if len(nodes) == 1 else ("and", nodes)
+
+    def parse_not(self):
+        if self.peek("keyword", "not"):
+            self.take()
+            return ("not", self.parse_not())
+        if self.peek("punct", "("):
+            self.take()
+            node = self.parse_or()
+            self.take("punct", ")")
+            return node
+        return self.parse_comparison()
+
+    def parse_value(self):
+        if self.peek("keyword") and self.tokens[self.position][1] in _CONSTANTS:
+            return _CONSTANTS[self.take()]
+        if self.peek("string") or self.peek("number"):
+            return self.take()
+        return self.take("string")
+
+    def parse_comparison(self):
+        field = self.take("word")
+        negate = False
+        if self.peek("keyword", "not"):
+            self.take()
+            negate = True
+        if self.peek("keyword", "in"):
+            self.take()
+            self.take("punct", "[")
+            values = []
+            while not self.peek("punct", "]"):
+                values.append(self.parse_value())
+                if not self.peek("punct", "]"):
+                    self.take("punct", ",")
+            self.take("punct", "]")
+            node = ("in", field, values)
+            return ("not", node) if negate else node
+        if negate:
+            raise ValueError("После NOT в сравнении ожидается IN")
+        return ("cmp", field, self.take("op"), self.parse_value())
+
+
+def _parse_dict(filter):
+    nodes = []
+    for key, condition in filter.items():
+        if key in ("$and", "$or"):
+            nodes.append((key[1:], [_parse_dict(item) for item in condition]))
+        elif isinstance(condition, dict):
+            for operator, value in condition.items():
+                if operator == "$in":
+                    nodes.append(("in", key, list(value)))
+                elif operator == "$nin":
+                    nodes.append(("not", ("in", key, list(value))))
+                elif operator in _DICT_OPERATORS:
+                    nodes.append(("cmp", key, _DICT_OPERATORS[operator], value))
+                else:
+                    raise ValueError(f"Неизвестный оператор фильтра: {operator}")
+        else:
+            nodes.append(("cmp", key, "==", condition))
+    return nodes[0] if len(nodes) == 1 else ("and", nodes)
+
+
+def parse_filter(filter):
+    """Строка или словарь -> дерево фильтра из кортежей."""
+    if isinstance(filter, str):
+        return _Parser(filter).parse()
+    if isinstance(filter, dict):
+        return _parse_dict(filter)
+    if isinstance(filter, tuple):
+        return filter
+    raise TypeError(f"Неподдерживаемый тип фильтра: {type(filter).__name__}")
+
+
+def _compare(left, operator, right):
+    if operator == "==":
+        return left == right
+    if operator == "!=":
+        return left != right
+    try:
+        if operator == "<":
+            return left < right
+        if operator == "<=":
+            return left <= right
+        if operator == ">":
+            return left > right
+        return left >= right
+    except TypeError:
+        # Значения несравнимых типов (строка и число) фильтр не проходят
+        return False
+
+
+def _values_of(metadata, field):
+    value = metadata.get(field)
+    return value if isinstance(value, list) else [value]
+
+
+def matches(node, metadata):
+    """Проверяет метаданные одного документа (поиск без индекса)."""
+    kind = node[0]
+    if kind == "and":
+        return all(matches(child, metadata) for child in node[1])
+    if kind == "or":
+        return any(matches(child, metadata) for child in node[1])
+    if kind == "not":
+        return not matches(node[1], metadata)
+    if kind == "in":
+        return any(value in node[2] for value in _values_of(metadata, node[1]))
+    _, field, operator, expected = node
+    if field not in metadata:
+        return operator == "!="
+    values = _values_of(metadata, field)
+    if operator == "!=":
+        return all(value != expected for value in values)
+    return any(_compare(value, operator, expected) for value in values)
+
+
+# --- Индекс ---
+
+def _indexable(value):
+    return value is None or isinstance(value, (str, int, float, bool))
+
+
+class MetadataIndex:
+    """Инвертированный индекс метаданных: поле -> значение -> строки.
+
+    Args:
+        fields: Индексируемые поля; None - все поля со скалярными значениями
+            (списки индексируются по элементам)
+    """
+
+    def __init__(self, fields=None):
+        self.fields = list(fields) if fields is not None else None
+        self.size = 0
+        # поле -> значение -> список массивов строк (сливаются при первом чтении)
+        self._postings = {}
+
+    def add(self, metadatas):
+        """Индексирует метаданные следующих по порядку строк."""
+        start = self.size
+        batch = {}
+        for offset, metadata in enumerate(metadatas):
+            fields = self.fields if self.fields is not None else metadata.keys()
+            for field in fields:
+                if field not in metadata:
+                    continue
+                for value in _values_of(metadata, field):
+                    if _indexable(value):
+                        batch.setdefault(field, {}).setdefault(value, []).append(start + offset)
+        for field, values in batch.items():
+            postings = self._postings.setdefault(field, {})
+            for value, rows in values.items():
+                postings.setdefault(value, []).append(np.array(rows, dtype=np.int64))
+        self.size += len(metadatas)
+
+    def _rows(self, field, value):
+        chunks = self._postings.get(field, {}).get(value)
+        if not chunks:
+            return np.zeros(0, dtype=np.int64)
+        if len(chunks) > 1:
+            chunks[:] = [np.concatenate(chunks)]
+        return chunks[0]
+
+    def _union(self, field, values):
+        rows = [self._rows(field, value) for value in values]
+        rows = [part for part in rows if len(part)]
+        if not rows:
+            return RowSet(self.size, rows=np.zeros(0, dtype=np.int64))
+        if len(rows) == 1:
+            return RowSet.from_rows(self.size, rows[0])
+        if sum(len(part) for part in rows) >= self.size * DENSE_FRACTION:
+            mask = np.zeros(self.size, dtype=bool)
+            for part in rows:
+                mask[part] = True
+            return RowSet.from_mask(mask)
+        return RowSet.from_rows(self.size, np.unique(np.concatenate(rows)))
+
+    def evaluate(self, filter):
+        """Множество строк, удовлетворяющих фильтру (строка, словарь или дерево)."""
+        return self._evaluate(parse_filter(filter))
+
+    def _evaluate(self, node):
+        kind = node[0]
+        if kind == "and":
+            # Сначала самые маленькие множества: пересечение с ними дешевле
+            sets = sorted((self._evaluate(child) for child in node[1]),
+                          key=lambda rowset: rowset.size if rowset.is_dense else len(rowset.rows))
+            result = sets[0]
+            for other in sets[1:]:
+                result = result & other
+            return result
+        if kind == "or":
+            result = self._evaluate(node[1][0])
+            for child in node[1][1:]:
+                result = result | self._evaluate(child)
+            return result
+        if kind == "not":
+            return ~self._evaluate(node[1])
+        field = node[1]
+        if self.fields is not None and field not in self.fields:
+            raise KeyError(f"Поле {field} не индексировано")
+        if kind == "in":
+            return self._union(field, node[2])
+        _, field, operator, expected = node
+        if operator == "==":
+            return self._union(field, [expected])
+        if operator == "!=":
+            return ~self._union(field, [expected])
+        values = [value for value in self._postings.get(field, {}) if _compare(value, operator, expected)]
+        return self._union(field, values)
+
+    # --- Хранение ---
+
+    def save(self, directory):
+        fields = {}
+        arrays = {}
+        for number, (field, postings) in enumerate(self._postings.items()):
+            values = list(postings)
+            rows = [self._rows(field, value) for value in values]
+            fields[field] = values
+            arrays[f"rows_{number}"] = np.concatenate(rows) if rows else np.zeros(0, dtype=np.int64)
+            arrays[f"offsets_{number}"] = np.cumsum([0] + [len(part) for part in rows])
+        with open(os.path.join(directory, "metadata_index.json"), "w", encoding="utf-8") as file:
+            json.dump({"fields": self.fields, "size": self.size, "values": list(fields.items())}, file,
+                      ensure_ascii=False)
+        np.savez(os.path.join(directory, "metadata_index.npz"), **arrays)
+
+    @classmethod
+    def load(cls, directory):
+        with open(os.path.join(directory, "metadata_index.json"), encoding="utf-8") as file:
+            data = json.load(file)
+        index = cls(data["fields"])
+        index.size = data["size"]
+        with np.load(os.path.join(directory, "metadata_index.npz")) as arrays:
+            for number, (field, values) in enumerate(data["values"]):
+                rows = arrays[f"rows_{number}"]
+                offsets = arrays[f"offsets_{number}"]
+                index._postings[field] = {value: [rows[offsets[i]:offsets[i + 1]]] for i, value in enumerate(values)}
+        return index
@@ -0,0 +1,508 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Точное векторное хранилище на NumPy
+NumpyVectorStore реализует интерфейс VectorStore LangChain поверх одной
+непрерывной матрицы float32 с нормированными по L2 строками. Поиск - это
+умножение матрицы запросов на блоки матрицы векторов и выбор top-k через
+argpartition, поэтому несколько запросов обрабатываются за один проход.
+
+На диске (persist_directory):
+    vectors.npy  - матрица векторов, открывается через memmap
+    docs.bin     - тексты, метаданные и id в JSON, запись за записью
+    offsets.npy  - границы записей в docs.bin
+    deleted.npy  - отметки удаленных строк
+    id_hashes.npy - 64-битные хэши id для поиска строк по id
+    meta.json    - размерность и число записей (записывается последним)
+Открытие хранилища не читает векторы и тексты целиком, поэтому занимает
+миллисекунды при любом размере корпуса.
+"""
+
+import hashlib
+import io
+import itertools
+import json
+import os
+import re
+import uuid
+
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.vectorstores import VectorStore
+from langchain_core.vectorstores.utils import maximal_marginal_relevance
+
+from metadata_index import MetadataIndex, RowSet, matches, parse_filter
+
+# Строк матрицы в одном блоке поиска: ограничивает память под матрицу оценок
+SEARCH_BLOCK_ROWS = 65536
+# Начало записи docs.bin: ["id",
+_ID_RE = re.compile(rb'\["((?:[^"\\]|\\.)*)"')
+
+
+def normalize_rows(matrix):
+    """Нормирует строки матрицы по L2 (нулевые строки остаются нулевыми)."""
+    matrix = np.asarray(matrix, dtype=np.float32)
+    if matrix.ndim == 1:
+        matrix = matrix[None, :]
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+def embed_texts(embedding, texts):
+    """Матрица эмбеддингов текстов; embed_array используется, если он есть."""
+    if hasattr(embedding, "embed_array"):
+        return np.asarray(embedding.embed_array(texts), dtype=np.float32)
+    return np.asarray(embedding.embed_documents(texts), dtype=np.float32)
+
+
+def hash_ids(ids):
+    """64-битные хэши id (uint64)."""
+    ids = list(ids)
+    return np.fromiter(
+        (int.from_bytes(hashlib.blake2b(str(record_id).encode("utf-8"), digest_size=8).digest(), "little")
+         for record_id in ids), dtype=np.uint64, count=len(ids))
+
+
+def top_k(scores, k):
+    """Индексы k наибольших значений в каждой строке, по убыванию."""
+    k = min(k, scores.shape[1])
+    if k == 0:
+        return np.empty((scores.shape[0], 0), dtype=np.int64)
+    if k < scores.shape[1]:
+        candidates = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    else:
+        candidates = np.broadcast_to(np.arange(scores.shape[1]), scores.shape)
+    order = np.argsort(-np.take_along_axis(scores, candidates, axis=1), axis=1, kind="stable")
+    return np.take_along_axis(candidates, order, axis=1)
+
+
+def _merge_top_k(best_rows, best_scores, scores, row_ids, k):
+    """Сливает лучшие строки блока (столбцы scores -> row_ids) с лучшими на данный момент."""
+    block_best = top_k(scores, k)
+    merged_scores = np.concatenate([best_scores, np.take_along_axis(scores, block_best, axis=1)], axis=1)
+    merged_rows = np.concatenate([best_rows, row_ids[block_best]], axis=1)
+    order = top_k(merged_scores, k)
+    return np.take_along_axis(merged_rows, order, axis=1), np.take_along_axis(merged_scores, order, axis=1)
+
+
+class _DocumentStore:
+    """Тексты, метаданные и id: сохраненная часть в memmap и новые записи в памяти."""
+
+    def __init__(self, blob=None, offsets=None):
+        self._blob = blob
+        self._offsets = offsets if offsets is not None else np.zeros(1, dtype=np.int64)
+        self._extra = []
+
+    def __len__(self):
+        return len(self._offsets) - 1 + len(self._extra)
+
+    def append(self, record_id, text, metadata):
+        self._extra.append(json.dumps([record_id, text, metadata], ensure_ascii=False).encode("utf-8"))
+
+    def get(self, row):
+        """(id, текст, метаданные) записи."""
+        saved = len(self._offsets) - 1
+        if row < saved:
+            raw = bytes(self._blob[self._offsets[row]:self._offsets[row + 1]])
+        else:
+            raw = self._extra[row - saved]
+        return json.loads(raw)
+
+    def ids(self):
+        """Id всех записей по порядку.
+
+        Id - первая строка JSON-записи, поэтому читается регулярным
+        выражением прямо из memmap, без разбора текста и метаданных.
+        """
+        saved = len(self._offsets) - 1
+        if saved:
+            blob = memoryview(self._blob)
+            match = _ID_RE.match
+            for start in self._offsets[:-1].tolist():
+                raw = match(blob, start).group(1)
+                yield json.loads(b'"' + raw + b'"') if b"\\" in raw else raw.decode("utf-8")
+        for raw in self._extra:
+            yield json.loads(raw)[0]
+
+    def save(self, directory):
+        saved = len(self._offsets) - 1
+        sizes = np.fromiter((len(raw) for raw in self._extra), dtype=np.int64, count=len(self._extra))
+        offsets = np.concatenate([self._offsets, self._offsets[-1] + np.cumsum(sizes)])
+        with open(os.path.join(directory, "docs.bin.tmp"), "wb") as file:
+            if saved:
+                file.write(memoryview(self._blob[:self._offsets[-1]]))
+            for raw in self._extra:
+                file.write(raw)
+        os.replace(os.path.join(directory, "docs.bin.tmp"), os.path.join(directory, "docs.bin"))
+        _save_array(directory, "offsets.npy", offsets)
+
+    def append_to(self, directory):
+        """Дописывает новые записи к уже сохраненным файлам, не переписывая их."""
+        saved = len(self._offsets) - 1
+        sizes = np.fromiter((len(raw) for raw in self._extra), dtype=np.int64, count=len(self._extra))
+        with open(os.path.join(directory, "docs.bin"), "r+b") as file:
+            file.seek(int(self._offsets[-1]))
+            for raw in self._extra:
+                file.write(raw)
+            file.truncate()
+        return _append_array(directory, "offsets.npy", self._offsets[-1] + np.cumsum(sizes), saved + 1)
+
+    @classmethod
+    def load(cls, directory, count):
+        offsets = np.load(os.path.join(directory, "offsets.npy"), mmap_mode="r")[:count + 1]
+        blob = None
+        if offsets[-1] > 0:
+            blob = np.memmap(os.path.join(directory, "docs.bin"), dtype=np.uint8, mode="r")
+        return cls(blob, offsets)
+
+
+def _save_array(directory, name, array):
+    temporary = os.path.join(directory, name + ".tmp")
+    with open(temporary, "wb") as file:
+        np.save(file, array)
+    os.replace(temporary, os.path.join(directory, name))
+
+
+def _append_array(directory, name, rows, start):
+    """Записывает rows в файл .npy после первых start строк.
+
+    NumPy оставляет в заголовке .npy место для роста первой размерности,
+    поэтому форма обновляется на месте. Возвращает False, если файл нельзя
+    дописать (другой тип или заголовок не помещается) - тогда нужна полная запись.
+    """
+    with open(os.path.join(directory, name), "r+b") as file:
+        version = np.lib.format.read_magic(file)
+        read_header = np.lib.format.read_array_header_1_0 if version == (1, 0) else np.lib.format.read_array_header_2_0
+        shape, fortran_order, dtype = read_header(file)
+        data_offset = file.tell()
+        if fortran_order or dtype != rows.dtype or tuple(shape[1:]) != rows.shape[1:] or shape[0] < start:
+            return False
+        header = io.BytesIO()
+        write_header = np.lib.format.write_array_header_1_0 if version == (1, 0) else np.lib.format.write_array_header_2_0
+        write_header(header, {"descr": np.lib.format.dtype_to_descr(dtype), "fortran_order": False,
+                              "shape": (start + len(rows),) + tuple(shape[1:])})
+        if len(header.getvalue()) != data_offset:
+            return False
+        row_bytes = dtype.itemsize * int(np.prod(shape[1:], dtype=np.int64))
+        file.seek(data_offset + start * row_bytes)
+        file.write(np.ascontiguousarray(rows).tobytes())
+        file.truncate()
+        file.seek(0)
+        file.write(header.getvalue())
+    return True
+
+
+class NumpyVectorStore(VectorStore):
+    """Векторное хранилище с точным поиском по косинусной близости.
+
+    Args:
+        embedding: Модель эмбеддингов
+        persist_directory: Каталог для сохранения; если в нем уже есть
+            хранилище, оно открывается
+        block_rows: Строк матрицы в одном блоке поиска
+        metadata_fields: Поля метаданных для индекса фильтрации (см.
+            metadata_index.py); True - все поля, None - фильтры без индекса
+    """
+
+    def __init__(self, embedding, persist_directory=None, block_rows=SEARCH_BLOCK_ROWS, metadata_fields=None):
+        self.embedding = embedding
+        self.persist_directory = persist_directory
+        self.block_rows = block_rows
+        self.metadata_index = None
+        if metadata_fields is not None:
+            self.metadata_index = MetadataIndex(None if metadata_fields is True else metadata_fields)
+        self.dim = None
+        self._vectors = np.empty((0, 0), dtype=np.float32)
+        self._pending = []
+        self._deleted = np.zeros(0, dtype=bool)
+        self._docs = _DocumentStore()
+        self._id_hashes = np.zeros(0, dtype=np.uint64)
+        self._saved = 0  # строк в файлах persist_directory
+        if persist_directory and os.path.exists(os.path.join(persist_directory, "meta.json")):
+            self._load(persist_directory)
+
+    @property
+    def embeddings(self):
+        return self.embedding
+
+    def __len__(self):
+        """Число неудаленных документов."""
+        return len(self._docs) - int(self._deleted.sum())
+
+    # --- Хранение ---
+
+    def _load(self, directory):
+        with open(os.path.join(directory, "meta.json"), encoding="utf-8") as file:
+            meta = json.load(file)
+        count = meta["count"]
+        self.dim = meta["dim"]
+        self._vectors = np.load(os.path.join(directory, "vectors.npy"), mmap_mode="r")[:count]
+        self._deleted = np.array(np.load(os.path.join(directory, "deleted.npy"))[:count])
+        self._docs = _DocumentStore.load(directory, count)
+        self._id_hashes = self._load_id_hashes(directory, count)
+        self._pending = []
+        self._saved = count
+        if self.metadata_index is not None:
+            self._load_metadata_index(directory, count)
+
+    def _load_id_hashes(self, directory, count):
+        hashes = np.zeros(0, dtype=np.uint64)
+        if os.path.exists(os.path.join(directory, "id_hashes.npy")):
+            hashes = np.load(os.path.join(directory, "id_hashes.npy"))[:count]
+        # Хранилища, сохраненные без хэшей id: недостающие считаются по docs.bin
+        if len(hashes) < count:
+            ids = itertools.islice(self._docs.ids(), len(hashes), count)
+            hashes = np.concatenate([hashes, hash_ids(ids)])
+        return hashes
+
+    def _load_metadata_index(self, directory, count):
+        fields = self.metadata_index.fields
+        if os.path.exists(os.path.join(directory, "metadata_index.json")):
+            index = MetadataIndex.load(directory)
+            if index.fields == fields and index.size <= count:
+                self.metadata_index = index
+        # Строки, добавленные после сохранения индекса (или индекс новый)
+        index = self.metadata_index
+        if index.size < count:
+            index.add([self._docs.get(row)[2] for row in range(index.size, count)])
+
+    def save(self, directory=None):
+        """Сохраняет хранилище; meta.json записывается последним.
+
+        Повторное сохранение в тот же каталог дописывает новые строки к
+        файлам, а не переписывает их: время зависит от числа изменений, а не
+        от размера хранилища.
+        """
+        directory = directory or self.persist_directory
+        if not directory:
+            raise ValueError("Не указан каталог для сохранения")
+        os.makedirs(directory, exist_ok=True)
+        if not (self._saved and self.persist_directory
+                and os.path.abspath(directory) == os.path.abspath(self.persist_directory)
+                and self._append_new_rows(directory)):
+            _save_array(directory, "vectors.npy", self._matrix())
+            self._docs.save(directory)
+        _save_array(directory, "deleted.npy", self._deleted)
+        _save_array(directory, "id_hashes.npy", self._id_hashes)
+        if self.metadata_index is not None:
+            self.metadata_index.save(directory)
+        meta = {"dim": self.dim, "count": len(self._docs)}
+        temporary = os.path.join(directory, "meta.json.tmp")
+        with open(temporary, "w", encoding="utf-8") as file:
+            json.dump(meta, file)
+        os.replace(temporary, os.path.join(directory, "meta.json"))
+        self.persist_directory = directory
+        # Переоткрываем сохраненные файлы, чтобы не держать копию в памяти
+        self._load(directory)
+
+    def _append_new_rows(self, directory):
+        """Дописывает строки, добавленные после открытия, к файлам хранилища."""
+        if self._pending and len(self._vectors) == self._saved:
+            rows = np.concatenate(self._pending)
+        else:
+            rows = self._matrix()[self._saved:]
+        if not len(rows):
+            return True
+        return _append_array(directory, "vectors.npy", rows, self._saved) and self._docs.append_to(directory)
+
+    @classmethod
+    def load(cls, persist_directory, embedding, **kwargs):
+        """Открывает сохраненное хранилище."""
+        if not os.path.exists(os.path.join(persist_directory, "meta.json")):
+            raise FileNotFoundError(f"В каталоге {persist_directory} нет сохраненного хранилища")
+        return cls(embedding, persist_directory=persist_directory, **kwargs)
+
+    def _matrix(self):
+        """Матрица всех векторов (новые блоки присоединяются один раз)."""
+        if self._pending:
+            blocks = [self._vectors] if len(self._vectors) else []
+            self._vectors = np.concatenate(blocks + self._pending)
+            self._pending = []
+        return self._vectors
+
+    # --- Добавление и удаление ---
+
+    def add_embeddings(self, texts, embeddings, metadatas=None, ids=None):
+        """Добавляет тексты с готовыми эмбеддингами."""
+        texts = list(texts)
+        vectors = normalize_rows(embeddings)
+        if len(vectors) != len(texts):
+            raise ValueError("Число эмбеддингов не совпадает с числом текстов")
+        if self.dim is None:
+            self.dim = vectors.shape[1]
+        elif vectors.shape[1] != self.dim:
+            raise ValueError(f"Размерность {vectors.shape[1]} не совпадает с размерностью хранилища {self.dim}")
+        metadatas = metadatas or [{} for _ in texts]
+        ids = list(ids) if ids is not None else [str(uuid.uuid4()) for _ in texts]
+        for record_id, text, metadata in zip(ids, texts, metadatas):
+            self._docs.append(record_id, text, metadata or {})
+        self._pending.append(vectors)
+        if self.metadata_index is not None:
+            self.metadata_index.add([metadata or {} for metadata in metadatas])
+        self._deleted = np.concatenate([self._deleted, np.zeros(len(texts), dtype=bool)])
+        self._id_hashes = np.concatenate([self._id_hashes, hash_ids(ids)])
+        return ids
+
+    def add_texts(self, texts, metadatas=None, *, ids=None, **kwargs):
+        texts = list(texts)
+        if not texts:
+            return []
+        return self.add_embeddings(texts, embed_texts(self.embedding, texts), metadatas, ids)
+
+    def _rows_of(self, ids):
+        """id -> строка неудаленной записи (последней, если id повторяется).
+
+        Кандидаты находятся сравнением хэшей с массивом хэшей всех строк, и
+        из docs.bin читаются только их записи: поиск не строит словарь по
+        всему хранилищу.
+        """
+        wanted = set(ids)
+        if not wanted:
+            return {}
+        candidates = np.flatnonzero(np.isin(self._id_hashes, hash_ids(wanted)) & ~self._deleted)
+        rows = {}
+        for row in candidates.tolist():
+            record_id = self._docs.get(row)[0]
+            if record_id in wanted:
+                rows[record_id] = row
+        return rows
+
+    def delete(self, ids=None, **kwargs):
+        """Помечает документы удаленными; их строки исключаются из поиска."""
+        if ids is None:
+            return False
+        rows = list(self._rows_of(ids).values())
+        self._deleted[rows] = True
+        return bool(rows)
+
+    def get_by_ids(self, ids):
+        ids = list(ids)
+        rows = self._rows_of(ids)
+        return [self._document(rows[record_id]) for record_id in ids if record_id in rows]
+
+    def _document(self, row):
+        record_id, text, metadata = self._docs.get(int(row))
+        return Document(id=record_id, page_content=text, metadata=metadata)
+
+    # --- Поиск ---
+
+    def search_vectors(self, queries, k=4, allowed=None):
+        """Пакетный поиск: для каждого запроса k строк с наибольшей близостью.
+
+        Args:
+            queries: Матрица запросов (m, dim)
+            allowed: Необязательный RowSet допустимых строк (результат фильтра);
+                при выборочном фильтре оцениваются только эти строки
+
+        Returns:
+            (индексы строк (m, k), оценки близости (m, k)); при нехватке строк
+            индекс равен -1
+        """
+        queries = normalize_rows(queries)
+        matrix = self._matrix()
+        best_rows = np.full((len(queries), k), -1, dtype=np.int64)
+        best_scores = np.full((len(queries), k), -np.inf, dtype=np.float32)
+        if not len(matrix) or k <= 0:
+            return best_rows, best_scores
+        if allowed is not None and not allowed.is_dense:
+            # Выборочный фильтр: векторы остальных строк не читаются
+            rows = allowed.to_rows()
+            rows = rows[~self._deleted[rows]]
+            for start in range(0, len(rows), self.block_rows):
+                block_rows = rows[start:start + self.block_rows]
+                scores = queries @ matrix[block_rows].T
+                best_rows, best_scores = _merge_top_k(best_rows, best_scores, scores, block_rows, k)
+        else:
+            mask = allowed.to_mask() if allowed is not None else None
+            for start in range(0, len(matrix), self.block_rows):
+                block = matrix[start:start + self.block_rows]
+                scores = queries @ block.T
+                excluded = self._deleted[start:start + len(block)]
+                if mask is not None:
+                    excluded = excluded | ~mask[start:start + len(block)]
+                if excluded.any():
+                    scores[:, excluded] = -np.inf
+                block_rows = np.arange(start, start + len(block))
+                best_rows, best_scores = _merge_top_k(best_rows, best_scores, scores, block_rows, k)
+        best_rows[~np.isfinite(best_scores)] = -1
+        return best_rows, best_scores
+
+    def filter_rows(self, filter):
+        """RowSet строк, проходящих фильтр (None - без фильтра).
+
+        filter - строка ('topic == "basics" AND year >= 2020'), словарь
+        ({"topic": "basics"}) или функция от метаданных. Строки и словари
+        вычисляются по индексу метаданных, если он есть, иначе проверяются
+        метаданные каждого документа.
+        """
+        if filter is None:
+            return None
+        if not callable(filter):
+            node = parse_filter(filter)
+            if self.metadata_index is not None:
+                try:
+                    return self.metadata_index.evaluate(node)
+                except KeyError:
+                    pass  # поле не индексировано
+
+            def filter(metadata):
+                return matches(node, metadata)
+        mask = np.fromiter((filter(self._docs.get(row)[2]) for row in range(len(self._docs))),
+                           dtype=bool, count=len(self._docs))
+        return RowSet.from_rows(len(mask), np.flatnonzero(mask))
+
+    def _results(self, rows, scores):
+        return [(self._document(row), float(score)) for row, score in zip(rows, scores) if row >= 0]
+
+    def similarity_search_with_score_by_vector(self, embedding, k=4, filter=None, **kwargs):
+        rows, scores = self.search_vectors(np.asarray([embedding]), k, self.filter_rows(filter))
+        return self._results(rows[0], scores[0])
+
+    def similarity_search_with_score(self, query, k=4, filter=None, **kwargs):
+        return self.similarity_search_with_score_by_vector(self.embedding.embed_query(query), k, filter)
+
+    def similarity_search_by_vector(self, embedding, k=4, filter=None, **kwargs):
+        return [doc for doc, _ in self.similarity_search_with_score_by_vector(embedding, k, filter)]
+
+    def similarity_search(self, query, k=4, filter=None, **kwargs):
+        return [doc for doc, _ in self.similarity_search_with_score(query, k, filter)]
+
+    def batch_similarity_search(self, queries, k=4, filter=None):
+        """Поиск по нескольким запросам за один проход по матрице.
+
+        Returns:
+            Список списков (Document, оценка) в порядке запросов
+        """
+        queries = list(queries)
+        if not queries:
+            return []
+        vectors = embed_texts(self.embedding, queries) if isinstance(queries[0], str) else np.asarray(queries)
+        rows, scores = self.search_vectors(vectors, k, self.filter_rows(filter))
+        return [self._results(row, score) for row, score in zip(rows, scores)]
+
+    def max_marginal_relevance_search_by_vector(self, embedding, k=4, fetch_k=20, lambda_mult=0.5,
+                                                filter=None, **kwargs):
+        rows, _ = self.search_vectors(np.asarray([embedding]), fetch_k, self.filter_rows(filter))
+        rows = rows[0][rows[0] >= 0]
+        if not len(rows):
+            return []
+        chosen = maximal_marginal_relevance(normalize_rows(embedding)[0], self._matrix()[rows],
+                                            k=k, lambda_mult=lambda_mult)
+        return [self._document(rows[i]) for i in chosen]
+
+    def max_marginal_relevance_search(self, query, k=4, fetch_k=20, lambda_mult=0.5, filter=None, **kwargs):
+        return self.max_marginal_relevance_search_by_vector(self.embedding.embed_query(query), k, fetch_k,
+                                                            lambda_mult, filter)
+
+    def _select_relevance_score_fn(self):
+        # Косинусная близость [-1, 1] -> релевантность [0, 1]
+        return lambda score: (score + 1.0) / 2.0
+
+    @classmethod
+    def from_texts(cls, texts, embedding, metadatas=None, *, ids=None, persist_directory=None, **kwargs):
+        store = cls(embedding, persist_directory=persist_directory, **kwargs)
+        store.add_texts(texts, metadatas, ids=ids)
+        if persist_directory:
+            store.save()
+        return store
@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Бенчмарк NumpyVectorStore и Chroma
+Для 10 000, 100 000 и 1 000 000 случайных векторов (размерность 256)
+измеряет время построения и сохранения, время открытия сохраненного
+хранилища, задержку одиночного запроса, пропускную способность пакетного
+поиска и память процесса (RSS). Каждый замер выполняется в отдельном
+процессе, чтобы память одного хранилища не влияла на другое. Chroma
+сравнивается, только если установлен пакет chromadb.
+"""
+
+import json
+import os
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from common.local_embeddings import HashingEmbeddings
+from numpy_vector_store import NumpyVectorStore
+
+SIZES = [10_000, 100_000, 1_000_000]
+DIM = 256
+ADD_BATCH = 5000
+NUM_QUERIES = 100
+K = 10
+
+
+def vector_batches(size, seed=0):
+    rng = np.random.default_rng(seed)
+    for start in range(0, size, ADD_BATCH):
+        count = min(ADD_BATCH, size - start)
+        yield start, rng.standard_normal((count, DIM), dtype=np.float32)
+
+
+def queries():
+    return np.random.default_rng(1).standard_normal((NUM_QUERIES, DIM), dtype=np.float32)
+
+
+def rss_mb():
+    with open("/proc/self/status") as file:
+        for line in file:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1]) / 1024
+    return 0.0
+
+
+def peak_rss_mb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+# --- Замеры в дочернем процессе ---
+
+def build_numpy(size, directory):
+    store = NumpyVectorStore(HashingEmbeddings(dim=DIM))
+    for start, vectors in vector_batches(size):
+        texts = [f"Документ {i}" for i in range(start, start + len(vectors))]
+        store.add_embeddings(texts, vectors, [{"i": i} for i in range(start, start + len(vectors))])
+    store.save(directory)
+
+
+def query_numpy(directory):
+    start = time.perf_counter()
+    store = NumpyVectorStore.load(directory, HashingEmbeddings(dim=DIM))
+    load_time = time.perf_counter() - start
+    batch = queries()
+    single = []
+    for vector in batch[:20]:
+        start = time.perf_counter()
+        store.similarity_search_with_score_by_vector(vector, k=K)
+        single.append(time.perf_counter() - start)
+    start = time.perf_counter()
+    store.batch_similarity_search(batch, k=K)
+    return load_time, single, time.perf_counter() - start
+
+
+def build_chroma(size, directory):
+    import chromadb
+
+    client = chromadb.PersistentClient(path=directory)
+    collection = client.get_or_create_collection("benchmark", metadata={"hnsw:space": "cosine"})
+    for start, vectors in vector_batches(size):
+        ids = [str(i) for i in range(start, start + len(vectors))]
+        collection.add(ids=ids, embeddings=vectors.tolist(), documents=[f"Документ {i}" for i in ids],
+                       metadatas=[{"i": int(i)} for i in ids])
+
+
+def query_chroma(directory):
+    import chromadb
+
+    start = time.perf_counter()
+    collection = chromadb.PersistentClient(path=directory).get_collection("benchmark")
+    collection.query(query_embeddings=queries()[:1].tolist(), n_results=K)
+    load_time = time.perf_counter() - start
+    batch = queries()
+    single = []
+    for vector in batch[:20]:
+        start = time.perf_counter()
+        collection.query(query_embeddings=[vector.tolist()], n_results=K)
+        single.append(time.perf_counter() - start)
+    start = time.perf_counter()
+    collection.query(query_embeddings=batch.tolist(), n_results=K)
+    return load_time, single, time.perf_counter() - start
+
+
+def worker(backend, stage, size, directory):
+    if stage == "build":
+        start = time.perf_counter()
+        (build_numpy if backend == "numpy" else build_chroma)(size, directory)
+        result = {"build": time.perf_counter() - start}
+    else:
+        load_time, single, batch_time = (query_numpy if backend == "numpy" else query_chroma)(directory)
+        result = {"load": load_time, "p50": float(np.median(single)), "batch_qps": NUM_QUERIES / batch_time}
+    result.update(rss=rss_mb(), peak=peak_rss_mb())
+    print(json.dumps(result))
+
+
+# --- Родительский процесс ---
+
+def run_worker(backend, stage, size, directory):
+    output = subprocess.run([sys.executable, os.path.abspath(__file__), "--worker", backend, stage, str(size),
+                             directory], check=True, capture_output=True, text=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def chroma_available():
+    try:
+        import chromadb  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def main():
+    """Основная функция."""
+    if len(sys.argv) > 1 and sys.argv[1] == "--worker":
+        worker(sys.argv[2], sys.argv[3], int(sys.argv[4]), sys.argv[5])
+        return
+    sizes = [int(arg) for arg in sys.argv[1:]] or SIZES
+    backends = ["numpy"]
+    if chroma_available():
+        backends.append("chroma")
+    else:
+        print("chromadb не установлен: измеряется только NumpyVectorStore (pip install chromadb)\n")
+
+    print(f"{'векторов':>9} {'хранилище':>9} {'построение':>11} {'пик RSS':>9} {'открытие':>9} "
+          f"{'p50 запроса':>12} {'пакет, QPS':>11} {'RSS поиска':>11}")
+    for size in sizes:
+        for backend in backends:
+            directory = tempfile.mkdtemp(prefix=f"{backend}_store_")
+            try:
+                build = run_worker(backend, "build", size, directory)
+                query = run_worker(backend, "query", size, directory)
+            finally:
+                shutil.rmtree(directory, ignore_errors=True)
+            print(f"{size:>9} {backend:>9} {build['build']:>9.2f} с {build['peak']:>6.0f} МБ "
+                  f"{query['load'] * 1000:>6.1f} мс {query['p50'] * 1000:>9.2f} мс {query['batch_qps']:>11.0f} "
+                  f"{query['rss']:>8.0f} МБ", flush=True)
+
+
+if __name__ == "__main__":
+    main()
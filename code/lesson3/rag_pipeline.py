@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Цепочка вопрос-ответ по документам (RAG) на LCEL
+build_rag_chain собирает цепочку ретривер -> упаковка контекста -> промпт ->
+модель. При chain.batch(questions) поиск по всем вопросам выполняется одним
+векторным запросом к хранилищу, а вызовы модели идут параллельно (не больше
+max_concurrency одновременно). Перед упаковкой фрагменты, перекрывающиеся
+из-за chunk_overlap, склеиваются, а контекст ограничивается бюджетом токенов.
+"""
+
+import asyncio
+
+from langchain_core.documents import Document
+from langchain_core.output_parsers import StrOutputParser
+from langchain_core.prompts import ChatPromptTemplate
+from langchain_core.runnables import Runnable, RunnableLambda
+
+from embedding_cache import approx_token_count
+
+RAG_PROMPT = ChatPromptTemplate.from_template(
+    "Ответь на вопрос, используя только приведенный контекст. "
+    "Если в контексте нет ответа, так и скажи.\n\n"
+    "Контекст:\n{context}\n\n"
+    "Вопрос: {question}\n"
+    "Ответ:"
+)
+
+
+def _join_overlap(first, second, min_overlap):
+    """Склеивает два текста, если конец first совпадает с началом second."""
+    if second in first:
+        return first
+    head = second[:min_overlap]
+    position = first.find(head, max(0, len(first) - len(second)))
+    while position != -1:
+        if second.startswith(first[position:]):
+            return first[:position] + second
+        position = first.find(head, position + 1)
+    return None
+
+
+def merge_overlapping(documents, min_overlap=20):
+    """Убирает повторы среди найденных фрагментов.
+
+    Одинаковые фрагменты (например, найденные и BM25, и векторным поиском)
+    остаются в одном экземпляре. Соседние фрагменты одного источника,
+    перекрывающиеся не меньше чем на min_overlap символов, склеиваются в
+    один на месте более релевантного.
+    """
+    result = []
+    seen = set()
+    for doc in documents:
+        text = doc.page_content
+        if text in seen:
+            continue
+        seen.add(text)
+        source = doc.metadata.get("source")
+        for i, kept in enumerate(result):
+            if kept.metadata.get("source") != source:
+                continue
+            merged = (_join_overlap(kept.page_content, text, min_overlap)
+                      or _join_overlap(text, kept.page_content, min_overlap))
+            if merged is not None:
+                result[i] = Document(id=kept.id, page_content=merged, metadata=kept.metadata)
+                break
+        else:
+            result.append(doc)
+    return result
+
+
+def pack_context(documents, max_tokens=1500, token_counter=approx_token_count):
+    """Текст контекста из фрагментов в порядке релевантности в пределах бюджета.
+
+    Фрагменты, которые не помещаются, пропускаются; первый фрагмент
+    обрезается, если он один больше бюджета.
+    """
+    parts = []
+    used = 0
+    for doc in documents:
+        source = doc.metadata.get("source")
+        header = f"[{len(parts) + 1}]" + (f" {source}" if source else "")
+        text = doc.page_content.strip()
+        tokens = token_counter(header) + token_counter(text)
+        if used + tokens > max_tokens:
+            if parts:
+                continue
+            text = text[:max(0, max_tokens - token_counter(header)) * 4]
+            tokens = max_tokens
+        parts.append(f"{header}\n{text}")
+        used += tokens
+    return "\n\n".join(parts)
+
+
+class BatchRetriever(Runnable):
+    """Шаг цепочки: вопрос -> {"question", "documents"}.
+
+    batch ищет по всем вопросам одним вызовом batch_similarity_search
+    хранилища (одно умножение матрицы на матрицу запросов), а не отдельным
+    поиском на каждый вопрос.
+
+    Args:
+        vectorstore: Хранилище с batch_similarity_search (NumpyVectorStore)
+            или любое VectorStore
+        k: Число фрагментов на вопрос
+        filter: Фильтр по метаданным
+    """
+
+    def __init__(self, vectorstore, k=4, filter=None):
+        self.vectorstore = vectorstore
+        self.k = k
+        self.filter = filter
+
+    def _search(self, questions):
+        if hasattr(self.vectorstore, "batch_similarity_search"):
+            results = self.vectorstore.batch_similarity_search(questions, k=self.k, filter=self.filter)
+            return [[doc for doc, _ in found] for found in results]
+        return [self.vectorstore.similarity_search(question, k=self.k, filter=self.filter)
+                for question in questions]
+
+    def invoke(self, input, config=None, **kwargs):
+        return self.batch([input], config)[0]
+
+    def batch(self, inputs, config=None, *, return_exceptions=False, **kwargs):
+        questions = list(inputs)
+        if not questions:
+            return []
+        documents = self._search(questions)
+        return [{"question": question, "documents": found} for question, found in zip(questions, documents)]
+
+    async def ainvoke(self, input, config=None, **kwargs):
+        return (await self.abatch([input], config))[0]
+
+    async def abatch(self, inputs, config=None, *, return_exceptions=False, **kwargs):
+        # Поиск занимает процессор: выполняется в потоке, не блокируя цикл событий
+        return await asyncio.to_thread(self.batch, list(inputs))
+
+
+def build_rag_chain(vectorstore, llm, k=4, max_context_tokens=1500, min_overlap=20, filter=None,
+                    prompt=RAG_PROMPT):
+    """Цепочка вопрос -> ответ (строка).
+
+    Пример:
+        chain = build_rag_chain(vectorstore, llm, k=4)
+        answers = chain.batch(questions, config={"max_concurrency": 8})
+    """
+
+    def prepare(item):
+        documents = merge_overlapping(item["documents"], min_overlap)
+        return {"question": item["question"], "context": pack_context(documents, max_context_tokens)}
+
+    return BatchRetriever(vectorstore, k, filter) | RunnableLambda(prepare) | prompt | llm | StrOutputParser()
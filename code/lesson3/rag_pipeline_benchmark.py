@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Бенчмарк цепочки RAG
+Отвечает на 1000 вопросов по синтетическому корпусу (фрагменты по 500
+символов с перекрытием 100) с детерминированными эмбеддингами и
+OpenAI-совместимым сервером-заглушкой (20 мс на ответ). Сравнивает поиск по
+одному вопросу с пакетным поиском, размер контекста со склейкой
+перекрывающихся фрагментов и без нее, и пропускную способность цепочки при
+последовательных и параллельных вызовах модели.
+"""
+
+import os
+import sys
+import time
+
+import numpy as np
+from langchain_core.documents import Document
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from common.llm_client import close_http_clients, create_chat_model
+from common.local_embeddings import HashingEmbeddings
+from common.stub_server import StubOpenAIServer
+from embedding_cache import approx_token_count
+from numpy_vector_store import NumpyVectorStore
+from rag_pipeline import BatchRetriever, build_rag_chain, merge_overlapping, pack_context
+
+NUM_DOCUMENTS = 300
+NUM_QUESTIONS = 1000
+K = 6
+LATENCY = 0.02
+CONCURRENCY = [1, 8, 32]
+WORDS = ["данные", "модель", "запрос", "индекс", "вектор", "цепочка", "агент", "память", "ответ", "поиск",
+         "фрагмент", "документ", "контекст", "токен", "промпт", "ретривер", "кэш", "пакет", "поток", "сервер"]
+
+
+def make_corpus(num_documents, seed=0):
+    """Документы из предложений с общими словами и редкими терминами."""
+    rng = np.random.default_rng(seed)
+    documents = []
+    for number in range(num_documents):
+        sentences = []
+        for _ in range(40):
+            words = [WORDS[i] for i in rng.integers(0, len(WORDS), 4)]
+            terms = [f"термин{i}" for i in rng.integers(0, 1_000_000, 4)]
+            sentences.append(f"Тема{number} {' '.join(words)} {' '.join(terms)}.")
+        documents.append(Document(page_content=" ".join(sentences), metadata={"source": f"doc{number}"}))
+    return documents
+
+
+def make_questions(chunks, num_questions, seed=1):
+    """Вопросы из слов конца случайных фрагментов.
+
+    Конец фрагмента повторяется в начале следующего (chunk_overlap), поэтому
+    поиск обычно находит оба соседних фрагмента.
+    """
+    rng = np.random.default_rng(seed)
+    questions = []
+    for i in rng.integers(0, len(chunks), num_questions):
+        words = chunks[i].page_content.split()
+        questions.append("Что известно про " + " ".join(words[-10:-2]) + "?")
+    return questions
+
+
+def compare_retrieval(vectorstore, questions):
+    print("=== Поиск ===")
+    start = time.perf_counter()
+    for question in questions:
+        vectorstore.similarity_search(question, k=K)
+    single = time.perf_counter() - start
+    start = time.perf_counter()
+    results = BatchRetriever(vectorstore, k=K).batch(questions)
+    batched = time.perf_counter() - start
+    print(f"По одному вопросу: {single:.2f} с; пакетом: {batched:.2f} с ({single / batched:.1f}x)")
+    return results
+
+
+def compare_packing(results):
+    print("\n=== Контекст ===")
+    raw = [sum(approx_token_count(doc.page_content) for doc in item["documents"]) for item in results]
+    merged = [merge_overlapping(item["documents"]) for item in results]
+    merged_tokens = [sum(approx_token_count(doc.page_content) for doc in documents) for documents in merged]
+    packed = [approx_token_count(pack_context(documents, 400)) for documents in merged]
+    print(f"Фрагментов на вопрос: {np.mean([len(item['documents']) for item in results]):.1f} -> "
+          f"{np.mean([len(documents) for documents in merged]):.1f} после склейки")
+    print(f"Токенов на вопрос: {np.mean(raw):.0f} -> {np.mean(merged_tokens):.0f} после склейки, "
+          f"{np.mean(packed):.0f} при бюджете 400")
+
+
+def compare_throughput(vectorstore, questions):
+    print(f"\n=== Ответы на {len(questions)} вопросов (заглушка, {LATENCY * 1000:.0f} мс на ответ) ===")
+    with StubOpenAIServer(latency=LATENCY) as server:
+        llm = create_chat_model(api_key="stub", base_url=server.base_url)
+        chain = build_rag_chain(vectorstore, llm, k=K, max_context_tokens=400)
+        for concurrency in CONCURRENCY:
+            server.reset_stats()
+            start = time.perf_counter()
+            answers = chain.batch(questions, config={"max_concurrency": concurrency})
+            elapsed = time.perf_counter() - start
+            assert len(answers) == len(questions) and server.stats["requests"] == len(questions)
+            print(f"max_concurrency={concurrency:<3} {elapsed:>6.1f} с, {len(questions) / elapsed:>6.1f} вопросов/с")
+    close_http_clients()
+
+
+def main():
+    """Основная функция."""
+    num_questions = int(sys.argv[1]) if len(sys.argv) > 1 else NUM_QUESTIONS
+    splitter = RecursiveCharacterTextSplitter(chunk_size=500, chunk_overlap=100)
+    chunks = splitter.split_documents(make_corpus(NUM_DOCUMENTS))
+    vectorstore = NumpyVectorStore.from_documents(chunks, HashingEmbeddings())
+    questions = make_questions(chunks, num_questions)
+    print(f"Корпус: {len(chunks)} фрагментов, вопросов: {num_questions}\n")
+
+    results = compare_retrieval(vectorstore, questions)
+    compare_packing(results)
+    compare_throughput(vectorstore, questions)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,11 +1,15 @@
 import os
-import shutil
+import sys
 from dotenv import load_dotenv
 from langchain_core.documents import Document
-from langchain_text_splitters import RecursiveCharacterTextSplitter
-from langchain_community.vectorstores import Chroma
-from langchain_openai import ChatOpenAI, OpenAIEmbeddings
-# Note: RetrievalQA import may need to be adjusted based on your LangChain version
+from langchain_openai import OpenAIEmbeddings
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from common.llm_client import create_chat_model
+from embedding_cache import CachedEmbeddings, EmbeddingStore
+from numpy_vector_store import NumpyVectorStore
+from hybrid_retriever import HybridRetriever
+from rag_pipeline import build_rag_chain
+from token_splitter import TokenAwareSplitter
 
 # Загружаем переменные окружения из файла .env
 load_dotenv()
@@ -65,21 +69,18 @@ def main():
         )
         
         # Разделение документов на части
-        text_splitter = RecursiveCharacterTextSplitter(
-            chunk_size=400,
-            chunk_overlap=100,
-            length_function=len,
+        # Размер фрагментов в токенах той же кодировки, что у text-embedding-ada-002
+        text_splitter = TokenAwareSplitter(
+            encoding="cl100k_base",
+            chunk_size=128,
+            chunk_overlap=32,
         )
         
         texts = text_splitter.split_documents([programming_doc, web_dev_doc])
         print(f"Документы разделены на {len(texts)} частей")
         
         # Инициализируем модель через OpenRouter
-        llm = ChatOpenAI(
-            model="openai/gpt-3.5-turbo",
-            openai_api_key=api_key,
-            openai_api_base="https://openrouter.ai/api/v1"
-        )
+        llm = create_chat_model(api_key=api_key)
         
         # Инициализация эмбеддингов
         embeddings = OpenAIEmbeddings(
@@ -88,20 +89,22 @@ def main():
             openai_api_base="https://openrouter.ai/api/v1"
         )
         
-        # Создание векторного хранилища
-        vectorstore = Chroma.from_documents(
-            documents=texts,
-            embedding=embeddings,
-            persist_directory="./chroma_db"
+        # Кэш эмбеддингов на диске: при повторном запуске неизмененные
+        # фрагменты не отправляются в модель, промахи отправляются пакетами
+        cached_embeddings = CachedEmbeddings(
+            embeddings,
+            EmbeddingStore("./embedding_cache", "text-embedding-ada-002"),
+            batch_size=100,
+            max_concurrency=4,
         )
         
-        # Создание цепочки для поиска и ответов
-        # Note: RetrievalQA import may need to be adjusted based on your LangChain version
-        # qa_chain = RetrievalQA.from_chain_type(
-        #     llm=llm,
-        #     chain_type="stuff",
-        #     retriever=vectorstore.as_retriever()
-        # )
+        # Создание векторного хранилища (точный поиск в памяти, без базы данных)
+        # с индексом метаданных и индекса BM25 по тем же фрагментам
+        vectorstore = NumpyVectorStore(embedding=cached_embeddings, metadata_fields=["source", "language", "topic"])
+        hybrid_retriever = HybridRetriever.from_documents(texts, vectorstore, k=2)
+        
+        # Цепочка для поиска и ответов: ретривер -> упаковка контекста -> промпт -> модель
+        qa_chain = build_rag_chain(vectorstore, llm, k=3, max_context_tokens=1000)
         
         # Примеры вопросов
         questions = [
@@ -111,9 +114,11 @@ def main():
         ]
         
         print("=== Вопросы и ответы ===")
-        # Note: RetrievalQA import may need to be adjusted based on your LangChain version
-        print("Note: RetrievalQA functionality is commented out due to import issues")
-        print("The vector store and similarity search functionality is still demonstrated below")
+        # Поиск по всем вопросам одним запросом к хранилищу, вызовы модели параллельно
+        answers = qa_chain.batch(questions, config={"max_concurrency": 4})
+        for question, answer in zip(questions, answers):
+            print(f"\nВопрос: {question}")
+            print(f"Ответ: {answer}")
         
         # Поиск похожих документов
         print("\n=== Поиск похожих документов ===")
@@ -126,9 +131,22 @@ def main():
             print(f"Содержимое: {doc.page_content[:200]}...")
             print(f"Метаданные: {doc.metadata}")
         
-        # Удаление временной базы данных
-        if os.path.exists("./chroma_db"):
-            shutil.rmtree("./chroma_db")
+        # Поиск с фильтром: строки-кандидаты берутся из индекса метаданных
+        metadata_filter = 'topic == "basics" AND language == "python"'
+        print(f"\n=== Поиск с фильтром: {metadata_filter} ===")
+        for i, doc in enumerate(vectorstore.similarity_search(query, k=2, filter=metadata_filter)):
+            print(f"{i+1}. {doc.metadata['source']}: {doc.page_content.strip()[:150]}...")
+        
+        # Гибридный поиск: точные термины (RESTful, API) находит BM25,
+        # близкие по смыслу фрагменты - векторный поиск
+        print("\n=== Гибридный поиск (BM25 + векторы) ===")
+        for question in questions:
+            print(f"\nВопрос: {question}")
+            for i, (doc, score) in enumerate(hybrid_retriever.search_with_scores(question)):
+                print(f"{i+1}. [{score:.4f}] {doc.page_content.strip()[:150]}...")
+        
+        stats = cached_embeddings.stats
+        print(f"\nЭмбеддинги: {stats.hits} из кэша, {stats.misses} вычислено ({stats.batches} запросов)")
         
     except Exception as e:
         print(f"Произошла ошибка при выполнении запроса: {str(e)}")
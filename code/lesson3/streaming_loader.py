@@ -0,0 +1,307 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Потоковая загрузка и разделение больших корпусов
+TextLoader(...).load() читает файл целиком, а split_documents держит в памяти
+все фрагменты. Здесь файлы читаются блоками фиксированного размера (большие -
+через mmap), StreamingSplitter режет текст с семантикой
+RecursiveCharacterTextSplitter, но как генератор, а load_directory
+раздает файлы пулу процессов и отдает фрагменты пакетами через очередь
+ограниченного размера. Потребление памяти не зависит от размера корпуса.
+"""
+
+import codecs
+import fnmatch
+import mmap
+import multiprocessing
+import os
+import queue
+import re
+import threading
+from collections import deque
+
+from langchain_core.documents import Document
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+from embedding_cache import content_hash
+
+BLOCK_SIZE = 1 << 20
+# Файлы больше этого размера читаются через mmap
+MMAP_THRESHOLD = 16 << 20
+PATTERNS = ("*.txt", "*.md")
+# Как часто потребитель проверяет, что процессы загрузки живы (секунды)
+WORKER_POLL_INTERVAL = 1.0
+
+
+def iter_files(root, patterns=PATTERNS):
+    """Пути подходящих файлов в дереве каталогов в постоянном порядке."""
+    for directory, subdirectories, names in os.walk(root):
+        subdirectories.sort()
+        for name in sorted(names):
+            if any(fnmatch.fnmatch(name, pattern) for pattern in patterns):
+                yield os.path.join(directory, name)
+
+
+def read_blocks(path, block_size=BLOCK_SIZE, encoding="utf-8", errors="strict"):
+    """Текст файла блоками примерно по block_size байт.
+
+    Многобайтовые символы на границе блоков декодируются корректно.
+    Прочитанные страницы mmap сразу освобождаются, поэтому RSS не растет
+    с размером файла.
+    """
+    decoder = codecs.getincrementaldecoder(encoding)(errors)
+    with open(path, "rb") as file:
+        size = os.fstat(file.fileno()).st_size
+        if size >= MMAP_THRESHOLD:
+            with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                for start in range(0, size, block_size):
+                    end = min(start + block_size, size)
+                    text = decoder.decode(mapped[start:end])
+                    page_start = start - start % mmap.PAGESIZE
+                    mapped.madvise(mmap.MADV_DONTNEED, page_start, end - page_start)
+                    if text:
+                        yield text
+        else:
+            for data in iter(lambda: file.read(block_size), b""):
+                text = decoder.decode(data)
+                if text:
+                    yield text
+    tail = decoder.decode(b"", final=True)
+    if tail:
+        yield tail
+
+
+class _Merger:
+    """Потоковая версия TextSplitter._merge_splits: части -> фрагменты со смещениями."""
+
+    def __init__(self, splitter, separator):
+        self.separator = separator
+        self.separator_length = splitter._length_function(separator)
+        self.length = splitter._length_function
+        self.chunk_size = splitter._chunk_size
+        self.chunk_overlap = splitter._chunk_overlap
+        self.strip = splitter._strip_whitespace
+        self.current = deque()  # (текст, смещение)
+        self.total = 0
+
+    def add(self, text, start):
+        length = self.length(text)
+        if self.total + length + (self.separator_length if self.current else 0) > self.chunk_size:
+            if self.current:
+                chunk = self._join()
+                if chunk is not None:
+                    yield chunk
+                while self.total > self.chunk_overlap or (
+                    self.total + length + (self.separator_length if self.current else 0) > self.chunk_size
+                    and self.total > 0
+                ):
+                    first, _ = self.current.popleft()
+                    self.total -= self.length(first) + (self.separator_length if self.current else 0)
+        self.current.append((text, start))
+        self.total += length + (self.separator_length if len(self.current) > 1 else 0)
+
+    def flush(self):
+        chunk = self._join() if self.current else None
+        self.current.clear()
+        self.total = 0
+        return chunk
+
+    def _join(self):
+        text = self.separator.join(part for part, _ in self.current)
+        start = self.current[0][1]
+        if self.strip:
+            start += len(text) - len(text.lstrip())
+            text = text.strip()
+        return (text, start) if text else None
+
+
+class StreamingSplitter:
+    """RecursiveCharacterTextSplitter, принимающий текст блоками.
+
+    split_blocks выдает (фрагмент, смещение начала в символах) по мере
+    готовности, держа в памяти только незаконченный абзац и текущий
+    фрагмент. Результат совпадает с split_text всего текста, если разделитель
+    верхнего уровня (первый из separators, встреченный в тексте) есть уже в
+    первом блоке - для текстов с абзацами это всегда так. Смещения точные при
+    keep_separator=True (по умолчанию); без разделителей фрагмент может не
+    совпадать с текстом файла, и смещение приблизительное.
+
+    Args:
+        splitter: Настроенный RecursiveCharacterTextSplitter; без него
+            создается новый с параметрами kwargs
+    """
+
+    def __init__(self, splitter=None, **kwargs):
+        self.splitter = splitter or RecursiveCharacterTextSplitter(**kwargs)
+
+    def _top_separator(self, text):
+        separators = self.splitter._separators
+        for i, separator in enumerate(separators):
+            if not separator:
+                return separator, []
+            pattern = separator if self.splitter._is_separator_regex else re.escape(separator)
+            if re.search(pattern, text):
+                return separator, separators[i + 1:]
+        return separators[-1], []
+
+    def _pieces(self, buffer, pattern, final):
+        """Законченные части буфера [(текст, смещение)] и длина обработанного префикса."""
+        if pattern is None:
+            return [(char, i) for i, char in enumerate(buffer)], len(buffer)
+        keep = self.splitter._keep_separator
+        pieces = []
+        previous = 0
+        for match in pattern.finditer(buffer):
+            cut = match.end() if keep == "end" else match.start()
+            pieces.append((buffer[previous:cut], previous))
+            previous = match.end() if not keep else cut
+        if final:
+            pieces.append((buffer[previous:], previous))
+            previous = len(buffer)
+        return [(text, start) for text, start in pieces if text], previous
+
+    def split_blocks(self, blocks):
+        splitter = self.splitter
+        blocks = iter(blocks)
+        buffer = next(blocks, "")
+        separator, deeper = self._top_separator(buffer)
+        pattern = None
+        if separator:
+            pattern = re.compile(separator if splitter._is_separator_regex else re.escape(separator))
+        merger = _Merger(splitter, "" if splitter._keep_separator else separator)
+        position = 0  # смещение начала буфера в тексте
+        final = False
+        while not final:
+            block = next(blocks, None)
+            if block is None:
+                final = True
+            else:
+                buffer += block
+            pieces, consumed = self._pieces(buffer, pattern, final)
+            for text, start in pieces:
+                start += position
+                if splitter._length_function(text) < splitter._chunk_size:
+                    yield from merger.add(text, start)
+                    continue
+                chunk = merger.flush()
+                if chunk is not None:
+                    yield chunk
+                if not deeper:
+                    yield text, start
+                    continue
+                index, previous_length = 0, 0
+                for part in splitter._split_text(text, deeper):
+                    found = text.find(part, max(0, index + previous_length - splitter._chunk_overlap))
+                    if found >= 0:
+                        index = found
+                    previous_length = len(part)
+                    yield part, start + index
+            buffer = buffer[consumed:]
+            position += consumed
+        chunk = merger.flush()
+        if chunk is not None:
+            yield chunk
+
+    def split_text(self, text):
+        """Как RecursiveCharacterTextSplitter.split_text (для проверки)."""
+        return [chunk for chunk, _ in self.split_blocks([text])]
+
+
+def chunk_id(source, start, text):
+    """Стабильный id фрагмента: не меняется при повторной загрузке того же файла."""
+    return content_hash(f"{source}\0{start}\0{text}").hex()
+
+
+def iter_file_documents(path, splitter=None, root=None, block_size=BLOCK_SIZE, encoding="utf-8"):
+    """Фрагменты одного файла как Document с id, source и start_index."""
+    splitter = splitter if isinstance(splitter, StreamingSplitter) else StreamingSplitter(splitter)
+    relative = os.path.relpath(path, root) if root else path
+    for text, start in splitter.split_blocks(read_blocks(path, block_size, encoding)):
+        yield Document(id=chunk_id(relative, start, text), page_content=text,
+                       metadata={"source": path, "start_index": start})
+
+
+def _worker(tasks, results, splitter, root, block_size, encoding, batch_size):
+    # Пакеты передаются кортежами: pickle Document заметно дороже
+    try:
+        for path in iter(tasks.get, None):
+            batch = []
+            try:
+                for document in iter_file_documents(path, splitter, root, block_size, encoding):
+                    batch.append((document.id, document.page_content, path, document.metadata["start_index"]))
+                    if len(batch) >= batch_size:
+                        results.put(batch)
+                        batch = []
+            except Exception as error:
+                # Исключение может не пережить pickle, поэтому передается текстом
+                results.put(RuntimeError(f"Не удалось загрузить {path}: {error!r}"))
+                continue
+            if batch:
+                results.put(batch)
+    finally:
+        # Без этого потребитель ждал бы завершения процесса вечно
+        results.put(None)
+
+
+def load_directory(root, splitter=None, patterns=PATTERNS, workers=None, batch_size=1000,
+                   block_size=BLOCK_SIZE, encoding="utf-8"):
+    """Генератор фрагментов всех файлов каталога.
+
+    Файлы обрабатываются в workers процессах (по умолчанию по числу
+    процессоров; при workers <= 1 - в текущем процессе). Фрагменты одного
+    файла идут по порядку, фрагменты разных файлов могут чередоваться.
+    Очередь результатов ограничена, поэтому процессы ждут, пока потребитель
+    не заберет очередные пакеты.
+
+    Пример:
+        splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=100)
+        for document in load_directory("./data", splitter, workers=4):
+    """
+    splitter = splitter if isinstance(splitter, StreamingSplitter) else StreamingSplitter(splitter)
+    workers = workers or os.cpu_count() or 1
+    if workers <= 1:
+        for path in iter_files(root, patterns):
+            yield from iter_file_documents(path, splitter, root, block_size, encoding)
+        return
+
+    tasks = multiprocessing.Queue(maxsize=workers * 4)
+    results = multiprocessing.Queue(maxsize=workers * 2)
+    processes = [
+        multiprocessing.Process(target=_worker, daemon=True,
+                                args=(tasks, results, splitter, root, block_size, encoding, batch_size))
+        for _ in range(workers)
+    ]
+    for process in processes:
+        process.start()
+
+    def feed():
+        for path in iter_files(root, patterns):
+            tasks.put(path)
+        for _ in processes:
+            tasks.put(None)
+
+    feeder = threading.Thread(target=feed, daemon=True)
+    feeder.start()
+    try:
+        running = len(processes)
+        while running:
+            try:
+                item = results.get(timeout=WORKER_POLL_INTERVAL)
+            except queue.Empty:
+                # Процесс, убитый сигналом или упавший при запуске, не пришлет None
+                failed = [process.exitcode for process in processes if process.exitcode not in (None, 0)]
+                if failed or not any(process.is_alive() for process in processes):
+                    raise RuntimeError(f"Процессы загрузки завершились раньше времени (коды {failed})")
+                continue
+            if item is None:
+                running -= 1
+            elif isinstance(item, Exception):
+                raise item
+            else:
+                for record_id, text, path, start in item:
+                    yield Document(id=record_id, page_content=text, metadata={"source": path, "start_index": start})
+    finally:
+        for process in processes:
+            if process.is_alive():
+                process.terminate()
+            process.join()
@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Бенчмарк потоковой загрузки корпуса
+Генерирует корпус (по умолчанию 2 ГБ: большие файлы, которые читаются через
+mmap, и много маленьких в подкаталогах) и в отдельных процессах измеряет
+скорость (МБ/с) и пиковую память load_directory с одним и несколькими
+процессами, а также TextLoader + split_documents на части корпуса. В конце
+проверяет, что ошибка в процессе загрузки доходит до потребителя.
+"""
+
+import json
+import os
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+from streaming_loader import iter_files, load_directory
+
+CORPUS_GB = 2.0
+LARGE_FILE_MB = 128
+SMALL_FILE_KB = 256
+# Доля корпуса (по объему) в больших файлах
+LARGE_SHARE = 0.5
+# TextLoader загружает только эту часть корпуса: весь не поместился бы в память
+BASELINE_MB = 256
+CHUNK_SIZE = 1000
+CHUNK_OVERLAP = 200
+WORDS = ["данные", "модель", "запрос", "индекс", "вектор", "цепочка", "агент", "память", "ответ", "поиск",
+         "document", "chunk", "loader", "splitter", "token", "stream", "process", "memory", "file", "corpus"]
+
+
+def make_paragraphs(count=5000, seed=0):
+    rng = np.random.default_rng(seed)
+    words = np.array(WORDS, dtype=object)
+    return [" ".join(words[rng.integers(0, len(WORDS), rng.integers(10, 150))]) + "." for _ in range(count)]
+
+
+def write_file(path, size, paragraphs, rng):
+    with open(path, "w", encoding="utf-8") as file:
+        written = 0
+        while written < size:
+            block = "\n\n".join(paragraphs[i] for i in rng.integers(0, len(paragraphs), 500)) + "\n\n"
+            file.write(block)
+            written += len(block.encode("utf-8"))
+
+
+def make_corpus(directory, total_bytes, seed=0):
+    """Большие файлы в корне и маленькие по подкаталогам."""
+    rng = np.random.default_rng(seed)
+    paragraphs = make_paragraphs()
+    large = LARGE_FILE_MB << 20
+    for i in range(max(1, int(total_bytes * LARGE_SHARE) // large)):
+        write_file(os.path.join(directory, f"large_{i:03}.txt"), large, paragraphs, rng)
+    small = SMALL_FILE_KB << 10
+    for i in range(int(total_bytes * (1 - LARGE_SHARE)) // small):
+        subdirectory = os.path.join(directory, f"part_{i // 500:03}")
+        os.makedirs(subdirectory, exist_ok=True)
+        write_file(os.path.join(subdirectory, f"doc_{i:05}.md"), small, paragraphs, rng)
+
+
+def rss_mb():
+    with open("/proc/self/status") as file:
+        for line in file:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1]) / 1024
+    return 0.0
+
+
+# --- Замеры в дочернем процессе ---
+
+def run_streaming(directory, workers):
+    splitter = RecursiveCharacterTextSplitter(chunk_size=CHUNK_SIZE, chunk_overlap=CHUNK_OVERLAP)
+    chunks = 0
+    samples = []
+    for document in load_directory(directory, splitter, workers=workers):
+        chunks += 1
+        if chunks % 50_000 == 0:
+            samples.append(rss_mb())
+    return chunks, samples
+
+
+def run_langchain(directory):
+    from langchain_community.document_loaders import TextLoader
+
+    documents = []
+    loaded = 0
+    for path in iter_files(directory):
+        if loaded >= BASELINE_MB << 20:
+            break
+        documents.extend(TextLoader(path, encoding="utf-8").load())
+        loaded += os.path.getsize(path)
+    splitter = RecursiveCharacterTextSplitter(chunk_size=CHUNK_SIZE, chunk_overlap=CHUNK_OVERLAP)
+    return len(splitter.split_documents(documents)), [rss_mb()], loaded
+
+
+def worker(mode, directory):
+    start = time.perf_counter()
+    if mode == "langchain":
+        chunks, samples, loaded = run_langchain(directory)
+    else:
+        chunks, samples = run_streaming(directory, int(mode))
+        loaded = sum(os.path.getsize(path) for path in iter_files(directory))
+    elapsed = time.perf_counter() - start
+    print(json.dumps({
+        "chunks": chunks, "seconds": elapsed, "megabytes": loaded / 2 ** 20, "samples": samples,
+        "peak": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        "children_peak": resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024,
+    }))
+
+
+# --- Родительский процесс ---
+
+def run_worker(mode, directory):
+    output = subprocess.run([sys.executable, os.path.abspath(__file__), "--worker", mode, directory],
+                            check=True, capture_output=True, text=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def check_worker_errors(directory):
+    """Ошибка чтения в процессе загрузки поднимается в потребителе, а не вешает его."""
+    start = time.perf_counter()
+    try:
+        list(load_directory(directory, workers=2, encoding="bogus"))
+    except RuntimeError as error:
+        assert "bogus" in str(error), error
+    else:
+        raise AssertionError("load_directory с неизвестной кодировкой не вызвал ошибку")
+    print(f"\nОшибка в процессе загрузки передана потребителю за {time.perf_counter() - start:.1f} с")
+
+
+def main():
+    """Основная функция."""
+    if len(sys.argv) > 1 and sys.argv[1] == "--worker":
+        worker(sys.argv[2], sys.argv[3])
+        return
+    corpus_gb = float(sys.argv[1]) if len(sys.argv) > 1 else CORPUS_GB
+    directory = tempfile.mkdtemp(prefix="corpus_")
+    try:
+        start = time.perf_counter()
+        make_corpus(directory, int(corpus_gb * 2 ** 30))
+        files = list(iter_files(directory))
+        size = sum(os.path.getsize(path) for path in files) / 2 ** 20
+        print(f"Корпус: {len(files)} файлов, {size:.0f} МБ (создан за {time.perf_counter() - start:.0f} с), "
+              f"процессоров: {os.cpu_count()}\n")
+        print(f"{'Способ':<28} {'МБ':>6} {'Фрагментов':>11} {'Время':>8} {'МБ/с':>6} {'Пик RSS':>9} "
+              f"{'Пик RSS воркера':>16} {'RSS по ходу':>14}")
+        modes = [("load_directory, 1 процесс", "1"),
+                 (f"load_directory, {max(2, os.cpu_count())} процесса", str(max(2, os.cpu_count()))),
+                 ("TextLoader + split_documents", "langchain")]
+        for name, mode in modes:
+            result = run_worker(mode, directory)
+            samples = result["samples"]
+            trend = f"{min(samples):.0f}-{max(samples):.0f} МБ" if samples else "-"
+            children = f"{result['children_peak']:.0f} МБ" if mode not in ("1", "langchain") else "-"
+            print(f"{name:<28} {result['megabytes']:>6.0f} {result['chunks']:>11} {result['seconds']:>6.1f} с "
+                  f"{result['megabytes'] / result['seconds']:>6.1f} {result['peak']:>6.0f} МБ {children:>16} "
+                  f"{trend:>14}", flush=True)
+        check_worker_errors(directory)
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
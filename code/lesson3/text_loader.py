@@ -2,6 +2,7 @@ import os
 from dotenv import load_dotenv
 from langchain_community.document_loaders import TextLoader
 from langchain_text_splitters import RecursiveCharacterTextSplitter
+from streaming_loader import iter_file_documents
 
 # Загружаем переменные окружения из файла .env
 load_dotenv()
@@ -52,6 +53,12 @@ def main():
             print(f"\n--- Часть {i+1} ---")
             print(doc.page_content)
         
+        # Потоковая загрузка: файл читается блоками, фрагменты выдаются по одному
+        # (те же фрагменты, что и у split_documents, плюс id и смещение в файле)
+        print("\n=== Потоковая загрузка ===")
+        for doc in iter_file_documents("sample.txt", text_splitter):
+            print(f"[{doc.metadata['start_index']}] {doc.id[:8]}: {doc.page_content[:50]}...")
+        
         # Удаление временного файла
         if os.path.exists("sample.txt"):
             os.remove("sample.txt")
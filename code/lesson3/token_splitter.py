@@ -0,0 +1,274 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Разделение текста по токенам
+Ограничения модели задаются в токенах, а RecursiveCharacterTextSplitter с
+length_function=len считает символы; для русского текста один токен - это
+2-4 символа, поэтому размер фрагментов в символах приходится брать с
+запасом. TokenAwareSplitter режет по тем же разделителям, но считает длину
+BPE-токенизатором tiktoken: каждая часть между разделителями токенизируется
+один раз (с кэшем повторяющихся частей), а длина склеенного фрагмента -
+сумма длин частей, без повторной токенизации.
+
+Кодировки OpenAI (cl100k_base и др.) tiktoken скачивает при первом
+использовании и дальше берет из кэша. Если скачать не удалось,
+load_encoding возвращает BPE, обученный на текстах уроков (local_encoding):
+длины в токенах у него другие, но разделитель продолжает работать. Свой
+BPE можно обучить на своем корпусе (train_bpe) и сохранить в файл формата
+.tiktoken.
+"""
+
+import base64
+import glob
+import heapq
+import os
+import warnings
+from collections import Counter, defaultdict
+from functools import lru_cache
+
+import regex
+import tiktoken
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+from tiktoken.load import load_tiktoken_bpe
+
+# Предварительное разбиение на слова, как в cl100k_base
+PAT_STR = (r"""'(?i:[sdmt]|ll|ve|re)|[^\r\n\p{L}\p{N}]?+\p{L}++|\p{N}{1,3}+| ?[^\s\p{L}\p{N}]++[\r\n]*+|"""
+           r"""\s++$|\s*[\r\n]|\s+(?!\S)|\s""")
+ENDOFTEXT = "<|endoftext|>"
+LESSONS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "lessons")
+
+
+# --- Токенизатор ---
+
+def train_bpe(texts, vocab_size=8000, name="local_bpe"):
+    """Обучает байтовый BPE на текстах и возвращает tiktoken.Encoding.
+
+    Слова выделяются регулярным выражением PAT_STR, затем самые частые пары
+    соседних токенов сливаются, пока словарь не достигнет vocab_size.
+    """
+    pattern = regex.compile(PAT_STR)
+    counts = Counter()
+    for text in texts:
+        counts.update(pattern.findall(text))
+    words = [list(word.encode("utf-8")) for word in counts]
+    frequencies = list(counts.values())
+    vocabulary = [bytes([i]) for i in range(256)]
+
+    pair_counts = defaultdict(int)
+    where = defaultdict(set)  # пара -> номера слов, где она встречается
+    for index, word in enumerate(words):
+        for pair in zip(word, word[1:]):
+            pair_counts[pair] += frequencies[index]
+            where[pair].add(index)
+    heap = [(-count, pair) for pair, count in pair_counts.items()]
+    heapq.heapify(heap)
+
+    while len(vocabulary) < vocab_size and heap:
+        count, pair = heapq.heappop(heap)
+        if -count != pair_counts.get(pair):
+            continue  # устаревшая запись кучи
+        if count == 0:
+            break
+        new_token = len(vocabulary)
+        vocabulary.append(vocabulary[pair[0]] + vocabulary[pair[1]])
+        changed = set()
+        for index in where.pop(pair):
+            word = words[index]
+            frequency = frequencies[index]
+            for old in zip(word, word[1:]):
+                pair_counts[old] -= frequency
+                changed.add(old)
+            merged = []
+            i = 0
+            while i < len(word):
+                if i + 1 < len(word) and (word[i], word[i + 1]) == pair:
+                    merged.append(new_token)
+                    i += 2
+                else:
+                    merged.append(word[i])
+                    i += 1
+            words[index] = merged
+            for new in zip(merged, merged[1:]):
+                pair_counts[new] += frequency
+                where[new].add(index)
+                changed.add(new)
+        pair_counts.pop(pair, None)
+        for changed_pair in changed:
+            count = pair_counts.get(changed_pair, 0)
+            if count > 0:
+                heapq.heappush(heap, (-count, changed_pair))
+
+    ranks = {}
+    for token in vocabulary:
+        ranks.setdefault(token, len(ranks))
+    return tiktoken.Encoding(name, pat_str=PAT_STR, mergeable_ranks=ranks,
+                             special_tokens={ENDOFTEXT: len(ranks)})
+
+
+def save_bpe(encoding, path):
+    """Сохраняет словарь в формате .tiktoken (base64 токена и ранг в строке)."""
+    ranks = encoding._mergeable_ranks
+    with open(path, "w", encoding="ascii") as file:
+        for token, rank in sorted(ranks.items(), key=lambda item: item[1]):
+            file.write(f"{base64.b64encode(token).decode('ascii')} {rank}\n")
+
+
+def load_encoding(name_or_path="cl100k_base"):
+    """Кодировка tiktoken по имени (cl100k_base, o200k_base) или из файла .tiktoken.
+
+    Если кодировку по имени не удалось скачать, возвращается local_encoding().
+    """
+    if name_or_path.endswith(".tiktoken"):
+        ranks = load_tiktoken_bpe(name_or_path)
+        return tiktoken.Encoding(name_or_path, pat_str=PAT_STR, mergeable_ranks=ranks,
+                                 special_tokens={ENDOFTEXT: len(ranks)})
+    try:
+        return tiktoken.get_encoding(name_or_path)
+    except OSError as error:
+        # Словарь кодировки OpenAI скачивается при первом использовании
+        warnings.warn(f"Кодировка {name_or_path} недоступна ({type(error).__name__}): "
+                      f"используется BPE, обученный на текстах уроков")
+        return local_encoding()
+
+
+def lesson_texts():
+    """Тексты уроков курса (lessons/*.md)."""
+    texts = []
+    for path in sorted(glob.glob(os.path.join(LESSONS, "*.md"))):
+        with open(path, encoding="utf-8") as file:
+            texts.append(file.read())
+    return texts
+
+
+@lru_cache(maxsize=None)
+def local_encoding(vocab_size=8000):
+    """BPE, обученный на текстах уроков (доли секунды): кодировка, которой не нужна сеть."""
+    return train_bpe(lesson_texts(), vocab_size, name="lessons_bpe")
+
+
+# --- Разделитель ---
+
+class TokenAwareSplitter(RecursiveCharacterTextSplitter):
+    """RecursiveCharacterTextSplitter с chunk_size и chunk_overlap в токенах.
+
+    Длина фрагмента оценивается суммой длин его частей, как и в
+    RecursiveCharacterTextSplitter с length_function на токенизаторе, поэтому
+    фрагменты получаются те же. На границах разделителей BPE почти не
+    склеивает токены (PAT_STR отделяет пробелы и переводы строк), и точная
+    длина фрагмента отличается от оценки на несколько токенов.
+
+    Args:
+        encoding: tiktoken.Encoding или имя кодировки
+        cache_size: Сколько длин частей хранить в кэше (повторяющиеся
+            заголовки, подписи, фрагменты кода токенизируются один раз)
+    """
+
+    def __init__(self, encoding="cl100k_base", chunk_size=512, chunk_overlap=64, cache_size=200_000, **kwargs):
+        if isinstance(encoding, str):
+            encoding = load_encoding(encoding)
+        self.encoding = encoding
+        self.cache_size = cache_size
+        self._lengths = {}
+        self.cache_hits = 0
+        self.cache_misses = 0
+        super().__init__(chunk_size=chunk_size, chunk_overlap=chunk_overlap,
+                         length_function=self.count_tokens, **kwargs)
+
+    def count_tokens(self, text):
+        return self._count_all([text])[0]
+
+    def _count_all(self, texts):
+        """Длины частей в токенах (из кэша или токенизацией)."""
+        lengths = self._lengths
+        encode = self.encoding.encode_ordinary
+        result = []
+        for text in texts:
+            length = lengths.get(text)
+            if length is None:
+                # encode_ordinary_batch здесь медленнее: пул потоков на каждую короткую часть
+                length = len(encode(text))
+                if len(lengths) >= self.cache_size:
+                    lengths.clear()
+                lengths[text] = length
+                self.cache_misses += 1
+            else:
+                self.cache_hits += 1
+            result.append(length)
+        return result
+
+    def _split_text(self, text, separators):
+        separator = separators[-1]
+        new_separators = []
+        for i, candidate in enumerate(separators):
+            pattern = candidate if self._is_separator_regex else regex.escape(candidate)
+            if not candidate:
+                separator = candidate
+                break
+            if regex.search(pattern, text):
+                separator = candidate
+                new_separators = separators[i + 1:]
+                break
+        pattern = separator if self._is_separator_regex else regex.escape(separator)
+        splits = _split_with_separator(text, pattern, self._keep_separator)
+        lengths = self._count_all(splits)
+        merge_separator = "" if self._keep_separator else separator
+
+        chunks = []
+        good_splits = []
+        good_lengths = []
+        for split, length in zip(splits, lengths):
+            if length < self._chunk_size:
+                good_splits.append(split)
+                good_lengths.append(length)
+                continue
+            if good_splits:
+                chunks.extend(self._merge_counted(good_splits, good_lengths, merge_separator))
+                good_splits, good_lengths = [], []
+            if new_separators:
+                chunks.extend(self._split_text(split, new_separators))
+            else:
+                chunks.append(split)
+        if good_splits:
+            chunks.extend(self._merge_counted(good_splits, good_lengths, merge_separator))
+        return chunks
+
+    def _merge_counted(self, splits, lengths, separator):
+        """TextSplitter._merge_splits с заранее посчитанными длинами частей."""
+        separator_length = self._count_all([separator])[0] if separator else 0
+        chunks = []
+        start = 0  # первая часть текущего фрагмента
+        total = 0
+        for end, length in enumerate(lengths):
+            if total + length + (separator_length if end > start else 0) > self._chunk_size:
+                if end > start:
+                    chunk = self._join_docs(splits[start:end], separator)
+                    if chunk is not None:
+                        chunks.append(chunk)
+                    while total > self._chunk_overlap or (
+                        total + length + (separator_length if end > start else 0) > self._chunk_size and total > 0
+                    ):
+                        total -= lengths[start] + (separator_length if end - start > 1 else 0)
+                        start += 1
+            total += length + (separator_length if end > start else 0)
+        chunk = self._join_docs(splits[start:], separator)
+        if chunk is not None:
+            chunks.append(chunk)
+        return chunks
+
+
+def _split_with_separator(text, pattern, keep_separator):
+    """Как _split_text_with_regex из langchain_text_splitters."""
+    if not pattern:
+        return list(text)
+    if not keep_separator:
+        return [part for part in regex.split(pattern, text) if part]
+    parts = regex.split(f"({pattern})", text)
+    if keep_separator == "end":
+        splits = [parts[i] + parts[i + 1] for i in range(0, len(parts) - 1, 2)]
+        if len(parts) % 2 == 1:
+            splits.append(parts[-1])
+    else:
+        splits = [parts[0]] + [parts[i] + parts[i + 1] for i in range(1, len(parts) - 1, 2)]
+        if len(parts) % 2 == 0:
+            splits.append(parts[-1])
+    return [split for split in splits if split]
@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Бенчмарк разделения текста по токенам
+Собирает русский корпус (по умолчанию 20 МБ) из строк уроков курса,
+перемешанных в случайные абзацы, и сравнивает скорость разделения и размеры
+фрагментов в токенах:
+- RecursiveCharacterTextSplitter с length_function=len (как в уроке);
+- тот же разделитель с length_function на tiktoken;
+- наивный вариант, который токенизирует склейку заново при каждом добавлении части;
+- TokenAwareSplitter.
+Если кодировка cl100k_base недоступна без сети, BPE обучается на текстах уроков.
+"""
+
+import sys
+import time
+
+import numpy as np
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+from token_splitter import TokenAwareSplitter, lesson_texts, load_encoding
+
+CORPUS_MB = 20
+# Наивный вариант слишком медленный для всего корпуса
+NAIVE_MB = 1
+CHUNK_TOKENS = 512
+OVERLAP_TOKENS = 64
+CHUNK_CHARS = 2000
+OVERLAP_CHARS = 200
+
+
+def make_corpus(texts, size_mb, seed=0):
+    """Абзацы из 1-8 случайных строк уроков, пока не наберется size_mb."""
+    rng = np.random.default_rng(seed)
+    lines = [line for text in texts for line in text.splitlines() if line.strip()]
+    paragraphs = []
+    size = 0
+    while size < size_mb << 20:
+        paragraph = "\n".join(lines[i] for i in rng.integers(0, len(lines), rng.integers(1, 9)))
+        paragraphs.append(paragraph)
+        size += len(paragraph.encode("utf-8")) + 2
+    return "\n\n".join(paragraphs)
+
+
+class PerMergeSplitter(RecursiveCharacterTextSplitter):
+    """Наивный вариант: длина склейки считается токенизацией всего текста фрагмента."""
+
+    def __init__(self, encoding, **kwargs):
+        self.encoding = encoding
+        super().__init__(length_function=lambda text: len(encoding.encode_ordinary(text)), **kwargs)
+
+    def _merge_splits(self, splits, separator):
+        chunks = []
+        current = []
+        for split in splits:
+            if current and self._length_function(separator.join(current + [split])) > self._chunk_size:
+                chunk = self._join_docs(current, separator)
+                if chunk is not None:
+                    chunks.append(chunk)
+                while current and (self._length_function(separator.join(current)) > self._chunk_overlap
+                                   or self._length_function(separator.join(current + [split])) > self._chunk_size):
+                    current = current[1:]
+            current.append(split)
+        chunk = self._join_docs(current, separator)
+        if chunk is not None:
+            chunks.append(chunk)
+        return chunks
+
+
+def measure(name, splitter, text, encoding):
+    start = time.perf_counter()
+    chunks = splitter.split_text(text)
+    elapsed = time.perf_counter() - start
+    tokens = np.array([len(tokens) for tokens in encoding.encode_ordinary_batch(chunks)])
+    megabytes = len(text.encode("utf-8")) / 2 ** 20
+    print(f"{name:<36} {megabytes:>5.1f} {elapsed:>7.2f} с {megabytes / elapsed:>6.2f} {len(chunks):>8} "
+          f"{tokens.mean():>8.0f} {tokens.min():>5} {tokens.max():>5}", flush=True)
+
+
+def main():
+    """Основная функция."""
+    corpus_mb = int(sys.argv[1]) if len(sys.argv) > 1 else CORPUS_MB
+    texts = lesson_texts()
+    # Без сети load_encoding возвращает BPE, обученный на текстах уроков
+    encoding = load_encoding("cl100k_base")
+    print(f"Кодировка: {encoding.name}, {encoding.n_vocab} токенов")
+    corpus = make_corpus(texts, corpus_mb)
+    naive_corpus = corpus[:corpus.find("\n\n", NAIVE_MB << 20)]
+    sample = corpus[:1 << 20]
+    print(f"Корпус: {len(corpus.encode('utf-8')) / 2 ** 20:.0f} МБ, "
+          f"{len(sample) / len(encoding.encode_ordinary(sample)):.2f} символа на токен\n")
+
+    print(f"{'Разделитель':<36} {'МБ':>5} {'Время':>9} {'МБ/с':>6} {'Фрагм.':>8} "
+          f"{'Ток. ср.':>8} {'мин':>5} {'макс':>5}")
+    measure(f"len, {CHUNK_CHARS} символов",
+            RecursiveCharacterTextSplitter(chunk_size=CHUNK_CHARS, chunk_overlap=OVERLAP_CHARS), corpus, encoding)
+    measure(f"length_function=tiktoken, {CHUNK_TOKENS} ток.",
+            RecursiveCharacterTextSplitter(chunk_size=CHUNK_TOKENS, chunk_overlap=OVERLAP_TOKENS,
+                                           length_function=lambda text: len(encoding.encode_ordinary(text))),
+            corpus, encoding)
+    measure(f"токенизация склейки, {CHUNK_TOKENS} ток.",
+            PerMergeSplitter(encoding, chunk_size=CHUNK_TOKENS, chunk_overlap=OVERLAP_TOKENS), naive_corpus, encoding)
+    splitter = TokenAwareSplitter(encoding, chunk_size=CHUNK_TOKENS, chunk_overlap=OVERLAP_TOKENS)
+    measure(f"TokenAwareSplitter, {CHUNK_TOKENS} ток.", splitter, corpus, encoding)
+    total = splitter.cache_hits + splitter.cache_misses
+    print(f"\nКэш длин частей: {splitter.cache_hits / total:.0%} попаданий из {total}")
+
+
+if __name__ == "__main__":
+    main()
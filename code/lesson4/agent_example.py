@@ -1,10 +1,25 @@
+import asyncio
 import os
+import sys
 from dotenv import load_dotenv
-from langchain_openai import ChatOpenAI
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from common.async_tools import inline_coroutine
+from common.llm_client import aclose_http_clients, create_chat_model
+from common.parallel_agent import ParallelToolAgent
+from common.tool_cache import ToolCache
 from langchain_classic.agents import create_react_agent, AgentExecutor
 from langchain_core.prompts import PromptTemplate
 from langchain_core.tools import tool
+from knowledge_index import default_index
+from safe_calculator import CalculatorError, evaluate
 
+# Повторные вызовы погоды и Википедии с тем же аргументом за сессию берутся из кэша
+tool_cache = ToolCache(max_entries=1000)
+
+# Инструменты работают доли миллисекунды без сети, поэтому при ainvoke
+# выполняются прямо в цикле событий (inline_coroutine), а не в пуле потоков
+
+@inline_coroutine
 @tool
 def calculate_expression(expression: str) -> float:
     """Выполняет математические вычисления. Используйте этот инструмент для решения математических задач.
@@ -16,16 +31,14 @@ def calculate_expression(expression: str) -> float:
         float: Результат вычисления
     """
     try:
-        # Безопасное вычисление выражения
-        allowed_chars = set('0123456789+-*/(). ')
-        if not all(c in allowed_chars for c in expression):
-            raise ValueError("Выражение содержит недопустимые символы")
-        
-        result = eval(expression)
-        return float(result)
-    except Exception as e:
+        # Разбор без eval: скомпилированные выражения кэшируются,
+        # размер чисел, вложенность и длина выражения ограничены
+        return evaluate(expression)
+    except CalculatorError as e:
         return f"Ошибка при вычислении: {str(e)}"
 
+@tool_cache.cached(ttl=600)
+@inline_coroutine
 @tool
 def get_weather(city: str) -> str:
     """Получает информацию о погоде в указанном городе.
@@ -46,6 +59,9 @@ def get_weather(city: str) -> str:
     
     return weather_data.get(city, f"Информация о погоде для {city} недоступна")
 
+# Поиск не различает регистр запроса, поэтому "ИИ" и "ии" - одна запись кэша
+@tool_cache.cached(ttl=3600, normalize=str.lower)
+@inline_coroutine
 @tool
 def search_wikipedia(query: str) -> str:
     """Выполняет поиск информации в Википедии.
@@ -56,19 +72,23 @@ def search_wikipedia(query: str) -> str:
     Returns:
         str: Краткая информация по запросу
     """
-    # В реальном приложении здесь был бы вызов API Википедии
-    wikipedia_data = {
-        "искусственный интеллект": "Искусственный интеллект (ИИ) — это область компьютерных наук, занимающаяся созданием программного обеспечения и алгоритмов, наделяющих компьютеры способностью к обучению, рассуждению и принятию решений.",
-        "машинное обучение": "Машинное обучение — это подраздел искусственного интеллекта, который изучает алгоритмы и статистические модели, которые компьютерные системы используют для выполнения задач без явных инструкций.",
-        "нейронная сеть": "Нейронная сеть — это вычислительная система, имитирующая работу биологических нейронных сетей головного мозга."
-    }
-    
-    for key, value in wikipedia_data.items():
-        if key in query.lower():
-            return value
+    # В реальном приложении здесь был бы вызов API Википедии; статьи ищутся по
+    # индексу (заголовки в любом падеже, затем BM25 по тексту), а не перебором
+    index = default_index()
+    article = index.lookup(query)
+    if article is not None:
+        return index.body(article)
     
     return f"Информация по запросу '{query}' не найдена в Википедии"
 
+async def run_sessions(agent, questions):
+    """Несколько сессий агента одновременно в одном цикле событий."""
+    try:
+        return await asyncio.gather(*(agent.ainvoke(question) for question in questions))
+    finally:
+        # Асинхронный HTTP-клиент привязан к этому циклу событий
+        await aclose_http_clients()
+
 def main():
     try:
         # Загружаем переменные окружения из файла .env
@@ -81,11 +101,7 @@ def main():
             return
 
         # Инициализируем модель через OpenRouter
-        llm = ChatOpenAI(
-            model="openai/gpt-3.5-turbo",
-            openai_api_key=api_key,
-            openai_api_base="https://openrouter.ai/api/v1"
-        )
+        llm = create_chat_model(api_key=api_key)
 
         # Создаем список инструментов
         tools = [calculate_expression, get_weather, search_wikipedia]
@@ -139,6 +155,33 @@ Final Answer: финальный ответ на оригинальный воп
             except Exception as e:
                 print(f"Ошибка при обработке вопроса: {str(e)}")
 
+        # ReAct выполняет одно действие за запрос к модели; ParallelToolAgent
+        # получает все независимые вызовы в одном ответе и выполняет их одновременно
+        print("\n=== Параллельные вызовы инструментов ===")
+        parallel_agent = ParallelToolAgent(llm, tools, verbose=True)
+        question = "Какая погода в Москве и Париже и что такое машинное обучение?"
+        print(f"\nВопрос: {question}")
+        try:
+            result = parallel_agent.invoke(question)
+            print(f"Ответ: {result['output']}")
+            print(f"Запросов к модели: {result['stats'].llm_calls}, вызовов инструментов: {result['stats'].tool_calls}")
+        except Exception as e:
+            print(f"Ошибка при обработке вопроса: {str(e)}")
+
+        # ainvoke не уходит в потоки: у всех инструментов есть coroutine,
+        # поэтому много сессий обслуживает один цикл событий
+        print("\n=== Одновременные сессии (ainvoke) ===")
+        questions = ["Какая погода в Новосибирске?", "Что такое нейронные сети?", "Сколько будет 2 ** 16?"]
+        try:
+            for question, result in zip(questions, asyncio.run(run_sessions(parallel_agent, questions))):
+                print(f"\nВопрос: {question}\nОтвет: {result['output']}")
+        except Exception as e:
+            print(f"Ошибка при обработке вопросов: {str(e)}")
+
+        cache_stats = tool_cache.stats()["total"]
+        print(f"\nКэш инструментов: {cache_stats['hits']} попаданий, {cache_stats['misses']} промахов "
+              f"({cache_stats['hit_rate']:.0%})")
+
     except Exception as e:
         print(f"Произошла ошибка при выполнении запроса: {str(e)}")
 
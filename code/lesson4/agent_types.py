@@ -1,6 +1,9 @@
 import os
+import sys
 from dotenv import load_dotenv
-from langchain_openai import ChatOpenAI
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from common.llm_client import create_chat_model
+from common.parallel_agent import ParallelToolAgent
 from langchain_classic.agents import (
     create_react_agent, 
     create_structured_chat_agent,
@@ -49,11 +52,7 @@ def main():
             return
 
         # Инициализируем модель через OpenRouter
-        llm = ChatOpenAI(
-            model="openai/gpt-3.5-turbo",
-            openai_api_key=api_key,
-            openai_api_base="https://openrouter.ai/api/v1"
-        )
+        llm = create_chat_model(api_key=api_key)
 
         # Создаем список инструментов
         tools = [simple_calculator, get_current_time]
@@ -114,6 +113,17 @@ Action Input: JSON с входными параметрами
         except Exception as e:
             print(f"Ошибка Structured Chat Agent: {str(e)}. Возможно, этот тип агента требует дополнительной настройки.")
 
+        # 3. Агент с параллельными вызовами инструментов
+        print("\n3. Parallel Tool Calling Agent:")
+        try:
+            # Модель возвращает несколько вызовов в одном ответе, они выполняются одновременно
+            parallel_agent = ParallelToolAgent(llm, tools, verbose=True)
+            result = parallel_agent.invoke("Сколько будет 10 умножить на 5 и какое сейчас время?")
+            print(f"Parallel Tool Calling Agent ответ: {result['output']}")
+            print(f"Запросов к модели: {result['stats'].llm_calls}, вызовов инструментов: {result['stats'].tool_calls}")
+        except Exception as e:
+            print(f"Ошибка Parallel Tool Calling Agent: {str(e)}")
+
     except Exception as e:
         print(f"Произошла ошибка при выполнении запроса: {str(e)}")
 
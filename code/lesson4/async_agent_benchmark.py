@@ -0,0 +1,262 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Бенчмарк асинхронных инструментов
+Сотни одновременных сессий агента (ParallelToolAgent) в одном процессе.
+Каждая сессия - ответ модели с тремя вызовами инструментов (карточка
+клиента CRM, остаток товара, погода - запросы к REST-сервису), затем
+итоговый ответ. Модель и сервис - локальные заглушки с задержкой ответа,
+запущенные в отдельном процессе, поэтому процессорное время, которое
+измеряет бенчмарк, - это только время клиента.
+
+Режимы:
+- потоки: invoke, поток на сессию, синхронные инструменты в пуле агента;
+- asyncio + синхронные инструменты: ainvoke, каждый вызов инструмента
+  уходит в пул потоков цикла событий (по умолчанию min(32, ядер + 4));
+- asyncio + async-инструменты: ainvoke, coroutine инструментов поверх
+  httpx.AsyncClient, все в одном потоке.
+
+Для каждого режима выводятся сессии в секунду, задержка сессии p50/p99,
+процессорное время клиента на сессию, сессии на ядро (за секунду
+процессорного времени), наибольшее число потоков и наибольшая задержка
+цикла событий. Результаты инструментов во всех режимах должны совпадать.
+"""
+
+import asyncio
+import multiprocessing
+import os
+import re
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from langchain_core.tools import StructuredTool
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from common.async_tools import ServiceClient, runs_in_thread
+from common.llm_client import aclose_http_clients, close_http_clients, configure_http_pool, create_chat_model
+from common.parallel_agent import ParallelToolAgent
+from common.stub_server import StubOpenAIServer, StubServiceServer
+
+CONCURRENCY = 200
+NUM_SESSIONS = 600
+LLM_LATENCY = 0.5
+SERVICE_LATENCY = 0.05
+CITIES = ["Москва", "Санкт-Петербург", "Новосибирск", "Екатеринбург", "Казань"]
+QUESTION = re.compile(r"клиент (\d+), товар (\d+), город (\S+)")
+
+
+# --- Заглушки (в отдельном процессе) ---
+
+def session_responder(messages):
+    """Первый ответ - три вызова инструментов, второй - итоговый ответ."""
+    if any(message["role"] == "tool" for message in messages):
+        return "готово"
+    question = next(message["content"] for message in messages if message["role"] == "user")
+    customer_id, product_id, city = QUESTION.search(question).groups()
+    return {"content": None, "tool_calls": [
+        {"name": "GetCustomerInfo", "args": {"customer_id": customer_id}},
+        {"name": "CheckInventory", "args": {"product_id": product_id}},
+        {"name": "GetWeather", "args": {"city": city}},
+    ]}
+
+
+def service_routes():
+    customers = {str(i): {"name": f"Клиент {i}", "status": "VIP" if i % 7 == 0 else "Regular"} for i in range(50)}
+    products = {str(i): {"name": f"Товар {i}", "stock": i * 3 % 17} for i in range(20)}
+    return {
+        ("GET", r"/customers/(\w+)"): lambda match, payload, query: (
+            (200, customers[match[1]]) if match[1] in customers else (404, {"error": "not found"})),
+        ("GET", r"/products/(\w+)"): lambda match, payload, query: (
+            (200, products[match[1]]) if match[1] in products else (404, {"error": "not found"})),
+        ("GET", r"/weather"): lambda match, payload, query: (
+            200, {"city": query["city"], "temperature": len(query["city"]) * 3 % 25}),
+    }
+
+
+def serve_stubs(connection):
+    with StubOpenAIServer(latency=LLM_LATENCY, responder=session_responder) as llm, \
+            StubServiceServer(service_routes(), latency=SERVICE_LATENCY) as service:
+        connection.send((llm.base_url, service.base_url))
+        connection.recv()  # ждем окончания бенчмарка
+        connection.send(time.process_time())
+
+
+# --- Инструменты ---
+
+def make_tools(service, async_native):
+    """Инструменты поверх REST-сервиса; без async_native у них нет coroutine."""
+    def customer(data):
+        return f"{data['name']}, статус {data['status']}" if data else "Клиент не найден"
+
+    def inventory(data):
+        return f"{data['name']}: {data['stock']} шт." if data else "Товар не найден"
+
+    def weather(data):
+        return f"В городе {data['city']} {data['temperature']}°C"
+
+    def get_customer_info(customer_id: str) -> str:
+        """Карточка клиента CRM по ID."""
+        return customer(service.get(f"/customers/{customer_id}"))
+
+    async def aget_customer_info(customer_id: str) -> str:
+        return customer(await service.aget(f"/customers/{customer_id}"))
+
+    def check_inventory(product_id: str) -> str:
+        """Остаток товара на складе."""
+        return inventory(service.get(f"/products/{product_id}"))
+
+    async def acheck_inventory(product_id: str) -> str:
+        return inventory(await service.aget(f"/products/{product_id}"))
+
+    def get_weather(city: str) -> str:
+        """Погода в городе."""
+        return weather(service.get("/weather", city=city))
+
+    async def aget_weather(city: str) -> str:
+        return weather(await service.aget("/weather", city=city))
+
+    return [
+        StructuredTool.from_function(func=func, coroutine=coroutine if async_native else None, name=name)
+        for name, func, coroutine in (("GetCustomerInfo", get_customer_info, aget_customer_info),
+                                      ("CheckInventory", check_inventory, acheck_inventory),
+                                      ("GetWeather", get_weather, aget_weather))
+    ]
+
+
+# --- Режимы ---
+
+class Monitor:
+    """Наибольшее число потоков и наибольшая задержка цикла событий."""
+
+    def __init__(self):
+        self.max_threads = threading.active_count()
+        self.max_lag = 0.0
+
+    def sample_threads(self):
+        self.max_threads = max(self.max_threads, threading.active_count())
+
+    async def watch_loop(self, interval=0.01):
+        while True:
+            start = time.perf_counter()
+            await asyncio.sleep(interval)
+            self.max_lag = max(self.max_lag, time.perf_counter() - start - interval)
+            self.sample_threads()
+
+    def watch_threads(self, stop, interval=0.01):
+        while not stop.wait(interval):
+            self.sample_threads()
+
+
+def questions():
+    return [f"Сессия {i}: клиент {i % 50}, товар {i % 20}, город {CITIES[i % len(CITIES)]}"
+            for i in range(NUM_SESSIONS)]
+
+
+def make_agent(llm_url, service, async_native, max_workers=8):
+    llm = create_chat_model(api_key="stub", base_url=llm_url)
+    return ParallelToolAgent(llm, make_tools(service, async_native), max_workers=max_workers)
+
+
+def run_threads(llm_url, service_url, monitor):
+    service = ServiceClient(service_url, max_connections=3 * CONCURRENCY)
+    # Пул агента общий для всех сессий: по три инструмента на сессию
+    agent = make_agent(llm_url, service, async_native=False, max_workers=3 * CONCURRENCY)
+
+    def session(question):
+        start = time.perf_counter()
+        result = agent.invoke(question)
+        return result, time.perf_counter() - start
+
+    stop = threading.Event()
+    watcher = threading.Thread(target=monitor.watch_threads, args=(stop,), daemon=True)
+    watcher.start()
+    try:
+        with ThreadPoolExecutor(max_workers=CONCURRENCY) as pool:
+            return list(pool.map(session, questions()))
+    finally:
+        stop.set()
+        watcher.join()
+        agent._pool.shutdown()
+        service.close()
+        close_http_clients()
+
+
+def run_asyncio(llm_url, service_url, monitor, async_native):
+    async def run():
+        service = ServiceClient(service_url, max_connections=3 * CONCURRENCY)
+        agent = make_agent(llm_url, service, async_native)
+        semaphore = asyncio.Semaphore(CONCURRENCY)
+
+        async def session(question):
+            async with semaphore:
+                start = time.perf_counter()
+                result = await agent.ainvoke(question)
+                return result, time.perf_counter() - start
+
+        watcher = asyncio.create_task(monitor.watch_loop())
+        try:
+            return await asyncio.gather(*(session(question) for question in questions()))
+        finally:
+            watcher.cancel()
+            await service.aclose()
+            await aclose_http_clients()
+
+    return asyncio.run(run())
+
+
+def run_mode(name, run, monitor):
+    cpu_start, start = time.process_time(), time.perf_counter()
+    sessions = run(monitor)
+    wall, cpu = time.perf_counter() - start, time.process_time() - cpu_start
+    latencies = np.array([seconds for _, seconds in sessions])
+    results = [sorted(str(observation) for _, observation in result["intermediate_steps"]) for result, _ in sessions]
+    thread_calls = sum(result["stats"].thread_tool_calls for result, _ in sessions)
+    print(f"{name:<32} {NUM_SESSIONS / wall:>8.1f} {np.percentile(latencies, 50):>7.2f} "
+          f"{np.percentile(latencies, 99):>7.2f} {cpu / NUM_SESSIONS * 1000:>9.1f} {NUM_SESSIONS / cpu:>9.1f} "
+          f"{monitor.max_threads:>7} {monitor.max_lag * 1000:>9.1f} {thread_calls:>9}", flush=True)
+    return results, thread_calls, monitor.max_threads
+
+
+def main():
+    """Основная функция."""
+    # Сессии не должны ждать соединений с моделью
+    configure_http_pool(max_connections=CONCURRENCY, max_keepalive_connections=CONCURRENCY)
+    parent, child = multiprocessing.Pipe()
+    stubs = multiprocessing.Process(target=serve_stubs, args=(child,), daemon=True)
+    stubs.start()
+    llm_url, service_url = parent.recv()
+    try:
+        print(f"Сессий: {NUM_SESSIONS}, одновременно: {CONCURRENCY}, задержка модели {LLM_LATENCY} с, "
+              f"сервиса {SERVICE_LATENCY} с; ядер: {os.cpu_count()}; "
+              f"пул потоков цикла событий по умолчанию: {min(32, os.cpu_count() + 4)}")
+        print(f"Нижняя граница времени сессии: {2 * LLM_LATENCY + SERVICE_LATENCY:.2f} с\n")
+        print(f"{'Режим':<32} {'сессий/с':>8} {'p50, с':>7} {'p99, с':>7} {'CPU мс/с.':>9} "
+              f"{'с./CPU-с':>9} {'потоков':>7} {'лаг, мс':>9} {'в потоках':>9}")
+        modes = {
+            "потоки, invoke": lambda monitor: run_threads(llm_url, service_url, monitor),
+            "asyncio, синхронные инструменты": lambda monitor: run_asyncio(llm_url, service_url, monitor, False),
+            "asyncio, async-инструменты": lambda monitor: run_asyncio(llm_url, service_url, monitor, True),
+        }
+        outcomes = {name: run_mode(name, run, Monitor()) for name, run in modes.items()}
+    finally:
+        parent.send("stop")
+        stubs_cpu = parent.recv()
+        stubs.join(timeout=5)
+    # На одном ядре заглушки делят процессор с клиентом
+    print(f"\nПроцессорное время заглушек: {stubs_cpu / (len(modes) * NUM_SESSIONS) * 1000:.1f} мс на сессию")
+
+    expected = outcomes["потоки, invoke"][0]
+    for name, (results, _, _) in outcomes.items():
+        assert results == expected, f"Результаты инструментов в режиме '{name}' отличаются"
+    _, thread_calls, threads = outcomes["asyncio, async-инструменты"]
+    assert thread_calls == 0
+    assert all(not runs_in_thread(tool) for tool in make_tools(None, async_native=True))
+    print("Результаты инструментов во всех режимах совпадают; "
+          f"с async-инструментами ни один вызов не ушел в поток (потоков в процессе: {threads})")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,11 @@
 import os
+import sys
 from dotenv import load_dotenv
 from langchain_openai import ChatOpenAI
 from langchain_core.tools import tool
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from knowledge_index import default_index
+from safe_calculator import CalculatorError, evaluate
 
 @tool
 def calculate_expression(expression: str) -> float:
@@ -14,14 +18,10 @@ def calculate_expression(expression: str) -> float:
         float: Результат вычисления
     """
     try:
-        # Безопасное вычисление выражения
-        allowed_chars = set('0123456789+-*/(). ')
-        if not all(c in allowed_chars for c in expression):
-            raise ValueError("Выражение содержит недопустимые символы")
-        
-        result = eval(expression)
-        return float(result)
-    except Exception as e:
+        # Разбор без eval: скомпилированные выражения кэшируются,
+        # размер чисел, вложенность и длина выражения ограничены
+        return evaluate(expression)
+    except CalculatorError as e:
         return f"Ошибка при вычислении: {str(e)}"
 
 @tool
@@ -54,16 +54,12 @@ def search_wikipedia(query: str) -> str:
     Returns:
         str: Краткая информация по запросу
     """
-    # В реальном приложении здесь был бы вызов API Википедии
-    wikipedia_data = {
-        "искусственный интеллект": "Искусственный интеллект (ИИ) — это область компьютерных наук, занимающаяся созданием программного обеспечения и алгоритмов, наделяющих компьютеры способностью к обучению, рассуждению и принятию решений.",
-        "машинное обучение": "Машинное обучение — это подраздел искусственного интеллекта, который изучает алгоритмы и статистические модели, которые компьютерные системы используют для выполнения задач без явных инструкций.",
-        "нейронная сеть": "Нейронная сеть — это вычислительная система, имитирующая работу биологических нейронных сетей головного мозга."
-    }
-    
-    for key, value in wikipedia_data.items():
-        if key in query.lower():
-            return value
+    # В реальном приложении здесь был бы вызов API Википедии; статьи ищутся по
+    # индексу (заголовки в любом падеже, затем BM25 по тексту), а не перебором
+    index = default_index()
+    article = index.lookup(query)
+    if article is not None:
+        return index.body(article)
     
     return f"Информация по запросу '{query}' не найдена в Википедии"
 
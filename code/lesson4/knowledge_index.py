@@ -0,0 +1,476 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Локальная база знаний с заранее построенным индексом
+Вместо перебора всех статей и проверки "заголовок in запрос" индекс
+строится один раз и открывается через memmap:
+
+    titles.bin, titles_offsets.npy   - заголовки статей (UTF-8 подряд)
+    bodies.bin, bodies_offsets.npy   - тексты статей
+    term_hash.npy, term_ids.npy      - словарь текста: хэши основ слов
+                                       (отсортированы) -> номер термина
+    postings_*.npy                   - инвертированный индекс: для каждого
+                                       термина статьи и вклад BM25, по
+                                       убыванию вклада и по номеру статьи
+    title_term_*.npy, trie_*.npy     - автомат Ахо-Корасик по словам
+                                       заголовков
+    meta.json                        - размеры и параметры BM25
+
+Слова приводятся к нижнему регистру, ё заменяется на е, русские слова
+сокращаются до основы стеммером Портера (Snowball) из
+common.russian_stemmer, общим с индексом BM25 урока 3, поэтому "машинного
+обучения" находит статью "Машинное обучение". Автомат Ахо-Корасик
+работает не по буквам, а по основам слов: за один проход по запросу он
+находит все упоминания заголовков, и время не зависит от числа статей.
+Если заголовков в запросе нет, статья ищется по тексту (BM25) с ранней
+остановкой по алгоритму порогов: списки вхождений хранятся в двух
+порядках, по убыванию вклада и по номеру статьи.
+"""
+
+import atexit
+import hashlib
+import json
+import math
+import os
+import re
+import shutil
+import tempfile
+import time
+from functools import lru_cache
+
+import numpy as np
+
+from common.russian_stemmer import STOP_WORDS as COMMON_STOP_WORDS, stem
+
+INDEX_VERSION = 2
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+_WORD_RE = re.compile(r"[0-9a-zа-яё]+")
+_CYRILLIC_RE = re.compile(r"[а-я]")
+
+# Служебные слова не индексируются в тексте статей (в заголовках остаются);
+# к общему списку добавлены слова просьб из запросов агента
+STOP_WORDS = COMMON_STOP_WORDS | frozenset("расскажи скажи найди покажи how what which who".split())
+
+
+@lru_cache(maxsize=262144)
+def normalize_word(word):
+    """Слово в нижнем регистре -> термин индекса (основа для русских слов)."""
+    if _CYRILLIC_RE.search(word):
+        return stem(word.replace("ё", "е"))
+    return word
+
+
+def tokenize(text):
+    """Слова текста в нижнем регистре."""
+    return _WORD_RE.findall(text.lower())
+
+
+def term_hash(term):
+    """64-битный хэш термина для поиска в отсортированном словаре."""
+    return int.from_bytes(hashlib.blake2b(term.encode("utf-8"), digest_size=8).digest(), "little")
+
+
+# --- Построение индекса ---
+
+class _BlobWriter:
+    """Строки подряд в файле UTF-8 и массив смещений."""
+
+    def __init__(self, path):
+        self.file = open(path, "wb")
+        self.offsets = [0]
+
+    def write(self, text):
+        data = text.encode("utf-8")
+        self.file.write(data)
+        self.offsets.append(self.offsets[-1] + len(data))
+
+    def close(self, offsets_path):
+        self.file.close()
+        np.save(offsets_path, np.array(self.offsets, dtype=np.int64))
+
+
+def _sorted_vocabulary(terms):
+    """Словарь {термин: номер} -> (отсортированные хэши, номера терминов в том же порядке)."""
+    hashes = np.fromiter((term_hash(term) for term in terms), dtype=np.uint64, count=len(terms))
+    order = np.argsort(hashes, kind="stable")
+    if len(hashes) > 1 and (np.diff(hashes[order]) == 0).any():
+        raise ValueError("Коллизия 64-битных хэшей терминов")
+    return hashes[order], order.astype(np.int32)
+
+
+def _goto(edge_keys, edge_children, num_symbols, nodes, symbols):
+    """Переходы автомата для массивов (узел, символ); -1, если перехода нет."""
+    keys = nodes.astype(np.int64) * num_symbols + symbols
+    positions = np.searchsorted(edge_keys, keys)
+    positions = np.minimum(positions, len(edge_keys) - 1)
+    found = edge_keys[positions] == keys if len(edge_keys) else np.zeros(len(keys), dtype=bool)
+    return np.where(found, edge_children[positions] if len(edge_keys) else -1, -1)
+
+
+def _build_automaton(parents, symbols, depths, articles, num_symbols):
+    """Ребра, ссылки неудач и выходные ссылки автомата Ахо-Корасик по бору заголовков.
+
+    Ссылки неудач считаются по уровням бора векторно: ссылка узла
+    глубины d ведет в узел меньшей глубины, уже обработанный.
+    """
+    num_nodes = len(parents)
+    children = np.arange(1, num_nodes, dtype=np.int32)
+    edge_keys = parents[1:].astype(np.int64) * num_symbols + symbols[1:]
+    order = np.argsort(edge_keys, kind="stable")
+    edge_keys, edge_children = edge_keys[order], children[order]
+
+    fail = np.zeros(num_nodes, dtype=np.int32)
+    link = np.full(num_nodes, -1, dtype=np.int32)
+    by_depth = np.argsort(depths, kind="stable")
+    bounds = np.searchsorted(depths[by_depth], np.arange(depths.max() + 2))
+    for depth in range(2, depths.max() + 1):
+        level = by_depth[bounds[depth]:bounds[depth + 1]]
+        candidates = fail[parents[level]]
+        result = np.full(len(level), -1, dtype=np.int32)
+        pending = np.arange(len(level))
+        while len(pending):
+            child = _goto(edge_keys, edge_children, num_symbols, candidates[pending], symbols[level[pending]])
+            found = child >= 0
+            result[pending[found]] = child[found]
+            at_root = ~found & (candidates[pending] == 0)
+            result[pending[at_root]] = 0
+            pending = pending[~found & ~at_root]
+            candidates[pending] = fail[candidates[pending]]
+        fail[level] = result
+    for depth in range(2, depths.max() + 1):
+        level = by_depth[bounds[depth]:bounds[depth + 1]]
+        target = fail[level]
+        link[level] = np.where(articles[target] >= 0, target, link[target])
+    return edge_keys, edge_children, fail, link
+
+
+def build_index(articles, directory, batch_size=50000, k1=BM25_K1, b=BM25_B):
+    """Строит индекс статей [(заголовок, текст)] в каталоге и возвращает meta.
+
+    Статьи читаются потоком; в памяти держатся словари терминов, бор
+    заголовков и пары (термин, статья) - по 12 байт на каждую.
+    """
+    start = time.perf_counter()
+    os.makedirs(directory, exist_ok=True)
+    path = lambda name: os.path.join(directory, name)  # noqa: E731
+    titles = _BlobWriter(path("titles.bin"))
+    bodies = _BlobWriter(path("bodies.bin"))
+
+    # Словари: слово -> номер термина (-1 для служебных), термин -> номер
+    word_terms, terms = {}, {}
+    title_word_symbols, title_terms = {}, {}
+    # Бор заголовков: (узел, символ) -> узел
+    trie = {}
+    parents, symbols, depths, node_articles = [0], [0], [0], [-1]
+    doc_lengths = []
+    pair_keys, pair_counts = [], []
+    batch_terms, batch_lengths = [], []
+    batch_start = count = 0
+
+    def body_term(word):
+        term = normalize_word(word)
+        term_id = -1 if word in STOP_WORDS else terms.setdefault(term, len(terms))
+        word_terms[word] = term_id
+        return term_id
+
+    def title_symbol(word):
+        term = normalize_word(word)
+        symbol = title_word_symbols[word] = title_terms.setdefault(term, len(title_terms))
+        return symbol
+
+    def flush():
+        if not batch_lengths:
+            return
+        terms_array = np.array(batch_terms, dtype=np.int64)
+        lengths = np.array(batch_lengths, dtype=np.int64)
+        docs = np.repeat(np.arange(batch_start, batch_start + len(lengths), dtype=np.int64), lengths)
+        keys, counts = np.unique((terms_array << 32) | docs, return_counts=True)
+        pair_keys.append(keys)
+        pair_counts.append(counts.astype(np.uint32))
+        batch_terms.clear()
+        batch_lengths.clear()
+
+    for title, body in articles:
+        titles.write(title)
+        bodies.write(body)
+        node = 0
+        for word in tokenize(title):
+            symbol = title_word_symbols.get(word)
+            if symbol is None:
+                symbol = title_symbol(word)
+            child = trie.get((node, symbol))
+            if child is None:
+                child = trie[(node, symbol)] = len(parents)
+                parents.append(node)
+                symbols.append(symbol)
+                depths.append(depths[node] + 1)
+                node_articles.append(-1)
+            node = child
+        if node and node_articles[node] < 0:
+            node_articles[node] = count  # одинаковые заголовки: первая статья
+
+        ids = [word_terms[word] if word in word_terms else body_term(word) for word in tokenize(title + "\n" + body)]
+        ids = [term_id for term_id in ids if term_id >= 0]
+        batch_terms.extend(ids)
+        batch_lengths.append(len(ids))
+        doc_lengths.append(len(ids))
+        count += 1
+        if len(batch_lengths) >= batch_size:
+            flush()
+            batch_start = count
+    flush()
+    titles.close(path("titles_offsets.npy"))
+    bodies.close(path("bodies_offsets.npy"))
+    trie = None
+
+    # Инвертированный индекс: вклад BM25 считается при построении
+    keys = np.concatenate(pair_keys) if pair_keys else np.zeros(0, dtype=np.int64)
+    tf = np.concatenate(pair_counts).astype(np.float32) if pair_counts else np.zeros(0, dtype=np.float32)
+    pair_keys = pair_counts = None
+    term_of = (keys >> 32).astype(np.int32)
+    docs = (keys & 0xFFFFFFFF).astype(np.uint32)
+    keys = None
+    doc_lengths = np.array(doc_lengths, dtype=np.float32)
+    avgdl = float(doc_lengths.mean()) if count else 0.0
+    df = np.bincount(term_of, minlength=len(terms))
+    idf = np.log1p((count - df + 0.5) / (df + 0.5)).astype(np.float32)
+    norm = k1 * (1 - b + b * doc_lengths / max(avgdl, 1e-9))
+    impacts = idf[term_of] * tf * (k1 + 1) / (tf + norm[docs])
+    impacts = impacts.astype(np.float32)
+    # Два порядка одних и тех же вхождений: по убыванию вклада - для чтения
+    # с начала списка, по номеру статьи - для точной оценки двоичным поиском
+    order = np.lexsort((-impacts, term_of))
+    np.save(path("postings_docs.npy"), docs[order])
+    np.save(path("postings_impacts.npy"), impacts[order])
+    order = np.lexsort((docs, term_of))
+    np.save(path("postings_by_doc_docs.npy"), docs[order])
+    np.save(path("postings_by_doc_impacts.npy"), impacts[order])
+    order = docs = impacts = tf = None
+    np.save(path("postings_offsets.npy"), np.concatenate([[0], np.cumsum(df)]).astype(np.int64))
+    hashes, ids = _sorted_vocabulary(list(terms))
+    np.save(path("term_hash.npy"), hashes)
+    np.save(path("term_ids.npy"), ids)
+
+    # Автомат заголовков
+    hashes, ids = _sorted_vocabulary(list(title_terms))
+    np.save(path("title_term_hash.npy"), hashes)
+    np.save(path("title_term_ids.npy"), ids)
+    parents = np.array(parents, dtype=np.int32)
+    symbols = np.array(symbols, dtype=np.int32)
+    depths = np.array(depths, dtype=np.int32)
+    node_articles = np.array(node_articles, dtype=np.int32)
+    num_symbols = max(len(title_terms), 1)
+    edge_keys, edge_children, fail, link = _build_automaton(parents, symbols, depths, node_articles, num_symbols)
+    np.save(path("trie_edge_keys.npy"), edge_keys)
+    np.save(path("trie_edge_children.npy"), edge_children)
+    np.save(path("trie_fail.npy"), fail)
+    np.save(path("trie_link.npy"), link)
+    np.save(path("trie_depth.npy"), depths.astype(np.uint16))
+    np.save(path("trie_article.npy"), node_articles)
+
+    meta = {"version": INDEX_VERSION, "articles": count, "terms": len(terms), "title_terms": len(title_terms),
+            "postings": int(df.sum()), "trie_nodes": len(parents), "avgdl": avgdl, "k1": k1, "b": b,
+            "build_seconds": round(time.perf_counter() - start, 3)}
+    with open(path("meta.json"), "w", encoding="utf-8") as file:
+        json.dump(meta, file, ensure_ascii=False, indent=2)
+    return meta
+
+
+# --- Поиск ---
+
+class KnowledgeIndex:
+    """Индекс, открытый через memmap: страницы читаются с диска по мере обращения.
+
+    Пример:
+        build_index(iter_articles("ruwiki.jsonl"), "./knowledge_index")
+        index = KnowledgeIndex("./knowledge_index")
+        article = index.lookup("Что такое машинное обучение?")
+        if article is not None:
+            print(index.title(article), index.body(article))
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        with open(os.path.join(directory, "meta.json"), encoding="utf-8") as file:
+            self.meta = json.load(file)
+        if self.meta.get("version") != INDEX_VERSION:
+            raise ValueError(f"Неподдерживаемая версия индекса {directory}: {self.meta.get('version')}")
+        load = lambda name: np.load(os.path.join(directory, name + ".npy"), mmap_mode="r")  # noqa: E731
+        self._titles = self._blob("titles.bin")
+        self._title_offsets = load("titles_offsets")
+        self._bodies = self._blob("bodies.bin")
+        self._body_offsets = load("bodies_offsets")
+        self._term_hash = load("term_hash")
+        self._term_ids = load("term_ids")
+        self._postings_offsets = load("postings_offsets")
+        self._postings_docs = load("postings_docs")
+        self._postings_impacts = load("postings_impacts")
+        self._by_doc_docs = load("postings_by_doc_docs")
+        self._by_doc_impacts = load("postings_by_doc_impacts")
+        self._title_term_hash = load("title_term_hash")
+        self._title_term_ids = load("title_term_ids")
+        self._edge_keys = load("trie_edge_keys")
+        self._edge_children = load("trie_edge_children")
+        self._fail = load("trie_fail")
+        self._link = load("trie_link")
+        self._depth = load("trie_depth")
+        self._node_article = load("trie_article")
+        self._num_symbols = max(self.meta["title_terms"], 1)
+
+    def _blob(self, name):
+        path = os.path.join(self.directory, name)
+        if os.path.getsize(path) == 0:
+            return np.zeros(0, dtype=np.uint8)  # memmap пустого файла невозможен
+        return np.memmap(path, dtype=np.uint8, mode="r")
+
+    def __len__(self):
+        return self.meta["articles"]
+
+    def title(self, article):
+        start, end = self._title_offsets[article], self._title_offsets[article + 1]
+        return self._titles[start:end].tobytes().decode("utf-8")
+
+    def body(self, article):
+        start, end = self._body_offsets[article], self._body_offsets[article + 1]
+        return self._bodies[start:end].tobytes().decode("utf-8")
+
+    @staticmethod
+    def _find(hashes, ids, term):
+        key = np.uint64(term_hash(term))
+        position = int(np.searchsorted(hashes, key))
+        if position < len(hashes) and hashes[position] == key:
+            return int(ids[position])
+        return -1
+
+    def find_titles(self, query):
+        """Все упоминания заголовков в запросе: [(начало, конец, статья)] в номерах слов.
+
+        Один проход автомата Ахо-Корасик по основам слов запроса.
+        """
+        matches = []
+        node = 0
+        edge_keys, num_symbols = self._edge_keys, self._num_symbols
+        for position, word in enumerate(tokenize(query)):
+            symbol = self._find(self._title_term_hash, self._title_term_ids, normalize_word(word))
+            if symbol < 0:
+                node = 0
+                continue
+            while True:
+                key = node * num_symbols + symbol
+                index = int(np.searchsorted(edge_keys, key))
+                if index < len(edge_keys) and edge_keys[index] == key:
+                    node = int(self._edge_children[index])
+                    break
+                if node == 0:
+                    break
+                node = int(self._fail[node])
+            output = node if self._node_article[node] >= 0 else int(self._link[node])
+            while output >= 0:
+                matches.append((position + 1 - int(self._depth[output]), position + 1, int(self._node_article[output])))
+                output = int(self._link[output])
+        return matches
+
+    def search(self, query, k=5, min_match=0.0, initial_postings=256, max_postings=1_000_000):
+        """Статьи по тексту (BM25): [(статья, оценка)] по убыванию оценки.
+
+        Алгоритм порогов Фагина: списки вхождений читаются с начала (с
+        наибольшего вклада), увиденные статьи оцениваются точно двоичным
+        поиском в списках по номеру статьи, и глубина чтения растет в 4 раза,
+        пока k-я оценка меньше суммы вкладов на текущей глубине - верхней
+        границы для еще не увиденных статей. Для редких терминов хватает
+        одного шага.
+
+        Args:
+            k: Сколько статей вернуть
+            min_match: Доля терминов запроса, которые должны найтись в статье
+            initial_postings: Глубина первого шага
+            max_postings: Наибольшая глубина; если ее не хватило, результат приближенный
+        """
+        terms = {normalize_word(word) for word in tokenize(query) if word not in STOP_WORDS}
+        ranges = []
+        for term in terms:
+            term_id = self._find(self._term_hash, self._term_ids, term)
+            if term_id >= 0:
+                ranges.append((int(self._postings_offsets[term_id]), int(self._postings_offsets[term_id + 1])))
+        if not ranges:
+            return []
+        needed = math.ceil(min_match * len(terms)) if min_match else 0
+        depth, previous = initial_postings, 0
+        candidates = np.empty(0, dtype=self._postings_docs.dtype)
+        scores = np.empty(0, dtype=np.float64)
+        while True:
+            seen, threshold, exhausted = [], 0.0, True
+            for start, end in ranges:
+                cut = min(end, start + depth)
+                seen.append(self._postings_docs[start + previous:cut])
+                if cut < end:
+                    threshold += float(self._postings_impacts[cut])
+                    exhausted = False
+            # Оцениваются только статьи, которых не было на прошлых шагах
+            new = np.setdiff1d(np.concatenate(seen), candidates)
+            new_scores, matched = self._score(new, ranges)
+            eligible = matched >= needed
+            candidates = np.concatenate([candidates, new])
+            scores = np.concatenate([scores, np.where(eligible, new_scores, -np.inf)])
+            top = np.lexsort((candidates, -scores))[:k]  # при равной оценке - меньший номер
+            top = top[np.isfinite(scores[top])]
+            if exhausted or depth >= max_postings or (len(top) == k and scores[top[-1]] >= threshold):
+                return [(int(candidates[i]), float(scores[i])) for i in top]
+            depth, previous = depth * 4, depth
+
+    def _score(self, candidates, ranges):
+        """Точные оценки BM25 и число найденных терминов для статей candidates."""
+        scores = np.zeros(len(candidates), dtype=np.float64)
+        matched = np.zeros(len(candidates), dtype=np.int32)
+        for start, end in ranges:
+            docs = self._by_doc_docs[start:end]
+            positions = np.minimum(np.searchsorted(docs, candidates), end - start - 1)
+            found = docs[positions] == candidates
+            scores[found] += self._by_doc_impacts[start:end][positions[found]]
+            matched += found
+        return scores, matched
+
+    def lookup(self, query, min_match=1.0):
+        """Лучшая статья для запроса или None.
+
+        Сначала самое длинное упоминание заголовка (при равной длине - более
+        раннее), иначе лучшая статья по тексту, содержащая не меньше
+        min_match терминов запроса (по умолчанию все: статья, совпавшая
+        с запросом одним словом, чаще не о том, и лучше ответить "не найдено").
+        """
+        matches = self.find_titles(query)
+        if matches:
+            start, end, article = min(matches, key=lambda match: (match[0] - match[1], match[0]))
+            return article
+        found = self.search(query, k=1, min_match=min_match)
+        return found[0][0] if found else None
+
+
+# --- Демонстрационная база для инструмента search_wikipedia ---
+
+SAMPLE_ARTICLES = [
+    ("Искусственный интеллект", "Искусственный интеллект (ИИ) — это область компьютерных наук, занимающаяся созданием "
+     "программного обеспечения и алгоритмов, наделяющих компьютеры способностью к обучению, рассуждению и принятию "
+     "решений."),
+    ("Машинное обучение", "Машинное обучение — это подраздел искусственного интеллекта, который изучает алгоритмы и "
+     "статистические модели, которые компьютерные системы используют для выполнения задач без явных инструкций."),
+    ("Нейронная сеть", "Нейронная сеть — это вычислительная система, имитирующая работу биологических нейронных сетей "
+     "головного мозга."),
+]
+
+
+@lru_cache(maxsize=1)
+def default_index():
+    """Индекс из каталога KNOWLEDGE_INDEX_DIR или, если он не задан, из SAMPLE_ARTICLES.
+
+    Демонстрационный индекс строится во временном каталоге, который
+    удаляется при выходе.
+    """
+    directory = os.getenv("KNOWLEDGE_INDEX_DIR")
+    if not directory:
+        directory = tempfile.mkdtemp(prefix="knowledge_index_")
+        atexit.register(shutil.rmtree, directory, True)
+        build_index(SAMPLE_ARTICLES, directory)
+    return KnowledgeIndex(directory)
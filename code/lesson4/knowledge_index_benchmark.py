@@ -0,0 +1,199 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Бенчмарк индекса базы знаний
+Генерирует 1 000 000 статей со словами русского вида (основа + падежное
+окончание), строит индекс и открывает его через memmap. Затем измеряет
+задержку find_titles, search и lookup на запросах, где заголовки стоят в
+других падежах, и сравнивает с прежним перебором "заголовок in запрос".
+Найденные автоматом Ахо-Корасик упоминания сверяются с полным перебором
+n-грамм запроса; lookup без заголовка в запросе находит только статьи
+со всеми словами запроса.
+"""
+
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from knowledge_index import KnowledgeIndex, build_index, normalize_word, tokenize
+
+NUM_ARTICLES = 1_000_000
+BODY_WORDS = 30
+NUM_STEMS = 50_000
+NUM_QUERIES = 2000
+LINEAR_QUERIES = 20
+CONSONANTS = "бвгджзклмнпрстфхцчш"
+VOWELS = "аеиоу"
+NOUN_ENDINGS = ["", "а", "у", "ом", "е", "ы", "ов", "ам", "ами", "ах"]
+ADJECTIVE_ENDINGS = ["ый", "ого", "ому", "ым", "ом", "ая", "ой", "ую", "ое", "ые", "ых", "ыми"]
+
+
+def make_stems(rng):
+    """Основы вида согласная-гласная-...-согласная, без повторов."""
+    stems = set()
+    while len(stems) < NUM_STEMS:
+        syllables = rng.integers(2, 4)
+        letters = [CONSONANTS[rng.integers(len(CONSONANTS))] + VOWELS[rng.integers(len(VOWELS))]
+                   for _ in range(syllables)]
+        stems.add("".join(letters) + CONSONANTS[rng.integers(len(CONSONANTS))])
+    return sorted(stems)
+
+
+def make_title(stems, rng, words, inflect=False):
+    """Заголовок: прилагательные и существительное; inflect - другие окончания."""
+    adjective = rng.integers(len(ADJECTIVE_ENDINGS)) if inflect else 0
+    noun = rng.integers(len(NOUN_ENDINGS)) if inflect else 0
+    parts = [stem + ADJECTIVE_ENDINGS[adjective] for stem in words[:-1]] + [words[-1] + NOUN_ENDINGS[noun]]
+    return " ".join(parts).capitalize()
+
+
+def iter_articles(count, stems, title_words, seed=1):
+    rng = np.random.default_rng(seed)
+    endings = np.array(NOUN_ENDINGS)
+    stem_array = np.array(stems)
+    chunk = 10000
+    for start in range(0, count, chunk):
+        size = min(chunk, count - start)
+        ranks = np.minimum(rng.zipf(1.2, size * BODY_WORDS), NUM_STEMS) - 1
+        words = np.char.add(stem_array[ranks], endings[rng.integers(len(endings), size=size * BODY_WORDS)])
+        words = words.reshape(size, BODY_WORDS).tolist()
+        for i in range(size):
+            yield make_title(stems, rng, title_words[start + i]), " ".join(words[i]) + "."
+
+
+def make_title_words(count, stems, rng):
+    lengths = rng.choice([1, 2, 3], size=count, p=[0.3, 0.5, 0.2])
+    picks = rng.integers(len(stems), size=int(lengths.sum())).tolist()
+    result, position = [], 0
+    for length in lengths.tolist():
+        result.append([stems[i] for i in picks[position:position + length]])
+        position += length
+    return result
+
+
+def normalized(text):
+    return tuple(normalize_word(word) for word in tokenize(text))
+
+
+def brute_force_matches(query, titles_by_terms, max_words=3):
+    """Все n-граммы запроса, совпадающие с заголовком."""
+    terms = normalized(query)
+    matches = []
+    for end in range(1, len(terms) + 1):
+        for start in range(max(0, end - max_words), end):
+            article = titles_by_terms.get(terms[start:end])
+            if article is not None:
+                matches.append((start, end, article))
+    return sorted(matches)
+
+
+def percentiles(samples):
+    samples = np.array(samples) * 1e6
+    return f"p50 {np.percentile(samples, 50):7.1f} мкс  p99 {np.percentile(samples, 99):7.1f} мкс"
+
+
+def timed(function, queries):
+    times, results = [], []
+    for query in queries:
+        start = time.perf_counter()
+        results.append(function(query))
+        times.append(time.perf_counter() - start)
+    return times, results
+
+
+def directory_size(directory):
+    return sum(os.path.getsize(os.path.join(directory, name)) for name in os.listdir(directory))
+
+
+def main():
+    """Основная функция."""
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else NUM_ARTICLES
+    rng = np.random.default_rng(0)
+    stems = make_stems(rng)
+    title_words = make_title_words(count, stems, rng)
+    workdir = tempfile.mkdtemp(prefix="knowledge_")
+    try:
+        print(f"Статей: {count}, слов в тексте: {BODY_WORDS}, основ: {NUM_STEMS}")
+        start = time.perf_counter()
+        meta = build_index(iter_articles(count, stems, title_words), workdir)
+        build_time = time.perf_counter() - start
+        print(f"Построение: {build_time:.1f} с, на диске {directory_size(workdir) / 2 ** 20:.0f} МБ, "
+              f"терминов {meta['terms']}, вхождений {meta['postings']}, узлов автомата {meta['trie_nodes']}")
+
+        start = time.perf_counter()
+        index = KnowledgeIndex(workdir)
+        print(f"Открытие через memmap: {(time.perf_counter() - start) * 1000:.1f} мс\n")
+
+        # Запросы: заголовки в других падежах внутри вопроса, иногда два заголовка
+        articles = rng.integers(count, size=NUM_QUERIES)
+        title_queries = []
+        for i, article in enumerate(articles.tolist()):
+            query = f"Что такое {make_title(stems, rng, title_words[article], inflect=True).lower()}?"
+            if i % 4 == 0:
+                other = title_words[int(rng.integers(count))]
+                query = query[:-1] + f" и {make_title(stems, rng, other, inflect=True).lower()}?"
+            title_queries.append(query)
+        # Запросы по тексту: три случайных слова статьи (частые слова - длинные списки вхождений)
+        body_articles = rng.integers(count, size=NUM_QUERIES).tolist()
+        body_queries = []
+        for article in body_articles:
+            words = index.body(article).rstrip(".").split()
+            body_queries.append(" ".join(words[i] for i in rng.choice(len(words), 3, replace=False)))
+
+        # Прогрев страниц memmap, которые нужны любому запросу
+        for query in title_queries[:50] + body_queries[:50]:
+            index.lookup(query)
+
+        title_times, title_results = timed(index.find_titles, title_queries)
+        search_times, search_results = timed(lambda query: index.search(query, k=5), body_queries)
+        lookup_times, lookup_results = timed(index.lookup, title_queries + body_queries)
+        print(f"find_titles (Ахо-Корасик)  {percentiles(title_times)}")
+        print(f"search (BM25, k=5)         {percentiles(search_times)}")
+        print(f"lookup                     {percentiles(lookup_times)}")
+
+        # Прежний способ: проверка каждого заголовка подстрокой запроса
+        lowered_titles = [index.title(i).lower() for i in range(count)]
+        linear_times, linear_found = [], 0
+        for query, article in zip(title_queries[:LINEAR_QUERIES], articles.tolist()):
+            start = time.perf_counter()
+            lowered = query.lower()
+            found = next((i for i, title in enumerate(lowered_titles) if title in lowered), None)
+            linear_times.append(time.perf_counter() - start)
+            linear_found += found is not None and lowered_titles[found] == lowered_titles[article]
+        print(f"перебор заголовков         {percentiles(linear_times)} ({LINEAR_QUERIES} запросов)")
+
+        # Проверки
+        titles_by_terms = {}
+        for i, title in enumerate(lowered_titles):
+            titles_by_terms.setdefault(normalized(title), i)
+        for query, matches in zip(title_queries, title_results):
+            assert sorted(matches) == brute_force_matches(query, titles_by_terms), query
+        found = sum(1 for article, matches in zip(articles.tolist(), title_results)
+                    if any(normalized(index.title(match[2])) == normalized(index.title(article))
+                           for match in matches))
+        # Слова запроса взяты из статьи, так что статья со всеми словами есть; со словом,
+        # которого нет ни в одной статье, lookup находит статью только по заголовку
+        assert all(article is not None for article in lookup_results[len(title_queries):])
+        for query in body_queries[:200]:
+            query += " квазиблорк"
+            assert index.lookup(query) is None or index.find_titles(query), query
+        # Ранняя остановка против полного BM25 по всем вхождениям
+        exact = [index.search(query, k=5, initial_postings=count) for query in body_queries[:200]]
+        same_top = sum(1 for full, early in zip(exact, search_results)
+                       if [doc for doc, _ in full] == [doc for doc, _ in early])
+        print(f"\nУпоминания совпадают с перебором n-грамм во всех {len(title_queries)} запросах")
+        print(f"Заголовок в другом падеже найден: {found / len(title_queries):.1%} "
+              f"(перебор подстрокой: {linear_found / LINEAR_QUERIES:.0%}; остальное - слова, которые "
+              f"стеммер режет как глагол: бабил / бабила)")
+        print(f"Top-5 BM25 с ранней остановкой совпадает с полным перебором вхождений: {same_top / len(exact):.1%}")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,203 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Бенчмарк параллельного вызова инструментов
+Сравнивает ReAct-агента в AgentExecutor (одно действие за запрос к модели)
+с ParallelToolAgent (все независимые вызовы в одном ответе модели) на
+задачах, которым нужно несколько инструментов. Модель заменена
+сценарием на локальной заглушке OpenAI API с задержкой ответа,
+инструменты имитируют задержку внешнего API. Для каждой задачи выводятся
+число запросов к модели и время; результаты инструментов в обоих режимах
+должны совпадать, а инструменты из sequential_tools - выполняться после
+остальных вызовов шага.
+"""
+
+import asyncio
+import os
+import sys
+import time
+
+from langchain_classic.agents import AgentExecutor, create_react_agent
+from langchain_core.prompts import PromptTemplate
+from langchain_core.tools import tool
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from common.llm_client import aclose_http_clients, create_chat_model
+from common.parallel_agent import ParallelToolAgent
+from common.stub_server import StubOpenAIServer
+from agent_example import calculate_expression, get_weather, search_wikipedia
+
+LLM_LATENCY = 0.3
+TOOL_LATENCY = 0.2
+
+REACT_TEMPLATE = """Ты полезный ассистент, который может использовать инструменты для ответа на вопросы.
+
+Доступные инструменты:
+{tools}
+
+Используй следующий формат:
+
+Вопрос: вопрос, на который нужно ответить
+Thought: твой ход мыслей о том, что делать
+Action: действие, которое нужно выполнить, должно быть одним из [{tool_names}]
+Action Input: входные данные для действия
+Observation: результат действия
+... (этот цикл Thought/Action/Action Input/Observation может повторяться N раз)
+Thought: теперь я знаю ответ
+Final Answer: финальный ответ на оригинальный вопрос
+
+Вопрос: {input}
+{agent_scratchpad}"""
+
+# Вопрос -> шаги сценария; вызовы одного шага независимы,
+# следующий шаг зависит от результатов предыдущего
+TASKS = {
+    "Какая погода в Москве?": [
+        [("weather", "city", "Москва")],
+    ],
+    "Какая погода в Париже и что такое машинное обучение?": [
+        [("weather", "city", "Париж"), ("wiki", "query", "машинное обучение")],
+    ],
+    "Сравни погоду в Москве, Санкт-Петербурге, Новосибирске и Екатеринбурге": [
+        [("weather", "city", "Москва"), ("weather", "city", "Санкт-Петербург"),
+         ("weather", "city", "Новосибирск"), ("weather", "city", "Екатеринбург")],
+    ],
+    "Что такое ИИ, машинное обучение и нейронная сеть, и сколько будет 2 ** 10?": [
+        [("wiki", "query", "искусственный интеллект"), ("wiki", "query", "машинное обучение"),
+         ("wiki", "query", "нейронная сеть"), ("calc", "expression", "2 ** 10")],
+    ],
+    "Найди погоду в Москве и Новосибирске, затем посчитай разницу температур и среднюю": [
+        [("weather", "city", "Москва"), ("weather", "city", "Новосибирск")],
+        [("calc", "expression", "22 - 15"), ("calc", "expression", "(22 + 15) / 2")],
+    ],
+}
+
+
+def slow(base_tool, name):
+    """Инструмент с задержкой внешнего API поверх инструмента из agent_example."""
+    def run(*args, **kwargs):
+        time.sleep(TOOL_LATENCY)
+        # ReAct передает строку из Action Input, вызов функций - именованные аргументы
+        return base_tool.invoke(args[0] if args else kwargs)
+
+    return tool(name, description=base_tool.description, args_schema=base_tool.args_schema)(run)
+
+
+TOOLS = [slow(get_weather, "weather"), slow(search_wikipedia, "wiki"), slow(calculate_expression, "calc")]
+
+
+def find_task(text):
+    for question, steps in TASKS.items():
+        if question in text:
+            return steps
+    raise ValueError(f"Нет сценария для запроса: {text[:80]}")
+
+
+def react_responder(messages):
+    """ReAct: одно действие за ответ; номер действия - число наблюдений в промпте."""
+    prompt = messages[-1]["content"]
+    calls = [call for step in find_task(prompt) for call in step]
+    done = prompt.count("Observation:") - 1  # одно вхождение - в описании формата
+    if done < len(calls):
+        name, _, value = calls[done]
+        return f"Thought: нужен инструмент {name}\nAction: {name}\nAction Input: {value}"
+    return "Thought: теперь я знаю ответ\nFinal Answer: готово"
+
+
+def tool_calling_responder(messages):
+    """Вызов функций: все вызовы шага в одном ответе."""
+    question = next(message["content"] for message in messages if message["role"] == "user")
+    steps = find_task(question)
+    done = sum(1 for message in messages if message["role"] == "assistant" and message.get("tool_calls"))
+    if done < len(steps):
+        return {"content": None, "tool_calls": [{"name": name, "args": {argument: value}}
+                                                for name, argument, value in steps[done]]}
+    return "готово"
+
+
+def observations(steps):
+    return sorted(str(observation) for _, observation in steps)
+
+
+def run_mode(name, server, run):
+    print(f"\n=== {name} ===")
+    print(f"{'Задача':<44} {'Запросов':>9} {'Время':>9}")
+    total_requests = total_time = 0
+    results = {}
+    for question in TASKS:
+        server.reset_stats()
+        start = time.perf_counter()
+        result = run(question)
+        elapsed = time.perf_counter() - start
+        requests = server.stats["requests"]
+        total_requests += requests
+        total_time += elapsed
+        results[question] = observations(result["intermediate_steps"])
+        print(f"{question[:44]:<44} {requests:>9} {elapsed:>8.2f} с", flush=True)
+    print(f"{'Всего':<44} {total_requests:>9} {total_time:>8.2f} с")
+    return total_requests, total_time, results
+
+
+def check_sequential_tools(llm):
+    """Заказ из sequential_tools выполняется после проверок остатка из того же ответа модели."""
+    events = []
+
+    @tool
+    def check_stock(product_id: str) -> str:
+        """Остаток товара."""
+        time.sleep(TOOL_LATENCY)
+        events.append("check")
+        return f"Товар {product_id}: 5 шт."
+
+    @tool
+    def process_order(product_id: str) -> str:
+        """Заказ товара."""
+        events.append("order")
+        return f"Заказ на товар {product_id} оформлен"
+
+    agent = ParallelToolAgent(llm, [check_stock, process_order], sequential_tools=["process_order"])
+    calls = [{"name": "process_order", "args": {"product_id": "1"}},
+             {"name": "check_stock", "args": {"product_id": "1"}},
+             {"name": "check_stock", "args": {"product_id": "2"}}]
+    expected = ["Заказ на товар 1 оформлен", "Товар 1: 5 шт.", "Товар 2: 5 шт."]
+    for run in (agent._run_tools, lambda calls: asyncio.run(agent._arun_tools(calls))):
+        events.clear()
+        assert run(calls) == expected
+        assert events == ["check", "check", "order"], events
+    agent._pool.shutdown()
+    print("Инструменты из sequential_tools выполняются после остальных вызовов шага")
+
+
+def main():
+    """Основная функция."""
+    calls = sum(len(step) for steps in TASKS.values() for step in steps)
+    print(f"Задач: {len(TASKS)}, вызовов инструментов: {calls}, "
+          f"задержка модели {LLM_LATENCY} с, инструмента {TOOL_LATENCY} с")
+
+    with StubOpenAIServer(latency=LLM_LATENCY, responder=react_responder) as server:
+        llm = create_chat_model(api_key="stub", base_url=server.base_url)
+        agent = create_react_agent(llm, TOOLS, PromptTemplate.from_template(REACT_TEMPLATE))
+        executor = AgentExecutor(agent=agent, tools=TOOLS, return_intermediate_steps=True)
+        react = run_mode("ReAct, AgentExecutor", server, lambda question: executor.invoke({"input": question}))
+
+        server.responder = tool_calling_responder
+        parallel_agent = ParallelToolAgent(llm, TOOLS)
+        parallel = run_mode("ParallelToolAgent.invoke (пул потоков)", server, parallel_agent.invoke)
+        # Один цикл событий на все задачи: общий асинхронный HTTP-клиент привязан к циклу
+        loop = asyncio.new_event_loop()
+        async_parallel = run_mode("ParallelToolAgent.ainvoke (asyncio)", server,
+                                  lambda question: loop.run_until_complete(parallel_agent.ainvoke(question)))
+        loop.run_until_complete(aclose_http_clients())
+        loop.close()
+
+    print()
+    for name, (requests, seconds, results) in (("invoke", parallel), ("ainvoke", async_parallel)):
+        assert results == react[2], f"Результаты инструментов {name} отличаются от ReAct"
+        print(f"ParallelToolAgent.{name}: запросов к модели {requests} вместо {react[0]}, "
+              f"время {seconds:.2f} с вместо {react[1]:.2f} с ({react[1] / seconds:.1f}x)")
+    print("Результаты инструментов совпадают с ReAct")
+    check_sequential_tools(llm)
+
+
+if __name__ == "__main__":
+    main()
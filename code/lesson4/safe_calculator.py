@@ -0,0 +1,338 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Безопасный калькулятор арифметических выражений
+Вместо eval выражение разбирается парсером Пратта и компилируется в
+байткод для маленькой стековой машины. Числа из выражения вынимаются до
+разбора, а разбирается только шаблон ("# * # - #"), поэтому
+"15 * 4 - 10" и "3 * 2 - 1" используют одну скомпилированную программу
+из LRU-кэша.
+
+Ограничения:
+    MAX_LENGTH  - длина выражения в символах
+    MAX_DEPTH   - вложенность скобок, вызовов и унарных операций
+    MAX_VALUE   - модуль чисел в выражении и результата
+Вычисление идет в float64: нет целых произвольной точности, поэтому
+"9**9**9" сразу дает ошибку переполнения, а не считается минутами. Циклов в
+байткоде нет, время вычисления ограничено длиной выражения; для пакета
+выражений есть timeout.
+
+evaluate_batch группирует выражения по шаблону и вычисляет каждую группу
+одним проходом программы над столбцами NumPy.
+"""
+
+import math
+import operator
+import re
+import time
+from functools import lru_cache
+
+import numpy as np
+
+MAX_LENGTH = 2000
+MAX_DEPTH = 64
+MAX_VALUE = 1e100
+
+# Число не может начинаться сразу после буквы: "log10" - имя функции.
+# Группа нужна для split: числа и текст между ними за один проход
+_NUMBER_RE = re.compile(r"((?<!\w)[\d.]+(?:[eE][+-]?\d+)?)")
+_TEMPLATE_TOKEN_RE = re.compile(r"\*\*|//|#|[A-Za-z_]\w*|\S")
+
+# Коды операций байткода
+CONST, NAME, UNARY, BINARY, CALL = range(5)
+
+CONSTANTS = {"pi": math.pi, "e": math.e}
+
+# Имя: (число аргументов, функция для float, функция для массивов)
+FUNCTIONS = {
+    "abs": (1, abs, np.abs),
+    "sqrt": (1, math.sqrt, np.sqrt),
+    "exp": (1, math.exp, np.exp),
+    "log": (1, math.log, np.log),
+    "log10": (1, math.log10, np.log10),
+    "sin": (1, math.sin, np.sin),
+    "cos": (1, math.cos, np.cos),
+    "tan": (1, math.tan, np.tan),
+    "round": (1, round, np.round),
+    "min": (2, min, np.minimum),
+    "max": (2, max, np.maximum),
+}
+
+# Оператор: (сила связывания, правоассоциативный)
+_BINARY_POWER = {
+    "+": (10, False), "-": (10, False),
+    "*": (20, False), "/": (20, False), "//": (20, False), "%": (20, False),
+    "**": (30, True), "^": (30, True),
+}
+# Унарный минус слабее степени: -2**2 = -4, как в Python
+_UNARY_POWER = 25
+
+_SCALAR_BINARY = {
+    "+": operator.add, "-": operator.sub, "*": operator.mul, "/": operator.truediv,
+    "//": operator.floordiv, "%": operator.mod, "**": math.pow, "^": math.pow,
+}
+_DIVISIONS = frozenset(("/", "//", "%"))
+_ARRAY_BINARY = {
+    "+": np.add, "-": np.subtract, "*": np.multiply, "/": np.true_divide,
+    "//": np.floor_divide, "%": np.remainder, "**": np.power, "^": np.power,
+}
+
+
+class CalculatorError(ValueError):
+    """Ошибка разбора или вычисления выражения."""
+
+
+class _Parser:
+    """Парсер Пратта: шаблон выражения -> байткод в обратной польской записи."""
+
+    def __init__(self, template, max_depth):
+        self.tokens = _TEMPLATE_TOKEN_RE.findall(template)
+        self.position = 0
+        self.max_depth = max_depth
+        self.depth = 0
+        self.constants = 0
+        self.code = []
+
+    def parse(self):
+        if not self.tokens:
+            raise CalculatorError("Пустое выражение")
+        self.expression(0)
+        if self.position < len(self.tokens):
+            token = self.tokens[self.position]
+            raise CalculatorError("Лишнее число" if token == "#" else f"Лишний символ '{token}'")
+        return tuple(self.code)
+
+    def peek(self):
+        return self.tokens[self.position] if self.position < len(self.tokens) else None
+
+    def next(self):
+        token = self.peek()
+        if token is None:
+            raise CalculatorError("Неожиданный конец выражения")
+        self.position += 1
+        return token
+
+    def expect(self, token):
+        if self.next() != token:
+            raise CalculatorError(f"Ожидалось '{token}'")
+
+    def expression(self, min_power):
+        self.depth += 1
+        if self.depth > self.max_depth:
+            raise CalculatorError(f"Слишком глубокая вложенность (больше {self.max_depth})")
+        self.prefix()
+        while True:
+            token = self.peek()
+            if token not in _BINARY_POWER:
+                break
+            power, right = _BINARY_POWER[token]
+            if power <= min_power:
+                break
+            self.position += 1
+            self.expression(power - 1 if right else power)
+            self.code.append((BINARY, token))
+        self.depth -= 1
+
+    def prefix(self):
+        token = self.next()
+        if token == "#":
+            self.code.append((CONST, self.constants))
+            self.constants += 1
+        elif token in ("-", "+"):
+            self.expression(_UNARY_POWER)
+            if token == "-":
+                self.code.append((UNARY, "-"))
+        elif token == "(":
+            self.expression(0)
+            self.expect(")")
+        elif token in FUNCTIONS:
+            arity = FUNCTIONS[token][0]
+            self.expect("(")
+            for i in range(arity):
+                if i:
+                    self.expect(",")
+                self.expression(0)
+            self.expect(")")
+            self.code.append((CALL, token))
+        elif token in CONSTANTS:
+            self.code.append((NAME, token))
+        elif token[0].isalpha() or token[0] == "_":
+            raise CalculatorError(f"Неизвестное имя '{token}'")
+        else:
+            raise CalculatorError(f"Недопустимый символ '{token}'")
+
+
+@lru_cache(maxsize=4096)
+def compile_template(template, max_depth=MAX_DEPTH):
+    """Байткод шаблона выражения (числа заменены на #); результат кэшируется."""
+    return _Parser(template, max_depth).parse()
+
+
+def split_expression(expression, max_length=MAX_LENGTH):
+    """Выражение -> (шаблон без пробелов, числа строками в порядке появления)."""
+    if len(expression) > max_length:
+        raise CalculatorError(f"Выражение длиннее {max_length} символов")
+    parts = _NUMBER_RE.split(expression)
+    return "".join("#".join(parts[::2]).split()), parts[1::2]
+
+
+def _parse_numbers(numbers, max_value):
+    try:
+        constants = [float(number) for number in numbers]
+    except ValueError:
+        raise CalculatorError("Некорректная запись числа") from None
+    if any(value > max_value for value in constants):
+        raise CalculatorError(f"Число в выражении больше {max_value:g}")
+    return constants
+
+
+@lru_cache(maxsize=65536)
+def compile_expression(expression, max_length=MAX_LENGTH, max_depth=MAX_DEPTH, max_value=MAX_VALUE):
+    """(байткод, числа) выражения; повторное выражение берется из кэша."""
+    template, numbers = split_expression(expression, max_length)
+    return compile_template(template, max_depth), tuple(_parse_numbers(numbers, max_value))
+
+
+def _run(code, constants, binary, slot, negate, suspect=None):
+    """Стековая машина; slot - 1 для float, 2 для массивов (столбец FUNCTIONS).
+
+    suspect - маска строк для массивов: в ней отмечаются строки, где
+    промежуточный результат не конечен или делитель равен нулю (там, где
+    evaluate мог бы выдать ошибку).
+    """
+    stack = []
+    push = stack.append
+    pop = stack.pop
+    for op, argument in code:
+        if op == CONST:
+            push(constants[argument])
+        elif op == BINARY:
+            right = pop()
+            result = binary[argument](pop(), right)
+            if suspect is not None:
+                suspect |= ~np.isfinite(result)
+                if argument in _DIVISIONS:
+                    suspect |= right == 0
+            push(result)
+        elif op == CALL:
+            function = FUNCTIONS[argument][slot]
+            if FUNCTIONS[argument][0] == 1:
+                result = function(pop())
+            else:
+                right = pop()
+                result = function(pop(), right)
+            if suspect is not None:
+                suspect |= ~np.isfinite(result)
+            push(result)
+        elif op == UNARY:
+            push(negate(pop()))
+        else:
+            push(CONSTANTS[argument])
+    return stack[0]
+
+
+def evaluate(expression, max_length=MAX_LENGTH, max_depth=MAX_DEPTH, max_value=MAX_VALUE):
+    """Значение выражения как float.
+
+    Поддерживаются + - * / // % ** (и ^ как степень), скобки, унарный
+    минус, константы pi и e и функции из FUNCTIONS.
+
+    Raises:
+        CalculatorError: выражение некорректно, превышены ограничения или
+            результат не определен (деление на ноль, переполнение)
+    """
+    code, constants = compile_expression(expression, max_length, max_depth, max_value)
+    try:
+        result = _run(code, constants, _SCALAR_BINARY, 1, operator.neg)
+    except ZeroDivisionError:
+        raise CalculatorError("Деление на ноль") from None
+    except OverflowError:
+        raise CalculatorError("Слишком большой результат") from None
+    except ValueError as error:
+        raise CalculatorError(f"Недопустимый аргумент: {error}") from None
+    result = float(result)
+    if not math.isfinite(result) or abs(result) > max_value:
+        raise CalculatorError("Слишком большой или неопределенный результат")
+    return result
+
+
+def evaluate_batch(expressions, max_length=MAX_LENGTH, max_depth=MAX_DEPTH, max_value=MAX_VALUE, timeout=None):
+    """Значения многих выражений: выражения с одинаковым шаблоном считаются вместе на NumPy.
+
+    Возвращает (values, errors): массив float64 (nan для ошибок) и словарь
+    номер выражения -> текст ошибки. Одинаковые выражения вычисляются один
+    раз. Строки, где по пути получилось переполнение или деление на ноль,
+    пересчитываются через evaluate, поэтому ошибки те же, что у evaluate.
+    Если задан timeout (секунды), группы, до которых не дошла очередь,
+    получают ошибку превышения времени.
+    """
+    deadline = time.perf_counter() + timeout if timeout is not None else None
+    unique = {}
+    inverse = np.fromiter((unique.setdefault(expression, len(unique)) for expression in expressions),
+                          dtype=np.int64, count=len(expressions))
+    values = np.full(len(unique), np.nan)
+    errors = {}
+    groups = {}
+    expressions_by_index = list(unique)
+    for index, expression in enumerate(expressions_by_index):
+        try:
+            template, numbers = split_expression(expression, max_length)
+        except CalculatorError as error:
+            errors[index] = str(error)
+            continue
+        group = groups.get(template)
+        if group is None:
+            group = groups[template] = ([], [])
+        group[0].append(index)
+        group[1].append(numbers)
+
+    for template, (indices, numbers) in groups.items():
+        if deadline is not None and time.perf_counter() > deadline:
+            errors.update(dict.fromkeys(indices, "Превышено время вычисления"))
+            continue
+        try:
+            code = compile_template(template, max_depth)
+        except CalculatorError as error:
+            errors.update(dict.fromkeys(indices, str(error)))
+            continue
+        indices, constants = _group_constants(indices, numbers, max_value, errors)
+        if not len(indices):
+            continue
+        suspect = np.zeros(len(indices), dtype=bool)
+        with np.errstate(all="ignore"):
+            result = _run(code, constants.T, _ARRAY_BINARY, 2, np.negative, suspect)
+        result = np.broadcast_to(np.asarray(result, dtype=np.float64), indices.shape)
+        suspect |= ~np.isfinite(result) | (np.abs(result) > max_value)
+        values[indices[~suspect]] = result[~suspect]
+        # Переполнение или деление на ноль по пути: такие строки считаются
+        # через evaluate, чтобы ошибки (и их тексты) совпадали
+        for index in indices[suspect].tolist():
+            try:
+                values[index] = evaluate(expressions_by_index[index], max_length, max_depth, max_value)
+            except CalculatorError as error:
+                errors[index] = str(error)
+
+    if len(unique) == len(expressions):
+        return values, errors
+    return values[inverse], {index: errors[row] for index, row in enumerate(inverse.tolist()) if row in errors}
+
+
+def _group_constants(indices, numbers, max_value, errors):
+    """Числа группы матрицей (выражения, числа); строки с ошибками уходят в errors."""
+    indices = np.array(indices)
+    try:
+        constants = np.array(numbers, dtype=np.float64).reshape(len(indices), len(numbers[0]))
+    except ValueError:
+        # Есть некорректная запись числа: разбираем построчно
+        rows = []
+        for index, row in zip(indices.tolist(), numbers):
+            try:
+                rows.append(_parse_numbers(row, np.inf))
+            except CalculatorError as error:
+                errors[index] = str(error)
+                rows.append([np.nan] * len(row))
+        constants = np.array(rows, dtype=np.float64).reshape(len(indices), len(numbers[0]))
+    large = (np.abs(constants) > max_value).any(axis=1)
+    errors.update(dict.fromkeys(indices[large].tolist(), f"Число в выражении больше {max_value:g}"))
+    keep = ~large & ~np.isnan(constants).any(axis=1)
+    return indices[keep], constants[keep]
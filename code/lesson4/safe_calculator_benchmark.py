@@ -0,0 +1,182 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Бенчмарк безопасного калькулятора
+Сравнивает прежнюю реализацию calculate_expression (проверка символов и
+eval) с safe_calculator на 1 000 000 выражений: арифметика на 40 шаблонах
+со случайными числами, часть выражений повторяется дословно (агент часто
+присылает одно и то же), часть с функциями и ошибками. Проверяет, что
+результаты совпадают, что evaluate_batch выдает те же значения и ошибки,
+что evaluate, на случайных выражениях с переполнениями и делением на ноль,
+и показывает выражения, на которых eval падает или зависает (в отдельном
+процессе с таймаутом).
+"""
+
+import subprocess
+import sys
+import time
+
+import numpy as np
+
+from safe_calculator import CalculatorError, compile_expression, compile_template, evaluate, evaluate_batch
+
+NUM_EXPRESSIONS = 1_000_000
+# Доля дословных повторов из небольшого набора
+REPEATED_SHARE = 0.3
+# Доля выражений с функциями (прежняя реализация их не принимает)
+FUNCTION_SHARE = 0.1
+EVAL_TIMEOUT = 5
+ARITHMETIC = [
+    "{} + {}", "{} - {} * {}", "({} + {}) * {}", "{} / {} + {}", "{} * {} - {} / {}", "({} - {}) / ({} + {})",
+    "{} ** 2 + {}", "-{} + {} * ({} - {})", "{} // {} + {} % {}", "{} * ({} + {} * ({} - {}))",
+]
+FUNCTIONS = ["sqrt({}) * {}", "max({}, {}) - min({}, {})", "pi * {} ** 2", "log10({}) + abs({} - {})"]
+# Выражения, которые не разбираются или не вычисляются
+INVALID = ["{} / 0", "{} +", "({} * {}", "{} $ {}"]
+
+
+def old_calculate(expression):
+    """Тело прежнего calculate_expression без декоратора @tool."""
+    try:
+        allowed_chars = set('0123456789+-*/(). ')
+        if not all(c in allowed_chars for c in expression):
+            raise ValueError("Выражение содержит недопустимые символы")
+        result = eval(expression)
+        return float(result)
+    except Exception as e:
+        return f"Ошибка при вычислении: {str(e)}"
+
+
+def new_calculate(expression):
+    try:
+        return evaluate(expression)
+    except CalculatorError as e:
+        return f"Ошибка при вычислении: {str(e)}"
+
+
+def number(rng):
+    if rng.random() < 0.7:
+        return str(rng.integers(1, 1000))
+    return f"{rng.random() * 100:.2f}"
+
+
+def fill(template, rng):
+    return template.format(*(number(rng) for _ in range(template.count("{}"))))
+
+
+def make_expressions(count, seed=0):
+    rng = np.random.default_rng(seed)
+    templates = []
+    for template in ARITHMETIC:
+        # Варианты записи одного шаблона: с пробелами и без
+        templates += [template, template.replace(" ", ""), "(" + template + ")", template + " * 1"]
+    repeated = [fill(templates[i % len(templates)], rng) for i in range(1000)]
+    expressions = []
+    for _ in range(count):
+        roll = rng.random()
+        if roll < REPEATED_SHARE:
+            expressions.append(repeated[rng.integers(len(repeated))])
+        elif roll < REPEATED_SHARE + FUNCTION_SHARE:
+            expressions.append(fill(FUNCTIONS[rng.integers(len(FUNCTIONS))], rng))
+        elif roll < REPEATED_SHARE + FUNCTION_SHARE + 0.01:
+            expressions.append(fill(INVALID[rng.integers(len(INVALID))], rng))
+        else:
+            expressions.append(fill(templates[rng.integers(len(templates))], rng))
+    return expressions
+
+
+def measure(name, function, expressions):
+    start = time.perf_counter()
+    results = function(expressions)
+    elapsed = time.perf_counter() - start
+    print(f"{name:<32} {elapsed:>7.2f} с {len(expressions) / elapsed / 1000:>8.0f} тыс./с", flush=True)
+    return results
+
+
+def as_values(results):
+    return np.array([value if isinstance(value, float) else np.nan for value in results])
+
+
+def compare(name, reference, values):
+    both = ~np.isnan(reference) & ~np.isnan(values)
+    close = np.isclose(reference[both], values[both], rtol=1e-9)
+    print(f"{name}: совпадают {close.sum()} из {both.sum()} значений, "
+          f"ошибок {np.isnan(values).sum()} (у eval {np.isnan(reference).sum()})")
+
+
+def random_expression(rng, operators=("+", "-", "*", "/", "//", "%", "**")):
+    """Случайное выражение из 3-6 чисел: степени дают переполнения, % и // - деление на ноль."""
+    parts = [f"{rng.random() * 10:.{rng.integers(0, 3)}f}"]
+    for _ in range(rng.integers(2, 6)):
+        parts += [operators[rng.integers(len(operators))], f"{rng.random() * 10:.{rng.integers(0, 3)}f}"]
+    expression = " ".join(parts)
+    if rng.random() < 0.2:
+        expression = f"{('sqrt', 'log', 'exp', 'round', 'tan')[rng.integers(5)]}({expression})"
+    return expression
+
+
+def check_batch_errors(count=20_000, seed=2):
+    """evaluate_batch выдает те же ошибки, что evaluate (в том числе на промежуточных переполнениях)."""
+    rng = np.random.default_rng(seed)
+    expressions = [random_expression(rng) for _ in range(count)]
+    values, errors = evaluate_batch(expressions)
+    error_mismatches = value_mismatches = 0
+    for index, expression in enumerate(expressions):
+        try:
+            expected, expected_error = evaluate(expression), None
+        except CalculatorError as error:
+            expected, expected_error = None, str(error)
+        if errors.get(index) != expected_error:
+            error_mismatches += 1
+        elif expected is not None and not np.isclose(values[index], expected, rtol=1e-9, atol=0):
+            value_mismatches += 1
+    assert error_mismatches == 0, f"Ошибки evaluate_batch и evaluate расходятся в {error_mismatches} из {count}"
+    # pow в NumPy (SIMD) и math.pow могут отличаться в последнем бите; после
+    # остатка от деления огромной степени это уже заметная разница
+    print(f"\nОшибки evaluate_batch совпадают с evaluate на {count} случайных выражениях "
+          f"(ошибок {len(errors)}); значения расходятся в {value_mismatches} плохо обусловленных")
+
+
+def check_dangerous():
+    print("\n=== Опасные выражения ===")
+    cases = [("9**9**9", "9**9**9"), ("300 скобок", "(" * 300 + "1" + ")" * 300),
+             ("100 000 унарных минусов", "-" * 100_000 + "1"), ("200 000 сложений", "1" + "+1" * 200_000)]
+    for name, expression in cases:
+        code = "import sys; from safe_calculator_benchmark import old_calculate; print(old_calculate(sys.stdin.read()))"
+        start = time.perf_counter()
+        try:
+            output = subprocess.run([sys.executable, "-c", code], input=expression, capture_output=True, text=True,
+                                    timeout=EVAL_TIMEOUT, cwd=sys.path[0]).stdout.strip()[:80]
+        except subprocess.TimeoutExpired:
+            output = f"не завершилось за {EVAL_TIMEOUT} с"
+        old_time = time.perf_counter() - start
+        start = time.perf_counter()
+        result = new_calculate(expression)
+        new_time = time.perf_counter() - start
+        print(f"{name}:\n  eval: {output} ({old_time:.2f} с, с запуском процесса)\n"
+              f"  safe_calculator: {result} ({new_time * 1000:.2f} мс)")
+
+
+def main():
+    """Основная функция."""
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else NUM_EXPRESSIONS
+    expressions = make_expressions(count)
+    print(f"Выражений: {len(expressions)}, различных: {len(set(expressions))}\n")
+
+    print(f"{'Способ':<32} {'Время':>9} {'Скорость':>13}")
+    reference = as_values(measure("eval (прежняя реализация)", lambda items: [old_calculate(e) for e in items],
+                                  expressions))
+    scalar = as_values(measure("evaluate", lambda items: [new_calculate(e) for e in items], expressions))
+    batch, _ = measure("evaluate_batch (NumPy)", evaluate_batch, expressions)
+    print()
+    for name, cache in (("Кэш выражений", compile_expression), ("Кэш программ шаблонов", compile_template)):
+        info = cache.cache_info()
+        print(f"{name}: {info.currsize} записей, {info.hits / (info.hits + info.misses):.1%} попаданий")
+    compare("evaluate", reference, scalar)
+    compare("evaluate_batch", reference, batch)
+    check_batch_errors()
+    check_dangerous()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,286 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Бенчмарк кэша результатов инструментов
+Проигрывает сессии агента (погода, Википедия, карточки клиентов CRM и
+изменения их статуса) с задержкой внешнего API без кэша и с ToolCache.
+Проверяет, что каждый результат из кэша совпадает с ответом API в тот же
+момент, и отдельно - нормализацию аргументов, TTL, вытеснение LRU, сброс
+по тегам и чтение, которое шло одновременно со сбросом.
+"""
+
+import asyncio
+import os
+import sys
+import threading
+import time
+
+import numpy as np
+from langchain_core.tools import StructuredTool, Tool, tool
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from common.tool_cache import ToolCache, normalize_text
+
+NUM_SESSIONS = 300
+CALLS_PER_SESSION = 10
+API_LATENCY = 0.005
+UPDATE_SHARE = 0.05
+CITIES = ["Москва", "Санкт-Петербург", "Новосибирск", "Екатеринбург", "Казань", "Париж", "Берлин", "Лондон",
+          "Рим", "Мадрид", "Прага", "Вена", "Варшава", "Рига", "Минск", "Киев", "Тбилиси", "Ереван", "Баку", "Сочи"]
+TOPICS = [f"тема {i}" for i in range(30)]
+NUM_CUSTOMERS = 50
+
+
+class FakeClock:
+    """Время, которое двигает сам тест."""
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class Backend:
+    """Внешние API с задержкой и счетчиком вызовов."""
+
+    def __init__(self, latency=API_LATENCY):
+        self.latency = latency
+        self.calls = 0
+        self.statuses = {str(i): "Regular" for i in range(NUM_CUSTOMERS)}
+
+    def _request(self):
+        self.calls += 1
+        if self.latency:
+            time.sleep(self.latency)
+
+    def weather(self, city):
+        self._request()
+        return f"В городе {city} {len(city) * 3 % 25}°C"
+
+    def wiki(self, query):
+        self._request()
+        return f"Статья: {query.lower()}"
+
+    def customer(self, customer_id):
+        self._request()
+        return f"Customer {customer_id}: {self.statuses.get(customer_id, 'not found')}"
+
+    def update(self, argument):
+        self._request()
+        customer_id, status = argument.split(",")
+        self.statuses[customer_id] = status
+        return f"Customer {customer_id} status updated to {status}"
+
+
+def make_tools(backend, cache=None):
+    tools = {
+        "weather": Tool(name="get_weather", func=backend.weather, description="Погода в городе"),
+        "wiki": Tool(name="search_wikipedia", func=backend.wiki, description="Поиск в Википедии"),
+        "customer": Tool(name="GetCustomerInfo", func=backend.customer, description="Клиент по ID"),
+        "update": Tool(name="UpdateCustomerStatus", func=backend.update, description="customer_id,status"),
+    }
+    if cache is not None:
+        tools["weather"] = cache.cached(ttl=600)(tools["weather"])
+        tools["wiki"] = cache.cached(ttl=3600, normalize=str.lower)(tools["wiki"])
+        tools["customer"] = cache.cached(ttl=60, tags=lambda customer_id: [f"customer:{customer_id}"])(
+            tools["customer"])
+        tools["update"] = cache.invalidates(lambda x: [f"customer:{x.split(',')[0]}"])(tools["update"])
+    return tools
+
+
+def make_workload(seed=0):
+    """Сессии агента: вызовы (инструмент, аргумент), популярные аргументы повторяются чаще."""
+    rng = np.random.default_rng(seed)
+
+    def popular(items):
+        return items[min(int(rng.zipf(1.3)) - 1, len(items) - 1)]
+
+    calls = []
+    for _ in range(NUM_SESSIONS):
+        for _ in range(CALLS_PER_SESSION):
+            roll = rng.random()
+            if roll < UPDATE_SHARE:
+                calls.append(("update", f"{rng.integers(NUM_CUSTOMERS)},{rng.choice(['VIP', 'Regular', 'Blocked'])}"))
+            elif roll < 0.4:
+                calls.append(("customer", str(popular(list(range(NUM_CUSTOMERS))))))
+            elif roll < 0.75:
+                city = popular(CITIES)
+                calls.append(("weather", city))
+            else:
+                topic = popular(TOPICS)
+                calls.append(("wiki", topic.upper() if rng.random() < 0.3 else topic))
+    return calls
+
+
+def run_workload(calls, tools, clock=None):
+    results = []
+    start = time.perf_counter()
+    for i, (name, argument) in enumerate(calls):
+        if clock is not None:
+            clock.now = i * 0.1  # ~10 вызовов инструментов в секунду
+        results.append(tools[name].invoke(argument))
+    return results, time.perf_counter() - start
+
+
+def check(name, condition):
+    print(f"  {'OK ' if condition else 'FAIL'} {name}")
+    assert condition, name
+
+
+def check_normalization():
+    backend = Backend(latency=0)
+    cache = ToolCache()
+    tools = make_tools(backend, cache)
+    tools["wiki"].invoke("Машинное обучение")
+    tools["wiki"].invoke("машинное обучение")
+    check("регистр запроса к Википедии не важен (str.lower)", backend.calls == 1)
+    tools["weather"].invoke("москва")
+    tools["weather"].invoke("Москва")
+    check("без normalize разные аргументы - разные записи", backend.calls == 3)
+
+    calls = []
+
+    @cache.cached(normalize=normalize_text)
+    @tool
+    def route(origin: str, destination: str) -> str:
+        """Маршрут между городами."""
+        calls.append((origin, destination))
+        return f"{origin.strip().lower()} -> {destination.strip().lower()}"
+
+    route.invoke({"origin": "Москва", "destination": "Казань"})
+    route.invoke({"destination": " казань ", "origin": "МОСКВА"})
+    check("порядок именованных аргументов и пробелы (normalize_text)", len(calls) == 1)
+
+
+def check_ttl_and_lru():
+    backend = Backend(latency=0)
+    clock = FakeClock()
+    cache = ToolCache(max_entries=2, clock=clock)
+    tools = make_tools(backend, cache)
+    tools["weather"].invoke("Москва")
+    clock.now = 599
+    tools["weather"].invoke("Москва")
+    check("запись жива до истечения ttl", backend.calls == 1)
+    clock.now = 601
+    tools["weather"].invoke("Москва")
+    check("после ttl инструмент вызывается снова", backend.calls == 2)
+    tools["weather"].invoke("Париж")
+    tools["weather"].invoke("Москва")  # Москва свежее Парижа
+    tools["weather"].invoke("Рим")     # вытесняет Париж
+    tools["weather"].invoke("Москва")
+    check("вытесняется давно не использованная запись", backend.calls == 4 and len(cache) == 2)
+    tools["weather"].invoke("Париж")
+    check("вытесненная запись запрашивается заново", backend.calls == 5)
+    stats = cache.stats()["get_weather"]
+    check("счетчики expirations и evictions", stats["expirations"] == 1 and stats["evictions"] == 2)
+
+
+def check_invalidation():
+    backend = Backend(latency=0)
+    cache = ToolCache()
+    tools = make_tools(backend, cache)
+    tools["customer"].invoke("1")
+    tools["customer"].invoke("2")
+    tools["update"].invoke("1,VIP")
+    check("после изменения клиент 1 читается заново",
+          tools["customer"].invoke("1") == "Customer 1: VIP" and backend.calls == 4)
+    tools["customer"].invoke("2")
+    check("клиент 2 остался в кэше", backend.calls == 4)
+
+    cache.invalidate("GetCustomerInfo")
+    tools["customer"].invoke("2")
+    check("сброс по имени инструмента удаляет все его записи", backend.calls == 5)
+
+    # Изменение с ошибкой тоже сбрасывает кэш: оно могло частично примениться
+    failing = cache.invalidates("customer:2")(Tool(name="Broken", func=lambda x: 1 / 0, description="ошибка"))
+    try:
+        failing.invoke("x")
+    except ZeroDivisionError:
+        pass
+    tools["customer"].invoke("2")
+    check("изменение с ошибкой сбрасывает теги", backend.calls == 6)
+
+
+def check_concurrent_invalidation():
+    """Чтение началось до изменения и закончилось после: его результат не сохраняется."""
+    cache = ToolCache()
+    statuses = {"1": "Regular"}
+    reading = threading.Event()
+    release = threading.Event()
+    calls = []
+
+    def read(customer_id):
+        calls.append(customer_id)
+        value = statuses[customer_id]
+        if len(calls) == 1:
+            reading.set()
+            release.wait()
+        return value
+
+    reader = cache.cached(tags=lambda customer_id: [f"customer:{customer_id}"])(
+        Tool(name="GetCustomerInfo", func=read, description="Клиент по ID"))
+    writer = cache.invalidates(lambda x: [f"customer:{x.split(',')[0]}"])(
+        Tool(name="UpdateCustomerStatus", func=lambda x: statuses.update([x.split(",")]), description="id,status"))
+
+    stale = []
+    thread = threading.Thread(target=lambda: stale.append(reader.invoke("1")))
+    thread.start()
+    reading.wait()
+    writer.invoke("1,VIP")
+    release.set()
+    thread.join()
+    check("чтение во время изменения вернуло старое значение", stale == ["Regular"])
+    check("и не попало в кэш", reader.invoke("1") == "VIP" and len(calls) == 2)
+
+
+def check_async():
+    cache = ToolCache()
+    calls = []
+
+    async def fetch(city: str) -> str:
+        calls.append(city)
+        await asyncio.sleep(0)
+        return f"погода: {city}"
+
+    weather = cache.cached(ttl=60)(StructuredTool.from_function(coroutine=fetch, name="aweather",
+                                                                description="Погода"))
+
+    async def run():
+        return [await weather.ainvoke({"city": "Москва"}) for _ in range(3)]
+
+    results = asyncio.run(run())
+    check("ainvoke использует кэш", len(calls) == 1 and results == ["погода: Москва"] * 3)
+
+
+def main():
+    """Основная функция."""
+    print("=== Проверки ===")
+    check_normalization()
+    check_ttl_and_lru()
+    check_invalidation()
+    check_concurrent_invalidation()
+    check_async()
+
+    calls = make_workload()
+    print(f"\n=== Сессии агента: {NUM_SESSIONS} x {CALLS_PER_SESSION} вызовов, "
+          f"задержка API {API_LATENCY * 1000:.0f} мс ===")
+    plain_backend = Backend()
+    expected, plain_time = run_workload(calls, make_tools(plain_backend))
+    cached_backend = Backend()
+    clock = FakeClock()
+    cache = ToolCache(max_entries=1000, clock=clock)
+    results, cached_time = run_workload(calls, make_tools(cached_backend, cache), clock)
+    mismatches = sum(1 for a, b in zip(expected, results) if a != b)
+
+    print(f"{'Режим':<12} {'Вызовов API':>12} {'Время':>9}")
+    print(f"{'Без кэша':<12} {plain_backend.calls:>12} {plain_time:>8.2f} с")
+    print(f"{'ToolCache':<12} {cached_backend.calls:>12} {cached_time:>8.2f} с")
+    print(f"\nУскорение: {plain_time / cached_time:.1f}x, результатов, отличающихся от API без кэша: {mismatches}")
+    assert mismatches == 0
+    print("\nМетрики кэша (Prometheus):")
+    print(cache.to_prometheus(), end="")
+
+
+if __name__ == "__main__":
+    main()
@@ -7,10 +7,13 @@
 
 import asyncio
 import os
+import sys
 from dotenv import load_dotenv
-from langchain_openai import ChatOpenAI
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from common.llm_client import create_chat_model
 from langchain_core.prompts import ChatPromptTemplate
 from langchain_core.output_parsers import StrOutputParser
+from batch_runner import AsyncBatchRunner
 
 async def async_chain_example():
     """Пример асинхронной цепочки."""
@@ -24,11 +27,7 @@ async def async_chain_example():
         return
     
     # Инициализация асинхронной модели
-    llm = ChatOpenAI(
-        model="openai/gpt-3.5-turbo",
-        openai_api_key=api_key,
-        openai_api_base="https://openrouter.ai/api/v1"
-    )
+    llm = create_chat_model(api_key=api_key, max_retries=0)
     
     # Создание промпта
     prompt = ChatPromptTemplate.from_template("Расскажи краткий интересный факт о {topic}")
@@ -47,16 +46,20 @@ async def async_chain_example():
     print("2. Параллельные асинхронные вызовы:")
     topics = ["космос", "история", "технологии", "биология"]
     
-    # Создаем задачи для параллельного выполнения
-    tasks = [chain.ainvoke({"topic": topic}) for topic in topics]
+    # Раннер ограничивает число одновременных запросов и частоту запросов,
+    # поэтому тот же код подходит и для тысяч тем
+    runner = AsyncBatchRunner(chain, max_concurrency=4, requests_per_minute=60)
     
-    # Выполняем все задачи параллельно
-    results = await asyncio.gather(*tasks)
-    
-    # Выводим результаты
-    for topic, result in zip(topics, results):
-        print(f"{topic.capitalize()}: {result}")
+    # Результаты приходят по мере готовности вместе с индексом входа
+    async for result in runner.run({"topic": topic} for topic in topics):
+        topic = topics[result.index]
+        if result.ok:
+            print(f"{topic.capitalize()}: {result.output}")
+        else:
+            print(f"{topic.capitalize()}: ошибка - {result.error}")
     
+    print(f"\nОбработано {runner.stats.completed} тем за {runner.stats.elapsed:.2f} с, "
+          f"повторов после 429: {runner.stats.retries}")
     print("\n=== Завершено ===")
 
 def main():
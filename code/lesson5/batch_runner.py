@@ -0,0 +1,235 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Пакетный асинхронный запуск цепочек
+AsyncBatchRunner обрабатывает большой поток входных данных любой цепочкой
+(prompt | llm | parser): ограничивает число одновременных запросов, частоту
+запросов и токенов в минуту, соблюдает Retry-After при ответах 429 и отдает
+результаты по мере готовности вместе с индексом входа.
+"""
+
+import asyncio
+import datetime
+import email.utils
+import itertools
+import time
+from dataclasses import dataclass
+from typing import Any, Optional
+
+
+@dataclass
+class BatchResult:
+    """Результат обработки одного входа."""
+    index: int
+    input: Any
+    output: Any = None
+    error: Optional[BaseException] = None
+    attempts: int = 0
+    latency: float = 0.0
+
+    @property
+    def ok(self):
+        return self.error is None
+
+
+@dataclass
+class BatchStats:
+    """Сводка по пакетному запуску."""
+    completed: int = 0
+    failed: int = 0
+    rate_limited: int = 0
+    retries: int = 0
+    elapsed: float = 0.0
+
+    @property
+    def throughput(self):
+        """Успешно обработанных входов в секунду."""
+        return self.completed / self.elapsed if self.elapsed else 0.0
+
+
+class TokenBucket:
+    """Асинхронное ведро токенов: не более rate_per_minute единиц в минуту.
+
+    Args:
+        rate_per_minute: Скорость пополнения (запросов или токенов в минуту)
+        capacity: Максимальный запас, по умолчанию - секундная норма; запрос
+            больше запаса пропускается при полном ведре и оставляет долг
+    """
+
+    def __init__(self, rate_per_minute, capacity=None):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = capacity or max(1.0, self.rate)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self, amount=1.0):
+        # Запрос больше емкости ведра ждет полного ведра и уводит запас в
+        # минус: следующие запросы ждут, пока долг не восполнится, и средняя
+        # скорость не превышает rate_per_minute
+        needed = min(amount, self.capacity)
+        # Блокировка сохраняет порядок ожидающих: крупный запрос не голодает
+        async with self._lock:
+            self._refill()
+            while self.tokens < needed:
+                await asyncio.sleep((needed - self.tokens) / self.rate)
+                self._refill()
+            self.tokens -= amount
+
+
+def estimate_tokens(value):
+    """Грубая оценка токенов запроса: ~3 символа на токен плюс запас на ответ."""
+    return len(str(value)) // 3 + 256
+
+
+def rate_limit_delay(error):
+    """Возвращает задержку из ответа 429 (Retry-After) или None, если это не 429.
+
+    0.0 - заголовка нет или его не удалось разобрать: вызывающий берет свою
+    задержку по умолчанию.
+    """
+    response = getattr(error, "response", None)
+    status = getattr(error, "status_code", None) or getattr(response, "status_code", None)
+    if status != 429:
+        return None
+    headers = getattr(response, "headers", None) or {}
+    if headers.get("retry-after-ms"):
+        try:
+            return float(headers["retry-after-ms"]) / 1000
+        except ValueError:
+            pass
+    retry_after = headers.get("retry-after")
+    if retry_after:
+        try:
+            return float(retry_after)
+        except ValueError:
+            pass
+        # Retry-After может быть датой HTTP
+        try:
+            retry_at = email.utils.parsedate_to_datetime(retry_after)
+        except (TypeError, ValueError):
+            return 0.0  # нечитаемый заголовок: задержка по умолчанию
+        if retry_at.tzinfo is None:
+            retry_at = retry_at.replace(tzinfo=datetime.timezone.utc)
+        return max(0.0, retry_at.timestamp() - time.time())
+    return 0.0
+
+
+async def _aiter(inputs):
+    if hasattr(inputs, "__aiter__"):
+        async for item in inputs:
+            yield item
+    else:
+        for item in inputs:
+            yield item
+
+
+class AsyncBatchRunner:
+    """Запускает цепочку на потоке входов с ограничениями по нагрузке.
+
+    LLM в цепочке лучше создавать с max_retries=0: повторами при 429
+    управляет раннер, и пауза по Retry-After действует сразу на все запросы.
+
+    Args:
+        chain: Любой Runnable с методом ainvoke
+        max_concurrency: Максимум одновременных запросов
+        requests_per_minute: Лимит запросов в минуту (None - без лимита)
+        tokens_per_minute: Лимит токенов в минуту (None - без лимита)
+        token_estimator: Функция вход -> оценка числа токенов
+        max_retries: Сколько раз повторять запрос после 429
+        default_retry_after: Пауза после 429 без заголовка Retry-After, в секундах
+    """
+
+    def __init__(self, chain, max_concurrency=8, requests_per_minute=None, tokens_per_minute=None,
+                 token_estimator=estimate_tokens, max_retries=5, default_retry_after=1.0):
+        self.chain = chain
+        self.max_concurrency = max_concurrency
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self.token_estimator = token_estimator
+        self.max_retries = max_retries
+        self.default_retry_after = default_retry_after
+        self.stats = BatchStats()
+
+    async def run(self, inputs, config=None):
+        """Асинхронный генератор BatchResult в порядке завершения.
+
+        Входы читаются лениво: одновременно в работе не больше max_concurrency
+        элементов, поэтому inputs может быть бесконечным или асинхронным потоком.
+        """
+        self.stats = BatchStats()
+        request_bucket = TokenBucket(self.requests_per_minute) if self.requests_per_minute else None
+        token_bucket = TokenBucket(self.tokens_per_minute) if self.tokens_per_minute else None
+        source = _aiter(inputs)
+        counter = itertools.count()
+        # Общая пауза после 429: провайдер ограничивает весь клиент, а не один запрос
+        pause = {"until": 0.0}
+        start = time.monotonic()
+
+        async def process(index, item):
+            result = BatchResult(index=index, input=item)
+            while True:
+                delay = pause["until"] - time.monotonic()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                if request_bucket is not None:
+                    await request_bucket.acquire()
+                if token_bucket is not None:
+                    await token_bucket.acquire(self.token_estimator(item))
+
+                result.attempts += 1
+                started = time.monotonic()
+                try:
+                    result.output = await self.chain.ainvoke(item, config=config)
+                    result.latency = time.monotonic() - started
+                    return result
+                except Exception as error:
+                    retry_after = rate_limit_delay(error)
+                    if retry_after is None:
+                        result.error = error
+                        return result
+                    self.stats.rate_limited += 1
+                    if result.attempts > self.max_retries:
+                        result.error = error
+                        return result
+                    self.stats.retries += 1
+                    retry_after = retry_after or self.default_retry_after
+                    pause["until"] = max(pause["until"], time.monotonic() + retry_after)
+
+        in_flight = set()
+        exhausted = False
+        try:
+            while True:
+                # Новые входы берем только на место завершившихся
+                while not exhausted and len(in_flight) < self.max_concurrency:
+                    try:
+                        item = await source.__anext__()
+                    except StopAsyncIteration:
+                        exhausted = True
+                        break
+                    in_flight.add(asyncio.ensure_future(process(next(counter), item)))
+                if not in_flight:
+                    break
+
+                done, in_flight = await asyncio.wait(in_flight, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    result = task.result()
+                    if result.ok:
+                        self.stats.completed += 1
+                    else:
+                        self.stats.failed += 1
+                    self.stats.elapsed = time.monotonic() - start
+                    yield result
+        finally:
+            for task in in_flight:
+                task.cancel()
+
+    async def run_all(self, inputs, config=None):
+        """Обрабатывает все входы и возвращает результаты в исходном порядке."""
+        results = [result async for result in self.run(inputs, config=config)]
+        return sorted(results, key=lambda result: result.index)
@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Бенчмарк пакетного запуска цепочек
+Обрабатывает тысячу тем через локальную заглушку, которая добавляет задержку
+и возвращает 429 при превышении 100 запросов в секунду. Сравнивает
+asyncio.gather без ограничений и AsyncBatchRunner. Перед этим проверяет
+разбор Retry-After (секунды, дата HTTP, нечитаемое значение) и то, что
+лимит токенов в минуту соблюдается и для запросов больше секундной нормы.
+"""
+
+import asyncio
+import email.utils
+import os
+import sys
+import time
+
+import httpx
+import openai
+from langchain_core.output_parsers import StrOutputParser
+from langchain_core.prompts import ChatPromptTemplate
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from common.llm_client import aclose_http_clients, configure_http_pool, create_chat_model
+from common.stub_server import StubOpenAIServer
+from batch_runner import AsyncBatchRunner, TokenBucket, estimate_tokens, rate_limit_delay
+
+NUM_INPUTS = 1000
+SERVER_RPS = 100
+
+
+def build_chain(base_url):
+    # Повторы отключены в клиенте OpenAI: ими управляет раннер
+    llm = create_chat_model(api_key="stub", base_url=base_url, max_retries=0)
+    prompt = ChatPromptTemplate.from_template("Расскажи краткий интересный факт о {topic}")
+    return prompt | llm | StrOutputParser()
+
+
+async def run_gather(chain, inputs):
+    start = time.monotonic()
+    results = await asyncio.gather(*(chain.ainvoke(item) for item in inputs), return_exceptions=True)
+    elapsed = time.monotonic() - start
+    failed = sum(isinstance(result, Exception) for result in results)
+    return len(results) - failed, failed, elapsed
+
+
+async def run_runner(chain, inputs):
+    runner = AsyncBatchRunner(chain, max_concurrency=32, requests_per_minute=SERVER_RPS * 60 * 0.9)
+    seen = set()
+    async for result in runner.run(iter(inputs)):
+        seen.add(result.index)
+    assert seen == set(range(len(inputs))), "каждый вход должен вернуться ровно один раз"
+    return runner.stats
+
+
+async def benchmark(num_inputs):
+    with StubOpenAIServer(latency=0.05, latency_jitter=0.05, max_requests_per_second=SERVER_RPS, seed=1) as server:
+        chain = build_chain(server.base_url)
+        inputs = [{"topic": f"тема {i}"} for i in range(num_inputs)]
+
+        print(f"=== {num_inputs} входов, сервер: 50-100 мс на ответ, лимит {SERVER_RPS} запросов/с ===\n")
+
+        completed, failed, elapsed = await run_gather(chain, inputs)
+        print("asyncio.gather без ограничений:")
+        print(f"  успешно {completed}, ошибок {failed}, ответов 429 от сервера: {server.stats['rate_limited']}")
+        print(f"  время {elapsed:.2f} с, пропускная способность {completed / elapsed:.1f} входов/с\n")
+
+        # Даем окну лимита сервера освободиться
+        await asyncio.sleep(1.0)
+        server.reset_stats()
+
+        stats = await run_runner(chain, inputs)
+        print("AsyncBatchRunner (32 параллельно, 90% лимита сервера):")
+        print(f"  успешно {stats.completed}, ошибок {stats.failed}, ответов 429: {stats.rate_limited}, "
+              f"повторов: {stats.retries}")
+        print(f"  время {stats.elapsed:.2f} с, пропускная способность {stats.throughput:.1f} входов/с")
+
+        await aclose_http_clients()
+
+
+def check_retry_after():
+    """Задержка по Retry-After; нечитаемый заголовок дает 0 (задержку раннера по умолчанию)."""
+    def delay(retry_after):
+        response = httpx.Response(429, headers={"retry-after": retry_after},
+                                  request=httpx.Request("POST", "http://stub/v1/chat/completions"))
+        return rate_limit_delay(openai.RateLimitError("rate limited", response=response, body=None))
+
+    in_30s = time.time() + 30
+    assert delay("2") == 2.0
+    assert 25 < delay(email.utils.formatdate(in_30s, usegmt=True)) <= 30
+    # Дата без часового пояса считается UTC
+    assert 25 < delay(time.strftime("%a, %d %b %Y %H:%M:%S", time.gmtime(in_30s))) <= 30
+    assert delay("soon") == 0.0
+    assert delay("Mon, 99 Foo 2020") == 0.0
+    print("Retry-After: секунды и даты разбираются, нечитаемые значения не ломают повтор\n")
+
+
+def check_token_bucket(tokens_per_minute=60_000, requests=5):
+    """Запросы крупнее емкости ведра (секундной нормы) не превышают лимит в минуту."""
+    async def run():
+        bucket = TokenBucket(tokens_per_minute)
+        amounts = [estimate_tokens("x" * 3000)] * requests  # каждый больше секундной нормы
+        start = time.monotonic()
+        for amount in amounts:
+            await bucket.acquire(amount)
+        return sum(amounts), amounts[-1], time.monotonic() - start
+
+    total, last, elapsed = asyncio.run(run())
+    # Все запросы, кроме последнего, оплачены пополнением ведра: последний ждал полного ведра
+    minimum = (total - last) / (tokens_per_minute / 60)
+    assert elapsed >= minimum * 0.95, f"{total} токенов за {elapsed:.2f} с при лимите {tokens_per_minute}/мин"
+    print(f"Лимит токенов: {total} токенов крупными запросами за {elapsed:.2f} с "
+          f"(не быстрее {minimum:.2f} с по лимиту {tokens_per_minute}/мин)\n")
+
+
+def main():
+    """Основная функция."""
+    num_inputs = int(sys.argv[1]) if len(sys.argv) > 1 else NUM_INPUTS
+    check_retry_after()
+    check_token_bucket()
+    # Пул должен вместить все одновременные запросы asyncio.gather
+    configure_http_pool(max_connections=num_inputs, max_keepalive_connections=64)
+    asyncio.run(benchmark(num_inputs))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Бенчмарк постоянного кэша LLM
+Измеряет задержку попадания в SQLiteLLMCache, пропускную способность
+при нескольких процессах-читателях и работу вытеснения по размеру.
+"""
+
+import multiprocessing
+import os
+import random
+import sys
+import tempfile
+import time
+
+from langchain_core.messages import AIMessage
+from langchain_core.outputs import ChatGeneration
+
+from disk_cache import SQLiteLLMCache
+
+NUM_ENTRIES = 10000
+LOOKUPS_PER_READER = 20000
+LLM_STRING = '{"name": "ChatOpenAI", "kwargs": {"model_name": "openai/gpt-3.5-turbo", "temperature": 0.7}}---[(\'stop\', None)]'
+
+
+def prompt_for(i):
+    return f'[{{"type": "human", "content": "Объясни концепцию номер {i}"}}]'
+
+
+def generation_for(i):
+    text = f"Ответ номер {i}. " + "Подробное объяснение концепции. " * 10
+    return [ChatGeneration(message=AIMessage(content=text))]
+
+
+def populate(path, num_entries):
+    cache = SQLiteLLMCache(path, max_bytes=1024 * 1024 * 1024)
+    start = time.perf_counter()
+    for i in range(num_entries):
+        cache.update(prompt_for(i), LLM_STRING, generation_for(i))
+    elapsed = time.perf_counter() - start
+    print(f"Запись {num_entries} ответов: {elapsed:.2f} с ({num_entries / elapsed:.0f} записей/с)")
+    return cache
+
+
+def measure_hit_latency(cache, num_entries, lookups=5000):
+    latencies = []
+    for _ in range(lookups):
+        i = random.randrange(num_entries)
+        start = time.perf_counter()
+        result = cache.lookup(prompt_for(i), LLM_STRING)
+        latencies.append(time.perf_counter() - start)
+        assert result is not None
+    latencies.sort()
+    p50 = latencies[len(latencies) // 2] * 1e6
+    p99 = latencies[int(len(latencies) * 0.99)] * 1e6
+    print(f"Задержка попадания: p50 {p50:.0f} мкс, p99 {p99:.0f} мкс")
+
+
+def reader(path, num_entries, lookups, queue):
+    cache = SQLiteLLMCache(path, max_bytes=1024 * 1024 * 1024)
+    rng = random.Random(os.getpid())
+    for _ in range(lookups):
+        cache.lookup(prompt_for(rng.randrange(num_entries)), LLM_STRING)
+    queue.put(cache.stats()["hits"])
+
+
+def measure_concurrent_readers(path, num_entries, lookups):
+    for num_readers in (1, 2, 4, 8):
+        queue = multiprocessing.Queue()
+        processes = [
+            multiprocessing.Process(target=reader, args=(path, num_entries, lookups, queue))
+            for _ in range(num_readers)
+        ]
+        start = time.perf_counter()
+        for process in processes:
+            process.start()
+        hits = sum(queue.get() for _ in processes)
+        for process in processes:
+            process.join()
+        elapsed = time.perf_counter() - start
+        print(f"Процессов-читателей: {num_readers} | попаданий: {hits} | {hits / elapsed:,.0f} чтений/с")
+
+
+def measure_eviction(directory):
+    path = os.path.join(directory, "small.db")
+    cache = SQLiteLLMCache(path, max_bytes=256 * 1024)
+    for i in range(2000):
+        cache.update(prompt_for(i), LLM_STRING, generation_for(i))
+    stats = cache.stats()
+    print(f"Лимит 256 КБ: записей {stats['entries']}, занято {stats['total_bytes']} байт, "
+          f"вытеснено {stats['evictions']}")
+    # Самые новые записи должны остаться в кэше, самые старые - быть вытеснены
+    assert cache.lookup(prompt_for(1999), LLM_STRING) is not None
+    assert cache.lookup(prompt_for(0), LLM_STRING) is None
+
+
+def main():
+    """Основная функция."""
+    num_entries = int(sys.argv[1]) if len(sys.argv) > 1 else NUM_ENTRIES
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "cache.db")
+        print("=== Бенчмарк SQLiteLLMCache ===\n")
+        cache = populate(path, num_entries)
+        measure_hit_latency(cache, num_entries)
+        print()
+        measure_concurrent_readers(path, num_entries, LOOKUPS_PER_READER)
+        print()
+        measure_eviction(directory)
+
+
+if __name__ == "__main__":
+    main()
@@ -6,15 +6,19 @@
 """
 
 import os
+import sys
 import time
 from dotenv import load_dotenv
-from langchain_openai import ChatOpenAI
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from common.llm_client import create_chat_model
 from langchain_core.prompts import ChatPromptTemplate
 from langchain_core.output_parsers import StrOutputParser
-# Включение кэширования в памяти
+# Включение постоянного кэша на диске: ответы переживают перезапуск
+# и доступны всем процессам, использующим тот же файл
 from langchain_core.globals import set_llm_cache
-from langchain_community.cache import InMemoryCache
-set_llm_cache(InMemoryCache())
+from disk_cache import SQLiteLLMCache
+llm_cache = SQLiteLLMCache(".langchain_cache.db", max_bytes=64 * 1024 * 1024, ttl=24 * 60 * 60)
+set_llm_cache(llm_cache)
 
 def caching_example():
     """Пример использования кэширования."""
@@ -28,11 +32,7 @@ def caching_example():
         return
     
     # Инициализация модели
-    llm = ChatOpenAI(
-        model="openai/gpt-3.5-turbo",
-        openai_api_key=api_key,
-        openai_api_base="https://openrouter.ai/api/v1"
-    )
+    llm = create_chat_model(api_key=api_key)
     
     # Создание промпта
     prompt = ChatPromptTemplate.from_template("Объясни концепцию {concept}")
@@ -82,6 +82,10 @@ def caching_example():
     print(f"Результат: {result5[:100]}...")
     print(f"Время выполнения: {end_time - start_time:.2f} секунд\n")
     
+    stats = llm_cache.stats()
+    print(f"Статистика кэша: попаданий {stats['hits']}, промахов {stats['misses']}, "
+          f"вытеснено {stats['evictions']}, записей {stats['entries']}")
+    
     print("=== Завершено ===")
     print("\nОбратите внимание на разницу во времени выполнения между кэшированными и некэшированными вызовами!")
 
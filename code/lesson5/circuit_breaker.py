@@ -0,0 +1,293 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Автоматический выключатель (circuit breaker) для вызовов LLM
+Когда провайдер недоступен, каждый вызов цепочки с with_fallbacks ждет полный
+таймаут, прежде чем сработает запасной вариант. CircuitBreaker следит за долей
+ошибок и медленных ответов в скользящем окне по каждому адресу модели и при
+превышении порога "размыкает цепь": вызовы сразу завершаются CircuitOpenError
+без обращения к сети, и with_fallbacks переходит к запасному варианту.
+Через open_timeout выключатель пропускает пробный запрос (half-open) и
+замыкается снова, если провайдер восстановился.
+"""
+
+import asyncio
+import inspect
+import logging
+import threading
+import time
+from collections import Counter, deque
+
+from langchain_core.runnables import Runnable
+from langchain_core.runnables.config import patch_config
+
+from retry_policy import classify_error
+
+logger = logging.getLogger(__name__)
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitOpenError(RuntimeError):
+    """Вызов отклонен без обращения к сети: цепь разомкнута."""
+
+    def __init__(self, name, retry_in):
+        super().__init__(f"Цепь '{name}' разомкнута, повторная проверка через {retry_in:.1f} с")
+        self.name = name
+        self.retry_in = retry_in
+
+
+class CircuitBreaker:
+    """Выключатель с состояниями closed, open и half_open.
+
+    Args:
+        name: Имя выключателя (обычно адрес и модель)
+        failure_rate_threshold: Доля ошибок в окне, при которой цепь размыкается
+        slow_call_threshold: Ответ дольше этого времени (с) считается медленным
+            (None - не учитывать задержку)
+        slow_call_rate_threshold: Доля медленных ответов, при которой цепь размыкается
+        window_size: Размер скользящего окна (последние N вызовов)
+        min_calls: Минимум вызовов в окне для принятия решения
+        open_timeout: Сколько секунд цепь остается разомкнутой до пробного запроса
+        half_open_max_calls: Сколько пробных запросов должны пройти для замыкания
+        clock: Источник времени (для тестов)
+    """
+
+    def __init__(self, name="default", failure_rate_threshold=0.5, slow_call_threshold=None,
+                 slow_call_rate_threshold=0.8, window_size=20, min_calls=10, open_timeout=10.0,
+                 half_open_max_calls=1, clock=time.monotonic):
+        self.name = name
+        self.failure_rate_threshold = failure_rate_threshold
+        self.slow_call_threshold = slow_call_threshold
+        self.slow_call_rate_threshold = slow_call_rate_threshold
+        self.min_calls = min_calls
+        self.open_timeout = open_timeout
+        self.half_open_max_calls = half_open_max_calls
+        self.clock = clock
+        self.listeners = []
+
+        self._lock = threading.Lock()
+        self._window = deque(maxlen=window_size)
+        self._failures = 0
+        self._slow = 0
+        self._state = CLOSED
+        self._opened_at = 0.0
+        self._probes_in_flight = 0
+        self._probe_successes = 0
+        self._counters = Counter()
+        self.transitions = Counter()
+
+    @property
+    def state(self):
+        with self._lock:
+            self._maybe_half_open()
+            return self._state
+
+    def _transition(self, new_state):
+        old_state, self._state = self._state, new_state
+        self.transitions[f"{old_state}->{new_state}"] += 1
+        if new_state == OPEN:
+            self._opened_at = self.clock()
+        if new_state != OPEN:
+            self._probes_in_flight = 0
+            self._probe_successes = 0
+        if new_state == CLOSED:
+            self._window.clear()
+            self._failures = self._slow = 0
+        logger.info("Выключатель %s: %s -> %s", self.name, old_state, new_state)
+        for listener in self.listeners:
+            listener(self.name, old_state, new_state)
+
+    def _maybe_half_open(self):
+        if self._state == OPEN and self.clock() - self._opened_at >= self.open_timeout:
+            self._transition(HALF_OPEN)
+
+    def acquire(self):
+        """Разрешает вызов или бросает CircuitOpenError."""
+        with self._lock:
+            self._maybe_half_open()
+            if self._state == CLOSED:
+                self._counters["calls"] += 1
+                return
+            if self._state == HALF_OPEN and self._probes_in_flight < self.half_open_max_calls:
+                self._probes_in_flight += 1
+                self._counters["calls"] += 1
+                self._counters["probes"] += 1
+                return
+            self._counters["rejected"] += 1
+            retry_in = max(0.0, self._opened_at + self.open_timeout - self.clock())
+        raise CircuitOpenError(self.name, retry_in)
+
+    def record(self, latency, error=None):
+        """Учитывает результат разрешенного вызова."""
+        # Ошибки клиента (4xx) говорят о запросе, а не о здоровье провайдера
+        failed = error is not None and classify_error(error) == "retryable"
+        slow = self.slow_call_threshold is not None and latency >= self.slow_call_threshold
+        with self._lock:
+            if failed:
+                self._counters["failures"] += 1
+            if slow:
+                self._counters["slow_calls"] += 1
+
+            if self._state == HALF_OPEN:
+                self._probes_in_flight = max(0, self._probes_in_flight - 1)
+                if failed or slow:
+                    self._transition(OPEN)
+                else:
+                    self._probe_successes += 1
+                    if self._probe_successes >= self.half_open_max_calls:
+                        self._transition(CLOSED)
+                return
+            if self._state != CLOSED:
+                # Ответ на запрос, начатый до размыкания цепи
+                return
+
+            if len(self._window) == self._window.maxlen:
+                old_failed, old_slow = self._window[0]
+                self._failures -= old_failed
+                self._slow -= old_slow
+            self._window.append((failed, slow))
+            self._failures += failed
+            self._slow += slow
+
+            calls = len(self._window)
+            if calls >= self.min_calls and (
+                self._failures / calls >= self.failure_rate_threshold
+                or self._slow / calls >= self.slow_call_rate_threshold
+            ):
+                self._transition(OPEN)
+
+    def release(self):
+        """Освобождает разрешение отмененного вызова, не учитывая результат."""
+        with self._lock:
+            if self._state == HALF_OPEN:
+                self._probes_in_flight = max(0, self._probes_in_flight - 1)
+
+    def stats(self):
+        """Состояние, счетчики вызовов и переходов между состояниями."""
+        with self._lock:
+            self._maybe_half_open()
+            calls = len(self._window)
+            return {
+                "name": self.name,
+                "state": self._state,
+                "calls": self._counters["calls"],
+                "rejected": self._counters["rejected"],
+                "failures": self._counters["failures"],
+                "slow_calls": self._counters["slow_calls"],
+                "probes": self._counters["probes"],
+                "window_failure_rate": self._failures / calls if calls else 0.0,
+                "window_slow_rate": self._slow / calls if calls else 0.0,
+                "transitions": dict(self.transitions),
+            }
+
+
+_registry = {}
+# Параметры, с которыми создан каждый выключатель реестра (с учетом значений по умолчанию)
+_registry_settings = {}
+_registry_lock = threading.Lock()
+_DEFAULT_SETTINGS = {
+    name: parameter.default
+    for name, parameter in inspect.signature(CircuitBreaker).parameters.items()
+    if name != "name"
+}
+
+
+def endpoint_name(runnable):
+    """Имя конечной точки модели: адрес API и имя модели."""
+    base_url = getattr(runnable, "openai_api_base", None) or "default"
+    model = getattr(runnable, "model_name", None) or runnable.get_name()
+    return f"{base_url}#{model}"
+
+
+def get_breaker(name, **kwargs):
+    """Общий выключатель для конечной точки: все цепочки с одной моделью делят его.
+
+    Raises:
+        ValueError: выключатель для name уже создан с другими параметрами
+            (иначе вторая цепочка молча получила бы настройки первой)
+    """
+    with _registry_lock:
+        breaker = _registry.get(name)
+        if breaker is None:
+            breaker = _registry[name] = CircuitBreaker(name=name, **kwargs)
+            _registry_settings[name] = {**_DEFAULT_SETTINGS, **kwargs}
+            return breaker
+        settings = _registry_settings[name]
+    conflicts = {key: (settings.get(key), value) for key, value in kwargs.items() if settings.get(key) != value}
+    if conflicts:
+        details = ", ".join(f"{key}={new!r} (уже {old!r})" for key, (old, new) in conflicts.items())
+        raise ValueError(f"Выключатель '{name}' уже создан с другими параметрами: {details}; "
+                         f"передайте собственный breaker=CircuitBreaker(...)")
+    return breaker
+
+
+def all_breakers():
+    """Статистика всех зарегистрированных выключателей."""
+    with _registry_lock:
+        breakers = list(_registry.values())
+    return [breaker.stats() for breaker in breakers]
+
+
+class CircuitBreakerRunnable(Runnable):
+    """Runnable, который не обращается к модели при разомкнутой цепи.
+
+    Используется вместе с with_fallbacks: CircuitOpenError перехватывается
+    как обычная ошибка, и управление сразу переходит к запасному варианту
+    (более дешевой модели или функции-заглушке).
+
+    Args:
+        bound: Оборачиваемая модель или цепочка
+        breaker: Выключатель; по умолчанию общий для адреса и модели bound
+        **breaker_kwargs: Параметры CircuitBreaker для выключателя по умолчанию;
+            должны совпадать у всех цепочек с одной моделью (см. get_breaker)
+    """
+
+    def __init__(self, bound, breaker=None, **breaker_kwargs):
+        self.bound = bound
+        self.breaker = breaker or get_breaker(endpoint_name(bound), **breaker_kwargs)
+
+    @property
+    def InputType(self):
+        return self.bound.InputType
+
+    @property
+    def OutputType(self):
+        return self.bound.OutputType
+
+    def get_name(self, suffix=None, *, name=None):
+        return name or f"CircuitBreaker{self.bound.get_name()}"
+
+    def _invoke(self, input, run_manager, config, **kwargs):
+        self.breaker.acquire()
+        started = time.monotonic()
+        try:
+            result = self.bound.invoke(input, patch_config(config, callbacks=run_manager.get_child()), **kwargs)
+        except Exception as error:
+            self.breaker.record(time.monotonic() - started, error)
+            raise
+        self.breaker.record(time.monotonic() - started)
+        return result
+
+    async def _ainvoke(self, input, run_manager, config, **kwargs):
+        self.breaker.acquire()
+        started = time.monotonic()
+        try:
+            result = await self.bound.ainvoke(input, patch_config(config, callbacks=run_manager.get_child()),
+                                              **kwargs)
+        except asyncio.CancelledError:
+            self.breaker.release()
+            raise
+        except Exception as error:
+            self.breaker.record(time.monotonic() - started, error)
+            raise
+        self.breaker.record(time.monotonic() - started)
+        return result
+
+    def invoke(self, input, config=None, **kwargs):
+        return self._call_with_config(self._invoke, input, config, **kwargs)
+
+    async def ainvoke(self, input, config=None, **kwargs):
+        return await self._acall_with_config(self._ainvoke, input, config, **kwargs)
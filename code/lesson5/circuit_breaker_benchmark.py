@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Бенчмарк автоматического выключателя
+Отправляет запросы с постоянной частотой через локальную заглушку, которая
+в середине прогона "падает" (перестает отвечать дольше таймаута клиента),
+а затем восстанавливается. Сравнивает задержку цепочки с with_fallbacks
+с выключателем и без него. Проверяет, что цепочки с одной моделью делят
+выключатель, а несовпадающие параметры не теряются молча.
+"""
+
+import asyncio
+import os
+import sys
+import time
+
+import numpy as np
+from langchain_core.output_parsers import StrOutputParser
+from langchain_core.prompts import ChatPromptTemplate
+from langchain_core.runnables import RunnableLambda
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from common.llm_client import aclose_http_clients, configure_http_pool, create_chat_model
+from common.stub_server import StubOpenAIServer
+from circuit_breaker import CircuitBreaker, CircuitBreakerRunnable
+
+REQUESTS_PER_SECOND = 50
+CLIENT_TIMEOUT = 0.5
+# (начало, конец) сбоя от старта прогона, в секундах
+OUTAGE = (1.5, 4.5)
+DURATION = 6.5
+FALLBACK_ANSWER = "Сервис временно недоступен, попробуйте позже."
+
+
+def build_chain(base_url, breaker=None):
+    llm = create_chat_model(api_key="stub", base_url=base_url, max_retries=0, timeout=CLIENT_TIMEOUT)
+    if breaker is not None:
+        llm = CircuitBreakerRunnable(llm, breaker)
+    prompt = ChatPromptTemplate.from_template("Ответь на вопрос: {question}")
+    return (prompt | llm | StrOutputParser()).with_fallbacks([RunnableLambda(lambda _: FALLBACK_ANSWER)])
+
+
+async def simulate_outage(server, start):
+    await asyncio.sleep(max(0.0, start + OUTAGE[0] - time.monotonic()))
+    # Сервер принимает соединения, но отвечает дольше таймаута клиента
+    server.slow_rate, server.slow_latency = 1.0, 5.0
+    await asyncio.sleep(max(0.0, start + OUTAGE[1] - time.monotonic()))
+    server.slow_rate = 0.0
+
+
+async def run(title, breaker, duration):
+    with StubOpenAIServer(latency=0.01, latency_jitter=0.01, seed=5) as server:
+        chain = build_chain(server.base_url, breaker)
+        results = []
+
+        async def call(i):
+            sent_at = time.monotonic()
+            answer = await chain.ainvoke({"question": f"вопрос {i}"})
+            results.append((sent_at - start, time.monotonic() - sent_at, answer == FALLBACK_ANSWER))
+
+        start = time.monotonic()
+        outage = asyncio.ensure_future(simulate_outage(server, start))
+        tasks = []
+        for i in range(int(duration * REQUESTS_PER_SECOND)):
+            await asyncio.sleep(max(0.0, start + i / REQUESTS_PER_SECOND - time.monotonic()))
+            tasks.append(asyncio.ensure_future(call(i)))
+        await asyncio.gather(*tasks)
+        await outage
+
+        sent_at = np.array([row[0] for row in results])
+        latencies = np.array([row[1] for row in results]) * 1000
+        fallbacks = sum(row[2] for row in results)
+        during = (sent_at >= OUTAGE[0]) & (sent_at < OUTAGE[1])
+
+        print(title)
+        print(f"  запросов: {len(results)}, ответов запасного варианта: {fallbacks}, "
+              f"запросов к серверу: {server.stats['requests']}")
+        for label, values in [("все запросы", latencies), ("во время сбоя", latencies[during])]:
+            p50, p90, p99 = np.percentile(values, [50, 90, 99])
+            print(f"  {label}: p50 {p50:.0f} мс, p90 {p90:.0f} мс, p99 {p99:.0f} мс")
+        if breaker is not None:
+            stats = breaker.stats()
+            print(f"  выключатель: состояние {stats['state']}, отклонено {stats['rejected']}, "
+                  f"пробных запросов {stats['probes']}, переходы {stats['transitions']}")
+        print()
+
+
+def check_shared_breaker(base_url="http://127.0.0.1:9/v1"):
+    """Общий выключатель по адресу модели; другие параметры для того же адреса - ошибка."""
+    llm = create_chat_model(api_key="stub", base_url=base_url, max_retries=0)
+    first = CircuitBreakerRunnable(llm, failure_rate_threshold=0.5, open_timeout=30.0)
+    assert CircuitBreakerRunnable(llm, open_timeout=30.0).breaker is first.breaker
+    assert CircuitBreakerRunnable(llm).breaker is first.breaker
+    try:
+        CircuitBreakerRunnable(llm, failure_rate_threshold=0.2)
+    except ValueError as error:
+        print(f"Общий выключатель для {first.breaker.name}; другие параметры: {error}\n")
+    else:
+        raise AssertionError("Параметры второй цепочки молча проигнорированы")
+
+
+async def benchmark(duration):
+    print(f"=== {REQUESTS_PER_SECOND} запросов/с, таймаут клиента {CLIENT_TIMEOUT} с, "
+          f"сбой с {OUTAGE[0]} по {OUTAGE[1]} с ===\n")
+    await run("Только with_fallbacks:", None, duration)
+    breaker = CircuitBreaker("stub", failure_rate_threshold=0.5, window_size=20, min_calls=10, open_timeout=1.0)
+    await run("Выключатель + with_fallbacks:", breaker, duration)
+    await aclose_http_clients()
+
+
+def main():
+    """Основная функция."""
+    duration = float(sys.argv[1]) if len(sys.argv) > 1 else DURATION
+    # Во время сбоя без выключателя одновременно висят до REQUESTS_PER_SECOND * CLIENT_TIMEOUT запросов
+    configure_http_pool(max_connections=4 * REQUESTS_PER_SECOND)
+    check_shared_breaker()
+    asyncio.run(benchmark(duration))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Бенчмарк пула соединений
+Сравнивает задержку запросов к локальной OpenAI-совместимой заглушке
+при общем keep-alive пуле и при новом соединении на каждый запрос.
+Проверяет, что прокси из переменных окружения получают свои пулы, хосты
+из NO_PROXY идут напрямую, а close_http_clients закрывает оба клиента.
+"""
+
+import asyncio
+import os
+import statistics
+import sys
+import time
+from unittest import mock
+
+import httpx
+from langchain_openai import ChatOpenAI
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from common.llm_client import (aclose_http_clients, close_http_clients, create_chat_model, environment_proxies,
+                               get_async_http_client)
+from common.stub_server import StubOpenAIServer
+
+NUM_REQUESTS = 200
+
+
+def summarize(name, latencies, connections):
+    """Печатает статистику задержек в миллисекундах."""
+    latencies = sorted(latencies)
+    p50 = latencies[len(latencies) // 2] * 1000
+    p95 = latencies[int(len(latencies) * 0.95)] * 1000
+    mean = statistics.mean(latencies) * 1000
+    print(f"{name:<28} среднее {mean:6.2f} мс | p50 {p50:6.2f} мс | p95 {p95:6.2f} мс | соединений: {connections}")
+
+
+def run_sync(llm, server, num_requests):
+    server.reset_stats()
+    latencies = []
+    for i in range(num_requests):
+        start = time.perf_counter()
+        llm.invoke(f"Вопрос номер {i}")
+        latencies.append(time.perf_counter() - start)
+    return latencies, server.stats["connections"]
+
+
+async def run_async(llm, server, num_requests, concurrency=10):
+    server.reset_stats()
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+
+    async def one(i):
+        async with semaphore:
+            start = time.perf_counter()
+            await llm.ainvoke(f"Вопрос номер {i}")
+            latencies.append(time.perf_counter() - start)
+
+    await asyncio.gather(*(one(i) for i in range(num_requests)))
+    return latencies, server.stats["connections"]
+
+
+def unpooled_model(base_url):
+    """Модель, открывающая новое соединение на каждый запрос."""
+    no_keepalive = httpx.Limits(max_keepalive_connections=0)
+    return ChatOpenAI(
+        model="openai/gpt-3.5-turbo",
+        openai_api_key="stub",
+        openai_api_base=base_url,
+        max_retries=0,
+        http_client=httpx.Client(limits=no_keepalive),
+        http_async_client=httpx.AsyncClient(limits=no_keepalive),
+    )
+
+
+def check_proxy_mounts():
+    """Шаблоны mounts из HTTPS_PROXY и NO_PROXY; NO_PROXY=* отключает прокси."""
+    environ = {"HTTPS_PROXY": "proxy.local:3128", "NO_PROXY": "localhost,.example.com,10.0.0.1,::1"}
+    with mock.patch.dict(os.environ, environ, clear=True):
+        mounts = environment_proxies()
+    assert mounts == {"https://": "http://proxy.local:3128", "all://localhost": None, "all://*.example.com": None,
+                      "all://10.0.0.1": None, "all://[::1]": None}, mounts
+    with mock.patch.dict(os.environ, {**environ, "NO_PROXY": "*"}, clear=True):
+        assert environment_proxies() == {}
+    print(f"Прокси из окружения: {mounts}\n")
+
+
+def check_close_clients(base_url):
+    """close_http_clients вне цикла событий закрывает и асинхронный клиент, а внутри оставляет его."""
+    create_chat_model(api_key="stub", base_url=base_url, max_retries=0).invoke("проверка")
+    async_client = get_async_http_client()
+    close_http_clients()
+    assert async_client.is_closed, "Асинхронный клиент сброшен, но не закрыт"
+
+    async def close_in_loop():
+        client = get_async_http_client()
+        close_http_clients()
+        assert get_async_http_client() is client and not client.is_closed
+        await aclose_http_clients()
+        assert client.is_closed
+
+    asyncio.run(close_in_loop())
+
+
+def main():
+    """Основная функция."""
+    num_requests = int(sys.argv[1]) if len(sys.argv) > 1 else NUM_REQUESTS
+    check_proxy_mounts()
+
+    with StubOpenAIServer(latency=0.002) as server:
+        pooled = create_chat_model(api_key="stub", base_url=server.base_url, max_retries=0)
+        unpooled = unpooled_model(server.base_url)
+
+        # Прогрев: импорт и первая инициализация клиентов не должны попасть в замер
+        pooled.invoke("прогрев")
+        unpooled.invoke("прогрев")
+
+        print(f"=== Синхронные запросы ({num_requests} шт.) ===")
+        summarize("Без пула (новое соединение)", *run_sync(unpooled, server, num_requests))
+        summarize("Общий пул (keep-alive)", *run_sync(pooled, server, num_requests))
+
+        async def async_part():
+            print(f"\n=== Асинхронные запросы ({num_requests} шт., 10 параллельно) ===")
+            summarize("Без пула (новое соединение)", *await run_async(unpooled, server, num_requests))
+            summarize("Общий пул (keep-alive)", *await run_async(pooled, server, num_requests))
+            await aclose_http_clients()
+
+        asyncio.run(async_part())
+        close_http_clients()
+        check_close_clients(server.base_url)
+
+
+if __name__ == "__main__":
+    main()
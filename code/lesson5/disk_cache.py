@@ -0,0 +1,230 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Постоянный кэш ответов LLM на SQLite
+Кэш подключается через set_llm_cache, переживает перезапуск процесса и может
+одновременно использоваться несколькими процессами. Размер ограничивается
+в байтах (вытесняются давно не использованные записи), устаревшие записи
+удаляются по TTL.
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from functools import lru_cache
+
+from langchain_core.caches import BaseCache
+from langchain_core.messages import message_to_dict, messages_from_dict
+from langchain_core.outputs import ChatGeneration, Generation
+
+# Параметры, от которых зависит ответ модели. Ключ API, адрес сервера,
+# таймауты и т.п. в ключ кэша не попадают.
+SAMPLING_PARAMS = (
+    "model", "model_name", "temperature", "top_p", "max_tokens", "max_completion_tokens",
+    "n", "seed", "stop", "frequency_penalty", "presence_penalty", "logit_bias",
+    "response_format", "reasoning_effort", "model_kwargs",
+)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS llm_cache (
+    key TEXT PRIMARY KEY,
+    value BLOB NOT NULL,
+    size INTEGER NOT NULL,
+    created REAL NOT NULL,
+    accessed REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_llm_cache_accessed ON llm_cache(accessed);
+CREATE INDEX IF NOT EXISTS idx_llm_cache_created ON llm_cache(created);
+CREATE TABLE IF NOT EXISTS llm_cache_meta (
+    id INTEGER PRIMARY KEY CHECK (id = 0),
+    total_bytes INTEGER NOT NULL
+);
+INSERT OR IGNORE INTO llm_cache_meta VALUES (0, 0);
+CREATE TRIGGER IF NOT EXISTS llm_cache_size_insert AFTER INSERT ON llm_cache BEGIN
+    UPDATE llm_cache_meta SET total_bytes = total_bytes + NEW.size WHERE id = 0;
+END;
+CREATE TRIGGER IF NOT EXISTS llm_cache_size_delete AFTER DELETE ON llm_cache BEGIN
+    UPDATE llm_cache_meta SET total_bytes = total_bytes - OLD.size WHERE id = 0;
+END;
+CREATE TRIGGER IF NOT EXISTS llm_cache_size_update AFTER UPDATE OF size ON llm_cache BEGIN
+    UPDATE llm_cache_meta SET total_bytes = total_bytes + NEW.size - OLD.size WHERE id = 0;
+END;
+"""
+
+
+def _canonical_json(text):
+    """Приводит JSON-строку к каноническому виду; не-JSON возвращает как есть."""
+    try:
+        return json.dumps(json.loads(text), sort_keys=True, ensure_ascii=False, separators=(",", ":"))
+    except (ValueError, TypeError):
+        return text
+
+
+@lru_cache(maxsize=1024)
+def normalize_llm_string(llm_string):
+    """Оставляет в описании модели только модель и параметры генерации."""
+    config, _, call_params = llm_string.partition("---")
+    try:
+        data = json.loads(config)
+    except ValueError:
+        return llm_string
+    kwargs = data.get("kwargs", {}) if isinstance(data, dict) else {}
+    relevant = {name: kwargs[name] for name in SAMPLING_PARAMS if name in kwargs}
+    class_name = data.get("name") or ".".join(data.get("id", []))
+    return json.dumps([class_name, relevant, call_params], sort_keys=True, ensure_ascii=False)
+
+
+def make_cache_key(prompt, llm_string):
+    """Ключ кэша: хэш от промпта и нормализованных параметров модели."""
+    payload = _canonical_json(prompt) + "\x00" + normalize_llm_string(llm_string)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def dump_generations(generations):
+    items = []
+    for generation in generations:
+        item = {"text": generation.text, "generation_info": generation.generation_info}
+        if isinstance(generation, ChatGeneration):
+            item["message"] = message_to_dict(generation.message)
+        items.append(item)
+    return json.dumps(items, ensure_ascii=False).encode("utf-8")
+
+
+def load_generations(blob):
+    generations = []
+    for item in json.loads(blob):
+        if "message" in item:
+            message = messages_from_dict([item["message"]])[0]
+            generations.append(ChatGeneration(message=message, generation_info=item["generation_info"]))
+        else:
+            generations.append(Generation(text=item["text"], generation_info=item["generation_info"]))
+    return generations
+
+
+class SQLiteLLMCache(BaseCache):
+    """Кэш ответов LLM в файле SQLite с вытеснением по LRU и TTL.
+
+    Args:
+        database_path: Путь к файлу базы данных
+        max_bytes: Максимальный суммарный размер сохраненных ответов
+        ttl: Время жизни записи в секундах (None - без ограничения)
+        touch_interval: Как часто (в секундах) обновлять время последнего
+            обращения к записи. Обновление на каждом попадании превратило бы
+            чтение в запись и создало бы конкуренцию за блокировку между процессами
+        busy_timeout: Сколько ждать блокировку базы другим процессом, в секундах
+    """
+
+    def __init__(self, database_path=".langchain_cache.db", max_bytes=64 * 1024 * 1024,
+                 ttl=None, touch_interval=10.0, busy_timeout=30.0):
+        self.database_path = database_path
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.touch_interval = touch_interval
+        self.busy_timeout = busy_timeout
+        self._local = threading.local()
+        self._stats_lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "evictions": 0, "expirations": 0}
+
+        connection = self._connection()
+        connection.executescript(_SCHEMA)
+
+    def _connection(self):
+        """Соединение для текущего потока (и процесса - после fork создается новое)."""
+        connection = getattr(self._local, "connection", None)
+        if connection is None or self._local.pid != os.getpid():
+            connection = sqlite3.connect(self.database_path, timeout=self.busy_timeout,
+                                         isolation_level=None, check_same_thread=False)
+            # WAL позволяет читателям не блокироваться во время записи
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self._local.connection = connection
+            self._local.pid = os.getpid()
+        return connection
+
+    def _count(self, name, value=1):
+        if value:
+            with self._stats_lock:
+                self._stats[name] += value
+
+    def lookup(self, prompt, llm_string):
+        """Ищет ответ в кэше."""
+        key = make_cache_key(prompt, llm_string)
+        connection = self._connection()
+        row = connection.execute("SELECT value, created, accessed FROM llm_cache WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            self._count("misses")
+            return None
+
+        value, created, accessed = row
+        now = time.time()
+        if self.ttl is not None and now - created > self.ttl:
+            connection.execute("DELETE FROM llm_cache WHERE key = ? AND created = ?", (key, created))
+            self._count("expirations")
+            self._count("misses")
+            return None
+
+        if now - accessed > self.touch_interval:
+            connection.execute("UPDATE llm_cache SET accessed = ? WHERE key = ?", (now, key))
+        self._count("hits")
+        return load_generations(value)
+
+    def update(self, prompt, llm_string, return_val):
+        """Сохраняет ответ и при необходимости вытесняет старые записи."""
+        key = make_cache_key(prompt, llm_string)
+        value = dump_generations(return_val)
+        now = time.time()
+        connection = self._connection()
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            connection.execute(
+                "INSERT INTO llm_cache (key, value, size, created, accessed) VALUES (?, ?, ?, ?, ?) "
+                "ON CONFLICT(key) DO UPDATE SET value = excluded.value, size = excluded.size, "
+                "created = excluded.created, accessed = excluded.accessed",
+                (key, value, len(value), now, now),
+            )
+            if self.ttl is not None:
+                cursor = connection.execute("DELETE FROM llm_cache WHERE created < ?", (now - self.ttl,))
+                self._count("expirations", cursor.rowcount)
+            self._evict(connection)
+            connection.execute("COMMIT")
+        except BaseException:
+            connection.execute("ROLLBACK")
+            raise
+
+    def _evict(self, connection):
+        """Удаляет давно не использованные записи, пока кэш больше лимита.
+
+        Удаляем до 90% лимита, чтобы не запускать вытеснение на каждой записи.
+        """
+        total = connection.execute("SELECT total_bytes FROM llm_cache_meta WHERE id = 0").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        target = int(self.max_bytes * 0.9)
+        while total > target:
+            cursor = connection.execute(
+                "DELETE FROM llm_cache WHERE key IN (SELECT key FROM llm_cache ORDER BY accessed LIMIT 64)"
+            )
+            if cursor.rowcount <= 0:
+                break
+            self._count("evictions", cursor.rowcount)
+            total = connection.execute("SELECT total_bytes FROM llm_cache_meta WHERE id = 0").fetchone()[0]
+
+    def clear(self, **kwargs):
+        """Очищает кэш."""
+        self._connection().execute("DELETE FROM llm_cache")
+
+    def stats(self):
+        """Счетчики этого процесса и текущий размер кэша."""
+        connection = self._connection()
+        entries = connection.execute("SELECT COUNT(*) FROM llm_cache").fetchone()[0]
+        total_bytes = connection.execute("SELECT total_bytes FROM llm_cache_meta WHERE id = 0").fetchone()[0]
+        with self._stats_lock:
+            stats = dict(self._stats)
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = stats["hits"] / lookups if lookups else 0.0
+        stats["entries"] = entries
+        stats["total_bytes"] = total_bytes
+        return stats
@@ -6,13 +6,16 @@
 """
 
 import os
+import sys
 import logging
 from dotenv import load_dotenv
-from langchain_openai import ChatOpenAI
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from common.llm_client import create_chat_model
 from langchain_core.prompts import ChatPromptTemplate
 from langchain_core.output_parsers import StrOutputParser
 from langchain_core.runnables import RunnableLambda
-from tenacity import retry, stop_after_attempt, wait_exponential
+from retry_policy import RetryPolicy, RetryingRunnable
+from circuit_breaker import CircuitBreakerRunnable
 
 # Настройка логирования
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
@@ -23,17 +26,10 @@ def handle_error(error: Exception) -> str:
     logger.error(f"Произошла ошибка: {str(error)}")
     return "Извините, произошла ошибка при обработке запроса. Пожалуйста, попробуйте еще раз."
 
-@retry(stop=stop_after_attempt(3), wait=wait_exponential(multiplier=1, min=4, max=10))
-def robust_llm_call(prompt, llm):
-    """Вызов LLM с механизмом повторных попыток."""
-    try:
-        logger.info("Вызов LLM...")
-        response = llm.invoke(prompt)
-        logger.info("Вызов LLM успешен")
-        return response
-    except Exception as e:
-        logger.warning(f"Ошибка при вызове LLM: {e}")
-        raise  # Повторная попытка
+def robust_llm(llm):
+    """LLM с механизмом повторных попыток (работает и с invoke, и с ainvoke)."""
+    policy = RetryPolicy(max_attempts=3, base_delay=1.0, max_delay=10.0, deadline=60.0)
+    return RetryingRunnable(llm, policy)
 
 def error_handling_example():
     """Пример обработки ошибок."""
@@ -46,12 +42,8 @@ def error_handling_example():
         print("Не найден API ключ. Пожалуйста, установите OPENROUTER_API_KEY в .env файле")
         return
     
-    # Инициализация модели
-    llm = ChatOpenAI(
-        model="openai/gpt-3.5-turbo",
-        openai_api_key=api_key,
-        openai_api_base="https://openrouter.ai/api/v1"
-    )
+    # Инициализация модели (повторами управляет RetryingRunnable)
+    llm = create_chat_model(api_key=api_key, max_retries=0)
     
     # Создание промпта
     prompt = ChatPromptTemplate.from_template("Ответь на вопрос: {question}")
@@ -69,10 +61,12 @@ def error_handling_example():
     except Exception as e:
         print(f"Ошибка: {str(e)}\n")
     
-    # Создание цепочки с обработкой ошибок
+    # Создание цепочки с обработкой ошибок: при недоступности провайдера
+    # выключатель сразу передает управление handle_error, не дожидаясь таймаута
+    guarded_llm = CircuitBreakerRunnable(llm, failure_rate_threshold=0.5, open_timeout=30.0)
     chain_with_fallback = (
         prompt 
-        | llm 
+        | guarded_llm 
         | StrOutputParser()
     ).with_fallbacks([RunnableLambda(handle_error)])
     
@@ -82,14 +76,17 @@ def error_handling_example():
         print(f"Результат: {result}\n")
     except Exception as e:
         print(f"Ошибка: {str(e)}\n")
+    print(f"Состояние выключателя: {guarded_llm.breaker.stats()}\n")
     
     # Пример вызова с повторными попытками
     print("3. Вызов с повторными попытками:")
+    retrying_llm = robust_llm(llm)
     try:
-        result = robust_llm_call("Объясни концепцию нейронных сетей", llm)
+        result = retrying_llm.invoke("Объясни концепцию нейронных сетей")
         print(f"Результат: {result.content}\n")
     except Exception as e:
         print(f"Ошибка после всех повторных попыток: {str(e)}\n")
+    print(f"Статистика повторов: {retrying_llm.stats.as_dict()}\n")
     
     print("=== Завершено ===")
 
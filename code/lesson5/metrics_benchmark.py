@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Бенчмарк накладных расходов callback handler'ов
+Измеряет стоимость одного события для MetricsCallbackHandler и для
+обработчика, который пишет каждое событие в лог, а также замедление
+цепочки на фиктивной модели (без сети) с каждым из обработчиков.
+"""
+
+import io
+import logging
+import sys
+import time
+import uuid
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.language_models import FakeListChatModel
+from langchain_core.messages import AIMessage
+from langchain_core.output_parsers import StrOutputParser
+from langchain_core.outputs import ChatGeneration, LLMResult
+from langchain_core.prompts import ChatPromptTemplate
+
+from metrics_handler import LogLinearHistogram, MetricsCallbackHandler
+
+NUM_EVENTS = 100_000
+NUM_CHAIN_CALLS = 2_000
+
+# Логгер пишет в память, чтобы измерять форматирование, а не вывод в терминал
+log_stream = io.StringIO()
+logger = logging.getLogger("metrics_benchmark")
+logger.addHandler(logging.StreamHandler(log_stream))
+logger.setLevel(logging.INFO)
+logger.propagate = False
+
+
+class LoggingHandler(BaseCallbackHandler):
+    """Обработчик, логирующий полные входы и выходы (как CustomLoggingHandler до изменений)."""
+
+    def on_chat_model_start(self, serialized, messages, **kwargs):
+        logger.info(f"Начало вызова LLM с сообщениями: {messages}")
+
+    def on_llm_end(self, response, **kwargs):
+        logger.info(f"LLM вернул {len(response.generations)} вариантов ответа: {response}")
+
+    def on_chain_start(self, serialized, inputs, **kwargs):
+        logger.info(f"Начало выполнения цепочки с входными данными: {inputs}")
+
+    def on_chain_end(self, outputs, **kwargs):
+        logger.info(f"Цепочка завершена с выходными данными: {outputs}")
+
+
+def check_histogram():
+    histogram = LogLinearHistogram()
+    for value in range(1, 100_001):
+        histogram.record(value)
+    for percent in (50, 90, 99):
+        exact = percent * 1000
+        error = abs(histogram.percentile(percent) - exact) / exact
+        assert error < 0.04, f"p{percent}: погрешность {error:.1%}"
+    print(f"Гистограмма: 100 000 значений в {len(histogram.counts)} корзинах, "
+          f"p50={histogram.percentile(50)}, p99={histogram.percentile(99)} (точные 50000 и 99000)\n")
+
+
+def per_event_cost(handler, num_events):
+    response = LLMResult(generations=[[ChatGeneration(message=AIMessage(
+        content="Ответ", usage_metadata={"input_tokens": 12, "output_tokens": 30, "total_tokens": 42}))]])
+    messages = [[{"role": "user", "content": "Вопрос " * 20}]]
+    metadata = {"ls_model_name": "openai/gpt-3.5-turbo"}
+    run_ids = [uuid.uuid4() for _ in range(num_events)]
+
+    start = time.perf_counter_ns()
+    for run_id in run_ids:
+        handler.on_chat_model_start({"name": "ChatOpenAI"}, messages, run_id=run_id, metadata=metadata)
+        handler.on_llm_end(response, run_id=run_id)
+    # Два события на вызов
+    return (time.perf_counter_ns() - start) / (2 * num_events)
+
+
+def chain_cost(handlers, num_calls):
+    llm = FakeListChatModel(responses=["Краткий ответ модели"])
+    chain = ChatPromptTemplate.from_template("Ответь на вопрос: {question}") | llm | StrOutputParser()
+    config = {"callbacks": handlers}
+    start = time.perf_counter()
+    for i in range(num_calls):
+        chain.invoke({"question": f"вопрос {i}"}, config=config)
+    return (time.perf_counter() - start) / num_calls * 1e6
+
+
+def main():
+    """Основная функция."""
+    num_events = int(sys.argv[1]) if len(sys.argv) > 1 else NUM_EVENTS
+    check_histogram()
+
+    print(f"=== Стоимость события, {num_events} вызовов LLM ===")
+    metrics = MetricsCallbackHandler()
+    print(f"  MetricsCallbackHandler: {per_event_cost(metrics, num_events):.0f} нс/событие")
+    print(f"  Логирование f-строками: {per_event_cost(LoggingHandler(), num_events):.0f} нс/событие")
+
+    print(f"\n=== Цепочка на фиктивной модели, {NUM_CHAIN_CALLS} вызовов ===")
+    baseline = chain_cost([], NUM_CHAIN_CALLS)
+    with_metrics = chain_cost([MetricsCallbackHandler()], NUM_CHAIN_CALLS)
+    with_logging = chain_cost([LoggingHandler()], NUM_CHAIN_CALLS)
+    print(f"  без обработчиков:        {baseline:.0f} мкс/вызов")
+    print(f"  MetricsCallbackHandler:  {with_metrics:.0f} мкс/вызов (+{with_metrics - baseline:.0f})")
+    print(f"  логирование:             {with_logging:.0f} мкс/вызов (+{with_logging - baseline:.0f})")
+
+    snapshot = metrics.snapshot()
+    llm_metrics = snapshot["llm:ChatOpenAI:openai/gpt-3.5-turbo"]
+    assert llm_metrics["calls"] == num_events and llm_metrics["prompt_tokens"]["p50"] == 12
+    print("\nПример экспорта Prometheus:")
+    print(metrics.to_prometheus())
+
+
+if __name__ == "__main__":
+    main()
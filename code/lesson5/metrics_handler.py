@@ -0,0 +1,301 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Метрики цепочек с минимальными накладными расходами
+MetricsCallbackHandler вместо записи каждого события в лог накапливает
+задержки (время до первого токена и полное время), токены запроса и ответа,
+попадания в кэш, повторы и ошибки. Данные группируются по типу (llm, chain,
+tool), имени и модели и хранятся в логарифмически-линейных гистограммах
+в стиле HDR Histogram. Каждый поток пишет в свой набор гистограмм без
+блокировок; снимок объединяет их. Экспорт - JSON и текстовый формат Prometheus.
+"""
+
+import threading
+import time
+from collections import defaultdict
+
+from langchain_core.callbacks import BaseCallbackHandler
+
+# 2**SUB_BUCKET_BITS линейных корзин на каждую степень двойки: погрешность ~3%
+SUB_BUCKET_BITS = 5
+SUB_BUCKETS = 1 << SUB_BUCKET_BITS
+
+
+def bucket_index(value):
+    """Номер корзины для неотрицательного целого значения."""
+    if value < 2 * SUB_BUCKETS:
+        return value
+    shift = value.bit_length() - SUB_BUCKET_BITS - 1
+    return SUB_BUCKETS * (shift + 1) + (value >> shift) - SUB_BUCKETS
+
+
+def bucket_value(index):
+    """Середина диапазона значений корзины."""
+    if index < 2 * SUB_BUCKETS:
+        return index
+    shift = index // SUB_BUCKETS - 1
+    low = (index % SUB_BUCKETS + SUB_BUCKETS) << shift
+    return low + (1 << shift) // 2
+
+
+class LogLinearHistogram:
+    """Гистограмма целых значений (микросекунд, токенов) с относительной точностью.
+
+    Память не зависит от числа измерений: ~32 корзины на степень двойки.
+    Запись - одно вычисление индекса и инкремент элемента списка.
+    """
+
+    __slots__ = ("counts", "count", "total", "max")
+
+    def __init__(self):
+        self.counts = []
+        self.count = 0
+        self.total = 0
+        self.max = 0
+
+    def record(self, value):
+        value = int(value) if value > 0 else 0
+        index = bucket_index(value)
+        counts = self.counts
+        if index >= len(counts):
+            counts.extend([0] * (index + 1 - len(counts)))
+        counts[index] += 1
+        self.count += 1
+        self.total += value
+        if value > self.max:
+            self.max = value
+
+    def merge(self, other):
+        if len(other.counts) > len(self.counts):
+            self.counts.extend([0] * (len(other.counts) - len(self.counts)))
+        for index, count in enumerate(other.counts):
+            self.counts[index] += count
+        self.count += other.count
+        self.total += other.total
+        self.max = max(self.max, other.max)
+
+    def percentile(self, percent):
+        if not self.count:
+            return 0
+        rank = max(1, round(self.count * percent / 100))
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank:
+                return min(bucket_value(index), self.max)
+        return self.max
+
+    def summary(self, percentiles=(50, 90, 99)):
+        result = {"count": self.count, "sum": self.total, "max": self.max}
+        for percent in percentiles:
+            result[f"p{percent}"] = self.percentile(percent)
+        return result
+
+
+class _Shard:
+    """Метрики одного потока: пишет только владелец, читает снимок."""
+
+    def __init__(self):
+        self.histograms = defaultdict(LogLinearHistogram)
+        self.counters = defaultdict(int)
+
+
+class MetricsCallbackHandler(BaseCallbackHandler):
+    """Callback handler, собирающий метрики вместо логов.
+
+    Метрики (ключ - тип, имя и модель):
+        latency_us, ttft_us: гистограммы полного времени и времени до первого токена
+        prompt_tokens, completion_tokens: гистограммы токенов на вызов
+        calls, errors, cache_hits, retries: счетчики
+
+    Args:
+        track_chains: Учитывать ли шаги цепочек (в LCEL каждый шаг - отдельная цепочка)
+    """
+
+    # Синхронный обработчик без этого флага в async-коде запускается в пуле потоков
+    run_inline = True
+
+    def __init__(self, track_chains=True):
+        self.track_chains = track_chains
+        self._local = threading.local()
+        self._shards = []
+        self._shards_lock = threading.Lock()
+        # run_id -> [ключ, время старта, время первого токена]
+        self._runs = {}
+
+    @property
+    def ignore_chain(self):
+        return not self.track_chains
+
+    # --- Хранилище ---
+
+    def _shard(self):
+        shard = getattr(self._local, "shard", None)
+        if shard is None:
+            shard = self._local.shard = _Shard()
+            with self._shards_lock:
+                self._shards.append(shard)
+        return shard
+
+    def _start(self, run_id, key):
+        self._runs[run_id] = [key, time.perf_counter_ns(), 0]
+        self._shard().counters[key + ("calls",)] += 1
+
+    def _finish(self, run_id, error=False):
+        run = self._runs.pop(run_id, None)
+        if run is None:
+            return None
+        key, started, _ = run
+        shard = self._shard()
+        shard.histograms[key + ("latency_us",)].record((time.perf_counter_ns() - started) // 1000)
+        if error:
+            shard.counters[key + ("errors",)] += 1
+        return run
+
+    # --- LLM ---
+
+    @staticmethod
+    def _llm_key(serialized, kwargs):
+        metadata = kwargs.get("metadata") or {}
+        model = metadata.get("ls_model_name")
+        if model is None:
+            params = kwargs.get("invocation_params") or {}
+            model = params.get("model_name") or params.get("model") or ""
+        name = kwargs.get("name") or (serialized or {}).get("name") or "llm"
+        return ("llm", name, model)
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, **kwargs):
+        self._start(run_id, self._llm_key(serialized, kwargs))
+
+    def on_llm_start(self, serialized, prompts, *, run_id, **kwargs):
+        self._start(run_id, self._llm_key(serialized, kwargs))
+
+    def on_llm_new_token(self, token, *, run_id, **kwargs):
+        run = self._runs.get(run_id)
+        if run is not None and not run[2]:
+            run[2] = time.perf_counter_ns()
+            self._shard().histograms[run[0] + ("ttft_us",)].record((run[2] - run[1]) // 1000)
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        run = self._finish(run_id)
+        if run is None:
+            return
+        key = run[0]
+        shard = self._shard()
+        usage = _usage_metadata(response)
+        # Ответы из кэша LangChain помечает нулевой стоимостью
+        if usage and "total_cost" in usage:
+            shard.counters[key + ("cache_hits",)] += 1
+            return
+        if not usage:
+            token_usage = (response.llm_output or {}).get("token_usage") or {}
+            usage = {"input_tokens": token_usage.get("prompt_tokens"),
+                     "output_tokens": token_usage.get("completion_tokens")}
+        if usage.get("input_tokens") is not None:
+            shard.histograms[key + ("prompt_tokens",)].record(usage["input_tokens"])
+        if usage.get("output_tokens") is not None:
+            shard.histograms[key + ("completion_tokens",)].record(usage["output_tokens"])
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        self._finish(run_id, error=True)
+
+    # --- Цепочки и инструменты ---
+
+    def on_chain_start(self, serialized, inputs, *, run_id, **kwargs):
+        name = kwargs.get("name") or (serialized or {}).get("name") or "chain"
+        self._start(run_id, ("chain", name, ""))
+
+    def on_chain_end(self, outputs, *, run_id, **kwargs):
+        self._finish(run_id)
+
+    def on_chain_error(self, error, *, run_id, **kwargs):
+        self._finish(run_id, error=True)
+
+    def on_tool_start(self, serialized, input_str, *, run_id, **kwargs):
+        name = kwargs.get("name") or (serialized or {}).get("name") or "tool"
+        self._start(run_id, ("tool", name, ""))
+
+    def on_tool_end(self, output, *, run_id, **kwargs):
+        self._finish(run_id)
+
+    def on_tool_error(self, error, *, run_id, **kwargs):
+        self._finish(run_id, error=True)
+
+    def on_retry(self, retry_state, *, run_id, **kwargs):
+        run = self._runs.get(run_id)
+        key = run[0] if run is not None else ("chain", "unknown", "")
+        self._shard().counters[key + ("retries",)] += 1
+
+    # --- Экспорт ---
+
+    def _merged(self):
+        histograms = defaultdict(LogLinearHistogram)
+        counters = defaultdict(int)
+        with self._shards_lock:
+            shards = list(self._shards)
+        for shard in shards:
+            # Копии защищают от изменения словаря владельцем во время обхода
+            for key, histogram in list(shard.histograms.items()):
+                histograms[key].merge(histogram)
+            for key, value in list(shard.counters.items()):
+                counters[key] += value
+        return histograms, counters
+
+    def snapshot(self):
+        """Сводка метрик: {"llm:имя:модель": {"calls": ..., "latency_us": {...}}}."""
+        histograms, counters = self._merged()
+        result = defaultdict(dict)
+        for (kind, name, model, metric), value in counters.items():
+            result[f"{kind}:{name}:{model}"][metric] = value
+        for (kind, name, model, metric), histogram in histograms.items():
+            result[f"{kind}:{name}:{model}"][metric] = histogram.summary()
+        return dict(result)
+
+    def to_prometheus(self, prefix="langchain"):
+        """Метрики в текстовом формате Prometheus (счетчики и summary с квантилями)."""
+        histograms, counters = self._merged()
+        lines = []
+        by_metric = defaultdict(list)
+        for (kind, name, model, metric), value in sorted(counters.items()):
+            by_metric[metric].append((kind, name, model, value))
+        for metric, rows in by_metric.items():
+            lines.append(f"# TYPE {prefix}_{metric}_total counter")
+            for kind, name, model, value in rows:
+                lines.append(f"{prefix}_{metric}_total{{{_labels(kind, name, model)}}} {value}")
+
+        by_metric = defaultdict(list)
+        for (kind, name, model, metric), histogram in sorted(histograms.items()):
+            by_metric[metric].append((kind, name, model, histogram))
+        for metric, rows in by_metric.items():
+            lines.append(f"# TYPE {prefix}_{metric} summary")
+            for kind, name, model, histogram in rows:
+                labels = _labels(kind, name, model)
+                for quantile in (0.5, 0.9, 0.99):
+                    value = histogram.percentile(quantile * 100)
+                    lines.append(f'{prefix}_{metric}{{{labels},quantile="{quantile}"}} {value}')
+                lines.append(f"{prefix}_{metric}_sum{{{labels}}} {histogram.total}")
+                lines.append(f"{prefix}_{metric}_count{{{labels}}} {histogram.count}")
+        return "\n".join(lines) + "\n"
+
+    def reset(self):
+        with self._shards_lock:
+            for shard in self._shards:
+                shard.histograms.clear()
+                shard.counters.clear()
+
+
+def _usage_metadata(response):
+    for generations in response.generations:
+        for generation in generations:
+            usage = getattr(getattr(generation, "message", None), "usage_metadata", None)
+            if usage:
+                return usage
+    return None
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(kind, name, model):
+    return f'kind="{kind}",name="{_escape(name)}",model="{_escape(model)}"'
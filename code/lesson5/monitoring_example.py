@@ -6,38 +6,48 @@
 """
 
 import os
+import sys
 import logging
 from dotenv import load_dotenv
-from langchain_openai import ChatOpenAI
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from common.llm_client import create_chat_model
 from langchain_core.prompts import ChatPromptTemplate
 from langchain_core.output_parsers import StrOutputParser
 from langchain_core.callbacks import BaseCallbackHandler, StdOutCallbackHandler
+from metrics_handler import MetricsCallbackHandler
+from trace_handler import TraceCallbackHandler, TraceWriter
 
 # Настройка логирования
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
 class CustomLoggingHandler(BaseCallbackHandler):
-    """Пользовательский обработчик логирования."""
+    """Пользовательский обработчик логирования.
+
+    Сообщения форматируются лениво (аргументами logger), а входы и выходы
+    обрезаются: полные данные в логе дороги и бесполезны для анализа нагрузки.
+    """
+    
+    def on_chat_model_start(self, serialized, messages, **kwargs):
+        logger.info("Начало вызова чат-модели, сообщений: %d", len(messages[0]))
     
     def on_llm_start(self, serialized, prompts, **kwargs):
-        logger.info(f"Начало вызова LLM с промптом: {prompts[0][:50]}...")
+        logger.info("Начало вызова LLM с промптом: %.50s...", prompts[0])
     
     def on_llm_end(self, response, **kwargs):
-        logger.info(f"LLM вернул {len(response.generations)} вариантов ответа")
+        logger.info("LLM вернул %d вариантов ответа", len(response.generations))
     
     def on_chain_start(self, serialized, inputs, **kwargs):
-        logger.info(f"Начало выполнения цепочки с входными данными: {inputs}")
+        logger.debug("Начало выполнения цепочки с входными данными: %.100r", inputs)
     
     def on_chain_end(self, outputs, **kwargs):
-        logger.info(f"Цепочка завершена с выходными данными: {outputs}")
+        logger.debug("Цепочка завершена с выходными данными: %.100r", outputs)
     
     def on_tool_start(self, serialized, input_str, **kwargs):
-        tool_name = serialized.get('name', 'Unknown')
-        logger.info(f"Начало выполнения инструмента: {tool_name}")
+        logger.info("Начало выполнения инструмента: %s", serialized.get('name', 'Unknown'))
     
     def on_tool_end(self, output, **kwargs):
-        logger.info(f"Инструмент завершен с результатом: {output[:50]}...")
+        logger.info("Инструмент завершен с результатом: %.50s...", output)
 
 def monitoring_example():
     """Пример мониторинга и логирования."""
@@ -51,11 +61,7 @@ def monitoring_example():
         return
     
     # Инициализация модели
-    llm = ChatOpenAI(
-        model="openai/gpt-3.5-turbo",
-        openai_api_key=api_key,
-        openai_api_base="https://openrouter.ai/api/v1"
-    )
+    llm = create_chat_model(api_key=api_key)
     
     # Создание промпта
     prompt = ChatPromptTemplate.from_template("Ответь подробно на вопрос: {question}")
@@ -68,15 +74,28 @@ def monitoring_example():
     # Создание обработчиков
     stdout_handler = StdOutCallbackHandler()
     custom_handler = CustomLoggingHandler()
+    metrics_handler = MetricsCallbackHandler()
+    # Трассы пишутся в фоновом потоке; в продакшене хватает выборки в несколько процентов
+    trace_writer = TraceWriter("traces")
+    trace_handler = TraceCallbackHandler(trace_writer, sample_rate=1.0)
     
     # Вызов цепочки с обработчиками
     print("Вызов цепочки с обработчиками логирования:")
     result = chain.invoke(
         {"question": "Что такое LangChain и зачем он нужен?"},
-        config={"callbacks": [stdout_handler, custom_handler]}
+        config={"callbacks": [stdout_handler, custom_handler, metrics_handler, trace_handler]}
     )
+    trace_writer.close()
+    print(f"Трасса записана в {trace_writer.path}")
     
     print(f"\nФинальный результат:\n{result}")
+    
+    # Метрики: задержки, токены, попадания в кэш, повторы и ошибки
+    print("\nМетрики (JSON):")
+    for key, values in metrics_handler.snapshot().items():
+        print(f"  {key}: {values}")
+    print("\nМетрики (формат Prometheus):")
+    print(metrics_handler.to_prometheus())
     print("\n=== Завершено ===")
 
 def main():
@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Бенчмарк повторных попыток
+Запускает цепочку через локальную заглушку с внедренными сбоями:
+20% ответов 503, ответ 400 и 5% очень медленных ответов. Сравнивает долю
+успешных вызовов и хвост задержек с RetryingRunnable и без него.
+Проверяет, что TimeoutError самого вызова повторяется и в асинхронном
+пути, а не принимается за исчерпанный бюджет времени.
+"""
+
+import asyncio
+import os
+import sys
+import time
+
+import numpy as np
+from langchain_core.output_parsers import StrOutputParser
+from langchain_core.prompts import ChatPromptTemplate
+from langchain_core.runnables import RunnableLambda
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from common.llm_client import aclose_http_clients, create_chat_model
+from common.stub_server import StubOpenAIServer
+from retry_policy import RetryPolicy, RetryingRunnable
+
+NUM_CALLS = 300
+CONCURRENCY = 16
+
+
+def build_chain(base_url, policy=None):
+    # Встроенные повторы клиента OpenAI отключены, чтобы сравнение было честным
+    llm = create_chat_model(api_key="stub", base_url=base_url, max_retries=0)
+    if policy is not None:
+        llm = RetryingRunnable(llm, policy, seed=1)
+    prompt = ChatPromptTemplate.from_template("Ответь на вопрос: {question}")
+    return prompt | llm | StrOutputParser(), llm
+
+
+async def run_calls(chain, num_calls):
+    semaphore = asyncio.Semaphore(CONCURRENCY)
+    latencies = []
+
+    async def call(i):
+        async with semaphore:
+            started = time.monotonic()
+            try:
+                await chain.ainvoke({"question": f"вопрос {i}"})
+            except Exception:
+                return False
+            latencies.append(time.monotonic() - started)
+            return True
+
+    results = await asyncio.gather(*(call(i) for i in range(num_calls)))
+    return sum(results), np.array(latencies)
+
+
+def print_result(title, succeeded, latencies, num_calls, stats=None):
+    print(title)
+    line = f"  успешно {succeeded}/{num_calls} ({succeeded / num_calls:.1%})"
+    if len(latencies):
+        line += (f", задержка p50 {np.percentile(latencies, 50) * 1000:.0f} мс, "
+                 f"p99 {np.percentile(latencies, 99) * 1000:.0f} мс")
+    print(line)
+    if stats is not None:
+        print(f"  статистика повторов: {stats.as_dict()}")
+
+
+async def server_errors(num_calls):
+    print(f"=== 20% ответов 503, {num_calls} вызовов ===\n")
+    policy = RetryPolicy(max_attempts=4, base_delay=0.05, max_delay=0.5, deadline=5.0)
+    for title, retry_policy in [("Без повторов:", None), ("RetryingRunnable:", policy)]:
+        with StubOpenAIServer(latency=0.01, error_rate=0.2, error_status=503, seed=7) as server:
+            chain, llm = build_chain(server.base_url, retry_policy)
+            succeeded, latencies = await run_calls(chain, num_calls)
+            print_result(title, succeeded, latencies, num_calls, getattr(llm, "stats", None))
+            print(f"  запросов к серверу: {server.stats['requests']}\n")
+
+
+async def fatal_errors():
+    print("=== Ответ 400 не повторяется ===\n")
+    policy = RetryPolicy(max_attempts=4, base_delay=0.05)
+    with StubOpenAIServer(error_rate=1.0, error_status=400) as server:
+        chain, llm = build_chain(server.base_url, policy)
+        try:
+            await chain.ainvoke({"question": "вопрос"})
+        except Exception as error:
+            print(f"  ошибка: {type(error).__name__}")
+        assert server.stats["requests"] == 1, "ошибка 400 не должна повторяться"
+        print(f"  запросов к серверу: {server.stats['requests']}, статистика: {llm.stats.as_dict()}\n")
+
+
+async def timeout_errors():
+    print("=== TimeoutError вызова повторяется ===\n")
+    policy = RetryPolicy(max_attempts=3, base_delay=0.01, deadline=5.0)
+    calls = []
+
+    def flaky(value):
+        calls.append(value)
+        if len(calls) % 2 == 1:
+            raise TimeoutError("медленный ответ")
+        return value
+
+    runnable = RetryingRunnable(RunnableLambda(flaky), policy, seed=1)
+    assert runnable.invoke("вопрос") == "вопрос"
+    assert await runnable.ainvoke("вопрос") == "вопрос"
+    assert len(calls) == 4 and runnable.stats.as_dict()["deadline_exceeded"] == 0
+    print(f"  invoke и ainvoke успешны со второй попытки, статистика: {runnable.stats.as_dict()}\n")
+
+
+async def slow_tail(num_calls):
+    print(f"=== 5% ответов по 1 с, {num_calls} вызовов ===\n")
+    hedging = RetryPolicy(deadline=10.0, hedge_percentile=90, hedge_min_samples=20)
+    for title, retry_policy in [("Без страхующих запросов:", None), ("Страхующий запрос после p90:", hedging)]:
+        with StubOpenAIServer(latency=0.02, latency_jitter=0.02, slow_rate=0.05, slow_latency=1.0, seed=3) as server:
+            chain, llm = build_chain(server.base_url, retry_policy)
+            succeeded, latencies = await run_calls(chain, num_calls)
+            print_result(title, succeeded, latencies, num_calls, getattr(llm, "stats", None))
+            print(f"  запросов к серверу: {server.stats['requests']}\n")
+
+
+async def benchmark(num_calls):
+    await server_errors(num_calls)
+    await fatal_errors()
+    await timeout_errors()
+    await slow_tail(num_calls)
+    await aclose_http_clients()
+
+
+def main():
+    """Основная функция."""
+    num_calls = int(sys.argv[1]) if len(sys.argv) > 1 else NUM_CALLS
+    asyncio.run(benchmark(num_calls))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,326 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Неблокирующие повторные попытки для цепочек
+RetryingRunnable оборачивает любой Runnable и повторяет вызов при временных
+ошибках (429, 5xx, таймауты) с экспоненциальной задержкой со случайным
+разбросом. Работает и с invoke, и с ainvoke (в асинхронном коде ждет через
+asyncio.sleep), соблюдает общий бюджет времени на вызов и умеет отправлять
+страхующий (hedged) второй запрос, если первый отвечает дольше обычного.
+"""
+
+import asyncio
+import concurrent.futures
+import contextvars
+import random
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import Optional
+
+import httpx
+import openai
+from langchain_core.runnables import Runnable
+from langchain_core.runnables.config import patch_config
+
+from batch_runner import rate_limit_delay
+
+RETRYABLE_STATUS_CODES = {408, 409, 425, 429, 500, 502, 503, 504}
+RETRYABLE_EXCEPTIONS = (
+    TimeoutError,
+    ConnectionError,
+    httpx.TimeoutException,
+    httpx.NetworkError,
+    openai.APIConnectionError,
+    openai.APITimeoutError,
+)
+
+
+class DeadlineExceeded(TimeoutError):
+    """Бюджет времени на вызов исчерпан."""
+
+
+def error_status(error):
+    """HTTP-статус ошибки клиента OpenAI/httpx, если он есть."""
+    status = getattr(error, "status_code", None)
+    if status is None:
+        status = getattr(getattr(error, "response", None), "status_code", None)
+    return status
+
+
+def classify_error(error):
+    """Возвращает "retryable" для временных ошибок и "fatal" для остальных."""
+    status = error_status(error)
+    if status is not None:
+        return "retryable" if status in RETRYABLE_STATUS_CODES or status >= 500 else "fatal"
+    if isinstance(error, RETRYABLE_EXCEPTIONS):
+        return "retryable"
+    return "fatal"
+
+
+@dataclass
+class RetryPolicy:
+    """Параметры повторных попыток.
+
+    Args:
+        max_attempts: Максимальное число попыток (включая первую)
+        base_delay: Базовая задержка перед повтором, в секундах
+        max_delay: Максимальная задержка перед повтором
+        deadline: Бюджет времени на весь вызов со всеми повторами (None - без ограничения)
+        hedge_percentile: Перцентиль задержки успешных вызовов, после которого
+            отправляется страхующий запрос (None - без страхующих запросов)
+        hedge_min_samples: Сколько успешных вызовов нужно для оценки перцентиля
+        hedge_min_delay: Минимальная задержка перед страхующим запросом
+    """
+    max_attempts: int = 4
+    base_delay: float = 0.5
+    max_delay: float = 8.0
+    deadline: Optional[float] = 60.0
+    hedge_percentile: Optional[float] = None
+    hedge_min_samples: int = 20
+    hedge_min_delay: float = 0.05
+
+    def backoff(self, attempt, rng):
+        """Экспоненциальная задержка с полным случайным разбросом (full jitter)."""
+        return rng.uniform(0, min(self.max_delay, self.base_delay * 2 ** (attempt - 1)))
+
+
+class RetryStats:
+    """Потокобезопасные счетчики повторов."""
+
+    FIELDS = ("calls", "attempts", "retries", "hedges", "hedge_wins", "fatal_errors", "exhausted", "deadline_exceeded")
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._values = dict.fromkeys(self.FIELDS, 0)
+
+    def increment(self, name, value=1):
+        with self._lock:
+            self._values[name] += value
+
+    def as_dict(self):
+        with self._lock:
+            return dict(self._values)
+
+
+@dataclass
+class RetryEvent:
+    """Передается обработчикам on_retry вместо состояния tenacity."""
+    attempt_number: int
+    error: BaseException
+    delay: float
+
+
+class RetryingRunnable(Runnable):
+    """Runnable с повторными попытками, бюджетом времени и страхующими запросами.
+
+    Args:
+        bound: Оборачиваемый Runnable (модель или цепочка)
+        policy: Параметры повторов (RetryPolicy)
+        seed: Зерно генератора задержек для воспроизводимых тестов
+    """
+
+    def __init__(self, bound, policy=None, seed=None):
+        self.bound = bound
+        self.policy = policy or RetryPolicy()
+        self.stats = RetryStats()
+        self._latencies = deque(maxlen=512)
+        self._rng = random.Random(seed)
+        self._executor = None
+        self._executor_lock = threading.Lock()
+
+    @property
+    def InputType(self):
+        return self.bound.InputType
+
+    @property
+    def OutputType(self):
+        return self.bound.OutputType
+
+    def get_name(self, suffix=None, *, name=None):
+        return name or f"Retrying{self.bound.get_name()}"
+
+    # --- Общая логика ---
+
+    def _hedge_delay(self):
+        """Задержка перед страхующим запросом или None, если страховка выключена."""
+        percentile = self.policy.hedge_percentile
+        if percentile is None or len(self._latencies) < self.policy.hedge_min_samples:
+            return None
+        latencies = sorted(self._latencies)
+        index = min(len(latencies) - 1, int(len(latencies) * percentile / 100))
+        return max(self.policy.hedge_min_delay, latencies[index])
+
+    def _next_delay(self, attempt, error, deadline):
+        """Решает, повторять ли вызов; возвращает задержку или пробрасывает ошибку."""
+        if classify_error(error) == "fatal":
+            self.stats.increment("fatal_errors")
+            raise error
+        if attempt >= self.policy.max_attempts:
+            self.stats.increment("exhausted")
+            raise error
+        delay = self.policy.backoff(attempt, self._rng)
+        # Сервер мог явно указать, когда повторить запрос
+        retry_after = rate_limit_delay(error)
+        if retry_after:
+            delay = max(delay, retry_after)
+        if deadline is not None and time.monotonic() + delay >= deadline:
+            self.stats.increment("deadline_exceeded")
+            raise error
+        self.stats.increment("retries")
+        return delay
+
+    def _attempt_config(self, config, run_manager, attempt):
+        tag = f"retry:attempt:{attempt}" if attempt > 1 else None
+        return patch_config(config, callbacks=run_manager.get_child(tag))
+
+    def _record_latency(self, started):
+        self._latencies.append(time.monotonic() - started)
+
+    # --- Синхронный путь ---
+
+    def _pool(self):
+        if self._executor is None:
+            with self._executor_lock:
+                if self._executor is None:
+                    self._executor = concurrent.futures.ThreadPoolExecutor(
+                        max_workers=32, thread_name_prefix="retrying-runnable"
+                    )
+        return self._executor
+
+    def _submit(self, input, config, kwargs):
+        started = time.monotonic()
+        context = contextvars.copy_context()
+        future = self._pool().submit(context.run, self.bound.invoke, input, config, **kwargs)
+        return future, started
+
+    def _attempt_sync(self, input, config, deadline, kwargs):
+        hedge_delay = self._hedge_delay()
+        if hedge_delay is None and deadline is None:
+            started = time.monotonic()
+            result = self.bound.invoke(input, config, **kwargs)
+            self._record_latency(started)
+            return result
+
+        # Поток нельзя прервать, поэтому проигравший запрос дорабатывает в фоне,
+        # а его результат отбрасывается
+        pending = {}
+        primary, started = self._submit(input, config, kwargs)
+        pending[primary] = started
+        hedged = False
+        last_error = None
+        while pending:
+            timeout = hedge_delay if (hedge_delay is not None and not hedged) else None
+            if deadline is not None:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self.stats.increment("deadline_exceeded")
+                    raise DeadlineExceeded("Бюджет времени на вызов исчерпан")
+                timeout = remaining if timeout is None else min(timeout, remaining)
+            done, _ = concurrent.futures.wait(pending, timeout=timeout,
+                                              return_when=concurrent.futures.FIRST_COMPLETED)
+            if not done:
+                if hedge_delay is not None and not hedged:
+                    hedged = True
+                    self.stats.increment("hedges")
+                    self.stats.increment("attempts")
+                    future, started = self._submit(input, config, kwargs)
+                    pending[future] = started
+                continue
+            for future in done:
+                started = pending.pop(future)
+                if future.exception() is None:
+                    self._record_latency(started)
+                    if future is not primary:
+                        self.stats.increment("hedge_wins")
+                    return future.result()
+                last_error = future.exception()
+        raise last_error
+
+    def _invoke(self, input, run_manager, config, **kwargs):
+        deadline = time.monotonic() + self.policy.deadline if self.policy.deadline else None
+        self.stats.increment("calls")
+        attempt = 0
+        while True:
+            attempt += 1
+            self.stats.increment("attempts")
+            try:
+                return self._attempt_sync(input, self._attempt_config(config, run_manager, attempt), deadline, kwargs)
+            except DeadlineExceeded:
+                raise
+            except Exception as error:
+                delay = self._next_delay(attempt, error, deadline)
+                run_manager.on_retry(RetryEvent(attempt, error, delay))
+                time.sleep(delay)
+
+    def invoke(self, input, config=None, **kwargs):
+        return self._call_with_config(self._invoke, input, config, **kwargs)
+
+    # --- Асинхронный путь ---
+
+    async def _attempt_async(self, input, config, kwargs):
+        hedge_delay = self._hedge_delay()
+
+        async def call():
+            started = time.monotonic()
+            result = await self.bound.ainvoke(input, config, **kwargs)
+            self._record_latency(started)
+            return result
+
+        primary = asyncio.ensure_future(call())
+        if hedge_delay is None:
+            return await primary
+
+        pending = {primary}
+        try:
+            done, _ = await asyncio.wait(pending, timeout=hedge_delay)
+            if not done:
+                self.stats.increment("hedges")
+                self.stats.increment("attempts")
+                pending.add(asyncio.ensure_future(call()))
+            last_error = None
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is not primary:
+                            self.stats.increment("hedge_wins")
+                        return task.result()
+                    last_error = task.exception()
+            raise last_error
+        finally:
+            # Отменяем проигравший запрос, чтобы не держать соединение
+            for task in pending:
+                task.cancel()
+
+    async def _ainvoke(self, input, run_manager, config, **kwargs):
+        deadline = time.monotonic() + self.policy.deadline if self.policy.deadline else None
+        self.stats.increment("calls")
+        attempt = 0
+        while True:
+            attempt += 1
+            self.stats.increment("attempts")
+            attempt_config = self._attempt_config(config, run_manager, attempt)
+            try:
+                if deadline is None:
+                    return await self._attempt_async(input, attempt_config, kwargs)
+                remaining = deadline - time.monotonic()
+                try:
+                    return await asyncio.wait_for(self._attempt_async(input, attempt_config, kwargs), remaining)
+                except asyncio.TimeoutError:
+                    # TimeoutError самого вызова - обычная ошибка для повтора,
+                    # DeadlineExceeded - только если бюджет действительно исчерпан
+                    if time.monotonic() < deadline:
+                        raise
+                    self.stats.increment("deadline_exceeded")
+                    raise DeadlineExceeded("Бюджет времени на вызов исчерпан") from None
+            except DeadlineExceeded:
+                raise
+            except Exception as error:
+                delay = self._next_delay(attempt, error, deadline)
+                await run_manager.on_retry(RetryEvent(attempt, error, delay))
+                await asyncio.sleep(delay)
+
+    async def ainvoke(self, input, config=None, **kwargs):
+        return await self._acall_with_config(self._ainvoke, input, config, **kwargs)
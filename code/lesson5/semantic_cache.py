@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Семантический кэш LLM
+Кэш находит ранее заданный вопрос, близкий по смыслу к новому (по косинусной
+близости эмбеддингов), и возвращает сохраненный ответ без запроса к модели.
+Может работать поверх точного кэша (например, SQLiteLLMCache).
+"""
+
+import json
+import threading
+import time
+from collections import deque
+
+import numpy as np
+from langchain_core.caches import BaseCache
+
+from disk_cache import normalize_llm_string
+
+
+def prompt_text(prompt):
+    """Извлекает текст сообщений из сериализованного промпта чат-модели.
+
+    Эмбеддинг служебного JSON ухудшил бы сравнение, поэтому сравниваем
+    только содержимое сообщений. Промпт обычной LLM - это уже текст.
+    """
+    try:
+        messages = json.loads(prompt)
+    except ValueError:
+        return prompt
+    if not isinstance(messages, list):
+        return prompt
+    parts = []
+    for message in messages:
+        content = message.get("kwargs", {}).get("content", "") if isinstance(message, dict) else ""
+        if isinstance(content, list):
+            content = " ".join(part.get("text", "") for part in content if isinstance(part, dict))
+        parts.append(str(content))
+    return "\n".join(parts)
+
+
+class VectorIndex:
+    """Компактный индекс для поиска ближайшего вектора перебором.
+
+    Векторы нормированы и лежат подряд в одной матрице, поэтому поиск -
+    это одно матричное умножение. При заполнении емкость удваивается,
+    а при достижении max_entries новые записи замещают самые старые.
+    """
+
+    def __init__(self, dim, initial_capacity=1024, max_entries=None, dtype=np.float32):
+        self.dim = dim
+        self.max_entries = max_entries
+        capacity = min(initial_capacity, max_entries) if max_entries else initial_capacity
+        self.matrix = np.zeros((capacity, dim), dtype=dtype)
+        self.values = [None] * capacity
+        self.size = 0
+        self._next = 0
+
+    def add(self, vector, value):
+        if self._next == len(self.values):
+            if self.max_entries and len(self.values) >= self.max_entries:
+                self._next = 0
+            else:
+                self._grow()
+        row = self._next
+        self.matrix[row] = vector
+        self.values[row] = value
+        self._next += 1
+        self.size = max(self.size, self._next)
+
+    def _grow(self):
+        capacity = len(self.values) * 2
+        if self.max_entries:
+            capacity = min(capacity, self.max_entries)
+        matrix = np.zeros((capacity, self.dim), dtype=self.matrix.dtype)
+        matrix[:self.size] = self.matrix[:self.size]
+        self.matrix = matrix
+        self.values.extend([None] * (capacity - len(self.values)))
+
+    def nearest(self, vector):
+        """Возвращает (значение, сходство) ближайшей записи или (None, -1)."""
+        if self.size == 0:
+            return None, -1.0
+        scores = self.matrix[:self.size] @ vector
+        row = int(np.argmax(scores))
+        return self.values[row], float(scores[row])
+
+
+class SemanticLLMCache(BaseCache):
+    """Кэш, отвечающий на перефразированные вопросы.
+
+    Args:
+        embeddings: Модель эмбеддингов (любая реализация Embeddings)
+        similarity_threshold: Минимальная косинусная близость для попадания
+        exact_cache: Необязательный точный кэш, который проверяется первым
+        max_entries: Максимальное число записей на одну конфигурацию модели
+    """
+
+    def __init__(self, embeddings, similarity_threshold=0.9, exact_cache=None, max_entries=None):
+        self.embeddings = embeddings
+        self.similarity_threshold = similarity_threshold
+        self.exact_cache = exact_cache
+        self.max_entries = max_entries
+        # Отдельный индекс на каждую конфигурацию модели: ответ другой модели
+        # или с другой температурой не должен считаться попаданием
+        self._indexes = {}
+        self._lock = threading.Lock()
+        self._latencies = deque(maxlen=10000)
+        self._stats = {"exact_hits": 0, "semantic_hits": 0, "misses": 0}
+
+    def _embed(self, prompt):
+        vector = np.asarray(self.embeddings.embed_query(prompt_text(prompt)), dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm > 0 else vector
+
+    def lookup(self, prompt, llm_string):
+        """Ищет точное совпадение, затем ближайший по смыслу промпт."""
+        start = time.perf_counter()
+        if self.exact_cache is not None:
+            cached = self.exact_cache.lookup(prompt, llm_string)
+            if cached is not None:
+                self._record("exact_hits", start)
+                return cached
+
+        index = self._indexes.get(normalize_llm_string(llm_string))
+        if index is not None:
+            vector = self._embed(prompt)
+            with self._lock:
+                value, score = index.nearest(vector)
+            if value is not None and score >= self.similarity_threshold:
+                self._record("semantic_hits", start)
+                return value
+
+        self._record("misses", start)
+        return None
+
+    def update(self, prompt, llm_string, return_val):
+        """Сохраняет ответ в точный кэш и в векторный индекс."""
+        if self.exact_cache is not None:
+            self.exact_cache.update(prompt, llm_string, return_val)
+        vector = self._embed(prompt)
+        key = normalize_llm_string(llm_string)
+        with self._lock:
+            index = self._indexes.get(key)
+            if index is None:
+                index = self._indexes[key] = VectorIndex(len(vector), max_entries=self.max_entries)
+            index.add(vector, list(return_val))
+
+    def _record(self, name, start):
+        elapsed = time.perf_counter() - start
+        with self._lock:
+            self._stats[name] += 1
+            self._latencies.append(elapsed)
+
+    def clear(self, **kwargs):
+        with self._lock:
+            self._indexes.clear()
+        if self.exact_cache is not None:
+            self.exact_cache.clear(**kwargs)
+
+    def stats(self):
+        """Доля попаданий и задержка поиска (по последним 10 000 запросам)."""
+        with self._lock:
+            stats = dict(self._stats)
+            latencies = sorted(self._latencies)
+        lookups = stats["exact_hits"] + stats["semantic_hits"] + stats["misses"]
+        stats["hit_rate"] = (stats["exact_hits"] + stats["semantic_hits"]) / lookups if lookups else 0.0
+        if latencies:
+            stats["lookup_p50_ms"] = latencies[len(latencies) // 2] * 1000
+            stats["lookup_p99_ms"] = latencies[int(len(latencies) * 0.99)] * 1000
+        return stats
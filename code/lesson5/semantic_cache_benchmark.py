@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Бенчмарк семантического кэша
+Заполняет SemanticLLMCache синтетическими вопросами и измеряет долю попаданий
+для перефразированных вопросов, долю ложных попаданий для новых вопросов
+и задержку поиска при 10 000 и 100 000 записях.
+"""
+
+import os
+import random
+import sys
+import time
+
+from langchain_core.outputs import Generation
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from common.local_embeddings import HashingEmbeddings
+from semantic_cache import SemanticLLMCache
+
+LLM_STRING = '{"name": "ChatOpenAI", "kwargs": {"model_name": "openai/gpt-3.5-turbo"}}---[]'
+TOPICS = ["нейронных сетей", "машинного обучения", "баз данных", "компиляторов", "операционных систем",
+          "криптографии", "распределенных систем", "компьютерного зрения", "обработки языка", "робототехники"]
+ASPECTS = ["архитектуру", "историю", "основные алгоритмы", "типичные ошибки", "применение", "ограничения"]
+NUM_QUERIES = 2000
+
+
+SYLLABLES = ["ка", "ро", "ми", "ту", "ле", "на", "зо", "ви", "ба", "ре", "фу", "до", "ся", "пе", "гу", "ли"]
+VOCABULARY = [a + b + c for a in SYLLABLES for b in SYLLABLES for c in SYLLABLES]
+
+
+def _parts(i):
+    """Тема, аспект и три слова-термина вопроса номер i (детерминированно)."""
+    rng = random.Random(i)
+    return rng.choice(TOPICS), rng.choice(ASPECTS), rng.sample(VOCABULARY, 3)
+
+
+def question(i):
+    """Уникальный синтетический вопрос номер i."""
+    topic, aspect, terms = _parts(i)
+    return f"Объясни {aspect} {topic}: как связаны {terms[0]}, {terms[1]} и {terms[2]}"
+
+
+def reworded(i):
+    """Тот же вопрос другими словами."""
+    topic, aspect, terms = _parts(i)
+    return f"Пожалуйста, объясни {aspect} {topic} - как связаны {terms[0]}, {terms[1]} и {terms[2]}?"
+
+
+def run(num_entries, threshold):
+    embeddings = HashingEmbeddings(dim=256)
+    cache = SemanticLLMCache(embeddings, similarity_threshold=threshold)
+
+    start = time.perf_counter()
+    for i in range(num_entries):
+        cache.update(question(i), LLM_STRING, [Generation(text=f"Ответ {i}")])
+    build_time = time.perf_counter() - start
+
+    rng = random.Random(42)
+    correct = wrong = 0
+    for _ in range(NUM_QUERIES):
+        i = rng.randrange(num_entries)
+        result = cache.lookup(reworded(i), LLM_STRING)
+        if result is not None:
+            if result[0].text == f"Ответ {i}":
+                correct += 1
+            else:
+                wrong += 1
+    rephrased_stats = cache.stats()
+
+    false_hits = 0
+    for j in range(NUM_QUERIES):
+        # Вопросы с номерами за пределами кэша - их тексты в кэш не попадали
+        if cache.lookup(question(num_entries + j), LLM_STRING) is not None:
+            false_hits += 1
+    total_stats = cache.stats()
+
+    print(f"\nЗаписей: {num_entries:,} (заполнение {build_time:.1f} с), порог {threshold}")
+    print(f"  Перефразированные вопросы: попаданий {correct / NUM_QUERIES:.1%}, "
+          f"из них с чужим ответом {wrong / NUM_QUERIES:.1%}")
+    print(f"  Новые вопросы: ложных попаданий {false_hits / NUM_QUERIES:.1%}")
+    print(f"  Задержка поиска: p50 {rephrased_stats['lookup_p50_ms']:.3f} мс, "
+          f"p99 {rephrased_stats['lookup_p99_ms']:.3f} мс, общая доля попаданий {total_stats['hit_rate']:.1%}")
+
+
+def main():
+    """Основная функция."""
+    sizes = [int(arg) for arg in sys.argv[1:]] or [10_000, 100_000]
+    print("=== Бенчмарк семантического кэша ===")
+    for num_entries in sizes:
+        run(num_entries, threshold=0.9)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Бенчмарк потокового вывода
+Локальная заглушка отвечает по словам событиями SSE с паузой между словами.
+Сравнивает время до первого видимого текста для invoke и stream, проверяет,
+что собранный из потока ответ совпадает с полным, и запускает lesson1/main.py
+и lesson2/chatbot.py против заглушки в потоковом режиме.
+"""
+
+import asyncio
+import io
+import os
+import subprocess
+import sys
+import time
+
+from langchain_core.output_parsers import StrOutputParser
+from langchain_core.prompts import ChatPromptTemplate
+
+CODE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.append(CODE_DIR)
+from common.llm_client import aclose_http_clients, create_chat_model
+from common.stub_server import StubOpenAIServer
+from common.streaming import astream_to_console, stream_to_console
+
+LATENCY = 0.3
+TOKEN_DELAY = 0.02
+NUM_WORDS = 60
+
+
+def responder(messages):
+    return " ".join(f"слово{i}" for i in range(NUM_WORDS))
+
+
+def compare(base_url):
+    llm = create_chat_model(api_key="stub", base_url=base_url)
+    chain = ChatPromptTemplate.from_template("Ответь на вопрос: {question}") | llm | StrOutputParser()
+    inputs = {"question": "Что такое потоковый вывод?"}
+
+    start = time.perf_counter()
+    full = chain.invoke(inputs)
+    invoke_time = time.perf_counter() - start
+
+    streamed, stats = stream_to_console(chain, inputs, file=io.StringIO())
+    assert streamed == full, "ответ из потока должен совпадать с полным ответом"
+    astreamed, astats = asyncio.run(astream_to_console(chain, inputs, file=io.StringIO()))
+    assert astreamed == full
+
+    print(f"invoke:  текст появляется через {invoke_time * 1000:.0f} мс (весь ответ сразу)")
+    print(f"stream:  {stats}")
+    print(f"astream: {astats}")
+    asyncio.run(aclose_http_clients())
+
+
+def run_script(path, base_url):
+    env = dict(os.environ, OPENROUTER_API_KEY="stub", OPENROUTER_API_BASE=base_url)
+    start = time.perf_counter()
+    result = subprocess.run([sys.executable, path], cwd=os.path.dirname(path), env=env,
+                            capture_output=True, text=True, timeout=120)
+    elapsed = time.perf_counter() - start
+    output = result.stdout.strip().splitlines()
+    ttft_lines = [line for line in output if line.startswith("(первый токен")]
+    print(f"\n{os.path.relpath(path, CODE_DIR)}: код возврата {result.returncode}, {elapsed:.1f} с")
+    for line in ttft_lines:
+        print(f"  {line}")
+    assert result.returncode == 0 and ttft_lines, result.stdout + result.stderr
+
+
+def main():
+    """Основная функция."""
+    print(f"=== Заглушка: {LATENCY * 1000:.0f} мс до первого слова, {NUM_WORDS} слов "
+          f"с паузой {TOKEN_DELAY * 1000:.0f} мс ===\n")
+    with StubOpenAIServer(latency=LATENCY, token_delay=TOKEN_DELAY, responder=responder) as server:
+        compare(server.base_url)
+        run_script(os.path.join(CODE_DIR, "lesson1", "main.py"), server.base_url)
+        run_script(os.path.join(CODE_DIR, "lesson2", "chatbot.py"), server.base_url)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Бенчмарк трассировки цепочек
+Измеряет пропускную способность цепочки на фиктивной модели (без сети)
+без трассировки, с выборкой 10% (головной и хвостовой) и со 100% трасс,
+а также для сравнения со StdOutCallbackHandler. Проверяет, что поток
+записи переживает битую трассу и сбой ротации файла.
+"""
+
+import contextlib
+import io
+import json
+import os
+import sys
+import tempfile
+import time
+
+from langchain_core.callbacks import StdOutCallbackHandler
+from langchain_core.language_models import FakeListChatModel
+from langchain_core.output_parsers import StrOutputParser
+from langchain_core.prompts import ChatPromptTemplate
+
+from trace_handler import TraceCallbackHandler, TraceWriter
+
+NUM_CALLS = 2_000
+
+
+def build_chain():
+    llm = FakeListChatModel(responses=["Краткий ответ модели " * 20])
+    return ChatPromptTemplate.from_template("Ответь подробно на вопрос: {question}") | llm | StrOutputParser()
+
+
+def throughput(chain, handlers, num_calls):
+    config = {"callbacks": handlers}
+    start = time.perf_counter()
+    for i in range(num_calls):
+        chain.invoke({"question": f"вопрос {i} " + "контекст " * 50}, config=config)
+    return num_calls / (time.perf_counter() - start)
+
+
+def check_writer_errors(chain, directory, num_calls=20):
+    """Битая трасса и сбой ротации учитываются в stats["errors"], но поток продолжает писать."""
+    writer = TraceWriter(directory, filename="traces_errors.jsonl", max_bytes=1, backup_count=2)
+    rotate = writer._rotate
+    failures = [OSError("диск недоступен")]
+
+    def failing_rotate():
+        if failures:
+            raise failures.pop()
+        rotate()
+
+    writer._rotate = failing_rotate
+    writer.submit([{"name": "битая трасса"}])
+    throughput(chain, [TraceCallbackHandler(writer)], num_calls)
+    writer.close()
+    assert not writer._thread.is_alive(), "Поток записи не завершился"
+    assert writer.stats["errors"] == 2, writer.stats
+    assert writer.stats["written"] >= num_calls - 1, writer.stats
+    print(f"  сбои записи: ошибок {writer.stats['errors']}, записано трасс {writer.stats['written']} "
+          f"из {num_calls}")
+
+
+def main():
+    """Основная функция."""
+    num_calls = int(sys.argv[1]) if len(sys.argv) > 1 else NUM_CALLS
+    chain = build_chain()
+    print(f"=== Трассировка, {num_calls} вызовов цепочки prompt | llm | parser ===\n")
+
+    baseline = throughput(chain, [], num_calls)
+    print(f"  без трассировки:                {baseline:8.0f} вызовов/с")
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        stdout_rate = throughput(chain, [StdOutCallbackHandler()], num_calls)
+    print(f"  StdOutCallbackHandler:          {stdout_rate:8.0f} вызовов/с ({stdout_rate / baseline:.0%})")
+
+    with tempfile.TemporaryDirectory() as directory:
+        for number, (title, kwargs) in enumerate([
+            ("головная выборка 10%", {"sample_rate": 0.1, "sampling": "head"}),
+            ("хвостовая выборка 10%", {"sample_rate": 0.1, "sampling": "tail"}),
+            ("все трассы (100%)", {"sample_rate": 1.0}),
+        ]):
+            writer = TraceWriter(directory, filename=f"traces_{number}.jsonl", max_bytes=1024 * 1024, backup_count=3)
+            handler = TraceCallbackHandler(writer, seed=1, **kwargs)
+            rate = throughput(chain, [handler], num_calls)
+            writer.close()
+            print(f"  {title + ':':32}{rate:8.0f} вызовов/с ({rate / baseline:.0%}), "
+                  f"записано трасс {writer.stats['written']}, ротаций {writer.stats['rotations']}")
+
+        with open(writer.path, encoding="utf-8") as file:
+            trace = json.loads(file.readline())
+        root = trace["root"]
+        assert [child["name"] for child in root["children"]] == ["ChatPromptTemplate", "FakeListChatModel",
+                                                                 "StrOutputParser"]
+        print(f"\nПример дерева: {root['name']} -> {[child['name'] for child in root['children']]}, "
+              f"файлов в каталоге: {len(os.listdir(directory))}")
+        check_writer_errors(chain, directory)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,333 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Структурированная трассировка цепочек с выборкой и фоновой записью
+TraceCallbackHandler собирает дерево вызовов (цепочка -> промпт -> LLM ->
+парсер -> инструмент) по run_id и parent_run_id. На пути запроса сохраняются
+только ссылки на данные и отметки времени; преобразование в строки, обрезка
+и запись в JSONL выполняются в фоновом потоке TraceWriter пакетами, с ротацией
+файлов. Выборка может быть головной (решение в начале трассы) или хвостовой
+(решение после завершения: ошибки и медленные трассы сохраняются всегда).
+"""
+
+import atexit
+import json
+import os
+import queue
+import random
+import threading
+import time
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.messages import BaseMessage
+from langchain_core.outputs import LLMResult
+
+HEAD = "head"
+TAIL = "tail"
+
+
+def truncate_payload(value, limit=256, max_items=20, depth=0):
+    """JSON-совместимая копия значения с обрезанными строками и списками."""
+    if value is None or isinstance(value, (bool, int, float)):
+        return value
+    if isinstance(value, str):
+        return value if len(value) <= limit else value[:limit] + f"...(+{len(value) - limit})"
+    if depth >= 4:
+        return truncate_payload(repr(value), limit)
+    if isinstance(value, BaseMessage):
+        return {"type": value.type, "content": truncate_payload(value.content, limit, max_items, depth + 1)}
+    if isinstance(value, LLMResult):
+        texts = [generation.text for generations in value.generations for generation in generations]
+        return {"generations": truncate_payload(texts, limit, max_items, depth + 1),
+                "llm_output": truncate_payload(value.llm_output, limit, max_items, depth + 1)}
+    if isinstance(value, dict):
+        items = list(value.items())
+        result = {str(key): truncate_payload(item, limit, max_items, depth + 1) for key, item in items[:max_items]}
+        if len(items) > max_items:
+            result["..."] = f"+{len(items) - max_items}"
+        return result
+    if isinstance(value, (list, tuple)):
+        result = [truncate_payload(item, limit, max_items, depth + 1) for item in value[:max_items]]
+        if len(value) > max_items:
+            result.append(f"...(+{len(value) - max_items})")
+        return result
+    if hasattr(value, "page_content"):
+        # Документы ретриверов
+        return {"page_content": truncate_payload(value.page_content, limit),
+                "metadata": truncate_payload(value.metadata, limit, max_items, depth + 1)}
+    if hasattr(value, "to_string"):
+        # Значения промптов (ChatPromptValue, StringPromptValue)
+        return truncate_payload(value.to_string(), limit)
+    return truncate_payload(repr(value), limit)
+
+
+class TraceWriter:
+    """Фоновая запись трасс в JSONL с ротацией файлов.
+
+    Args:
+        directory: Каталог для файлов трасс
+        filename: Имя текущего файла; старые файлы получают суффиксы .1, .2, ...
+        max_bytes: Размер файла, после которого выполняется ротация
+        backup_count: Сколько старых файлов хранить
+        batch_size: Максимум трасс в одной записи на диск
+        flush_interval: Как часто записывать неполный пакет, в секундах
+        max_queue: Размер очереди; при переполнении трассы отбрасываются
+        max_payload_chars: Максимальная длина строк во входах и выходах
+    """
+
+    def __init__(self, directory="traces", filename="traces.jsonl", max_bytes=10 * 1024 * 1024,
+                 backup_count=5, batch_size=200, flush_interval=1.0, max_queue=10000, max_payload_chars=256):
+        os.makedirs(directory, exist_ok=True)
+        self.path = os.path.join(directory, filename)
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_payload_chars = max_payload_chars
+        # errors - сбои записи: трасса не сериализуется или пакет не записан на диск
+        self.stats = {"submitted": 0, "written": 0, "dropped": 0, "rotations": 0, "bytes": 0, "errors": 0}
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name="trace-writer", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def submit(self, spans):
+        """Ставит завершенную трассу в очередь; никогда не блокирует вызывающего."""
+        try:
+            self._queue.put_nowait(spans)
+            self.stats["submitted"] += 1
+        except queue.Full:
+            self.stats["dropped"] += 1
+
+    def _run(self):
+        file = open(self.path, "a", encoding="utf-8")
+        try:
+            while True:
+                try:
+                    first = self._queue.get(timeout=self.flush_interval)
+                except queue.Empty:
+                    continue
+                if first is None:
+                    break
+                batch = [first]
+                stop = False
+                while len(batch) < self.batch_size:
+                    try:
+                        item = self._queue.get_nowait()
+                    except queue.Empty:
+                        break
+                    if item is None:
+                        stop = True
+                        break
+                    batch.append(item)
+                try:
+                    file = self._write(file, batch)
+                except Exception:
+                    # Сбой диска не должен останавливать поток: пакет теряется,
+                    # следующие пишутся в заново открытый файл
+                    self.stats["errors"] += 1
+                    file = self._reopen(file)
+                if stop:
+                    break
+        finally:
+            file.close()
+
+    def _write(self, file, batch):
+        lines = []
+        for spans in batch:
+            try:
+                lines.append(json.dumps(self.build_tree(spans), ensure_ascii=False) + "\n")
+            except Exception:
+                self.stats["errors"] += 1  # одна плохая трасса не должна терять весь пакет
+        count = len(lines)
+        lines = "".join(lines)
+        file.write(lines)
+        file.flush()
+        self.stats["written"] += count
+        self.stats["bytes"] += len(lines)
+        if file.tell() >= self.max_bytes:
+            file.close()
+            self._rotate()
+            file = open(self.path, "a", encoding="utf-8")
+        return file
+
+    def _reopen(self, file):
+        """Файл для следующего пакета после сбоя записи или ротации."""
+        if file.closed:
+            try:
+                file = open(self.path, "a", encoding="utf-8")
+            except OSError:
+                pass  # попробуем снова при следующем сбое
+        return file
+
+    def _rotate(self):
+        for index in range(self.backup_count - 1, 0, -1):
+            source = f"{self.path}.{index}"
+            if os.path.exists(source):
+                os.replace(source, f"{self.path}.{index + 1}")
+        if self.backup_count:
+            os.replace(self.path, f"{self.path}.1")
+        else:
+            os.remove(self.path)
+        self.stats["rotations"] += 1
+
+    def build_tree(self, spans):
+        """Вложенное дерево спанов одной трассы (выполняется в фоновом потоке)."""
+        limit = self.max_payload_chars
+        nodes = {}
+        for span in spans:
+            node = {
+                "name": span["name"],
+                "kind": span["kind"],
+                "run_id": str(span["run_id"]),
+                "start": span["start"],
+                "duration_ms": round(((span["end"] or span["start"]) - span["start"]) * 1000, 3),
+                "inputs": truncate_payload(span["inputs"], limit),
+                "outputs": truncate_payload(span["outputs"], limit),
+            }
+            if span["error"] is not None:
+                node["error"] = truncate_payload(repr(span["error"]), limit)
+            if span["tags"]:
+                node["tags"] = span["tags"]
+            node["children"] = []
+            nodes[span["run_id"]] = node
+
+        root = None
+        for span in sorted(spans, key=lambda item: item["start"]):
+            node = nodes[span["run_id"]]
+            parent = nodes.get(span["parent_id"])
+            if parent is not None:
+                parent["children"].append(node)
+            elif root is None:
+                root = node
+        return {"trace_id": str(spans[0]["trace_id"]), "root": root, "spans": len(spans)}
+
+    def close(self, timeout=5.0):
+        """Записывает оставшиеся трассы и останавливает поток."""
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put(None)
+        self._thread.join(timeout)
+
+
+class TraceCallbackHandler(BaseCallbackHandler):
+    """Callback handler, собирающий трассы вызовов для TraceWriter.
+
+    Args:
+        writer: TraceWriter для записи трасс
+        sample_rate: Доля сохраняемых трасс (0..1)
+        sampling: "head" - решение при старте трассы (несохраняемые трассы почти
+            ничего не стоят); "tail" - после завершения, с учетом ошибок и задержки
+        tail_latency_ms: В режиме "tail" трассы дольше этого времени сохраняются всегда
+        seed: Зерно генератора выборки
+    """
+
+    # Обработчик не блокирует и должен вызываться прямо в цикле событий
+    run_inline = True
+
+    def __init__(self, writer, sample_rate=1.0, sampling=HEAD, tail_latency_ms=None, seed=None):
+        if sampling not in (HEAD, TAIL):
+            raise ValueError(f"Неизвестный режим выборки: {sampling}")
+        self.writer = writer
+        self.sample_rate = sample_rate
+        self.sampling = sampling
+        self.tail_latency_ms = tail_latency_ms
+        self._random = random.Random(seed)
+        # run_id -> трасса (список спанов) или None, если трасса не сохраняется
+        self._traces = {}
+        self._spans = {}
+
+    # --- Общая логика ---
+
+    def _start(self, kind, serialized, inputs, run_id, parent_run_id, kwargs):
+        if parent_run_id is None:
+            if self.sampling == HEAD and self._random.random() >= self.sample_rate:
+                self._traces[run_id] = None
+                return
+            trace = []
+        else:
+            trace = self._traces.get(parent_run_id)
+            if trace is None:
+                # Дочерний вызов несохраняемой трассы или трассы, начатой до подключения
+                self._traces[run_id] = None
+                return
+        self._traces[run_id] = trace
+        span = {
+            "trace_id": trace[0]["run_id"] if trace else run_id,
+            "run_id": run_id,
+            "parent_id": parent_run_id,
+            "name": kwargs.get("name") or (serialized or {}).get("name") or kind,
+            "kind": kind,
+            "start": time.time(),
+            "end": None,
+            # Ссылки на данные; строки из них строит фоновый поток
+            "inputs": inputs,
+            "outputs": None,
+            "error": None,
+            "tags": kwargs.get("tags"),
+        }
+        trace.append(span)
+        self._spans[run_id] = span
+
+    def _end(self, run_id, parent_run_id, outputs=None, error=None):
+        trace = self._traces.pop(run_id, None)
+        span = self._spans.pop(run_id, None)
+        if span is not None:
+            span["end"] = time.time()
+            span["outputs"] = outputs
+            span["error"] = error
+        if parent_run_id is None and trace is not None and self._keep(trace):
+            self.writer.submit(trace)
+
+    def _keep(self, trace):
+        if self.sampling == HEAD:
+            return True
+        root = trace[0]
+        if any(span["error"] is not None for span in trace):
+            return True
+        if self.tail_latency_ms is not None and (root["end"] - root["start"]) * 1000 >= self.tail_latency_ms:
+            return True
+        return self._random.random() < self.sample_rate
+
+    # --- События ---
+
+    def on_chain_start(self, serialized, inputs, *, run_id, parent_run_id=None, **kwargs):
+        self._start("chain", serialized, inputs, run_id, parent_run_id, kwargs)
+
+    def on_chain_end(self, outputs, *, run_id, parent_run_id=None, **kwargs):
+        self._end(run_id, parent_run_id, outputs=outputs)
+
+    def on_chain_error(self, error, *, run_id, parent_run_id=None, **kwargs):
+        self._end(run_id, parent_run_id, error=error)
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, parent_run_id=None, **kwargs):
+        self._start("llm", serialized, messages, run_id, parent_run_id, kwargs)
+
+    def on_llm_start(self, serialized, prompts, *, run_id, parent_run_id=None, **kwargs):
+        self._start("llm", serialized, prompts, run_id, parent_run_id, kwargs)
+
+    def on_llm_end(self, response, *, run_id, parent_run_id=None, **kwargs):
+        self._end(run_id, parent_run_id, outputs=response)
+
+    def on_llm_error(self, error, *, run_id, parent_run_id=None, **kwargs):
+        self._end(run_id, parent_run_id, error=error)
+
+    def on_tool_start(self, serialized, input_str, *, run_id, parent_run_id=None, **kwargs):
+        self._start("tool", serialized, input_str, run_id, parent_run_id, kwargs)
+
+    def on_tool_end(self, output, *, run_id, parent_run_id=None, **kwargs):
+        self._end(run_id, parent_run_id, outputs=output)
+
+    def on_tool_error(self, error, *, run_id, parent_run_id=None, **kwargs):
+        self._end(run_id, parent_run_id, error=error)
+
+    def on_retriever_start(self, serialized, query, *, run_id, parent_run_id=None, **kwargs):
+        self._start("retriever", serialized, query, run_id, parent_run_id, kwargs)
+
+    def on_retriever_end(self, documents, *, run_id, parent_run_id=None, **kwargs):
+        self._end(run_id, parent_run_id, outputs=documents)
+
+    def on_retriever_error(self, error, *, run_id, parent_run_id=None, **kwargs):
+        self._end(run_id, parent_run_id, error=error)
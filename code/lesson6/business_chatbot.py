@@ -4,8 +4,11 @@ This script demonstrates how to create a business chatbot using LangChain
 """
 
 import os
+import sys
 from dotenv import load_dotenv
-from langchain_openai import ChatOpenAI
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from common.llm_client import create_chat_model
+from common.streaming import stream_to_console
 from langchain.memory import ConversationBufferMemory
 from langchain.prompts import ChatPromptTemplate
 from langchain_core.output_parsers import StrOutputParser
@@ -13,15 +16,14 @@ from langchain_core.output_parsers import StrOutputParser
 # Load environment variables
 load_dotenv()
 
+# Stream responses by default; --no-stream prints each response once it is complete
+STREAMING = "--no-stream" not in sys.argv
+
 def create_business_chatbot():
     """Create a business chatbot with company context"""
     
     # Initialize the model
-    llm = ChatOpenAI(
-        model="openai/gpt-3.5-turbo",
-        openai_api_key=os.getenv("OPENROUTER_API_KEY"),
-        openai_api_base="https://openrouter.ai/api/v1"
-    )
+    llm = create_chat_model()
     
     # Create prompt template for business chatbot
     template = """
@@ -79,15 +81,20 @@ def main():
             # Get conversation history
             history = memory.chat_memory.messages
             
-            # Get response
-            response = chain.invoke({
+            inputs = {
                 "history": history,
                 "input": question
-            })
+            }
             
-            print(f"Assistant: {response}\n")
+            # Get response
+            if STREAMING:
+                response, stats = stream_to_console(chain, inputs, prefix="Assistant: ")
+                print(f"(first token after {stats.ttft * 1000:.0f} ms, total {stats.total * 1000:.0f} ms)\n")
+            else:
+                response = chain.invoke(inputs)
+                print(f"Assistant: {response}\n")
             
-            # Save to memory
+            # Save to memory once the full response has arrived
             memory.save_context({"input": question}, {"output": response})
             
     except Exception as e:
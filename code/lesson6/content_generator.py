@@ -4,8 +4,11 @@ This script demonstrates how to create content generators using LangChain
 """
 
 import os
+import sys
 from dotenv import load_dotenv
-from langchain_openai import ChatOpenAI
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from common.llm_client import create_chat_model
+from streaming_json import StreamingJsonOutputParser
 from langchain.prompts import PromptTemplate
 from langchain_core.output_parsers import StrOutputParser, JsonOutputParser
 from langchain_core.pydantic_v1 import BaseModel, Field
@@ -14,21 +17,24 @@ from typing import List
 # Load environment variables
 load_dotenv()
 
+# Stream structured results by default; --no-stream waits for the whole JSON
+STREAMING = "--no-stream" not in sys.argv
+
 class MarketingContent(BaseModel):
     headline: str = Field(description="Attention-grabbing headline")
     body: str = Field(description="Main content body")
     call_to_action: str = Field(description="Call to action statement")
 
-def create_ad_generator():
-    """Create an advertising content generator"""
+def create_ad_generator(streaming=False):
+    """Create an advertising content generator
+    
+    With streaming=True the chain yields validated fields and list items
+    as soon as they are generated (see streaming_json.py); invoke() still
+    returns the parsed dict.
+    """
     
     # Initialize the model
-    llm = ChatOpenAI(
-        model="openai/gpt-3.5-turbo",
-        openai_api_key=os.getenv("OPENROUTER_API_KEY"),
-        openai_api_base="https://openrouter.ai/api/v1",
-        temperature=0.7
-    )
+    llm = create_chat_model(temperature=0.7)
     
     # Create prompt template for ad generation
     ad_template = """
@@ -41,7 +47,10 @@ def create_ad_generator():
     """
     
     # Create JSON parser for structured output
-    parser = JsonOutputParser(pydantic_object=MarketingContent)
+    if streaming:
+        parser = StreamingJsonOutputParser(pydantic_object=MarketingContent)
+    else:
+        parser = JsonOutputParser(pydantic_object=MarketingContent)
     
     ad_prompt = PromptTemplate(
         template=ad_template,
@@ -58,11 +67,7 @@ def create_report_generator():
     """Create a report generator"""
     
     # Initialize the model
-    llm = ChatOpenAI(
-        model="openai/gpt-3.5-turbo",
-        openai_api_key=os.getenv("OPENROUTER_API_KEY"),
-        openai_api_base="https://openrouter.ai/api/v1"
-    )
+    llm = create_chat_model()
     
     # Create prompt template for report generation
     report_template = """
@@ -99,18 +104,27 @@ def main():
         
         # Generate marketing content
         print("1. Marketing Content Generation:")
-        ad_chain = create_ad_generator()
+        ad_chain = create_ad_generator(streaming=STREAMING)
         
-        ad_result = ad_chain.invoke({
+        ad_inputs = {
             "product": "Smart Water Bottle",
             "audience": "Fitness enthusiasts",
             "benefits": "Tracks water intake, reminds to hydrate, eco-friendly",
             "tone": "energetic and motivational"
-        })
+        }
+        titles = {"headline": "Headline", "body": "Body", "call_to_action": "Call to Action"}
         
-        print(f"Headline: {ad_result['headline']}")
-        print(f"Body: {ad_result['body']}")
-        print(f"Call to Action: {ad_result['call_to_action']}\n")
+        if STREAMING:
+            # Each field is printed as soon as it is complete
+            for event in ad_chain.stream(ad_inputs):
+                if event.kind == "field" and event.path[0] in titles:
+                    print(f"{titles[event.path[0]]}: {event.value}", flush=True)
+            print()
+        else:
+            ad_result = ad_chain.invoke(ad_inputs)
+            for key, title in titles.items():
+                print(f"{title}: {ad_result[key]}")
+            print()
         
         # Generate report
         print("2. Report Generation:")
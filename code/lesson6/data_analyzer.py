@@ -4,8 +4,11 @@ This script demonstrates how to analyze data and documents using LangChain
 """
 
 import os
+import sys
 from dotenv import load_dotenv
-from langchain_openai import ChatOpenAI
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from common.llm_client import create_chat_model
+from streaming_json import StreamingJsonOutputParser
 from langchain.prompts import PromptTemplate
 from langchain_core.output_parsers import JsonOutputParser
 from langchain_core.pydantic_v1 import BaseModel, Field
@@ -14,6 +17,9 @@ from typing import List
 # Load environment variables
 load_dotenv()
 
+# Stream structured results by default; --no-stream waits for the whole JSON
+STREAMING = "--no-stream" not in sys.argv
+
 class ReviewAnalysis(BaseModel):
     sentiment: str = Field(description="Overall sentiment: positive, negative, or neutral")
     key_points: List[str] = Field(description="Key points from the review")
@@ -24,15 +30,16 @@ class LegalAnalysis(BaseModel):
     risks: List[str] = Field(description="Potential risks identified")
     recommendations: List[str] = Field(description="Recommendations for improvement")
 
-def create_review_analyzer():
-    """Create a customer review analyzer"""
+def create_review_analyzer(streaming=False):
+    """Create a customer review analyzer
+    
+    With streaming=True the chain yields validated fields and list items
+    as soon as they are generated (see streaming_json.py); invoke() still
+    returns the parsed dict.
+    """
     
     # Initialize the model
-    llm = ChatOpenAI(
-        model="openai/gpt-3.5-turbo",
-        openai_api_key=os.getenv("OPENROUTER_API_KEY"),
-        openai_api_base="https://openrouter.ai/api/v1"
-    )
+    llm = create_chat_model()
     
     # Create prompt template for review analysis
     review_template = """
@@ -44,7 +51,10 @@ def create_review_analyzer():
     """
     
     # Create JSON parser
-    parser = JsonOutputParser(pydantic_object=ReviewAnalysis)
+    if streaming:
+        parser = StreamingJsonOutputParser(pydantic_object=ReviewAnalysis)
+    else:
+        parser = JsonOutputParser(pydantic_object=ReviewAnalysis)
     
     review_prompt = PromptTemplate(
         template=review_template,
@@ -57,15 +67,16 @@ def create_review_analyzer():
     
     return review_chain
 
-def create_legal_analyzer():
-    """Create a legal document analyzer"""
+def create_legal_analyzer(streaming=False):
+    """Create a legal document analyzer
+    
+    With streaming=True the chain yields validated fields and list items
+    as soon as they are generated (see streaming_json.py); invoke() still
+    returns the parsed dict.
+    """
     
     # Initialize the model
-    llm = ChatOpenAI(
-        model="openai/gpt-3.5-turbo",
-        openai_api_key=os.getenv("OPENROUTER_API_KEY"),
-        openai_api_base="https://openrouter.ai/api/v1"
-    )
+    llm = create_chat_model()
     
     # Create prompt template for legal analysis
     legal_template = """
@@ -83,7 +94,10 @@ def create_legal_analyzer():
     """
     
     # Create JSON parser
-    parser = JsonOutputParser(pydantic_object=LegalAnalysis)
+    if streaming:
+        parser = StreamingJsonOutputParser(pydantic_object=LegalAnalysis)
+    else:
+        parser = JsonOutputParser(pydantic_object=LegalAnalysis)
     
     legal_prompt = PromptTemplate(
         template=legal_template,
@@ -96,6 +110,21 @@ def create_legal_analyzer():
     
     return legal_chain
 
+def print_streamed(chain, inputs, titles):
+    """Print list items and scalar fields of a streaming analyzer as they arrive"""
+    current = None
+    for event in chain.stream(inputs):
+        if event.kind == "done" or event.path[0] not in titles:
+            continue
+        field = event.path[0]
+        if event.kind == "item":
+            if field != current:
+                print(f"{titles[field]}:")
+                current = field
+            print(f"  - {event.value}", flush=True)
+        elif not isinstance(event.value, list):
+            print(f"{titles[field]}: {event.value}", flush=True)
+
 def main():
     """Main function to demonstrate data analyzers"""
     try:
@@ -109,24 +138,29 @@ def main():
         
         # Analyze customer review
         print("1. Customer Review Analysis:")
-        review_chain = create_review_analyzer()
+        review_chain = create_review_analyzer(streaming=STREAMING)
         
         review = "The product arrived quickly, but the quality is disappointing. The packaging was damaged."
         
-        review_result = review_chain.invoke({"review": review})
-        
-        print(f"Sentiment: {review_result['sentiment']}")
-        print("Key Points:")
-        for point in review_result['key_points']:
-            print(f"  - {point}")
-        print("Suggestions:")
-        for suggestion in review_result['suggestions']:
-            print(f"  - {suggestion}")
+        if STREAMING:
+            print_streamed(review_chain, {"review": review}, {
+                "sentiment": "Sentiment", "key_points": "Key Points", "suggestions": "Suggestions"
+            })
+        else:
+            review_result = review_chain.invoke({"review": review})
+            
+            print(f"Sentiment: {review_result['sentiment']}")
+            print("Key Points:")
+            for point in review_result['key_points']:
+                print(f"  - {point}")
+            print("Suggestions:")
+            for suggestion in review_result['suggestions']:
+                print(f"  - {suggestion}")
         print()
         
         # Analyze legal document
         print("2. Legal Document Analysis:")
-        legal_chain = create_legal_analyzer()
+        legal_chain = create_legal_analyzer(streaming=STREAMING)
         
         contract = """
         SUPPLY AGREEMENT
@@ -135,17 +169,23 @@ def main():
         3. Late delivery penalty: 0.1% of goods value per day.
         """
         
-        legal_result = legal_chain.invoke({"document": contract})
-        
-        print("Legal Obligations:")
-        for obligation in legal_result['obligations']:
-            print(f"  - {obligation}")
-        print("Potential Risks:")
-        for risk in legal_result['risks']:
-            print(f"  - {risk}")
-        print("Recommendations:")
-        for recommendation in legal_result['recommendations']:
-            print(f"  - {recommendation}")
+        if STREAMING:
+            print_streamed(legal_chain, {"document": contract}, {
+                "obligations": "Legal Obligations", "risks": "Potential Risks",
+                "recommendations": "Recommendations"
+            })
+        else:
+            legal_result = legal_chain.invoke({"document": contract})
+            
+            print("Legal Obligations:")
+            for obligation in legal_result['obligations']:
+                print(f"  - {obligation}")
+            print("Potential Risks:")
+            for risk in legal_result['risks']:
+                print(f"  - {risk}")
+            print("Recommendations:")
+            for recommendation in legal_result['recommendations']:
+                print(f"  - {recommendation}")
         
     except Exception as e:
         print(f"An error occurred: {str(e)}")
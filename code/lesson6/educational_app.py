@@ -4,8 +4,12 @@ This script demonstrates how to create educational applications using LangChain
 """
 
 import os
+import sys
 from dotenv import load_dotenv
-from langchain_openai import ChatOpenAI
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from common.llm_client import create_chat_model
+from common.streaming import stream_to_console
+from streaming_json import StreamingJsonOutputParser
 from langchain.prompts import PromptTemplate
 from langchain_core.output_parsers import StrOutputParser, JsonOutputParser
 from langchain_core.pydantic_v1 import BaseModel, Field
@@ -14,6 +18,9 @@ from typing import List
 # Load environment variables
 load_dotenv()
 
+# Stream responses by default; --no-stream prints each response once it is complete
+STREAMING = "--no-stream" not in sys.argv
+
 class Question(BaseModel):
     question: str = Field(description="The question")
     options: List[str] = Field(description="Answer options")
@@ -26,11 +33,7 @@ def create_tutorial_generator():
     """Create a tutorial generator"""
     
     # Initialize the model
-    llm = ChatOpenAI(
-        model="openai/gpt-3.5-turbo",
-        openai_api_key=os.getenv("OPENROUTER_API_KEY"),
-        openai_api_base="https://openrouter.ai/api/v1"
-    )
+    llm = create_chat_model()
     
     # Create prompt template for tutorial generation
     tutorial_template = """
@@ -52,15 +55,16 @@ def create_tutorial_generator():
     
     return tutorial_chain
 
-def create_quiz_generator():
-    """Create a quiz generator"""
+def create_quiz_generator(streaming=False):
+    """Create a quiz generator
+    
+    With streaming=True the chain yields validated fields and list items
+    as soon as they are generated (see streaming_json.py); invoke() still
+    returns the parsed dict.
+    """
     
     # Initialize the model
-    llm = ChatOpenAI(
-        model="openai/gpt-3.5-turbo",
-        openai_api_key=os.getenv("OPENROUTER_API_KEY"),
-        openai_api_base="https://openrouter.ai/api/v1"
-    )
+    llm = create_chat_model()
     
     # Create prompt template for quiz generation
     quiz_template = """
@@ -70,7 +74,10 @@ def create_quiz_generator():
     """
     
     # Create JSON parser
-    parser = JsonOutputParser(pydantic_object=Quiz)
+    if streaming:
+        parser = StreamingJsonOutputParser(pydantic_object=Quiz)
+    else:
+        parser = JsonOutputParser(pydantic_object=Quiz)
     
     quiz_prompt = PromptTemplate(
         template=quiz_template,
@@ -83,6 +90,13 @@ def create_quiz_generator():
     
     return quiz_chain
 
+def print_question(number, question):
+    """Print a quiz question with its options"""
+    print(f"{number}. {question['question']}")
+    for j, option in enumerate(question['options'], 1):
+        print(f"   {j}) {option}")
+    print(f"   Correct answer: {question['correct_answer']}\n", flush=True)
+
 def main():
     """Main function to demonstrate educational applications"""
     try:
@@ -98,35 +112,44 @@ def main():
         print("1. Tutorial Generation:")
         tutorial_chain = create_tutorial_generator()
         
-        tutorial_result = tutorial_chain.invoke({
+        tutorial_inputs = {
             "topic": "Python basics",
             "level": "beginner",
             "format": "step-by-step guide",
             "length": "3 paragraphs",
             "examples": "yes",
             "style": "friendly and clear"
-        })
+        }
         
         print("Python Basics Tutorial:")
-        print(tutorial_result)
+        if STREAMING:
+            tutorial_result, stats = stream_to_console(tutorial_chain, tutorial_inputs)
+            print(f"(first token after {stats.ttft * 1000:.0f} ms, total {stats.total * 1000:.0f} ms)")
+        else:
+            tutorial_result = tutorial_chain.invoke(tutorial_inputs)
+            print(tutorial_result)
         print()
         
         # Generate quiz
         print("2. Quiz Generation:")
-        quiz_chain = create_quiz_generator()
+        quiz_chain = create_quiz_generator(streaming=STREAMING)
         
-        quiz_result = quiz_chain.invoke({
+        quiz_inputs = {
             "num_questions": "3",
             "topic": "machine learning",
             "level": "beginner"
-        })
+        }
         
         print("Machine Learning Quiz:")
-        for i, question in enumerate(quiz_result['questions'], 1):
-            print(f"{i}. {question['question']}")
-            for j, option in enumerate(question['options'], 1):
-                print(f"   {j}) {option}")
-            print(f"   Correct answer: {question['correct_answer']}\n")
+        if STREAMING:
+            # Each question is printed as soon as its JSON object closes
+            for event in quiz_chain.stream(quiz_inputs):
+                if event.kind == "item" and event.path[0] == "questions":
+                    print_question(event.path[1] + 1, event.value)
+        else:
+            quiz_result = quiz_chain.invoke(quiz_inputs)
+            for i, question in enumerate(quiz_result['questions'], 1):
+                print_question(i, question)
         
     except Exception as e:
         print(f"An error occurred: {str(e)}")
@@ -0,0 +1,346 @@
+"""
+Streaming JSON Output Parser
+This module parses JSON produced by an LLM incrementally while tokens stream in.
+Instead of re-parsing the accumulated text on every chunk, it scans each new
+character once, keeps a stack of open containers and emits an event as soon as
+a top-level field or a list item closes. Each completed value is validated
+against the pydantic model field it belongs to (pydantic v1 and v2 are supported).
+"""
+
+import json
+import re
+from dataclasses import dataclass
+from typing import Any, List, Tuple, get_args, get_origin
+
+from langchain_core.exceptions import OutputParserException
+from langchain_core.output_parsers import JsonOutputParser
+from langchain_core.runnables import Runnable
+
+# Next character that matters before the document / outside / inside a string
+_OPENING = re.compile(r"[{\[]")
+_STRUCTURAL = re.compile(r'[{}\[\],:"]')
+_STRING_SPECIAL = re.compile(r'["\\]')
+
+# Value states of a container frame
+_PENDING = None  # no value text seen since the last delimiter
+_EMITTED = -1  # the current value has already been reported
+
+
+@dataclass
+class JsonEvent:
+    """A completed piece of the streamed JSON document.
+
+    kind is "field" (a value of an object key), "item" (a list element) or
+    "done" (the whole document). path locates the value, e.g. ("questions", 0).
+    """
+    kind: str
+    path: Tuple
+    value: Any
+
+
+class _Frame:
+    __slots__ = ("is_object", "path", "key", "index", "expect_key", "value_start", "value_from")
+
+    def __init__(self, is_object, path, value_from):
+        self.is_object = is_object
+        self.path = path
+        self.key = None
+        self.index = 0
+        self.expect_key = is_object
+        self.value_start = _PENDING
+        # Position right after the last ":", "," or opening bracket
+        self.value_from = value_from
+
+
+class IncrementalJsonParser:
+    """Push parser: feed() text chunks, get back the JsonEvents they completed.
+
+    Every character is scanned once; a value is decoded with json.loads only
+    when it closes, so the total cost is linear in the length of the output.
+    Text before the first "{" or "[" (for example a ```json fence) is skipped,
+    as is anything after the top-level value closes.
+
+    Args:
+        max_depth: Emit events for values inside containers up to this depth
+            (1 - top-level fields only, 2 - also items of top-level lists)
+    """
+
+    def __init__(self, max_depth=2):
+        self.max_depth = max_depth
+        self.buffer = ""
+        self.result = None
+        self._pos = 0
+        self._stack = []
+        self._in_string = False
+        self._string_start = 0
+        self._root_start = None
+        self._done = False
+
+    @property
+    def done(self):
+        return self._done
+
+    def feed(self, text):
+        """Consumes a chunk of text and returns the list of completed events."""
+        if self._done or not text:
+            return []
+        self.buffer += text
+        buffer = self.buffer
+        length = len(buffer)
+        pos = self._pos
+        events = []
+
+        while pos < length:
+            if self._in_string:
+                match = _STRING_SPECIAL.search(buffer, pos)
+                if match is None:
+                    pos = length
+                    break
+                pos = match.start()
+                if buffer[pos] == "\\":
+                    if pos + 1 >= length:
+                        # Escape sequence split across chunks
+                        break
+                    pos += 2
+                    continue
+                pos += 1
+                self._in_string = False
+                self._close_string(self._string_start, pos, events)
+                continue
+
+            if self._root_start is None:
+                match = _OPENING.search(buffer, pos)
+                if match is None:
+                    pos = length
+                    break
+                pos = self._root_start = match.start()
+
+            match = _STRUCTURAL.search(buffer, pos)
+            if match is None:
+                pos = length
+                break
+            pos = match.start()
+            char = buffer[pos]
+            frame = self._stack[-1] if self._stack else None
+
+            if char == '"':
+                self._in_string = True
+                self._string_start = pos
+                if frame is not None and not frame.expect_key and frame.value_start is _PENDING:
+                    frame.value_start = pos
+            elif char == "{" or char == "[":
+                path = ()
+                if frame is not None:
+                    if frame.value_start is _PENDING:
+                        frame.value_start = pos
+                    path = frame.path + (frame.key if frame.is_object else frame.index,)
+                self._stack.append(_Frame(char == "{", path, pos + 1))
+            elif char == "}" or char == "]":
+                self._complete_primitive(frame, pos, events)
+                self._stack.pop()
+                if not self._stack:
+                    self._finish(pos + 1, events)
+                    pos += 1
+                    break
+                # The closed container is a complete value of its parent
+                parent = self._stack[-1]
+                self._emit(parent, parent.value_start, pos + 1, events)
+            elif char == ":":
+                frame.expect_key = False
+                frame.value_start = _PENDING
+                frame.value_from = pos + 1
+            else:  # ","
+                self._complete_primitive(frame, pos, events)
+                if frame.is_object:
+                    frame.expect_key = True
+                else:
+                    frame.index += 1
+                frame.value_start = _PENDING
+                frame.value_from = pos + 1
+            pos += 1
+
+        self._pos = pos
+        return events
+
+    # --- Internals ---
+
+    def _close_string(self, start, end, events):
+        frame = self._stack[-1]
+        if frame.is_object and frame.expect_key:
+            frame.key = json.loads(self.buffer[start:end])
+        else:
+            self._emit(frame, frame.value_start, end, events)
+
+    def _complete_primitive(self, frame, end, events):
+        """At a delimiter: a number, true, false or null has no closing character."""
+        if frame.value_start is not _PENDING or (frame.is_object and frame.expect_key):
+            return
+        if self.buffer[frame.value_from:end].strip():
+            self._emit(frame, frame.value_from, end, events)
+
+    def _emit(self, frame, start, end, events):
+        if start is _PENDING or start == _EMITTED:
+            return
+        frame.value_start = _EMITTED
+        if len(self._stack) > self.max_depth:
+            return
+        text = self.buffer[start:end]
+        try:
+            value = json.loads(text)
+        except json.JSONDecodeError as error:
+            raise OutputParserException(f"Invalid JSON value at {frame.path}: {text.strip()[:80]!r}",
+                                        llm_output=self.buffer) from error
+        key = frame.key if frame.is_object else frame.index
+        events.append(JsonEvent("field" if frame.is_object else "item", frame.path + (key,), value))
+
+    def _finish(self, end, events):
+        self._done = True
+        text = self.buffer[self._root_start:end]
+        try:
+            self.result = json.loads(text)
+        except json.JSONDecodeError as error:
+            raise OutputParserException(f"Invalid JSON: {error}", llm_output=self.buffer) from error
+        events.append(JsonEvent("done", (), self.result))
+
+
+class FieldValidator:
+    """Validates completed fields and list items against a pydantic model.
+
+    Works with pydantic v2 models and with v1 models (including pydantic.v1
+    and langchain_core.pydantic_v1 on top of pydantic 2).
+    """
+
+    def __init__(self, model):
+        self.model = model
+        self.is_v2 = hasattr(model, "model_fields")
+        self._adapters = {}
+
+    def _annotation(self, name):
+        if self.is_v2:
+            field = self.model.model_fields.get(name)
+            return None if field is None else field.annotation
+        field = self.model.__fields__.get(name)
+        return None if field is None else field.outer_type_
+
+    def _validate_v2(self, annotation, value, cache_key):
+        from pydantic import TypeAdapter, ValidationError
+
+        adapter = self._adapters.get(cache_key)
+        if adapter is None:
+            adapter = self._adapters[cache_key] = TypeAdapter(annotation)
+        try:
+            return adapter.validate_python(value)
+        except ValidationError as error:
+            raise OutputParserException(f"Field {cache_key} failed validation: {error}") from error
+
+    def _validate_v1(self, name, value, item):
+        field = self.model.__fields__[name]
+        if item:
+            field = field.sub_fields[0] if field.sub_fields else field
+        validated, errors = field.validate(value, {}, loc=name)
+        if errors:
+            raise OutputParserException(f"Field {name} failed validation: {errors}")
+        return validated
+
+    def validate(self, event):
+        """Returns the validated value of a field/item event (or None if not in the model)."""
+        if event.kind == "done":
+            if self.is_v2:
+                return self.model.model_validate(event.value)
+            return self.model.parse_obj(event.value)
+        name = event.path[0] if event.path else None
+        annotation = self._annotation(name)
+        if annotation is None:
+            return None
+        item = event.kind == "item" and len(event.path) == 2
+        if not self.is_v2:
+            return self._validate_v1(name, event.value, item)
+        if item:
+            if get_origin(annotation) not in (list, List):
+                return None
+            args = get_args(annotation)
+            annotation = args[0] if args else Any
+            return self._validate_v2(annotation, event.value, (name, "item"))
+        return self._validate_v2(annotation, event.value, (name,))
+
+
+@dataclass
+class ValidatedEvent(JsonEvent):
+    """JsonEvent plus the value validated against the pydantic model."""
+    validated: Any = None
+
+
+def _chunk_text(chunk):
+    if isinstance(chunk, str):
+        return chunk
+    content = getattr(chunk, "content", "")
+    if isinstance(content, list):
+        return "".join(part.get("text", "") if isinstance(part, dict) else str(part) for part in content)
+    return content
+
+
+class StreamingJsonOutputParser(Runnable):
+    """Drop-in alternative to JsonOutputParser for streamed structured output.
+
+    invoke() returns the parsed dict like JsonOutputParser; stream()/astream()
+    of a chain ending with this parser yield ValidatedEvent objects as soon
+    as fields and list items close, followed by a final "done" event.
+
+    Args:
+        pydantic_object: Optional pydantic model used for format instructions
+            and field-by-field validation
+        max_depth: See IncrementalJsonParser
+    """
+
+    def __init__(self, pydantic_object=None, max_depth=2):
+        self.pydantic_object = pydantic_object
+        self.max_depth = max_depth
+        self._validator = FieldValidator(pydantic_object) if pydantic_object is not None else None
+
+    def get_format_instructions(self):
+        return JsonOutputParser(pydantic_object=self.pydantic_object).get_format_instructions()
+
+    def _events(self, parser, text):
+        for event in parser.feed(text):
+            validated = self._validator.validate(event) if self._validator is not None else None
+            yield ValidatedEvent(event.kind, event.path, event.value, validated)
+
+    def _parse_stream(self, chunks):
+        parser = IncrementalJsonParser(self.max_depth)
+        for chunk in chunks:
+            yield from self._events(parser, _chunk_text(chunk))
+        if not parser.done:
+            raise OutputParserException("Incomplete JSON in model output", llm_output=parser.buffer)
+
+    async def _aparse_stream(self, chunks):
+        parser = IncrementalJsonParser(self.max_depth)
+        async for chunk in chunks:
+            for event in self._events(parser, _chunk_text(chunk)):
+                yield event
+        if not parser.done:
+            raise OutputParserException("Incomplete JSON in model output", llm_output=parser.buffer)
+
+    def invoke(self, input, config=None, **kwargs):
+        def parse(value):
+            events = list(self._parse_stream([value]))
+            return events[-1].value
+        return self._call_with_config(parse, input, config, run_type="parser")
+
+    def transform(self, input, config=None, **kwargs):
+        yield from self._transform_stream_with_config(input, self._parse_stream, config, run_type="parser")
+
+    async def atransform(self, input, config=None, **kwargs):
+        async for event in self._atransform_stream_with_config(input, self._aparse_stream, config,
+                                                               run_type="parser"):
+            yield event
+
+    def stream(self, input, config=None, **kwargs):
+        yield from self.transform(iter([input]), config, **kwargs)
+
+    async def astream(self, input, config=None, **kwargs):
+        async def single():
+            yield input
+
+        async for event in self.atransform(single(), config, **kwargs):
+            yield event
+
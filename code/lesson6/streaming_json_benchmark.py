@@ -0,0 +1,129 @@
+"""
+Streaming JSON Parser Benchmark
+This script compares the incremental parser with re-parsing the accumulated
+buffer on every chunk (what JsonOutputParser does while streaming): total parse
+cost and how early the first complete quiz question becomes available. It also
+streams a quiz from a local stub server to measure time to the first question.
+"""
+
+import json
+import os
+import random
+import sys
+import time
+from typing import List
+
+from langchain_core.output_parsers import JsonOutputParser
+from langchain_core.outputs import Generation
+from langchain_core.prompts import PromptTemplate
+from pydantic import BaseModel, Field
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from common.llm_client import create_chat_model
+from common.stub_server import StubOpenAIServer
+from streaming_json import IncrementalJsonParser, StreamingJsonOutputParser
+
+
+class Question(BaseModel):
+    question: str = Field(description="The question")
+    options: List[str] = Field(description="Answer options")
+    correct_answer: str = Field(description="Correct answer")
+
+
+class Quiz(BaseModel):
+    questions: List[Question] = Field(description="List of questions")
+
+
+def make_quiz(num_questions, seed=0):
+    rng = random.Random(seed)
+    words = ["model", "gradient", "feature", "label", "training", "overfitting", "loss", "layer", "batch"]
+    questions = []
+    for i in range(num_questions):
+        options = [" ".join(rng.choices(words, k=3)) for _ in range(4)]
+        questions.append({
+            "question": f"Question {i}: what is the role of {' '.join(rng.choices(words, k=4))}?",
+            "options": options,
+            "correct_answer": options[0],
+        })
+    return {"questions": questions}
+
+
+def chunks_of(text, size=4):
+    """Split text into token-sized chunks (~4 characters like BPE tokens)."""
+    return [text[i:i + size] for i in range(0, len(text), size)]
+
+
+def run_incremental(chunks):
+    parser = IncrementalJsonParser()
+    first_item = None
+    start = time.perf_counter()
+    for index, chunk in enumerate(chunks):
+        for event in parser.feed(chunk):
+            if first_item is None and event.kind == "item":
+                first_item = index
+    return time.perf_counter() - start, first_item, parser.result
+
+
+def run_reparse(chunks):
+    parser = JsonOutputParser()
+    buffer = ""
+    first_item = None
+    result = None
+    start = time.perf_counter()
+    for index, chunk in enumerate(chunks):
+        buffer += chunk
+        result = parser.parse_result([Generation(text=buffer)], partial=True)
+        # A question is known to be complete once the next one has started
+        if first_item is None and result and len(result.get("questions", [])) > 1:
+            first_item = index
+    return time.perf_counter() - start, first_item, result
+
+
+def parse_cost(sizes):
+    print("=== Parse cost per document (4-character chunks) ===\n")
+    print(f"{'questions':>9} {'chunks':>7} {'incremental':>12} {'re-parse':>10} {'first item (chunk #)':>22}")
+    for num_questions in sizes:
+        document = make_quiz(num_questions)
+        chunks = chunks_of(json.dumps(document, indent=2))
+        incremental_time, incremental_first, incremental_result = run_incremental(chunks)
+        reparse_time, reparse_first, reparse_result = run_reparse(chunks)
+        assert incremental_result == document and reparse_result == document
+        print(f"{num_questions:>9} {len(chunks):>7} {incremental_time * 1000:>9.1f} ms {reparse_time * 1000:>7.0f} ms "
+              f"{incremental_first:>10} vs {reparse_first:<10}")
+
+
+def time_to_first_question(num_questions):
+    document = json.dumps(make_quiz(num_questions), indent=2)
+    print(f"\n=== Stub server: {num_questions} questions, 300 ms to first token, 5 ms between words ===\n")
+    with StubOpenAIServer(latency=0.3, token_delay=0.005, responder=lambda messages: document) as server:
+        llm = create_chat_model(api_key="stub", base_url=server.base_url)
+        prompt = PromptTemplate.from_template("Create a quiz with {num_questions} questions")
+
+        start = time.perf_counter()
+        result = (prompt | llm | JsonOutputParser(pydantic_object=Quiz)).invoke({"num_questions": num_questions})
+        invoke_time = time.perf_counter() - start
+
+        chain = prompt | llm | StreamingJsonOutputParser(pydantic_object=Quiz)
+        start = time.perf_counter()
+        first_question = None
+        for event in chain.stream({"num_questions": num_questions}):
+            if first_question is None and event.kind == "item":
+                first_question = time.perf_counter() - start
+                assert isinstance(event.validated, Question)
+        stream_time = time.perf_counter() - start
+        assert event.kind == "done" and event.value == result
+
+    print(f"JsonOutputParser.invoke: whole quiz after {invoke_time * 1000:.0f} ms")
+    print(f"StreamingJsonOutputParser: first validated question after {first_question * 1000:.0f} ms, "
+          f"whole quiz after {stream_time * 1000:.0f} ms")
+
+
+def main():
+    """Main function"""
+    sizes = [int(arg) for arg in sys.argv[1:]] or [10, 50, 100]
+    parse_cost(sizes)
+    time_to_first_question(sizes[0])
+
+
+if __name__ == "__main__":
+    main()
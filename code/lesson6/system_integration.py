@@ -3,93 +3,172 @@ System Integration Example
 This script demonstrates how to integrate LangChain with external systems
 """
 
+import asyncio
 import os
+import sys
 from dotenv import load_dotenv
-from langchain_openai import ChatOpenAI
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from common.async_tools import ServiceClient
+from common.llm_client import aclose_http_clients, create_chat_model
+from common.parallel_agent import ParallelToolAgent
+from common.tool_cache import ToolCache
 from langchain.agents import Tool, AgentExecutor, create_react_agent
 from langchain.prompts import PromptTemplate
+from langchain_core.tools import StructuredTool
 
 # Load environment variables
 load_dotenv()
 
-# Mock CRM API
+# Cache for read-only tool results; mutating tools invalidate the affected entries
+tool_cache = ToolCache(max_entries=1000)
+
+# CRM API: in-memory demo data, or a real REST backend when base_url is given.
+# Every method has an async twin so agents running under ainvoke never leave
+# the event loop for a tool call.
 class CRMAPI:
-    def __init__(self):
+    def __init__(self, base_url=None):
+        self.client = ServiceClient(base_url) if base_url else None
         self.customers = {
             "1": {"name": "John Smith", "email": "john@example.com", "status": "VIP"},
             "2": {"name": "Jane Doe", "email": "jane@example.com", "status": "Regular"}
         }
     
-    def get_customer_info(self, customer_id):
-        customer = self.customers.get(customer_id)
+    @staticmethod
+    def _format_customer(customer):
         if customer:
             return f"Name: {customer['name']}, Email: {customer['email']}, Status: {customer['status']}"
         return "Customer not found"
     
-    def update_customer_status(self, customer_id, status):
-        if customer_id in self.customers:
-            self.customers[customer_id]["status"] = status
+    def _update_local(self, customer_id, status):
+        customer = self.customers.get(customer_id)
+        if customer:
+            customer["status"] = status
+        return customer
+    
+    @staticmethod
+    def _format_update(customer_id, status, customer):
+        if customer:
             return f"Customer {customer_id} status updated to {status}"
         return "Customer not found"
+    
+    def get_customer_info(self, customer_id):
+        if self.client:
+            return self._format_customer(self.client.get(f"/customers/{customer_id}"))
+        return self._format_customer(self.customers.get(customer_id))
+    
+    async def aget_customer_info(self, customer_id):
+        if self.client:
+            return self._format_customer(await self.client.aget(f"/customers/{customer_id}"))
+        return self._format_customer(self.customers.get(customer_id))
+    
+    def update_customer_status(self, customer_id, status):
+        if self.client:
+            customer = self.client.post(f"/customers/{customer_id}/status", json={"status": status})
+        else:
+            customer = self._update_local(customer_id, status)
+        return self._format_update(customer_id, status, customer)
+    
+    async def aupdate_customer_status(self, customer_id, status):
+        if self.client:
+            customer = await self.client.apost(f"/customers/{customer_id}/status", json={"status": status})
+        else:
+            customer = self._update_local(customer_id, status)
+        return self._format_update(customer_id, status, customer)
 
-# Mock E-commerce API
+# E-commerce API: in-memory demo data, or a real REST backend when base_url is given
 class ECommerceAPI:
-    def __init__(self):
+    def __init__(self, base_url=None):
+        self.client = ServiceClient(base_url) if base_url else None
         self.products = {
             "1": {"name": "Smartphone", "price": 500, "stock": 10},
             "2": {"name": "Laptop", "price": 1000, "stock": 5}
         }
     
-    def get_product_info(self, product_id):
-        product = self.products.get(product_id)
+    @staticmethod
+    def _format_product(product):
         if product:
             return f"Product: {product['name']}, Price: ${product['price']}, Stock: {product['stock']}"
         return "Product not found"
     
-    def check_inventory(self, product_id):
-        product = self.products.get(product_id)
+    @staticmethod
+    def _format_inventory(product):
         if product:
             return f"Product {product['name']} inventory: {product['stock']} units"
         return "Product not found"
     
-    def process_order(self, product_id, quantity):
+    def _order_local(self, product_id, quantity):
         product = self.products.get(product_id)
         if not product:
+            return None
+        if product["stock"] >= quantity:
+            product["stock"] -= quantity
+            return {"processed": True, "total": quantity * product["price"], "stock": product["stock"]}
+        return {"processed": False, "stock": product["stock"]}
+    
+    @staticmethod
+    def _format_order(order):
+        if not order:
             return "Product not found"
-        
-        if product["stock"] >= int(quantity):
-            product["stock"] -= int(quantity)
-            total = int(quantity) * product["price"]
-            return f"Order processed. Total: ${total}. Remaining stock: {product['stock']} units"
+        if order["processed"]:
+            return f"Order processed. Total: ${order['total']}. Remaining stock: {order['stock']} units"
+        return f"Insufficient stock. Available: {order['stock']} units"
+    
+    def _get_product(self, product_id):
+        return self.client.get(f"/products/{product_id}") if self.client else self.products.get(product_id)
+    
+    async def _aget_product(self, product_id):
+        return await self.client.aget(f"/products/{product_id}") if self.client else self.products.get(product_id)
+    
+    def get_product_info(self, product_id):
+        return self._format_product(self._get_product(product_id))
+    
+    async def aget_product_info(self, product_id):
+        return self._format_product(await self._aget_product(product_id))
+    
+    def check_inventory(self, product_id):
+        return self._format_inventory(self._get_product(product_id))
+    
+    async def acheck_inventory(self, product_id):
+        return self._format_inventory(await self._aget_product(product_id))
+    
+    def process_order(self, product_id, quantity):
+        if self.client:
+            order = self.client.post("/orders", json={"product_id": product_id, "quantity": int(quantity)})
         else:
-            return f"Insufficient stock. Available: {product['stock']} units"
+            order = self._order_local(product_id, int(quantity))
+        return self._format_order(order)
+    
+    async def aprocess_order(self, product_id, quantity):
+        if self.client:
+            order = await self.client.apost("/orders", json={"product_id": product_id, "quantity": int(quantity)})
+        else:
+            order = self._order_local(product_id, int(quantity))
+        return self._format_order(order)
 
 def create_crm_agent():
     """Create an agent for CRM integration"""
     
-    # Initialize APIs
-    crm = CRMAPI()
+    # Initialize APIs (CRM_API_URL points the tools at a real backend)
+    crm = CRMAPI(os.getenv("CRM_API_URL"))
     
-    # Create tools
+    # Create tools; coroutine= keeps ainvoke on the event loop
     tools = [
-        Tool(
+        tool_cache.cached(ttl=60, tags=lambda customer_id: [f"customer:{customer_id}"])(Tool(
             name="GetCustomerInfo",
             func=lambda customer_id: crm.get_customer_info(customer_id),
+            coroutine=lambda customer_id: crm.aget_customer_info(customer_id),
             description="Gets customer information by ID"
-        ),
-        Tool(
+        )),
+        tool_cache.invalidates(lambda x: [f"customer:{x.split(',')[0]}"])(Tool(
             name="UpdateCustomerStatus",
             func=lambda x: crm.update_customer_status(*x.split(",")),
+            coroutine=lambda x: crm.aupdate_customer_status(*x.split(",")),
             description="Updates customer status. Format: customer_id,status"
-        )
+        ))
     ]
     
     # Initialize the model
-    llm = ChatOpenAI(
-        model="openai/gpt-3.5-turbo",
-        openai_api_key=os.getenv("OPENROUTER_API_KEY"),
-        openai_api_base="https://openrouter.ai/api/v1"
-    )
+    llm = create_chat_model()
     
     # Create prompt
     prompt = PromptTemplate.from_template("""
@@ -106,50 +185,58 @@ def create_crm_agent():
     return agent_executor
 
 def create_ecommerce_agent():
-    """Create an agent for e-commerce integration"""
+    """Create an agent for e-commerce integration with parallel tool calls"""
     
-    # Initialize APIs
-    ecommerce = ECommerceAPI()
+    # Initialize APIs (ECOMMERCE_API_URL points the tools at a real backend)
+    ecommerce = ECommerceAPI(os.getenv("ECOMMERCE_API_URL"))
     
-    # Create tools
+    # Create typed tools so the model passes arguments as JSON
+    # Product reads are cached; an order changes stock and invalidates them
+    product_tags = lambda product_id, **kwargs: [f"product:{product_id}"]
     tools = [
-        Tool(
+        tool_cache.cached(ttl=300, tags=product_tags)(StructuredTool.from_function(
+            func=lambda product_id: ecommerce.get_product_info(str(product_id)),
+            coroutine=lambda product_id: ecommerce.aget_product_info(str(product_id)),
             name="GetProductInfo",
-            func=lambda product_id: ecommerce.get_product_info(product_id),
             description="Gets product information by ID"
-        ),
-        Tool(
+        )),
+        tool_cache.cached(ttl=30, tags=product_tags)(StructuredTool.from_function(
+            func=lambda product_id: ecommerce.check_inventory(str(product_id)),
+            coroutine=lambda product_id: ecommerce.acheck_inventory(str(product_id)),
             name="CheckInventory",
-            func=lambda product_id: ecommerce.check_inventory(product_id),
             description="Checks product inventory"
-        ),
-        Tool(
+        )),
+        tool_cache.invalidates(product_tags)(StructuredTool.from_function(
+            func=lambda product_id, quantity: ecommerce.process_order(str(product_id), quantity),
+            coroutine=lambda product_id, quantity: ecommerce.aprocess_order(str(product_id), quantity),
             name="ProcessOrder",
-            func=lambda x: ecommerce.process_order(*x.split(",")),
-            description="Processes an order. Format: product_id,quantity"
-        )
+            description="Processes an order for the given product ID and quantity"
+        ))
     ]
     
     # Initialize the model
-    llm = ChatOpenAI(
-        model="openai/gpt-3.5-turbo",
-        openai_api_key=os.getenv("OPENROUTER_API_KEY"),
-        openai_api_base="https://openrouter.ai/api/v1"
-    )
-    
-    # Create prompt
-    prompt = PromptTemplate.from_template("""
-    You are an e-commerce assistant. Help with product inquiries and orders.
+    llm = create_chat_model()
     
-    Question: {input}
-    {agent_scratchpad}
-    """)
-    
-    # Create agent
-    agent = create_react_agent(llm, tools, prompt)
-    agent_executor = AgentExecutor(agent=agent, tools=tools, verbose=True)
+    # The model can request several tools in one response; independent calls run
+    # concurrently, orders change stock and run one at a time in the given order
+    agent = ParallelToolAgent(
+        llm,
+        tools,
+        system_prompt="You are an e-commerce assistant. Help with product inquiries and orders. "
+                      "Call independent tools together in one response.",
+        sequential_tools=["ProcessOrder"],
+        verbose=True
+    )
     
-    return agent_executor
+    return agent
+
+async def run_concurrent_sessions(agent, questions):
+    """Serve several agent sessions concurrently on one event loop"""
+    try:
+        return await asyncio.gather(*(agent.ainvoke({"input": question}) for question in questions))
+    finally:
+        # The shared async HTTP client is bound to this event loop
+        await aclose_http_clients()
 
 def main():
     """Main function to demonstrate system integrations"""
@@ -174,7 +261,18 @@ def main():
         ecommerce_agent = create_ecommerce_agent()
         
         ecommerce_result = ecommerce_agent.invoke({"input": "Check inventory for product 1 and process order for 2 units"})
-        print(f"E-commerce Response: {ecommerce_result['output']}")
+        print(f"E-commerce Response: {ecommerce_result['output']}\n")
+        
+        # Concurrent sessions: async tools keep every call on the event loop
+        print("3. Concurrent E-commerce Sessions:")
+        questions = ["What is product 1?", "How many laptops are in stock?", "Order 1 unit of product 2"]
+        results = asyncio.run(run_concurrent_sessions(ecommerce_agent, questions))
+        for question, result in zip(questions, results):
+            print(f"{question} -> {result['output']} (tool calls in threads: {result['stats'].thread_tool_calls})")
+        
+        cache_stats = tool_cache.stats()["total"]
+        print(f"Tool cache: {cache_stats['hits']} hits, {cache_stats['misses']} misses, "
+              f"{cache_stats['invalidations']} invalidated entries")
         
     except Exception as e:
         print(f"An error occurred: {str(e)}")